@@ -21,12 +21,44 @@ import sqlite3
 import hashlib
 import secrets
 import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# 异步 HTTP 客户端（模型探测等出站请求复用连接池）；缺失时退化为线程中的 requests
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
 
 # 确保项目根目录在 path 中
 _ROOT = os.path.dirname(os.path.abspath(__file__))
 if _ROOT not in sys.path:
     sys.path.insert(0, _ROOT)
 
+# 分阶段埋点（rag/tracing.py）；rag 依赖缺失时退化为空操作
+try:
+    from rag.tracing import span as _trace_span, record_llm_usage as _record_llm_usage, render_prometheus
+    TRACING_AVAILABLE = True
+except ImportError:
+    from contextlib import contextmanager as _contextmanager
+
+    class _NoopSpan:
+        def set(self, **attrs):
+            return self
+
+    @_contextmanager
+    def _trace_span(name, **attrs):
+        yield _NoopSpan()
+
+    def _record_llm_usage(sp, resp):
+        pass
+
+    TRACING_AVAILABLE = False
+
 # 加载 .env 文件（容错处理）
 try:
     from dotenv import load_dotenv
@@ -53,6 +85,7 @@ try:
         ("intent_recognition.py", f"{_pkg_name}.intent_recognition"),
         ("stopping_rules.py",     f"{_pkg_name}.stopping_rules"),
         ("citation.py",           f"{_pkg_name}.citation"),
+        ("prompt_budget.py",      f"{_pkg_name}.prompt_budget"),
     ]:
         _fpath = os.path.join(_agent_dir, _fname)
         if os.path.exists(_fpath) and _mod_name not in sys.modules:
@@ -72,13 +105,42 @@ try:
     sys.modules[f"{_pkg_name}.graph"] = _graph_mod
     _spec.loader.exec_module(_graph_mod)
     decision_graph = _graph_mod.graph
+
+    # 并行专家模式（mode="deep"）：四个专家 Agent 并行执行后合并进 finalize_decision
+    try:
+        _fanout_spec = _ilu.spec_from_file_location(f"{_pkg_name}.fanout",
+                          os.path.join(_agent_dir, "fanout.py"))
+        _fanout_mod = _ilu.module_from_spec(_fanout_spec)
+        sys.modules[f"{_pkg_name}.fanout"] = _fanout_mod
+        _fanout_spec.loader.exec_module(_fanout_mod)
+        fanout_graph = _fanout_mod.graph
+    except Exception as e_fanout:
+        fanout_graph = None
+        print(f"⚠️  并行专家模式不可用: {e_fanout}")
+
+    # DECISION_GRAPH=pipeline：兜底路径改用确定性直连流水线（pipeline.py），省去 supervisor 路由的 LLM 往返
+    if os.getenv("DECISION_GRAPH", "supervisor") == "pipeline":
+        _pipe_spec = _ilu.spec_from_file_location(f"{_pkg_name}.pipeline",
+                        os.path.join(_agent_dir, "pipeline.py"))
+        _pipe_mod = _ilu.module_from_spec(_pipe_spec)
+        sys.modules[f"{_pkg_name}.pipeline"] = _pipe_mod
+        _pipe_spec.loader.exec_module(_pipe_mod)
+        decision_graph = _pipe_mod.graph
+        print("✅ decision-pipeline 已启用（DECISION_GRAPH=pipeline）")
     # 直接拿到 full_decision_analysis 工具函数，供"绕过 supervisor"模式使用
     _full_decision_fn = getattr(_graph_mod, "full_decision_analysis", None)
+    # 原生异步版本（检索在线程中并行、LLM 走 ainvoke），/chat 优先使用
+    _afull_decision_fn = getattr(_graph_mod, "afull_decision_analysis", None)
+    # 请求级状态（引用池 / 停止规则）的初始化入口
+    _begin_request = getattr(_graph_mod, "begin_request", None)
     GRAPH_AVAILABLE = True
     print("✅ decision-agent graph 加载成功")
 except Exception as e2:
     GRAPH_AVAILABLE = False
     _full_decision_fn = None
+    _afull_decision_fn = None
+    _begin_request = None
+    fanout_graph = None
     print(f"⚠️  graph 加载失败: {e2}")
     print("   将使用 mock 模式运行（返回示例响应）")
 
@@ -107,38 +169,133 @@ def _web_search(query: str) -> str:
         return ""
 
 
+# ============================================================
+# 出站 HTTP / 线程池
+# ============================================================
+
+# 事件循环默认线程池大小：ddgs、Chroma、同步 LLM 兜底等阻塞调用在这里执行，
+# 等待 LLM 的请求（ainvoke）不占线程，因此几十个线程即可支撑上千个并发等待中的请求
+PROXY_THREAD_POOL = int(os.getenv("PROXY_THREAD_POOL", "32"))
+# auth.db 访问与 pbkdf2 口令哈希使用独立的小线程池，避免被检索任务挤占
+AUTH_DB_THREADS = int(os.getenv("AUTH_DB_THREADS", "4"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+# 完整决策报告的跨进程共享缓存：相同问题 + 画像 + 模式在 TTL 内直接复用（REPORT_CACHE_TTL_S=0 关闭）
+try:
+    from rag.shared_cache import SharedCache
+    _report_cache = SharedCache("report", float(os.getenv("REPORT_CACHE_TTL_S", "0")))
+except ImportError:
+    _report_cache = None
+
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=AUTH_DB_THREADS, thread_name_prefix="auth-db")
+_http_client = None
+
+
+def _get_http_client():
+    """进程内共享的 httpx.AsyncClient（连接池 + keep-alive），首次使用时创建"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(10.0),
+        )
+    return _http_client
+
+
+async def _run_db(fn, *args):
+    """在 auth-db 线程池中执行同步的 sqlite / 口令哈希函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_DB_EXECUTOR, fn, *args)
+
+
+# ============================================================
+# Gemini 模型探测（结果在进程内缓存，只探测一次）
+# ============================================================
+
+_GOOGLE_MODELS_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+_PREFERRED_MODELS = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"]
+_DEFAULT_MODEL = "gemini-2.5-flash"
+_resolved_model = None
+
+
+def _pick_google_model(models: list) -> str:
+    candidates = []
+    for m in models:
+        methods = m.get("supportedGenerationMethods", []) or []
+        if "generateContent" in methods:
+            name = (m.get("name") or "").split("/")[-1]
+            if name:
+                candidates.append(name)
+
+    for p in _PREFERRED_MODELS:
+        if p in candidates:
+            return p
+    if candidates:
+        return candidates[0]
+    return _DEFAULT_MODEL
+
+
 def _resolve_google_model() -> str:
+    global _resolved_model
     forced = os.getenv("GOOGLE_MODEL")
     if forced:
         return forced
+    if _resolved_model:
+        return _resolved_model
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
-        return "gemini-2.5-flash"
+        return _DEFAULT_MODEL
     try:
-        resp = requests.get(
-            "https://generativelanguage.googleapis.com/v1beta/models",
-            params={"key": api_key},
-            timeout=8,
-        )
+        resp = requests.get(_GOOGLE_MODELS_URL, params={"key": api_key}, timeout=8)
+        resp.raise_for_status()
+        _resolved_model = _pick_google_model(resp.json().get("models", []))
+        return _resolved_model
+    except Exception as e:
+        print(f"⚠️  fallback 模型探测失败: {e}")
+    return _DEFAULT_MODEL
+
+
+async def _aresolve_google_model() -> str:
+    """_resolve_google_model 的异步版本：通过共享 httpx 连接池探测，不阻塞事件循环"""
+    global _resolved_model
+    forced = os.getenv("GOOGLE_MODEL")
+    if forced:
+        return forced
+    if _resolved_model:
+        return _resolved_model
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        return _DEFAULT_MODEL
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(_resolve_google_model)
+    try:
+        resp = await _get_http_client().get(_GOOGLE_MODELS_URL, params={"key": api_key}, timeout=8)
         resp.raise_for_status()
-        models = resp.json().get("models", [])
-        candidates = []
-        for m in models:
-            methods = m.get("supportedGenerationMethods", []) or []
-            if "generateContent" in methods:
-                name = (m.get("name") or "").split("/")[-1]
-                if name:
-                    candidates.append(name)
-
-        preferred = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"]
-        for p in preferred:
-            if p in candidates:
-                return p
-        if candidates:
-            return candidates[0]
+        _resolved_model = _pick_google_model(resp.json().get("models", []))
+        return _resolved_model
     except Exception as e:
         print(f"⚠️  fallback 模型探测失败: {e}")
-    return "gemini-2.5-flash"
+    return _DEFAULT_MODEL
+
+
+_chat_models = {}
+_chat_models_lock = threading.Lock()
+
+
+def _get_chat_model(model: str, temperature: float):
+    """按 (模型, 温度) 复用 ChatGoogleGenerativeAI 实例，避免每个请求重建客户端"""
+    key = (model, temperature)
+    llm = _chat_models.get(key)
+    if llm is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        with _chat_models_lock:
+            llm = _chat_models.get(key)
+            if llm is None:
+                llm = ChatGoogleGenerativeAI(model=model, temperature=temperature)
+                _chat_models[key] = llm
+    return llm
 
 
 _AUTH_DB = os.path.join(_ROOT, "data", "auth.db")
@@ -254,6 +411,70 @@ def _get_profile(user_id: int) -> dict:
         conn.close()
 
 
+def _register_user(email: str, password: str) -> str:
+    """创建用户并签发会话，返回 token；邮箱已存在时抛 sqlite3.IntegrityError"""
+    salt = secrets.token_hex(16)
+    pwd_hash = _hash_password(password, salt)
+    now = int(time.time())
+    conn = _db_conn()
+    try:
+        cur = conn.execute(
+            "INSERT INTO users(email, password_hash, salt, created_at) VALUES(?, ?, ?, ?)",
+            (email, pwd_hash, salt, now),
+        )
+        user_id = cur.lastrowid
+        token = secrets.token_urlsafe(32)
+        conn.execute(
+            "INSERT INTO sessions(token, user_id, expires_at, created_at) VALUES(?, ?, ?, ?)",
+            (token, user_id, now + 30 * 24 * 3600, now),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    _upsert_profile(user_id, {"email": email})
+    return token
+
+
+def _login_user(email: str, password: str) -> Optional[str]:
+    """校验口令并签发会话，返回 token；账号或密码错误时返回 None"""
+    conn = _db_conn()
+    try:
+        row = conn.execute(
+            "SELECT id, password_hash, salt FROM users WHERE email = ?",
+            (email,),
+        ).fetchone()
+        if not row or _hash_password(password, row["salt"]) != row["password_hash"]:
+            return None
+        now = int(time.time())
+        token = secrets.token_urlsafe(32)
+        conn.execute(
+            "INSERT INTO sessions(token, user_id, expires_at, created_at) VALUES(?, ?, ?, ?)",
+            (token, row["id"], now + 30 * 24 * 3600, now),
+        )
+        conn.commit()
+        return token
+    finally:
+        conn.close()
+
+
+def _delete_session(token: str) -> None:
+    conn = _db_conn()
+    try:
+        conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _delete_profile(user_id: int) -> None:
+    conn = _db_conn()
+    try:
+        conn.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def _build_search_context(message: str) -> dict:
     """根据问题类型决定搜索什么，返回真实搜索结果"""
     has_house   = any(k in message for k in ["买房", "房子", "首付", "月供", "通州", "楼市"])
@@ -399,9 +620,43 @@ def _generate_mock_response(message: str, mode: str = "simple") -> str:
 > 💡 演示模式 · 如需完整 AI 分析请配置 API Key"""
 
 
+def warmup() -> None:
+    """
+    gunicorn --preload 时在 master 中调用：提前加载 embedding / 精排模型权重，
+    fork 出的 worker 以写时复制方式共享这些只读内存页，每个 worker 不再各自冷启动。
+    只加载不推理（推理会拉起线程池，fork 后不安全）；Chroma / SQLite 连接在 worker 中按进程重建。
+    """
+    start = time.perf_counter()
+    try:
+        from rag.embeddings import get_embedding_function
+        get_embedding_function()
+    except Exception as e:
+        print(f"⚠️  预热 embedding 失败: {e}")
+    try:
+        from rag.reranker import RERANK_BACKEND, _get_cross_encoder
+        if RERANK_BACKEND != "jaccard":
+            _get_cross_encoder()
+    except Exception as e:
+        print(f"⚠️  预热精排模型失败: {e}")
+    print(f"✅ 预热完成（{(time.perf_counter() - start) * 1000:.0f}ms）")
+
+
 if HAS_FASTAPI:
     _init_auth_db()
-    app = FastAPI(title="DecideX Backend Proxy")
+
+    @asynccontextmanager
+    async def _lifespan(app):
+        # 有界默认线程池：阻塞调用（检索、ddgs、graph 同步节点）共用 PROXY_THREAD_POOL 个线程
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=PROXY_THREAD_POOL, thread_name_prefix="proxy"))
+        yield
+        global _http_client
+        if _http_client is not None:
+            await _http_client.aclose()
+            _http_client = None
+        _DB_EXECUTOR.shutdown(wait=False)
+
+    app = FastAPI(title="DecideX Backend Proxy", lifespan=_lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -415,7 +670,7 @@ if HAS_FASTAPI:
         agent: str
         message: str
         conversation_id: Optional[str] = None
-        mode: Optional[str] = "simple"  # "simple" | "detailed"
+        mode: Optional[str] = "simple"  # "simple" | "detailed" | "deep"（并行专家 Agent）
         user_id: Optional[str] = None
         user_profile: Optional[dict] = None
 
@@ -442,53 +697,72 @@ if HAS_FASTAPI:
     async def chat(request: ChatRequest, authorization: Optional[str] = Header(default=None)):
         conversation_id = request.conversation_id or str(uuid.uuid4())[:8]
         token = _extract_bearer(authorization)
-        authed_user = _get_user_by_token(token) if token else None
+        authed_user = await _run_db(_get_user_by_token, token) if token else None
 
         mode = request.mode or "simple"
 
         if not GRAPH_AVAILABLE:
-            mock_response = _generate_mock_response(request.message, mode)
+            # mock 模式会同步调用 DuckDuckGo，放进线程池
+            mock_response = await asyncio.to_thread(_generate_mock_response, request.message, mode)
             return ChatResponse(response=mock_response, conversation_id=conversation_id)
 
         # 合并用户画像
         merged_profile = {}
         if authed_user:
-            merged_profile = _get_profile(authed_user["id"])
+            merged_profile = await _run_db(_get_profile, authed_user["id"])
         if request.user_profile:
             merged_profile.update(request.user_profile)
         if authed_user and merged_profile:
-            _upsert_profile(authed_user["id"], merged_profile)
+            await _run_db(_upsert_profile, authed_user["id"], merged_profile)
 
         # ── 两种模式都先跑完整详细分析，保证分析依据100%一致 ─────────────────────
         # simple 模式：完整分析完成后，再做一次快速二次压缩（保证结论来自同一份分析）
         # detailed 模式：直接返回完整报告
+        # 本请求独立的引用池 / 停止规则状态（并发请求互不串扰）
+        if _begin_request is not None:
+            _begin_request()
+
         try:
-            import asyncio
             profile_json = json.dumps(merged_profile, ensure_ascii=False) if merged_profile else ""
+            report_key = json.dumps([mode, request.message, profile_json], ensure_ascii=False)
+            if _report_cache is not None and _report_cache.enabled:
+                cached = await _run_db(_report_cache.get, report_key)
+                if cached is not None:
+                    return ChatResponse(response=cached, conversation_id=conversation_id)
+
+            # deep 模式：并行专家 Agent 深度报告（耗时约等于最慢的一个专家 + 一次综合推荐）
+            if mode == "deep" and fanout_graph is not None:
+                fanout_state = await fanout_graph.ainvoke({
+                    "decision_query": request.message,
+                    "user_profile": profile_json,
+                    "user_id": str(authed_user["id"]) if authed_user else "default",
+                })
+                result = fanout_state["messages"][-1].content
+                return ChatResponse(response=str(result), conversation_id=conversation_id)
 
-            if _full_decision_fn is not None:
-                # 第一步：始终以 detailed 模式跑完整分析
-                loop = asyncio.get_running_loop()
-                detailed_result = await loop.run_in_executor(
-                    None,
-                    lambda: _full_decision_fn.invoke({
-                        "decision_query": request.message,
-                        "user_profile": profile_json,
-                        "mode": "detailed",
-                    })
-                )
-                if not detailed_result or len(str(detailed_result).strip()) < 50:
-                    raise ValueError("full_decision_analysis 返回内容过短，降级处理")
-
-                # 第二步：simple 模式对完整报告做二次压缩（结论来自同一份分析，保证一致）
-                if mode == "simple":
-                    result = await loop.run_in_executor(
-                        None,
-                        lambda: _compress_to_simple(str(detailed_result))
-                    )
-                else:
-                    result = detailed_result
+            if _afull_decision_fn is not None or _full_decision_fn is not None:
+                # 整个请求作为一条 trace：to_thread / ainvoke 中的阶段 span 通过 contextvars 挂到 chat_request 下
+                with _trace_span("chat_request", mode=mode):
+                    # 第一步：始终以 detailed 模式跑完整分析
+                    if _afull_decision_fn is not None:
+                        detailed_result = await _afull_decision_fn(request.message, profile_json, "detailed")
+                    else:
+                        detailed_result = await asyncio.to_thread(_full_decision_fn.invoke, {
+                            "decision_query": request.message,
+                            "user_profile": profile_json,
+                            "mode": "detailed",
+                        })
+                    if not detailed_result or len(str(detailed_result).strip()) < 50:
+                        raise ValueError("full_decision_analysis 返回内容过短，降级处理")
+
+                    # 第二步：simple 模式对完整报告做二次压缩（结论来自同一份分析，保证一致）
+                    if mode == "simple":
+                        result = await _acompress_to_simple(str(detailed_result))
+                    else:
+                        result = detailed_result
 
+                if _report_cache is not None and _report_cache.enabled:
+                    await _run_db(_report_cache.put, report_key, str(result))
                 return ChatResponse(response=str(result), conversation_id=conversation_id)
 
             # 兜底：full_decision_fn 不可用时走旧的 graph stream 路径
@@ -521,123 +795,68 @@ if HAS_FASTAPI:
             raise HTTPException(status_code=400, detail="邮箱格式不正确")
         if len(password) < 6:
             raise HTTPException(status_code=400, detail="密码至少6位")
-        salt = secrets.token_hex(16)
-        pwd_hash = _hash_password(password, salt)
-        now = int(time.time())
-        conn = _db_conn()
         try:
-            cur = conn.execute(
-                "INSERT INTO users(email, password_hash, salt, created_at) VALUES(?, ?, ?, ?)",
-                (email, pwd_hash, salt, now),
-            )
-            user_id = cur.lastrowid
-            token = secrets.token_urlsafe(32)
-            conn.execute(
-                "INSERT INTO sessions(token, user_id, expires_at, created_at) VALUES(?, ?, ?, ?)",
-                (token, user_id, now + 30 * 24 * 3600, now),
-            )
-            conn.commit()
-            _upsert_profile(user_id, {"email": email})
-            return {"token": token, "email": email}
+            token = await _run_db(_register_user, email, password)
         except sqlite3.IntegrityError:
             raise HTTPException(status_code=409, detail="邮箱已注册")
-        finally:
-            conn.close()
+        return {"token": token, "email": email}
 
     @app.post("/auth/login")
     async def auth_login(payload: AuthRequest):
         email = payload.email.strip().lower()
         password = payload.password.strip()
-        conn = _db_conn()
-        try:
-            row = conn.execute(
-                "SELECT id, password_hash, salt FROM users WHERE email = ?",
-                (email,),
-            ).fetchone()
-            if not row:
-                raise HTTPException(status_code=401, detail="账号或密码错误")
-            if _hash_password(password, row["salt"]) != row["password_hash"]:
-                raise HTTPException(status_code=401, detail="账号或密码错误")
-            now = int(time.time())
-            token = secrets.token_urlsafe(32)
-            conn.execute(
-                "INSERT INTO sessions(token, user_id, expires_at, created_at) VALUES(?, ?, ?, ?)",
-                (token, row["id"], now + 30 * 24 * 3600, now),
-            )
-            conn.commit()
-            return {"token": token, "email": email}
-        finally:
-            conn.close()
+        token = await _run_db(_login_user, email, password)
+        if not token:
+            raise HTTPException(status_code=401, detail="账号或密码错误")
+        return {"token": token, "email": email}
 
     @app.post("/auth/logout")
     async def auth_logout(authorization: Optional[str] = Header(default=None)):
         token = _extract_bearer(authorization)
         if not token:
             return {"ok": True}
-        conn = _db_conn()
-        try:
-            conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
-            conn.commit()
-        finally:
-            conn.close()
+        await _run_db(_delete_session, token)
         return {"ok": True}
 
-    @app.get("/auth/me")
-    async def auth_me(authorization: Optional[str] = Header(default=None)):
+    async def _require_user(authorization: Optional[str]) -> dict:
         token = _extract_bearer(authorization)
         if not token:
             raise HTTPException(status_code=401, detail="未登录")
-        user = _get_user_by_token(token)
+        user = await _run_db(_get_user_by_token, token)
         if not user:
             raise HTTPException(status_code=401, detail="登录已过期")
+        return user
+
+    @app.get("/auth/me")
+    async def auth_me(authorization: Optional[str] = Header(default=None)):
+        user = await _require_user(authorization)
         return {"email": user["email"], "user_id": user["id"]}
 
     @app.get("/profile")
     async def get_profile(authorization: Optional[str] = Header(default=None)):
-        token = _extract_bearer(authorization)
-        if not token:
-            raise HTTPException(status_code=401, detail="未登录")
-        user = _get_user_by_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="登录已过期")
-        return {"profile": _get_profile(user["id"])}
+        user = await _require_user(authorization)
+        return {"profile": await _run_db(_get_profile, user["id"])}
 
     @app.post("/profile")
     async def save_profile(payload: ProfileRequest, authorization: Optional[str] = Header(default=None)):
-        token = _extract_bearer(authorization)
-        if not token:
-            raise HTTPException(status_code=401, detail="未登录")
-        user = _get_user_by_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="登录已过期")
+        user = await _require_user(authorization)
         profile = payload.profile or {}
         profile["email"] = user["email"]
-        _upsert_profile(user["id"], profile)
+        await _run_db(_upsert_profile, user["id"], profile)
         return {"ok": True}
 
     @app.post("/profile/reset")
     async def reset_profile(authorization: Optional[str] = Header(default=None)):
-        token = _extract_bearer(authorization)
-        if not token:
-            raise HTTPException(status_code=401, detail="未登录")
-        user = _get_user_by_token(token)
-        if not user:
-            raise HTTPException(status_code=401, detail="登录已过期")
-        conn = _db_conn()
-        try:
-            conn.execute("DELETE FROM profiles WHERE user_id = ?", (user["id"],))
-            conn.commit()
-        finally:
-            conn.close()
+        user = await _require_user(authorization)
+        await _run_db(_delete_profile, user["id"])
         return {"ok": True, "message": "用户画像已重置"}
 
-    def _compress_to_simple(detailed_report: str) -> str:
+    async def _acompress_to_simple(detailed_report: str) -> str:
         """
         用 LLM 对完整详细报告做二次提炼，生成真正精简的摘要。
         LLM 只允许提炼/复述报告中已有的结论，不能新增分析，保证与详细模式一致。
         Citation 块直接透传，不经 LLM。
         """
-        from langchain_google_genai import ChatGoogleGenerativeAI
         from langchain_core.messages import HumanMessage, SystemMessage
 
         # ── 分离 citation 块（不经 LLM，直接透传）────────────────────────────
@@ -650,7 +869,8 @@ if HAS_FASTAPI:
 
         # ── 用 LLM 提炼精简摘要 ───────────────────────────────────────────────
         try:
-            _llm = ChatGoogleGenerativeAI(model=_resolve_google_model(), temperature=0.1)
+            model = await _aresolve_google_model()
+            _llm = _get_chat_model(model, 0.1)
             system = (
                 "你是一个报告摘要助手。你的任务是从用户提供的完整决策报告中提炼精简摘要。\n"
                 "严格规则：\n"
@@ -669,10 +889,12 @@ if HAS_FASTAPI:
                 "- [第一条行动建议，≤25字]\n"
                 "- [第二条行动建议，≤25字]"
             )
-            resp = _llm.invoke([
-                SystemMessage(content=system),
-                HumanMessage(content=f"请提炼以下报告：\n\n{detailed_report[:3000]}")
-            ])
+            with _trace_span("compress_to_simple", model=model) as sp:
+                resp = await _llm.ainvoke([
+                    SystemMessage(content=system),
+                    HumanMessage(content=f"请提炼以下报告：\n\n{detailed_report[:3000]}")
+                ])
+                _record_llm_usage(sp, resp)
             simple_body = resp.content.strip()
         except Exception:
             # LLM 失败时的兜底：直接截取综合推荐段
@@ -718,46 +940,26 @@ if HAS_FASTAPI:
             )
         return str(content)
 
+    def _extract_text(content) -> str:
+        """兼容 Gemini list 格式、dict 和普通字符串"""
+        if isinstance(content, dict):
+            # dict 必须用 json.dumps，否则 str(dict) 产生单引号格式，json.loads 会失败
+            return json.dumps(content, ensure_ascii=False)
+        if isinstance(content, list):
+            parts = []
+            for item in content:
+                if isinstance(item, dict):
+                    parts.append(item.get("text", "") or json.dumps(item, ensure_ascii=False))
+                else:
+                    parts.append(str(item))
+            return " ".join(parts)
+        return str(content or "")
+
     async def _run_graph(inputs: dict, config: dict) -> str:
         """用 stream 收集所有消息，智能提取最佳结果"""
-        import asyncio
-        loop = asyncio.get_running_loop()
-
-        def _extract_text(content) -> str:
-            """兼容 Gemini list 格式、dict 和普通字符串"""
-            if isinstance(content, dict):
-                # dict 必须用 json.dumps，否则 str(dict) 产生单引号格式，json.loads 会失败
-                return json.dumps(content, ensure_ascii=False)
-            if isinstance(content, list):
-                parts = []
-                for item in content:
-                    if isinstance(item, dict):
-                        parts.append(item.get("text", "") or json.dumps(item, ensure_ascii=False))
-                    else:
-                        parts.append(str(item))
-                return " ".join(parts)
-            return str(content or "")
-
-        def _invoke():
-            print("[DEBUG] streaming graph ...")
-            all_msgs = []
-            try:
-                for chunk in decision_graph.stream(inputs, config, stream_mode="values"):
-                    msgs = chunk.get("messages", []) if isinstance(chunk, dict) else []
-                    all_msgs = msgs
-                    # 简化日志，只打印最后一条
-                    if msgs:
-                        m = msgs[-1]
-                        mtype = getattr(m, "type", "?")
-                        tcalls = getattr(m, "tool_calls", [])
-                        tnames = [t.get("name","?") if isinstance(t,dict) else getattr(t,"name","?") for t in tcalls]
-                        text = _extract_text(getattr(m, "content", "") or "")
-                        print(f"[DEBUG]   msg type={mtype} tool_calls={tnames} len={len(text)} preview={text[:60]}")
-            except Exception as e:
-                print(f"[DEBUG] stream error: {e}")
-
-            print(f"[DEBUG] total messages after stream: {len(all_msgs)}")
 
+        def _pick_result(all_msgs: list) -> Optional[str]:
+            """按优先级从消息列表中挑出分析报告，找不到时返回 None"""
             # ── 策略1：在 tool 消息中找 full_decision_analysis 的输出 ─────────────
             # full_decision_analysis 返回的是长报告（>500字），transfer 消息很短（<100字）
             # 只要 tool 消息够长且不是 transfer 消息，就是分析报告
@@ -864,29 +1066,47 @@ if HAS_FASTAPI:
                     print(f"[DEBUG] found fallback ai msg, len={len(text)}")
                     return text
 
-            # ── 最终兜底：直接调 LLM ─────────────────────────────────────────────
-            print("[DEBUG] no useful content, falling back to direct LLM")
-            return _direct_llm_fallback(inputs["messages"][0].content)
+            return None
+
+        print("[DEBUG] streaming graph ...")
+        all_msgs = []
+        try:
+            # astream：LLM 节点走 ainvoke，同步节点由 LangGraph 放进默认线程池
+            async for chunk in decision_graph.astream(inputs, config, stream_mode="values"):
+                msgs = chunk.get("messages", []) if isinstance(chunk, dict) else []
+                all_msgs = msgs
+                # 简化日志，只打印最后一条
+                if msgs:
+                    m = msgs[-1]
+                    mtype = getattr(m, "type", "?")
+                    tcalls = getattr(m, "tool_calls", [])
+                    tnames = [t.get("name","?") if isinstance(t,dict) else getattr(t,"name","?") for t in tcalls]
+                    text = _extract_text(getattr(m, "content", "") or "")
+                    print(f"[DEBUG]   msg type={mtype} tool_calls={tnames} len={len(text)} preview={text[:60]}")
+        except Exception as e:
+            print(f"[DEBUG] stream error: {e}")
+
+        print(f"[DEBUG] total messages after stream: {len(all_msgs)}")
+        result = _pick_result(all_msgs)
+        if result is not None:
+            return result
 
-        return await loop.run_in_executor(None, _invoke)
+        # ── 最终兜底：直接调 LLM ─────────────────────────────────────────────
+        print("[DEBUG] no useful content, falling back to direct LLM")
+        return await _adirect_llm_fallback(inputs["messages"][0].content)
 
-    def _direct_llm_fallback(user_message: str) -> str:
+    async def _adirect_llm_fallback(user_message: str) -> str:
         """当 graph 无输出时，直接调 Gemini 生成决策分析"""
         try:
-            import os
-            from langchain_google_genai import ChatGoogleGenerativeAI
             from langchain_core.messages import HumanMessage, SystemMessage
-            _llm = ChatGoogleGenerativeAI(
-                model=_resolve_google_model(),
-                temperature=0.3,
-            )
+            _llm = _get_chat_model(await _aresolve_google_model(), 0.3)
             system = (
                 "你是 DecideX 智能决策助手，专注于帮助用户做理性决策。\n"
                 "请从**成本分析、风险评估、价值判断、个人匹配度**四个维度分析用户的决策问题，\n"
                 "给出结构化的分析报告，最后给出明确的建议。\n"
                 "用 Markdown 格式输出，带标题和要点。"
             )
-            resp = _llm.invoke([SystemMessage(content=system), HumanMessage(content=user_message)])
+            resp = await _llm.ainvoke([SystemMessage(content=system), HumanMessage(content=user_message)])
             return resp.content or "分析完成，请重试。"
         except Exception as e:
             return f"❌ 分析失败：{e}\n\n请确认 GOOGLE_API_KEY 已正确设置。"
@@ -904,12 +1124,34 @@ if HAS_FASTAPI:
 
     @app.get("/health")
     async def health():
+        try:
+            from rag.reranker import reranker_health
+            reranker_state = reranker_health()
+        except Exception as e:
+            reranker_state = {"error": str(e)}
         return {
             "status": "healthy",
             "graph_available": GRAPH_AVAILABLE,
             "mode": "direct" if GRAPH_AVAILABLE else "mock",
+            "reranker": reranker_state,
         }
 
+    @app.get("/stats/embeddings")
+    async def embedding_stats():
+        """embedding 缓存命中率、磁盘命中数、估算节省时间"""
+        try:
+            from rag.embeddings import embedding_cache_stats
+            return embedding_cache_stats()
+        except Exception as e:
+            return {"enabled": False, "error": str(e)}
+
+    @app.get("/metrics")
+    async def metrics():
+        """Prometheus 文本格式：各阶段延迟直方图、token 用量、缓存命中、文档数"""
+        from fastapi.responses import PlainTextResponse
+        body = render_prometheus() if TRACING_AVAILABLE else ""
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
     if __name__ == "__main__":
         import uvicorn
         port = int(os.getenv("PORT", 8123))
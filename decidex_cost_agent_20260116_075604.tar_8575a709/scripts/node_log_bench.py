@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+节点日志开销基准：write_log 同步逐条 fsync vs 异步批量写入
+
+构建一个 --nodes 个节点的线性图（节点本身不做任何事，只透传 --payload-kb 大小的状态），
+挂上 utils.log.node_log.Logger 回调运行 --runs 次，对比三种模式：
+  - off     不挂 Logger（基线）
+  - sync    NODE_LOG_ASYNC=0：每条日志 open + write + fsync
+  - async   NODE_LOG_ASYNC=1：入队后由后台线程批量写入
+
+每个节点的日志开销 = (模式耗时 - 基线耗时) / (runs × nodes)。
+async 模式另外统计 flush_logs() 等待全部落盘的时间，以及丢弃条数。
+--history 在状态中放入 N 轮历史对话，log CPU% = 日志占整次运行 CPU 时间（process_time）的比例，
+用于观察 _serialize_data 的预算截断与已记录消息去重效果。
+
+使用方式（在项目根目录）：
+    python scripts/node_log_bench.py
+    python scripts/node_log_bench.py --nodes 20 --runs 50 --payload-kb 16
+    python scripts/node_log_bench.py --history 500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+app_dir = os.path.join(workspace_path, "src")
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+# 日志写到临时目录，避免污染真实日志；必须在导入 node_log 之前设置
+os.environ.setdefault("COZE_LOG_DIR", tempfile.mkdtemp(prefix="node_log_bench_"))
+os.environ.pop("COZE_PROJECT_ENV", None)
+
+import logging
+from typing import Annotated
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from coze_coding_utils.runtime_ctx.context import new_context
+from utils.log import node_log
+from utils.log.node_log import Logger, flush_logs
+
+
+class BenchState(TypedDict):
+    payload: str
+    step: int
+    messages: Annotated[list, add_messages]
+
+
+def build_graph(n_nodes: int):
+    builder = StateGraph(BenchState)
+
+    def make_node(i: int):
+        def node(state: BenchState) -> dict:
+            return {"step": state["step"] + 1, "messages": [AIMessage(content=f"节点 {i} 的输出")]}
+        node.__name__ = f"node_{i}"
+        return node
+
+    names = [f"node_{i}" for i in range(n_nodes)]
+    for i, name in enumerate(names):
+        builder.add_node(name, make_node(i))
+    builder.add_edge(START, names[0])
+    for a, b in zip(names, names[1:]):
+        builder.add_edge(a, b)
+    builder.add_edge(names[-1], END)
+    return builder.compile()
+
+
+def build_history(n: int) -> list:
+    history = []
+    for i in range(n):
+        history.append(HumanMessage(content=f"第 {i} 轮提问：" + "请帮我分析这个决策。" * 20, id=f"h{i}"))
+        history.append(AIMessage(content=f"第 {i} 轮回答：" + "综合成本、风险和价值来看……" * 40, id=f"a{i}"))
+    return history
+
+
+def run_mode(mode: str, graph, runs: int, payload: str, history: list) -> dict:
+    node_log.NODE_LOG_ASYNC = mode == "async"
+    state = {"payload": payload, "step": 0, "messages": history}
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    for _ in range(runs):
+        config = {}
+        if mode != "off":
+            tracer = Logger(graph, new_context(method="bench"))
+            tracer.on_chain_start = tracer.on_chain_start_graph
+            tracer.on_chain_end = tracer.on_chain_end_graph
+            config = {"callbacks": [tracer]}
+        graph.invoke(state, config)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - c0
+
+    flush_s = 0.0
+    if mode == "async":
+        t1 = time.perf_counter()
+        flush_logs(timeout=60)
+        flush_s = time.perf_counter() - t1
+    return {"mode": mode, "elapsed_s": elapsed, "cpu_s": cpu, "flush_s": flush_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="node_log 同步 / 异步写入开销对比")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--payload-kb", type=int, default=8, help="状态中透传的字符串大小（KB）")
+    parser.add_argument("--history", type=int, default=0, help="状态中的历史对话轮数（每轮 2 条消息）")
+    args = parser.parse_args()
+
+    # 控制台日志不是本基准的测量对象
+    logging.getLogger(node_log.__name__).setLevel(logging.WARNING)
+
+    graph = build_graph(args.nodes)
+    payload = "x" * (args.payload_kb * 1024)
+    history = build_history(args.history)
+    run_mode("off", graph, 2, payload, history)  # 预热
+
+    rows = [run_mode(m, graph, args.runs, payload, history) for m in ("off", "sync", "async")]
+    base, base_cpu = rows[0]["elapsed_s"], rows[0]["cpu_s"]
+    calls = args.runs * args.nodes
+
+    print(f"日志文件：{node_log.LOG_FILE}，日志大小 {os.path.getsize(node_log.LOG_FILE) / 1024:.0f} KB")
+    print(f"{'mode':<8}{'total(s)':>10}{'per-node(us)':>14}{'log CPU%':>10}{'flush(s)':>10}")
+    for r in rows:
+        per_node = (r["elapsed_s"] - base) / calls * 1e6 if r["mode"] != "off" else 0.0
+        cpu_share = max(r["cpu_s"] - base_cpu, 0.0) / r["cpu_s"] * 100 if r["cpu_s"] else 0.0
+        print(f"{r['mode']:<8}{r['elapsed_s']:>10.3f}{per_node:>14.1f}{cpu_share:>10.1f}{r['flush_s']:>10.3f}")
+    print("async sink:", node_log.get_log_sink(node_log.LOG_FILE).stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,11 @@ import os
 import inspect
 import importlib
 import ast
+import hashlib
+import logging
 import textwrap
+import threading
+import time
 from pydantic import BaseModel
 from typing import get_type_hints,Type,Optional,get_origin,Union,get_args
 from langgraph.graph.state import CompiledStateGraph
@@ -20,6 +24,140 @@ def get_agent_instance(module_name, ctx):
     module = importlib.import_module(module_name)
     return module.build_agent(ctx)
 
+
+logger = logging.getLogger(__name__)
+
+# 温池大小：同一份配置预先构建的 agent 实例数，请求间轮转复用
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "2"))
+# 两次 stat 配置文件之间的最小间隔（秒），避免每个请求都访问磁盘
+AGENT_CONFIG_CHECK_INTERVAL = float(os.getenv("AGENT_CONFIG_CHECK_INTERVAL", "1.0"))
+
+
+class AgentGraphCache:
+    """
+    编译后 agent 的缓存 + 温池。
+
+    build_agent(ctx) 每次都要读 agent_llm_config.json、新建 ChatOpenAI 客户端并编译图；
+    编译结果与请求无关（会话状态在 checkpointer 中按 thread_id 隔离），可以跨请求复用。
+
+    - 缓存按配置文件内容的 sha256 区分：先比较 (mtime, size)，变化后再算哈希，
+      哈希不同才重建，编辑保存但内容未变时不会重建
+    - 同一配置下保留 pool_size 个实例，get() 轮转返回
+    - stats() 导出构建次数、耗时、命中率等指标
+    """
+
+    def __init__(self, module_name: str, pool_size: int = AGENT_POOL_SIZE,
+                 check_interval: float = AGENT_CONFIG_CHECK_INTERVAL):
+        self.module_name = module_name
+        self.pool_size = max(1, pool_size)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._pool = []
+        self._next = 0
+        self._config_hash = None
+        self._config_stat = None
+        self._last_check = 0.0
+        self._metrics = {"builds": 0, "build_ms_total": 0.0, "last_build_ms": 0.0,
+                         "hits": 0, "misses": 0, "reloads": 0, "build_errors": 0}
+
+    def _config_path(self):
+        module = importlib.import_module(self.module_name)
+        rel = getattr(module, "LLM_CONFIG", None)
+        if not rel:
+            return None
+        workspace_path = os.getenv("COZE_WORKSPACE_PATH", "/workspace/projects")
+        return os.path.join(workspace_path, rel)
+
+    def _current_hash(self, force: bool = False):
+        """返回配置文件内容哈希；stat 未变化时直接复用上次的哈希"""
+        now = time.monotonic()
+        if not force and self._config_hash is not None and now - self._last_check < self.check_interval:
+            return self._config_hash
+        self._last_check = now
+        path = self._config_path()
+        if not path or not os.path.exists(path):
+            return ""
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if stat_key == self._config_stat and self._config_hash is not None:
+            return self._config_hash
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._config_stat = stat_key
+        return digest
+
+    def _build(self, ctx):
+        t0 = time.perf_counter()
+        try:
+            agent = get_agent_instance(self.module_name, ctx)
+        except Exception:
+            self._metrics["build_errors"] += 1
+            raise
+        elapsed = (time.perf_counter() - t0) * 1000
+        self._metrics["builds"] += 1
+        self._metrics["build_ms_total"] += elapsed
+        self._metrics["last_build_ms"] = round(elapsed, 2)
+        return agent
+
+    def get(self, ctx=None):
+        with self._lock:
+            digest = self._current_hash()
+            if digest != self._config_hash:
+                if self._config_hash is not None:
+                    self._metrics["reloads"] += 1
+                    logger.info(f"Agent config changed, rebuilding pool for {self.module_name}")
+                self._pool = []
+                self._config_hash = digest
+            if len(self._pool) < self.pool_size:
+                self._metrics["misses"] += 1
+                agent = self._build(ctx)
+                self._pool.append(agent)
+                return agent
+            self._metrics["hits"] += 1
+            agent = self._pool[self._next % len(self._pool)]
+            self._next += 1
+            return agent
+
+    def warm(self, ctx=None):
+        """预先构建满温池，服务启动时调用"""
+        with self._lock:
+            self._config_hash = self._current_hash(force=True)
+            while len(self._pool) < self.pool_size:
+                self._pool.append(self._build(ctx))
+        return self.stats()
+
+    def invalidate(self):
+        with self._lock:
+            self._pool = []
+            self._config_hash = None
+            self._config_stat = None
+
+    def stats(self):
+        m = dict(self._metrics)
+        lookups = m["hits"] + m["misses"]
+        m["build_ms_avg"] = round(m["build_ms_total"] / m["builds"], 2) if m["builds"] else 0.0
+        m["build_ms_total"] = round(m["build_ms_total"], 2)
+        m["hit_ratio"] = round(m["hits"] / lookups, 4) if lookups else 0.0
+        m["pool_size"] = len(self._pool)
+        m["pool_capacity"] = self.pool_size
+        m["config_hash"] = (self._config_hash or "")[:12]
+        return m
+
+
+_agent_caches = {}
+
+
+def get_agent_cache(module_name) -> AgentGraphCache:
+    cache = _agent_caches.get(module_name)
+    if cache is None:
+        cache = _agent_caches.setdefault(module_name, AgentGraphCache(module_name))
+    return cache
+
+
+def get_cached_agent_instance(module_name, ctx):
+    """get_agent_instance 的缓存版本：配置未变化时复用温池中的已编译 agent"""
+    return get_agent_cache(module_name).get(ctx)
+
 # return: func, input_class, output_class
 def get_graph_node_func_with_inout(graph, node_name):
     for node_id, node in graph.nodes.items():
@@ -6,13 +6,15 @@ from utils.log.config import LOG_DIR
 from utils.log.common import get_execute_mode, is_prod
 import uuid
 from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
 from coze_coding_utils.runtime_ctx.context import Context
 import os
 import sys
 import json
 from typing import Dict, Optional, Any
 from pydantic import BaseModel
-from utils.log.parser import LangGraphParser
+from utils.log.parser import get_parser
+from utils.log.log_sink import get_log_sink
 import asyncio
 
 
@@ -54,15 +56,42 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+# 默认异步批量写入：请求线程只入队，后台线程批量写文件并按间隔 fsync（见 log_sink.py）
+# NODE_LOG_ASYNC=0 恢复逐条写入 + fsync 的同步模式
+NODE_LOG_ASYNC = os.getenv("NODE_LOG_ASYNC", "1") != "0"
+
+
 def write_log(log_entry):
+    """
+    写入JSON格式日志。异步模式下只入队，由后台写线程批量落盘；同步模式逐条写入并 fsync
+    :param log_entry: 符合要求格式的日志字典
+    :return: 日志是否被接收（线上不写、队列过载丢弃 / 采样淘汰、写入失败时为 False）
+    """
+    if is_prod():
+        #  线上不打日志，待具备清理能后再打
+        return False
+    if NODE_LOG_ASYNC:
+        accepted = get_log_sink(LOG_FILE).submit(log_entry)
+        level = log_entry.get('level', 'info').lower()
+        log_method = getattr(logger, level, logger.info)
+        log_method(log_entry.get('message', ''))
+        return accepted
+    return _write_log_sync(log_entry)
+
+
+def flush_logs(timeout: float = 5.0) -> bool:
+    """等待已入队的日志全部落盘（同步模式下直接返回 True）"""
+    if not NODE_LOG_ASYNC:
+        return True
+    return get_log_sink(LOG_FILE).flush(timeout)
+
+
+def _write_log_sync(log_entry):
     """
     直接使用文件操作写入JSON格式日志，确保立即刷新到磁盘
     :param log_entry: 符合要求格式的日志字典
     """
     try:
-        if is_prod():
-            #  线上不打日志，待具备清理能后再打
-            return None
         log_json = json.dumps(log_entry, ensure_ascii=False)
 
         # 修改为行缓冲模式（buffering=1）而不是无缓冲模式
@@ -76,6 +105,7 @@ def write_log(log_entry):
         level = log_entry.get('level', 'info').lower()
         log_method = getattr(logger, level, logger.info)
         log_method(log_entry.get('message', ''))
+        return True
 
     except Exception as e:
         # 如果写入失败，打印到标准错误
@@ -92,8 +122,10 @@ def write_log(log_entry):
                 os.fsync(f.fileno())
             finally:
                 f.close()
+            return True
         except Exception as fallback_e:
             print(f"Fallback log write failed: {fallback_e}", flush=True)
+            return False
 
 
 def create_log_entry(level="info", message="", timestamp=None, log_id=None, latency=0,
@@ -187,11 +219,12 @@ def log_workflow_start(project_id, commit_id, log_id=None, execute_id="", input_
         method=method,
     )
 
-    write_log(log_entry)
+    return write_log(log_entry)
 
 
 def log_workflow_end(execution_id, output=None, total_time=None, status="success", token_consumed=None,
-                     error_reason=None, error_code=None, is_test_run=False, log_id="", method=""):
+                     error_reason=None, error_code=None, is_test_run=False, log_id="", method="",
+                     seen_message_ids=None):
     """
     记录流程结束日志
     :param execution_id: 执行唯一ID
@@ -202,6 +235,7 @@ def log_workflow_end(execution_id, output=None, total_time=None, status="success
     :param error_reason: 错误原因
     :param error_code: 错误码
     :param is_test_run: 是否试运行
+    :param seen_message_ids: 本次运行已记录过的消息 id（只输出引用）
     """
     level = "error" if status == "error" else "info"
     execute_mode = "test_run" if is_test_run else "run"
@@ -214,7 +248,7 @@ def log_workflow_end(execution_id, output=None, total_time=None, status="success
         level=level,
         message=message,
         latency=int(total_time * 1000) if total_time else 0,
-        output_data=_serialize_data(output),
+        output_data=_serialize_data(output, seen_message_ids),
         execute_mode=execute_mode,
         event_type="test_run_done" if is_test_run else "done",
         token=str(token_consumed) if token_consumed else "",
@@ -234,7 +268,18 @@ class Logger(BaseCallbackHandler):
         self.graph = graph
         self.runtime_ctx = ctx
         self.start_time = time.time()
-        self.parser = LangGraphParser(graph)
+        self.parser = get_parser(graph)  # 按图缓存，回调初始化 O(1)
+        # 本次运行中已完整写入日志的消息 id，后续节点的输入 / 输出中只记录引用
+        self.logged_message_ids: set = set()
+
+    def _serialize(self, data: Any, new_ids: set) -> str:
+        """序列化节点输入 / 输出；本条日志中完整记录的新消息 id 收集到 new_ids"""
+        return _serialize_data(data, self.logged_message_ids, new_ids)
+
+    def _write(self, log_entry: dict, new_ids: set) -> None:
+        """写入日志；只有被接收的条目中的消息才标记为已记录，丢弃的条目不影响后续日志"""
+        if write_log(log_entry) and new_ids:
+            self.logged_message_ids.update(new_ids)
 
     run_id_map: Dict[uuid.UUID, str] = {}
 
@@ -258,6 +303,7 @@ class Logger(BaseCallbackHandler):
         if parent_run_id is None:
             self._on_graph_start(inputs)  # workflow 开始
         node_info = self.parser.nodes.get(node_name) if node_name is not None else None
+        new_ids: set = set()
         if node_info is None:
             # 检查是否为条件节点
             if node_name in self.parser.condition_funcs:
@@ -265,7 +311,7 @@ class Logger(BaseCallbackHandler):
                 log_entry = create_log_entry(
                     level="info",
                     message=f"Condition node '{node_name}' started",
-                    input_data=_serialize_data(inputs),
+                    input_data=self._serialize(inputs, new_ids),
                     node_name=self.parser.condition_funcs[node_name]["cond_node_name"],  # 前端的条件节点名
                     execution_id=self.runtime_ctx.run_id,
                     execute_mode=get_execute_mode(),
@@ -274,14 +320,14 @@ class Logger(BaseCallbackHandler):
                     method=self.runtime_ctx.method,
                     node_type="condition"
                 )
-                write_log(log_entry)
+                self._write(log_entry, new_ids)
                 return
             logger.debug(f"Node {node_name} not found in graph")
             return
         log_entry = create_log_entry(
             level="info",
             message=f"Node '{node_info.name}' started",
-            input_data=_serialize_data(inputs),
+            input_data=self._serialize(inputs, new_ids),
             node_id=node_info.node_id,
             node_type=node_info.node_type,
             node_title=node_info.title,
@@ -292,7 +338,7 @@ class Logger(BaseCallbackHandler):
             node_name=node_info.name,
             method=self.runtime_ctx.method,
         )
-        write_log(log_entry)
+        self._write(log_entry, new_ids)
 
     def on_chain_end_graph(
             self,
@@ -308,6 +354,7 @@ class Logger(BaseCallbackHandler):
         elif node_name:
             # Node end
             node_info = self.parser.nodes.get(node_name, None)
+            new_ids: set = set()
             if node_info is None:
                 # 检查是否为条件节点
                 if node_name in self.parser.condition_funcs:
@@ -315,7 +362,7 @@ class Logger(BaseCallbackHandler):
                     log_entry = create_log_entry(
                         level="info",
                         message=f"Condition node '{node_name}' ended",
-                        output_data=_serialize_data(outputs),
+                        output_data=self._serialize(outputs, new_ids),
                         node_name=self.parser.condition_funcs[node_name]["cond_node_name"],  # 前端的条件节点名
                         execution_id=self.runtime_ctx.run_id,
                         execute_mode=get_execute_mode(),
@@ -324,14 +371,14 @@ class Logger(BaseCallbackHandler):
                         method=self.runtime_ctx.method,
                         node_type="condition"
                     )
-                    write_log(log_entry)
+                    self._write(log_entry, new_ids)
                     return
                 logger.debug(f"Node {node_name} not found in graph")
                 return
             log_entry = create_log_entry(
                 level="info",
                 message=f"Node '{node_info.name}' ended",
-                output_data=_serialize_data(outputs),
+                output_data=self._serialize(outputs, new_ids),
                 node_id=node_info.node_id,  # 注册的时候使用的function name，前端用来流转
                 node_type=node_info.node_type,
                 node_title=node_info.title,
@@ -342,20 +389,23 @@ class Logger(BaseCallbackHandler):
                 node_name=node_info.name,
                 method=self.runtime_ctx.method,
             )
-            write_log(log_entry)
+            self._write(log_entry, new_ids)
 
     def _on_graph_start(self, inputs: Dict[str, Any]):
         # Workflow start
         project_id = os.getenv("COZE_PROJECT_ID", "")
         commit_id = ""  # This might need to be sourced from metadata if available
-        log_workflow_start(
+        new_ids: set = set()
+        accepted = log_workflow_start(
             project_id=project_id,
             commit_id=commit_id,
             log_id=str(self.runtime_ctx.logid),
             execute_id=self.runtime_ctx.run_id,
-            input_data=_serialize_data(inputs),
+            input_data=self._serialize(inputs, new_ids),
             method=self.runtime_ctx.method,
         )
+        if accepted:
+            self.logged_message_ids.update(new_ids)
 
     def _on_graph_end(self, outputs: Dict[str, Any]):
         # Workflow end
@@ -368,6 +418,7 @@ class Logger(BaseCallbackHandler):
             log_id=self.runtime_ctx.logid,
             is_test_run=not is_prod(),
             method=self.runtime_ctx.method,
+            seen_message_ids=self.logged_message_ids,
         )
 
     def on_chain_error(
@@ -414,19 +465,14 @@ class Logger(BaseCallbackHandler):
         write_log(error_log_entry)
 
     def get_node_tags(self, node_name: str) -> dict[str, str]:
-        node_tags = {}
         if node_name is None or node_name == "":
-            return node_tags
+            return {}
 
-        node_info = self.parser.nodes.get(node_name, None)
-        if node_info is None:
+        node_tags = self.parser.node_tags.get(node_name)
+        if node_tags is None:
             logger.debug(f"Node {node_name} not found in graph")
             return {}
-        node_tags["node_id"] = node_info.node_id
-        node_tags["node_type"] = self.parser.get_node_type(node_info.node_id)
-        node_tags["node_title"] = node_info.title
-        node_tags["node_name"] = node_info.name
-        return node_tags
+        return dict(node_tags)
 
     def get_node_name(self, node_name: str) -> str:
         # 获取node title
@@ -440,48 +486,141 @@ class Logger(BaseCallbackHandler):
         return node_title
 
 
-def _serialize_data(data: Any) -> str:
+# 节点输入 / 输出日志的序列化预算：嵌套深度、单个字符串长度、单个列表 / 字典条目数、总字节数
+SERIALIZE_MAX_DEPTH = int(os.getenv("NODE_LOG_MAX_DEPTH", "6"))
+SERIALIZE_MAX_STR = int(os.getenv("NODE_LOG_MAX_STR", "2000"))
+SERIALIZE_MAX_ITEMS = int(os.getenv("NODE_LOG_MAX_ITEMS", "50"))
+SERIALIZE_MAX_BYTES = int(os.getenv("NODE_LOG_MAX_BYTES", str(64 * 1024)))
+# 列表超长时保留的尾部条目数（消息列表最新的内容在末尾）
+_SERIALIZE_TAIL_ITEMS = 5
+
+
+class _BoundedSerializer:
     """
-    增强版数据序列化函数，支持：
-    - Pydantic BaseModel
-    - 字典/列表等基础类型
-    - 自定义对象（通过 __dict__ 序列化）
-    - 特殊字符（保证 ASCII 编码）
+    按预算把任意对象转换为可 JSON 序列化的结构，超出预算的部分原地截断并留下标记：
+      - 字符串超过 max_str：保留前缀 + "...[+N chars]"
+      - 列表 / 字典超过 max_items：保留头尾，中间替换为 "...[N items omitted]"
+      - 嵌套超过 max_depth：替换为 "<ClassName>"
+      - 总字节数超过 max_bytes：后续内容一律替换为 "...[truncated: byte budget]"
+      - seen_message_ids 中已记录过的消息只输出 {"type", "id", "_logged": True}
+
+    seen_message_ids 只读：在预算内完整输出（没有任何截断）的新消息 id 收集到 new_ids，
+    由调用方在日志条目被接收后再并入 seen，截断或被丢弃的消息后续仍会完整记录。
     """
 
-    def _recursive_serialize(item: Any):
-        """递归序列化单个元素"""
-        # 处理 Pydantic 模型
+    def __init__(self, seen_message_ids: Optional[set] = None, max_depth: int = SERIALIZE_MAX_DEPTH,
+                 max_str: int = SERIALIZE_MAX_STR, max_items: int = SERIALIZE_MAX_ITEMS,
+                 max_bytes: int = SERIALIZE_MAX_BYTES):
+        self.seen = seen_message_ids if seen_message_ids is not None else set()
+        self.new_ids: set = set()
+        # 已留下的截断标记数，用于判断某条消息是否被完整输出
+        self.truncations = 0
+        self.max_depth = max_depth
+        self.max_str = max_str
+        self.max_items = max_items
+        self.remaining = max_bytes
+
+    def walk(self, item: Any, depth: int = 0) -> Any:
+        if self.remaining <= 0:
+            self.truncations += 1
+            return "...[truncated: byte budget]"
+        if item is None or isinstance(item, (bool, int, float)):
+            self.remaining -= 8
+            return item
+        if isinstance(item, str):
+            return self._string(item)
+        if isinstance(item, (bytes, bytearray)):
+            return self._string(f"<bytes len={len(item)}>")
+        if depth >= self.max_depth:
+            self.truncations += 1
+            return f"<{type(item).__name__}>"
+
+        if isinstance(item, BaseMessage):
+            return self._message(item, depth)
         if isinstance(item, BaseModel):
-            return item.model_dump()  # 先转字典再序列化
-
-        # 处理列表/元组
-        elif isinstance(item, (list, tuple)):
-            return [_recursive_serialize(sub_item) for sub_item in item]
-
-        # 处理字典
-        elif isinstance(item, dict):
-            return {key: _recursive_serialize(value) for key, value in item.items()}
-
-        # 处理自定义对象（有 __dict__ 属性的）
-        elif hasattr(item, '__dict__') and not isinstance(item, (str, int, float, bool, type(None))):
-            return _recursive_serialize(item.__dict__)
-
-        # 基础类型直接返回
+            fields = type(item).model_fields
+            return self._mapping(((k, getattr(item, k, None)) for k in fields), len(fields), depth)
+        if isinstance(item, dict):
+            return self._mapping(item.items(), len(item), depth)
+        if isinstance(item, (list, tuple, set, frozenset)):
+            return self._sequence(item if isinstance(item, (list, tuple)) else list(item), depth)
+        if hasattr(item, '__dict__'):
+            return self._mapping(vars(item).items(), len(vars(item)), depth)
+        return self._string(str(item))
+
+    def _string(self, s: str) -> str:
+        if len(s) > self.max_str:
+            self.truncations += 1
+            s = f"{s[:self.max_str]}...[+{len(s) - self.max_str} chars]"
+        self.remaining -= len(s.encode('utf-8')) + 2
+        return s
+
+    def _message(self, msg: "BaseMessage", depth: int) -> Any:
+        msg_id = getattr(msg, "id", None)
+        if msg_id and (msg_id in self.seen or msg_id in self.new_ids):
+            self.remaining -= 64
+            return {"type": msg.type, "id": msg_id, "_logged": True}
+        fields = type(msg).model_fields
+        # 空字段（默认的 additional_kwargs / response_metadata 等）不输出
+        pairs = ((k, v) for k in fields if (v := getattr(msg, k, None)) not in (None, "", [], {}))
+        truncations = self.truncations
+        out = self._mapping(pairs, len(fields), depth)
+        if msg_id and self.truncations == truncations:
+            self.new_ids.add(msg_id)
+        return out
+
+    def _mapping(self, pairs, size: int, depth: int) -> dict:
+        out = {}
+        for i, (key, value) in enumerate(pairs):
+            if i >= self.max_items or self.remaining <= 0:
+                self.truncations += 1
+                out["..."] = f"[{size - i} keys omitted]" if size > i else "[truncated: byte budget]"
+                break
+            key = key if isinstance(key, str) else str(key)
+            self.remaining -= len(key) + 4
+            out[key] = self.walk(value, depth + 1)
+        return out
+
+    def _sequence(self, seq, depth: int) -> list:
+        n = len(seq)
+        if n <= self.max_items:
+            head, tail = seq, []
         else:
-            return item
-
+            tail_n = min(_SERIALIZE_TAIL_ITEMS, self.max_items // 2)
+            head, tail = seq[:self.max_items - tail_n], seq[n - tail_n:]
+        # 尾部优先占用预算，保证最新的条目（如最近的消息）不被截掉
+        tail_out = [self.walk(value, depth + 1) for value in tail]
+        out = []
+        for value in head:
+            if self.remaining <= 0:
+                break
+            out.append(self.walk(value, depth + 1))
+        omitted = n - len(out) - len(tail_out)
+        if omitted > 0:
+            self.truncations += 1
+            out.append(f"...[{omitted} items omitted]")
+        out.extend(tail_out)
+        return out
+
+
+def _serialize_data(data: Any, seen_message_ids: Optional[set] = None,
+                    new_message_ids: Optional[set] = None) -> str:
+    """
+    有预算的数据序列化函数（见 _BoundedSerializer），支持：
+    - Pydantic BaseModel / LangChain 消息（按字段逐个展开，不做完整 model_dump）
+    - 字典/列表等基础类型
+    - 自定义对象（通过 __dict__ 序列化）
+    - seen_message_ids：同一次运行中已记录过的消息只输出引用，避免重复写入历史消息（只读）
+    - new_message_ids：收集本次完整输出的新消息 id，日志被接收后由调用方并入 seen_message_ids
+    """
     try:
-        # 先递归处理数据为可序列化的基础类型
-        serialized_data = _recursive_serialize(data)
-        # 最终序列化为 JSON 字符串
-        return json.dumps(serialized_data, ensure_ascii=False, indent=None)
-
+        serializer = _BoundedSerializer(seen_message_ids)
+        result = json.dumps(serializer.walk(data), ensure_ascii=False, indent=None, default=str)
+        # 超过 create_log_entry 的 1MB 上限时整条内容会被替换，消息并未真正记录
+        if new_message_ids is not None and len(result) <= 1024 * 1024:
+            new_message_ids.update(serializer.new_ids)
+        return result
     except Exception as e:
         logger.error(f"Error serializing data: {e}", exc_info=True)
-        # 降级处理：返回字符串表示
-        if len(str(data)) > 1000:
-            # 避免bytes类型返回过大，打挂线程
-            logger.info(f"Data too large and truncated, len={len(str(data))}")
-            return ""
-        return str(data)
+        # 降级处理：只输出类型名，避免对大对象整体调用 str()
+        return json.dumps(f"<unserializable {type(data).__name__}>")
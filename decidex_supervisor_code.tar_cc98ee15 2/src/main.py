@@ -1,6 +1,7 @@
 import argparse
 import asyncio
 import json
+import os
 import traceback
 import logging
 from typing import Any, Dict, Iterable, AsyncIterable, AsyncGenerator, Optional
@@ -41,30 +42,43 @@ from utils.helper.agent_helper import (
     to_stream_input,
     to_client_message,
     agent_iter_server_messages,
+    agent_aiter_server_messages,
 )
 from utils.openai.handler import OpenAIChatHandler
-from utils.log.parser import LangGraphParser
+from utils.log.parser import get_parser
 from utils.log.err_trace import extract_core_stack
 from utils.log.loop_trace import init_run_config, init_agent_config
 
 
 # 超时配置常量
 TIMEOUT_SECONDS = 900  # 15分钟
+# 流式输出缓冲队列上限：客户端读取变慢时，生产端在此处等待（背压）
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+# 流式实现：async（graph.astream，默认）或 thread（旧实现：每个流一个线程跑同步 graph.stream）
+STREAM_IMPL = os.getenv("GRAPH_STREAM_IMPL", "async")
 
 class GraphService:
     def __init__(self):
         if not graph_helper.is_agent_proj():
             self.graph = graph_helper.get_graph_instance("graphs.graph")
+        else:
+            # 启动时预热 agent 温池，请求路径上不再重复构建
+            try:
+                stats = graph_helper.get_agent_cache("agents.agent").warm()
+                logger.info(f"Agent pool warmed: {stats}")
+            except Exception as e:
+                logger.warning(f"Agent pool warm-up failed, will build on first request: {e}")
 
         # 用于跟踪正在运行的任务（使用asyncio.Task）
         self.running_tasks: Dict[str, asyncio.Task] = {}
         # 错误分类器
         self.error_classifier = ErrorClassifier()
+        self.stream_impl = STREAM_IMPL
 
     
     def _get_graph(self, ctx=Context):
         if graph_helper.is_agent_proj():
-            return graph_helper.get_agent_instance("agents.agent", ctx)
+            return graph_helper.get_cached_agent_instance("agents.agent", ctx)
         else:
             return self.graph
     
@@ -225,7 +239,7 @@ class GraphService:
         if node_func is None or input_cls is None:
             raise KeyError(f"node_id '{node_id}' not found")
         assert self.graph is not None, "Graph is not initialized"
-        parser = LangGraphParser(self.graph)
+        parser = get_parser(self.graph)
         metadata = parser.get_node_metadata(node_id) or {}
 
         _g = StateGraph(input_cls, input_schema=input_cls, output_schema=output_cls)
@@ -247,6 +261,93 @@ class GraphService:
         return {"input_schema": _graph_input.model_json_schema(), "output_schema": _graph_output.model_json_schema()}
 
     async def astream(self, payload: Dict[str, Any], graph: CompiledStateGraph, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
+        if self.stream_impl == "thread":
+            async for item in self._astream_threaded(payload, graph, run_config, ctx):
+                yield item
+            return
+
+        client_msg, session_id = to_client_message(payload)
+        run_config["recursion_limit"] = 100
+        run_config["configurable"] = {"thread_id": session_id}
+        stream_input = to_stream_input(client_msg)
+
+        # 生产端是事件循环上的一个 Task（不占线程）：
+        # - 队列有界，客户端读得慢时 q.put 会等待，graph.astream 随之暂停
+        # - 客户端断开 / cancel_run 时取消该 Task，CancelledError 直接打断正在 await 的 LLM 调用
+        q: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        start_time = time.time()
+        done = object()
+
+        def end_msg(code: str, message: str, sequence_id: int, reply_id: str = "") -> Dict[str, Any]:
+            return create_message_end_dict(
+                code=code,
+                message=message,
+                session_id=client_msg.session_id,
+                query_msg_id=client_msg.local_msg_id,
+                log_id=ctx.logid,
+                time_cost_ms=int((time.time() - start_time) * 1000),
+                reply_id=reply_id,
+                sequence_id=sequence_id,
+            )
+
+        last = {"seq": 0, "reply_id": ""}
+
+        async def producer():
+            try:
+                items = graph.astream(stream_input, stream_mode="messages", config=run_config, context=ctx)
+                async for sm in agent_aiter_server_messages(
+                    items,
+                    session_id=client_msg.session_id,
+                    query_msg_id=client_msg.local_msg_id,
+                    local_msg_id=client_msg.local_msg_id,
+                    run_id=ctx.run_id,
+                    log_id=ctx.logid,
+                ):
+                    await q.put(sm.dict())
+                    last["seq"] = sm.sequence_id
+                    last["reply_id"] = getattr(sm, "reply_id", "")
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                # 使用错误分类器获取错误码
+                err = classify_error(ex, {"node_name": "astream"})
+                await q.put(end_msg(str(err.code), err.message, last["seq"] + 1))
+            await q.put(done)
+
+        task = asyncio.create_task(producer())
+        try:
+            while True:
+                remaining = TIMEOUT_SECONDS - (time.time() - start_time)
+                try:
+                    item = await asyncio.wait_for(q.get(), timeout=max(remaining, 0))
+                except asyncio.TimeoutError:
+                    logger.error(f"Agent execution timeout after {TIMEOUT_SECONDS}s for run_id: {ctx.run_id}")
+                    task.cancel()
+                    yield end_msg("TIMEOUT", f"Execution timeout: exceeded {TIMEOUT_SECONDS} seconds",
+                                  last["seq"] + 1, last["reply_id"])
+                    return
+                if item is done:
+                    break
+                yield item
+            # 生产端已正常结束，取回其异常（如有）
+            await task
+        except asyncio.CancelledError:
+            logger.info(f"Stream cancelled for run_id: {ctx.run_id}, cancelling producer task")
+            task.cancel()
+            # 与 stream / _astream_threaded 一致：先发出取消结束消息，再继续传播取消
+            yield end_msg(MESSAGE_END_CODE_CANCELED, "Stream execution cancelled",
+                          last["seq"] + 1, last["reply_id"])
+            raise
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+    async def _astream_threaded(self, payload: Dict[str, Any], graph: CompiledStateGraph, run_config: RunnableConfig, ctx=Context) -> AsyncIterable[Any]:
+        """旧实现（GRAPH_STREAM_IMPL=thread）：后台线程跑同步 graph.stream，仅在消息之间检查取消"""
         client_msg, session_id = to_client_message(payload)
         run_config["recursion_limit"] = 100
         run_config["configurable"] = {"thread_id": session_id}
@@ -599,6 +700,20 @@ async def health_check():
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@app.get("/graph_cache")
+async def graph_cache_stats():
+    """agent 缓存 / 温池的构建指标"""
+    if not graph_helper.is_agent_proj():
+        return {"enabled": False}
+    return {"enabled": True, **graph_helper.get_agent_cache("agents.agent").stats()}
+
+
+@app.get("/stats/errors")
+async def error_stats(recent: int = 10):
+    """错误统计：累计计数、1m/5m/1h 滑动窗口错误数与速率、最近错误"""
+    return service.error_classifier.get_stats_snapshot(recent)
+
+
 @app.get(path="/graph_parameter")
 async def http_graph_inout_parameter(request: Request):
     return service.graph_inout_schema()
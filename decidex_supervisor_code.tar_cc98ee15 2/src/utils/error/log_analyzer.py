@@ -0,0 +1,165 @@
+"""
+批量日志错误分析 - 流式读取大日志文件，多进程按错误码统计
+
+文件按字节范围切成若干块，每个进程只读自己的块（行首落在块内的行归该块），
+逐行用 ErrorClassifier.parse_error_from_log 解析后汇总：
+  - 不含 "Error" / "Exception" 的行直接跳过（parse_error_from_log 也无法从中解析出错误）
+  - 内存占用与块大小无关，只与单行长度有关；多 GB 日志也能处理
+
+使用方式（在 src 目录）：
+    python -m utils.error.log_analyzer /tmp/app/work/logs/bypass/app.log
+    python -m utils.error.log_analyzer app.log --workers 8 --chunk-mb 64 --json stats.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .classifier import ErrorClassifier
+from .codes import get_error_description
+
+# 行级快速预筛：parse_error_from_log 只识别 xxxError / xxxException
+_LINE_MARKERS = (b"Error", b"Exception")
+
+
+@dataclass
+class LogErrorStats:
+    """一个块（或整个文件）的统计结果"""
+    lines: int = 0
+    candidate_lines: int = 0
+    errors: int = 0
+    by_code: Counter = field(default_factory=Counter)
+    by_node: Counter = field(default_factory=Counter)
+    # 每个错误码保留一条示例
+    samples: Dict[int, str] = field(default_factory=dict)
+
+    def merge(self, other: "LogErrorStats") -> None:
+        self.lines += other.lines
+        self.candidate_lines += other.candidate_lines
+        self.errors += other.errors
+        self.by_code.update(other.by_code)
+        self.by_node.update(other.by_node)
+        for code, sample in other.samples.items():
+            self.samples.setdefault(code, sample)
+
+    def to_dict(self) -> Dict:
+        return {
+            "lines": self.lines,
+            "candidate_lines": self.candidate_lines,
+            "errors": self.errors,
+            "by_code": [
+                {
+                    "code": code,
+                    "count": count,
+                    "description": get_error_description(code),
+                    "sample": self.samples.get(code, ""),
+                }
+                for code, count in self.by_code.most_common()
+            ],
+            "by_node": dict(self.by_node.most_common()),
+        }
+
+
+def _available_cpus() -> int:
+    # 容器里 cpu_count 返回宿主机核数，优先使用进程实际可用的核
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _chunk_ranges(path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    size = os.path.getsize(path)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)] or [(0, 0)]
+
+
+def analyze_chunk(path: str, start: int, end: int) -> LogErrorStats:
+    """分析 [start, end) 字节范围内开始的所有行"""
+    stats = LogErrorStats()
+    parse = ErrorClassifier.parse_error_from_log
+    with open(path, "rb") as f:
+        if start > 0:
+            # 上一个块负责跨越边界的那一行
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            stats.lines += 1
+            if not any(marker in raw for marker in _LINE_MARKERS):
+                continue
+            stats.candidate_lines += 1
+            info = parse(raw.decode("utf-8", errors="replace"))
+            if info is None:
+                continue
+            stats.errors += 1
+            stats.by_code[info.code] += 1
+            if info.node_name:
+                stats.by_node[info.node_name] += 1
+            stats.samples.setdefault(info.code, info.message[:200])
+    return stats
+
+
+def _analyze_chunk_args(args: Tuple[str, int, int]) -> LogErrorStats:
+    return analyze_chunk(*args)
+
+
+def analyze_log(path: str, workers: Optional[int] = None, chunk_mb: int = 64) -> LogErrorStats:
+    """
+    多进程分析整个日志文件，返回合并后的统计。
+    workers=1 时在当前进程内顺序执行（便于调试和小文件）。
+    """
+    workers = workers or _available_cpus()
+    ranges = _chunk_ranges(path, max(1, chunk_mb) * 1024 * 1024)
+    total = LogErrorStats()
+    if workers == 1 or len(ranges) == 1:
+        for start, end in ranges:
+            total.merge(analyze_chunk(path, start, end))
+        return total
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        for stats in pool.map(_analyze_chunk_args, [(path, s, e) for s, e in ranges]):
+            total.merge(stats)
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="按错误码统计日志中的错误（多进程）")
+    parser.add_argument("path", help="日志文件路径")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认可用 CPU 核数")
+    parser.add_argument("--chunk-mb", type=int, default=64, help="每个任务处理的字节数（MB）")
+    parser.add_argument("--json", default=None, help="统计结果另存为 JSON 文件")
+    parser.add_argument("--top", type=int, default=30, help="打印前 N 个错误码")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"错误: 找不到日志文件 {args.path}")
+        return 1
+
+    size_mb = os.path.getsize(args.path) / 1024 / 1024
+    t0 = time.perf_counter()
+    stats = analyze_log(args.path, args.workers, args.chunk_mb)
+    elapsed = time.perf_counter() - t0
+
+    print(f"文件: {args.path} ({size_mb:.1f} MB)，耗时 {elapsed:.2f}s（{size_mb / max(elapsed, 1e-9):.1f} MB/s）")
+    print(f"总行数 {stats.lines}，候选行 {stats.candidate_lines}，识别错误 {stats.errors}")
+    print(f"{'错误码':<10}{'次数':>8}  描述")
+    for code, count in stats.by_code.most_common(args.top):
+        print(f"{code:<10}{count:>8}  {get_error_description(code)}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(stats.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"结果已保存：{args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+错误统计 - 请求线程无锁写入，读取时合并
+
+写入（ErrorClassifier._update_stats，位于请求线程）：
+  - 每个线程只写自己的计数分片（threading.local），分片首次创建时才加锁登记
+  - 最近错误写入固定大小的环形缓冲区，槽位由 itertools.count 分配（CPython 下 next() 原子）
+  - 滑动窗口按秒分桶（环形数组，容量 = 最大窗口秒数），过期桶在写入时就地清零
+
+读取（/stats/errors）：遍历所有分片求和，窗口计数只累加仍在窗口内的桶。
+
+分片按线程弱引用登记；线程退出后，其分片在下次登记或读取时并入 retired 分片后移除，
+短生命周期线程（如每个流一个线程）不会让分片数和读取开销无限增长。
+"""
+
+import itertools
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# 滑动窗口：名称 -> 秒数
+WINDOWS: Tuple[Tuple[str, int], ...] = (("1m", 60), ("5m", 300), ("1h", 3600))
+_MAX_WINDOW_S = max(seconds for _, seconds in WINDOWS)
+
+
+class _ThreadShard:
+    """单个线程的计数分片，只被所属线程写入"""
+
+    __slots__ = ("total", "by_category", "by_code", "by_node", "bucket_sec", "bucket_count")
+
+    def __init__(self):
+        self.total = 0
+        self.by_category: Dict[str, int] = defaultdict(int)
+        self.by_code: Dict[int, int] = defaultdict(int)
+        self.by_node: Dict[str, int] = defaultdict(int)
+        # 第 i 个桶记录的是哪一秒，以及该秒的错误数
+        self.bucket_sec = [0] * _MAX_WINDOW_S
+        self.bucket_count = [0] * _MAX_WINDOW_S
+
+    def add(self, category: str, code: int, node_name: str, now: int) -> None:
+        self.total += 1
+        self.by_category[category] += 1
+        self.by_code[code] += 1
+        if node_name:
+            self.by_node[node_name] += 1
+
+        idx = now % _MAX_WINDOW_S
+        if self.bucket_sec[idx] != now:
+            self.bucket_sec[idx] = now
+            self.bucket_count[idx] = 1
+        else:
+            self.bucket_count[idx] += 1
+
+    def merge(self, other: "_ThreadShard") -> None:
+        """把另一个（已不再写入的）分片累加进来；同一槽位只保留较新的那一秒"""
+        self.total += other.total
+        for mine, theirs in ((self.by_category, other.by_category), (self.by_code, other.by_code),
+                             (self.by_node, other.by_node)):
+            for key, value in theirs.items():
+                mine[key] += value
+        for idx, sec in enumerate(other.bucket_sec):
+            if sec == self.bucket_sec[idx]:
+                self.bucket_count[idx] += other.bucket_count[idx]
+            elif sec > self.bucket_sec[idx]:
+                self.bucket_sec[idx] = sec
+                self.bucket_count[idx] = other.bucket_count[idx]
+
+    def copy(self) -> "_ThreadShard":
+        clone = _ThreadShard()
+        clone.merge(self)
+        return clone
+
+
+class RingBuffer:
+    """固定容量的环形缓冲区，写入 O(1)，不需要锁"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._slots: List[Any] = [None] * self.capacity
+        self._counter = itertools.count()
+        # 已写入的条数（并发写入时可能短暂落后一两条，只影响读取时的定位）
+        self._written = 0
+
+    def append(self, item: Any) -> None:
+        seq = next(self._counter)
+        self._slots[seq % self.capacity] = item
+        if seq + 1 > self._written:
+            self._written = seq + 1
+
+    def latest(self, n: Optional[int] = None) -> List[Any]:
+        """按写入顺序返回最近 n 条（默认全部）"""
+        end = self._written
+        n = min(n or self.capacity, self.capacity, end)
+        items = [self._slots[seq % self.capacity] for seq in range(end - n, end)]
+        return [item for item in items if item is not None]
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+
+class ErrorStatsCollector:
+    """按线程分片计数 + 最近错误环形缓冲 + 秒级滑动窗口"""
+
+    def __init__(self, max_recent_errors: int = 100):
+        self._local = threading.local()
+        # (所属线程的弱引用, 分片)
+        self._shards: List[Tuple[weakref.ref, _ThreadShard]] = []
+        # 已退出线程的计数汇总
+        self._retired = _ThreadShard()
+        self._register_lock = threading.Lock()
+        self.recent = RingBuffer(max_recent_errors)
+        self.started_at = time.time()
+
+    def _shard(self) -> _ThreadShard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _ThreadShard()
+            with self._register_lock:
+                self._prune_locked()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+            self._local.shard = shard
+        return shard
+
+    def _prune_locked(self) -> None:
+        """把已退出线程的分片并入 retired（调用方持有 _register_lock）"""
+        alive = []
+        for ref, shard in self._shards:
+            thread = ref()
+            if thread is not None and thread.is_alive():
+                alive.append((ref, shard))
+            else:
+                self._retired.merge(shard)
+        self._shards = alive
+
+    def _all_shards(self) -> List[_ThreadShard]:
+        """读取用：存活线程的分片 + retired 的副本"""
+        with self._register_lock:
+            self._prune_locked()
+            return [shard for _, shard in self._shards] + [self._retired.copy()]
+
+    def record(self, category: str, code: int, node_name: str, info: Any = None) -> None:
+        """热路径：只写当前线程的分片和环形缓冲区"""
+        self._shard().add(category, code, node_name, int(time.time()))
+        if info is not None:
+            self.recent.append(info)
+
+    # ── 读取（合并所有分片） ────────────────────────────────────
+
+    def totals(self) -> Dict[str, Any]:
+        shards = self._all_shards()
+        by_category: Dict[str, int] = defaultdict(int)
+        by_code: Dict[int, int] = defaultdict(int)
+        by_node: Dict[str, int] = defaultdict(int)
+        total = 0
+        for shard in shards:
+            total += shard.total
+            # dict() 拷贝在 GIL 下一次完成，写线程不会在拷贝中途改变字典大小
+            for merged, part in ((by_category, shard.by_category), (by_code, shard.by_code),
+                                 (by_node, shard.by_node)):
+                for key, value in dict(part).items():
+                    merged[key] += value
+        return {"total_count": total, "by_category": by_category, "by_code": by_code, "by_node": by_node}
+
+    def windows(self, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """各滑动窗口内的错误数和每分钟错误率（窗口包含当前这一秒）"""
+        now_sec = int(now if now is not None else time.time())
+        shards = self._all_shards()
+        # 按“距今秒数”聚合，再对各窗口做前缀求和
+        per_age = [0] * _MAX_WINDOW_S
+        for shard in shards:
+            secs, counts = list(shard.bucket_sec), list(shard.bucket_count)
+            for sec, count in zip(secs, counts):
+                age = now_sec - sec
+                if 0 <= age < _MAX_WINDOW_S:
+                    per_age[age] += count
+
+        uptime = max(time.time() - self.started_at, 1.0)
+        result = {}
+        for name, seconds in WINDOWS:
+            count = sum(per_age[:seconds])
+            # 启动不满一个窗口时按实际运行时长计算速率
+            span = min(seconds, uptime)
+            result[name] = {
+                "count": count,
+                "rate_per_min": round(count * 60.0 / span, 3),
+            }
+        return result
+
+    def snapshot(self, recent: int = 10) -> Dict[str, Any]:
+        totals = self.totals()
+        return {
+            "total_count": totals["total_count"],
+            "by_category": dict(totals["by_category"]),
+            "by_code": {str(k): v for k, v in totals["by_code"].items()},
+            "by_node": dict(totals["by_node"]),
+            "windows": self.windows(),
+            "threads": len(self._shards),
+            "recent_errors": [e.to_dict() if hasattr(e, "to_dict") else e for e in self.recent.latest(recent)],
+        }
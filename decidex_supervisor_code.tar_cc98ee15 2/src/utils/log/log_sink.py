@@ -0,0 +1,260 @@
+"""
+异步批量日志写入（node_log.write_log 的落盘后端）
+
+请求线程只把日志条目放进有界内存队列，由后台写线程：
+  - 批量取出条目，序列化后写入常驻打开的文件句柄
+  - 每批写完 flush，按时间间隔或累计字节数阈值 fsync
+  - 队列过载时按策略丢弃 / 采样，并在日志中补一条丢弃统计
+  - 进程退出（atexit）时排空队列并 fsync
+
+过载策略（NODE_LOG_OVERFLOW）：
+  drop    队列满时丢弃新条目（默认）
+  sample  队列超过高水位后，普通 info 条目只保留 1/NODE_LOG_SAMPLE_N；
+          error 条目和 workflow 开始/结束条目不采样。队列满时仍然丢弃
+  block   队列满时阻塞调用方，最多 NODE_LOG_BLOCK_TIMEOUT_S 秒，超时后丢弃
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+# 队列容量（条）
+QUEUE_SIZE = int(os.getenv("NODE_LOG_QUEUE_SIZE", "10000"))
+# 单批最多写入的条目数
+BATCH_SIZE = int(os.getenv("NODE_LOG_BATCH_SIZE", "256"))
+# fsync 时间间隔（秒）与字节阈值，任一满足即 fsync
+FSYNC_INTERVAL_S = float(os.getenv("NODE_LOG_FSYNC_INTERVAL_S", "1.0"))
+FSYNC_BYTES = int(os.getenv("NODE_LOG_FSYNC_BYTES", str(1024 * 1024)))
+OVERFLOW_POLICY = os.getenv("NODE_LOG_OVERFLOW", "drop")
+SAMPLE_N = max(1, int(os.getenv("NODE_LOG_SAMPLE_N", "10")))
+# sample 策略的高水位（队列占用比例）
+SAMPLE_HIGH_WATER = float(os.getenv("NODE_LOG_SAMPLE_HIGH_WATER", "0.8"))
+BLOCK_TIMEOUT_S = float(os.getenv("NODE_LOG_BLOCK_TIMEOUT_S", "0.05"))
+
+# 不参与采样的事件类型
+_KEEP_EVENT_TYPES = {"run_start", "test_run_start", "done", "test_run_done", "error", "cancel"}
+
+_STOP = object()
+
+
+class AsyncLogSink:
+    """有界队列 + 后台写线程的 JSONL 日志写入器"""
+
+    def __init__(self, path: str, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 fsync_interval: float = FSYNC_INTERVAL_S, fsync_bytes: int = FSYNC_BYTES,
+                 overflow: str = OVERFLOW_POLICY, sample_n: int = SAMPLE_N):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.fsync_bytes = fsync_bytes
+        self.overflow = overflow
+        self.sample_n = sample_n
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._high_water = int(queue_size * SAMPLE_HIGH_WATER)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._closed = False
+        self._sample_counter = 0
+        # 统计
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.fsyncs = 0
+        self._dropped_reported = 0
+
+    # ── 生产端（请求线程） ──────────────────────────────────────
+
+    def submit(self, entry: dict) -> bool:
+        """放入队列，返回是否被接收（丢弃 / 采样淘汰时返回 False）"""
+        if self._closed:
+            return False
+        self._ensure_writer()
+
+        if self.overflow == "sample" and self._queue.qsize() >= self._high_water and not _must_keep(entry):
+            with self._lock:
+                self._sample_counter += 1
+                keep = self._sample_counter % self.sample_n == 0
+                if not keep:
+                    self.sampled_out += 1
+            if not keep:
+                return False
+
+        try:
+            if self.overflow == "block":
+                self._queue.put(entry, timeout=BLOCK_TIMEOUT_S)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待队列中已有条目全部落盘（含 fsync），超时返回 False"""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """停止写线程：排空队列、fsync 后关闭文件"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "policy": self.overflow,
+                "queued": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "sampled_out": self.sampled_out,
+                "fsyncs": self.fsyncs,
+            }
+
+    def _ensure_writer(self) -> None:
+        # fork 之后子进程没有写线程，按 pid 判断并重新启动
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid not in (None, pid):
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="node-log-writer", daemon=True)
+            self._thread.start()
+
+    # ── 消费端（写线程） ────────────────────────────────────────
+
+    def _run(self) -> None:
+        f = None
+        unsynced = 0
+        last_sync = time.monotonic()
+        while True:
+            try:
+                first = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                first = None
+
+            batch, waiters, stop = [], [], False
+            item = first
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size or stop:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            lines = []
+            for entry in batch:
+                try:
+                    lines.append(json.dumps(entry, ensure_ascii=False))
+                except (TypeError, ValueError) as e:
+                    lines.append(json.dumps({"level": "error", "message": f"unserializable log entry: {e}"}))
+            with self._lock:
+                lost = self.dropped + self.sampled_out - self._dropped_reported
+                self._dropped_reported += lost
+            if lost:
+                lines.append(json.dumps({
+                    "level": "warning",
+                    "message": f"node_log overloaded, {lost} entries dropped ({self.overflow})",
+                    "timestamp": int(time.time() * 1000),
+                    "type": "log_dropped",
+                }, ensure_ascii=False))
+
+            if lines:
+                data = "\n".join(lines) + "\n"
+                try:
+                    if f is None:
+                        f = open(self.path, "a", encoding="utf-8")
+                    f.write(data)
+                    f.flush()
+                    unsynced += len(data)
+                except OSError as e:
+                    print(f"Failed to write log batch: {e}", flush=True)
+                    f = _close_quietly(f)
+                with self._lock:
+                    self.written += len(batch)
+
+            now = time.monotonic()
+            if f is not None and unsynced and (
+                    waiters or stop or unsynced >= self.fsync_bytes or now - last_sync >= self.fsync_interval):
+                try:
+                    os.fsync(f.fileno())
+                    with self._lock:
+                        self.fsyncs += 1
+                except OSError:
+                    pass
+                unsynced, last_sync = 0, now
+
+            for w in waiters:
+                w.set()
+            if stop:
+                _close_quietly(f)
+                return
+
+
+def _must_keep(entry: dict) -> bool:
+    return entry.get("level") == "error" or entry.get("type") in _KEEP_EVENT_TYPES
+
+
+def _close_quietly(f):
+    if f is not None:
+        try:
+            f.close()
+        except OSError:
+            pass
+    return None
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_log_sink(path: str) -> AsyncLogSink:
+    """按文件路径复用的进程级 sink，退出时自动排空"""
+    with _sinks_lock:
+        sink = _sinks.get(path)
+        if sink is None:
+            sink = AsyncLogSink(path)
+            _sinks[path] = sink
+        return sink
+
+
+@atexit.register
+def _close_all_sinks() -> None:
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
@@ -0,0 +1,144 @@
+"""
+基准测试 — 历史决策检索（按用户过滤）延迟
+
+对比 rag/decision_store.py 中的各分区后端在不同数据规模下的检索延迟：
+  - shared    单一 collection + where 过滤（旧实现）
+  - per_user  每用户一个 collection
+  - sharded   按用户哈希分片
+
+数据为合成数据：随机单位向量（维度与 all-MiniLM-L6-v2 一致，384），
+直接写入 embedding，不加载任何 embedding 模型，结果只反映向量库本身的开销。
+
+运行方式：
+    python evaluation/bench_decision_memory.py
+    python evaluation/bench_decision_memory.py --sizes 1000,100000 --backends shared,sharded
+    python evaluation/bench_decision_memory.py --sizes 1000000 --per-user 200 --queries 500
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+import numpy as np
+import chromadb
+
+from rag.decision_store import available_backends, create_store
+
+DIM = 384
+BATCH = 4000
+
+
+def _unit_vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    v /= np.linalg.norm(v, axis=1, keepdims=True)
+    return v
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(np.asarray(values), q)) if values else 0.0
+
+
+# ============================================================
+# 单次基准：某个后端 × 某个数据规模
+# ============================================================
+
+def run_one(backend: str, size: int, per_user: int, n_queries: int, seed: int) -> Dict:
+    rng = np.random.default_rng(seed)
+    n_users = max(1, size // per_user)
+    workdir = tempfile.mkdtemp(prefix=f"decidex_bench_{backend}_")
+    try:
+        client = chromadb.PersistentClient(path=workdir)
+        store = create_store(client, embedding_function=None, backend=backend)
+
+        # ── 灌数据：按用户分批写入 ────────────────────────────────
+        t0 = time.perf_counter()
+        written = 0
+        uid = 0
+        while written < size:
+            user_id = f"user_{uid % n_users:07d}"
+            n = min(per_user, size - written, BATCH)
+            vecs = _unit_vectors(rng, n)
+            ids = [f"d_{written + i:08d}" for i in range(n)]
+            metas = [{"user_id": user_id, "timestamp": "2026-01-01"} for _ in range(n)]
+            docs = [f"[general] 合成决策 {written + i}" for i in range(n)]
+            store.add_many(user_id, ids, docs, metas, vecs.tolist())
+            written += n
+            uid += 1
+        load_s = time.perf_counter() - t0
+
+        # ── 检索：随机用户 + 随机 query 向量 ───────────────────────
+        queries = _unit_vectors(rng, n_queries)
+        users = [f"user_{random.Random(seed + i).randrange(n_users):07d}" for i in range(n_queries)]
+
+        # 预热一次，避免把首次加载 HNSW 索引的时间计入
+        store.query(users[0], n_results=3, query_embedding=queries[0].tolist())
+
+        latencies_ms = []
+        hits = 0
+        for q, user_id in zip(queries, users):
+            t = time.perf_counter()
+            res = store.query(user_id, n_results=3, query_embedding=q.tolist())
+            latencies_ms.append((time.perf_counter() - t) * 1000)
+            hits += len(res["ids"][0])
+
+        return {
+            "backend": backend,
+            "size": size,
+            "users": n_users,
+            "load_s": round(load_s, 2),
+            "p50_ms": round(_percentile(latencies_ms, 50), 3),
+            "p99_ms": round(_percentile(latencies_ms, 99), 3),
+            "avg_hits": round(hits / max(n_queries, 1), 2),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ============================================================
+# CLI 入口
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="历史决策检索延迟基准")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="总决策条数，逗号分隔")
+    parser.add_argument("--backends", default=",".join(available_backends()), help="后端列表，逗号分隔")
+    parser.add_argument("--per-user", type=int, default=50, help="每个用户的决策条数")
+    parser.add_argument("--queries", type=int, default=300, help="每组检索次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default=None, help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+
+    print("=" * 72)
+    print("DecideX 历史决策检索基准（带 user_id 过滤）")
+    print("=" * 72)
+    print(f"{'backend':<10}{'size':>10}{'users':>9}{'load(s)':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'hits':>7}")
+    print("-" * 72)
+
+    results = []
+    for size in sizes:
+        for backend in backends:
+            r = run_one(backend, size, args.per_user, args.queries, args.seed)
+            results.append(r)
+            print(f"{r['backend']:<10}{r['size']:>10}{r['users']:>9}{r['load_s']:>10}"
+                  f"{r['p50_ms']:>10}{r['p99_ms']:>10}{r['avg_hits']:>7}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存：{args.json}")
+
+
+if __name__ == "__main__":
+    main()
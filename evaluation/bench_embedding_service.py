@@ -0,0 +1,156 @@
+"""
+基准测试 — Embedding 服务（Unix Socket + 动态微批）
+
+测三组数据：
+  1. local       进程内直接调用模型（基线）
+  2. service     单客户端顺序请求，批大小 1 ~ 64（衡量 IPC 开销）
+  3. concurrent  C 个线程并发、每次 1 条（衡量动态微批带来的吞吐提升）
+
+服务端以子进程启动，与多 worker 部署时的形态一致。
+
+运行方式：
+    python evaluation/bench_embedding_service.py
+    python evaluation/bench_embedding_service.py --batches 1,8,64 --rounds 50 --clients 16
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+import numpy as np
+
+from rag.embedding_service import EmbeddingServiceClient
+from rag.embeddings import create_local_embedding_function
+
+TEST_SET_PATH = os.path.join(os.path.dirname(__file__), "test_set.jsonl")
+
+
+def _load_texts() -> List[str]:
+    """用测试集里的真实决策问题做语料，不足时拼接编号扩充"""
+    texts = []
+    with open(TEST_SET_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                texts.append(json.loads(line)["input"])
+    return [f"{texts[i % len(texts)]}（{i}）" for i in range(256)]
+
+
+def _summary(mode: str, batch: int, latencies_ms: List[float], n_texts: int, wall_s: float) -> Dict:
+    arr = np.asarray(latencies_ms)
+    return {
+        "mode": mode,
+        "batch": batch,
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "texts_per_s": round(n_texts / wall_s, 1) if wall_s > 0 else 0.0,
+    }
+
+
+def _run_sequential(mode: str, ef, texts: List[str], batch: int, rounds: int) -> Dict:
+    ef(texts[:batch])  # 预热
+    latencies = []
+    t0 = time.perf_counter()
+    for r in range(rounds):
+        start = (r * batch) % (len(texts) - batch + 1)
+        t = time.perf_counter()
+        ef(texts[start:start + batch])
+        latencies.append((time.perf_counter() - t) * 1000)
+    return _summary(mode, batch, latencies, batch * rounds, time.perf_counter() - t0)
+
+
+def _run_concurrent(socket_path: str, texts: List[str], clients: int, rounds: int) -> Dict:
+    client = EmbeddingServiceClient(socket_path)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(offset: int):
+        local = []
+        for r in range(rounds):
+            t = time.perf_counter()
+            client.embed([texts[(offset + r) % len(texts)]])
+            local.append((time.perf_counter() - t) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i * rounds,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    result = _summary(f"concurrent×{clients}", 1, latencies, clients * rounds, time.perf_counter() - t0)
+    result["server"] = client.stats()
+    return result
+
+
+def _start_server(socket_path: str, wait_ms: float, max_batch: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "rag.embedding_service", "--socket", socket_path,
+         "--wait-ms", str(wait_ms), "--max-batch", str(max_batch)],
+        cwd=_ROOT,
+    )
+    deadline = time.time() + 300
+    while not os.path.exists(socket_path):
+        if proc.poll() is not None or time.time() > deadline:
+            raise RuntimeError("embedding 服务启动失败")
+        time.sleep(0.2)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding 服务吞吐 / 延迟基准")
+    parser.add_argument("--batches", default="1,2,4,8,16,32,64", help="批大小，逗号分隔")
+    parser.add_argument("--rounds", type=int, default=30, help="每个批大小的请求次数")
+    parser.add_argument("--clients", type=int, default=8, help="并发测试的客户端线程数")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="服务端凑批等待（毫秒）")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--json", default=None, help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    batches = [int(b) for b in args.batches.split(",") if b.strip()]
+    texts = _load_texts()
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="decidex_embed_"), "embed.sock")
+
+    print("加载进程内模型（基线）...")
+    local_ef = create_local_embedding_function()
+    print("启动 embedding 服务子进程...")
+    proc = _start_server(socket_path, args.wait_ms, args.max_batch)
+
+    results = []
+    try:
+        service_ef = EmbeddingServiceClient(socket_path)
+        for batch in batches:
+            results.append(_run_sequential("local", local_ef, texts, batch, args.rounds))
+            results.append(_run_sequential("service", service_ef, texts, batch, args.rounds))
+        results.append(_run_concurrent(socket_path, texts, args.clients, args.rounds))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    print("=" * 64)
+    print(f"{'mode':<16}{'batch':>7}{'p50(ms)':>11}{'p99(ms)':>11}{'texts/s':>12}")
+    print("-" * 64)
+    for r in results:
+        print(f"{r['mode']:<16}{r['batch']:>7}{r['p50_ms']:>11}{r['p99_ms']:>11}{r['texts_per_s']:>12}")
+    server = results[-1].get("server", {})
+    print(f"\n服务端微批：共 {server.get('batches')} 批，平均 {server.get('avg_batch')} 条，"
+          f"最大 {server.get('largest_batch')} 条")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存：{args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+基准测试 — 端到端延迟：supervisor graph vs 确定性直连流水线
+
+对同一批测试问题分别运行：
+  1. supervisor   graph.py:graph（supervisor → comprehensive_agent → full_decision_analysis）
+  2. pipeline     pipeline.py:graph（recognize_intent → 并行检索 → analysis → citation → persist）
+
+记录每次请求的端到端耗时和 LLM 调用次数（通过 callback 统计 on_chat_model_start / on_llm_start）。
+默认 PIPELINE_PERSIST=0，避免基准测试把决策写进向量库。
+
+运行方式：
+    python evaluation/bench_pipeline.py
+    python evaluation/bench_pipeline.py --n 5 --only pipeline --json results/pipeline.json
+"""
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+os.environ.setdefault("PIPELINE_PERSIST", "0")
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+_AGENT_DIR = os.path.join(_ROOT, "src", "decision-agent")
+TEST_SET_PATH = os.path.join(os.path.dirname(__file__), "test_set.jsonl")
+
+
+def _load_agent_package():
+    """把 src/decision-agent 注册为 decision_agent 包，使其中的相对导入可用"""
+    if "decision_agent" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "decision_agent", os.path.join(_AGENT_DIR, "__init__.py"),
+            submodule_search_locations=[_AGENT_DIR],
+        )
+        pkg = importlib.util.module_from_spec(spec)
+        sys.modules["decision_agent"] = pkg
+        spec.loader.exec_module(pkg)
+
+
+class _LLMCallCounter(BaseCallbackHandler):
+    """统计一次 graph 运行中的 LLM 调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        with self._lock:
+            self.calls += 1
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _run(name: str, graph, questions: List[str]) -> Dict:
+    latencies, llm_calls, failures = [], [], 0
+    for q in questions:
+        counter = _LLMCallCounter()
+        config = {"recursion_limit": 40, "callbacks": [counter]}
+        t = time.perf_counter()
+        try:
+            graph.invoke({"messages": [HumanMessage(content=f"【用户问题】{q}")]}, config)
+        except Exception as e:
+            failures += 1
+            print(f"  ❌ [{name}] {q[:30]}… {e}")
+            continue
+        latencies.append(time.perf_counter() - t)
+        llm_calls.append(counter.calls)
+        print(f"  [{name}] {latencies[-1]:.1f}s  LLM×{counter.calls}  {q[:30]}")
+    return {
+        "graph": name,
+        "n": len(latencies),
+        "failures": failures,
+        "p50_s": round(_percentile(latencies, 50), 2),
+        "p95_s": round(_percentile(latencies, 95), 2),
+        "mean_s": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "mean_llm_calls": round(sum(llm_calls) / len(llm_calls), 2) if llm_calls else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="supervisor graph vs 直连流水线 端到端延迟")
+    parser.add_argument("--n", type=int, default=3, help="测试问题数量（取测试集前 n 条）")
+    parser.add_argument("--only", choices=["supervisor", "pipeline"], default=None, help="只跑其中一个")
+    parser.add_argument("--json", default=None, help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    with open(TEST_SET_PATH, "r", encoding="utf-8") as f:
+        questions = [json.loads(line)["input"] for line in f if line.strip()][:args.n]
+
+    _load_agent_package()
+    graphs = []
+    if args.only in (None, "supervisor"):
+        graphs.append(("supervisor", importlib.import_module("decision_agent.graph").graph))
+    if args.only in (None, "pipeline"):
+        graphs.append(("pipeline", importlib.import_module("decision_agent.pipeline").graph))
+
+    print(f"问题 {len(questions)} 条，依次运行：{', '.join(n for n, _ in graphs)}")
+    results = [_run(name, g, questions) for name, g in graphs]
+
+    print("=" * 72)
+    print(f"{'graph':<12}{'n':>4}{'fail':>6}{'p50(s)':>9}{'p95(s)':>9}{'mean(s)':>9}{'LLM calls':>11}")
+    for r in results:
+        print(f"{r['graph']:<12}{r['n']:>4}{r['failures']:>6}{r['p50_s']:>9}{r['p95_s']:>9}"
+              f"{r['mean_s']:>9}{r['mean_llm_calls']:>11}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存：{args.json}")
+
+
+if __name__ == "__main__":
+    main()
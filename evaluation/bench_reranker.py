@@ -0,0 +1,132 @@
+"""
+基准测试 — 本地精排：交叉编码器 vs Jaccard
+
+语料：rag/documents 下三个知识库按 knowledge_base._chunk_text 切分后的全部片段。
+查询：evaluation/test_set.jsonl 的 input。
+相关性代理标签：片段中命中该样本 key_factors 的个数
+  （完整命中记 1 分，仅命中前两个字记 0.5 分），据此计算 nDCG@k。
+  这只是近似标注，用于横向比较两种精排，不代表绝对质量。
+
+延迟分两轮：cold（分数缓存为空）和 warm（同样的 query 再跑一次，命中 (query, doc_hash) 缓存）。
+
+运行方式：
+    python evaluation/bench_reranker.py
+    python evaluation/bench_reranker.py --k 3,5 --json results/rerank.json
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Dict, List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+from langchain_core.documents import Document
+
+from rag import reranker
+from rag.knowledge_base import DOCUMENTS_DIR, KNOWLEDGE_FILES, _chunk_text
+
+TEST_SET_PATH = os.path.join(os.path.dirname(__file__), "test_set.jsonl")
+
+
+def _load_samples() -> List[dict]:
+    with open(TEST_SET_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _load_corpus() -> List[Document]:
+    docs = []
+    for kb_type, fname in KNOWLEDGE_FILES.items():
+        with open(os.path.join(DOCUMENTS_DIR, fname), "r", encoding="utf-8") as f:
+            for i, chunk in enumerate(_chunk_text(f.read())):
+                docs.append(Document(page_content=chunk, metadata={"source": fname, "chunk_index": i}))
+    return docs
+
+
+def _gain(text: str, key_factors: List[str]) -> float:
+    g = 0.0
+    for factor in key_factors:
+        if factor in text:
+            g += 1.0
+        elif len(factor) > 2 and factor[:2] in text:
+            g += 0.5
+    return g
+
+
+def _ndcg(gains: List[float], ideal: List[float], k: int) -> float:
+    def dcg(values):
+        return sum(v / math.log2(i + 2) for i, v in enumerate(values[:k]))
+    best = dcg(sorted(ideal, reverse=True))
+    return dcg(gains) / best if best > 0 else 0.0
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _run(name: str, fn, samples: List[dict], corpus: List[Document], ks: List[int]) -> Dict:
+    ndcg = {k: [] for k in ks}
+    cold, warm = [], []
+    for passes, bucket in ((0, cold), (1, warm)):
+        for s in samples:
+            docs = [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in corpus]
+            t = time.perf_counter()
+            ranked = fn(s["input"], docs, max(ks))
+            bucket.append((time.perf_counter() - t) * 1000)
+            if passes == 0:
+                all_gains = [_gain(d.page_content, s["key_factors"]) for d in corpus]
+                gains = [_gain(d.page_content, s["key_factors"]) for d, _ in ranked]
+                for k in ks:
+                    ndcg[k].append(_ndcg(gains, all_gains, k))
+    row = {"backend": name}
+    for k in ks:
+        row[f"ndcg@{k}"] = round(sum(ndcg[k]) / len(ndcg[k]), 4)
+    row["cold_p50_ms"] = round(_percentile(cold, 50), 2)
+    row["cold_p95_ms"] = round(_percentile(cold, 95), 2)
+    row["warm_p50_ms"] = round(_percentile(warm, 50), 2)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地精排相关性 / 延迟基准")
+    parser.add_argument("--k", default="3,5", help="nDCG 截断位置，逗号分隔")
+    parser.add_argument("--json", default=None, help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    ks = [int(k) for k in args.k.split(",") if k.strip()]
+    samples = _load_samples()
+    corpus = _load_corpus()
+    print(f"样本 {len(samples)} 条，候选片段 {len(corpus)} 个（每个 query 对全部片段精排）")
+
+    results = [_run("jaccard", reranker._local_rerank, samples, corpus, ks)]
+    if reranker._get_cross_encoder() is not None:
+        # 预热一次，避免把模型首轮初始化计入延迟
+        reranker._cross_encoder_rerank("预热", corpus[:2], 1)
+        reranker._score_cache.clear()
+        results.append(_run(f"cross_encoder ({reranker.RERANK_LOCAL_MODEL})",
+                            reranker._cross_encoder_rerank, samples, corpus, ks))
+    else:
+        print("⚠️  CrossEncoder 不可用，仅输出 Jaccard 基线")
+
+    print("=" * 80)
+    for r in results:
+        metrics = "  ".join(f"{k}={v}" for k, v in r.items() if k != "backend")
+        print(f"{r['backend']}\n    {metrics}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存：{args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+RAG 热路径基准测试的公共配置
+
+  - 离线：导入 rag 之前安装 evaluation/loadtest/fakes.py 的替身（哈希 embedding、假 LLM、零延迟假 DDG）
+  - 语料规模：BENCH_SIZES（默认 1000,10000,100000）
+  - 基线：evaluation/benchmarks/baseline.json 记录每个用例的中位耗时；
+    实测中位数超过基线 × (1 + 阈值) 时该用例失败（阈值默认 0.25，--bench-threshold / BENCH_REGRESSION_THRESHOLD）
+  - --bench-update-baseline 用本次结果重写基线文件（只在参考机器上执行，并随代码一起提交）
+"""
+
+import json
+import os
+import platform
+import sys
+import tempfile
+
+import pytest
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(os.path.dirname(_HERE))
+for _p in (_ROOT, os.path.join(os.path.dirname(_HERE), "loadtest"), _HERE):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+# 必须在 fakes / rag 导入之前设置：假 DDG 不等待，embedding / 搜索结果不写磁盘缓存
+os.environ.setdefault("FAKE_DDG_MS", "0")
+os.environ.setdefault("EMBEDDING_CACHE_DB", "")
+os.environ.setdefault("SHARED_CACHE_DB", "")
+os.environ.setdefault("TRACE_ENABLED", "0")
+os.environ.setdefault("PROMPT_BUDGET_LOG", "0")
+
+from corpus import make_corpus, size_id  # noqa: E402
+
+BASELINE_PATH = os.path.join(_HERE, "baseline.json")
+DATA_DIR = os.getenv("BENCH_DATA_DIR", os.path.join(tempfile.gettempdir(), "decidex_bench"))
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("decidex-bench")
+    group.addoption("--bench-baseline", default=BASELINE_PATH, help="基线文件路径")
+    group.addoption("--bench-update-baseline", action="store_true", help="用本次结果重写基线文件")
+    group.addoption("--bench-threshold", type=float,
+                    default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.25")),
+                    help="允许的中位耗时回退比例（0.25 = 慢 25%% 以内不算回退）")
+
+
+def _machine() -> dict:
+    return {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system(),
+            "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()}
+
+
+def pytest_configure(config):
+    config._bench_results = {}
+    path = config.getoption("--bench-baseline")
+    config._bench_baseline = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            config._bench_baseline = json.load(f)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.getoption("--bench-update-baseline") or not config._bench_results:
+        return
+    baseline = dict(config._bench_baseline.get("benchmarks", {}))
+    baseline.update(config._bench_results)
+    with open(config.getoption("--bench-baseline"), "w", encoding="utf-8") as f:
+        json.dump({"machine": _machine(), "benchmarks": dict(sorted(baseline.items()))}, f, indent=2)
+        f.write("\n")
+
+
+@pytest.fixture
+def bench(benchmark, request):
+    """
+    benchmark 的包装：运行后把中位耗时和基线比较，回退超过阈值时让用例失败。
+    用法与 benchmark 相同：bench(fn, *args, **kwargs)
+    """
+    config = request.config
+
+    def run(fn, *args, **kwargs):
+        result = benchmark(fn, *args, **kwargs)
+        stats = getattr(benchmark, "stats", None)
+        if stats is None:  # --benchmark-disable
+            return result
+        median = stats.stats.median
+        name = request.node.name
+        config._bench_results[name] = median
+        base = config._bench_baseline.get("benchmarks", {}).get(name)
+        limit = config.getoption("--bench-threshold")
+        if base and not config.getoption("--bench-update-baseline") and median > base * (1 + limit):
+            pytest.fail(f"{name} 回退：中位 {median * 1e3:.3f}ms，基线 {base * 1e3:.3f}ms"
+                        f"（+{(median / base - 1) * 100:.0f}% > {limit * 100:.0f}%）", pytrace=False)
+        return result
+
+    return run
+
+
+# ============================================================
+# 离线替身 + 预构建 Chroma
+# ============================================================
+
+@pytest.fixture(scope="session")
+def offline_rag():
+    import fakes
+    fakes.install()
+    import rag.knowledge_base as knowledge_base
+    return knowledge_base
+
+
+@pytest.fixture(scope="session")
+def chroma_corpus(offline_rag):
+    """
+    返回 build(n)：把 n 条合成语料按 kb_type 写入 knowledge_cost / risk / value 三个 collection，
+    每个规模一个持久化目录（BENCH_DATA_DIR 下），已构建过则直接复用。
+    """
+    knowledge_base = offline_rag
+    import rag.vector_store as vector_store
+
+    def build(n: int):
+        chroma_dir = os.path.join(DATA_DIR, f"chroma_{size_id(n)}")
+        if knowledge_base.CHROMA_PERSIST_DIR != chroma_dir:
+            knowledge_base.CHROMA_PERSIST_DIR = chroma_dir
+            vector_store.CHROMA_PERSIST_DIR = chroma_dir
+            knowledge_base._client = None
+            knowledge_base._collections.clear()
+            knowledge_base._counts.clear()
+            knowledge_base.invalidate_knowledge_cache()
+
+        docs = make_corpus(n)
+        by_kb = {}
+        for doc in docs:
+            by_kb.setdefault(doc.metadata["kb_type"], []).append(doc)
+        for kb, kb_docs in by_kb.items():
+            collection = knowledge_base._get_kb_collection(kb)
+            if collection.count() == len(kb_docs):
+                continue
+            if collection.count():
+                knowledge_base._get_client().delete_collection(f"knowledge_{kb}")
+                knowledge_base._collections.pop(kb, None)
+                collection = knowledge_base._get_kb_collection(kb)
+            for start in range(0, len(kb_docs), 5000):
+                batch = kb_docs[start:start + 5000]
+                collection.add(
+                    documents=[d.page_content for d in batch],
+                    metadatas=[{k: d.metadata[k] for k in ("kb_type", "chunk_index", "source")} for d in batch],
+                    ids=[f"{kb}_chunk_{d.metadata['chunk_index']:06d}" for d in batch],
+                )
+        knowledge_base._counts.clear()
+        return docs
+
+    return build
+
+
+@pytest.fixture(scope="session")
+def decision_graph(offline_rag):
+    """加载 decision-agent graph 模块（LLM 已替换为假模型，只测 LLM 之前的阶段）"""
+    import importlib
+    import importlib.util
+
+    agent_dir = os.path.join(_ROOT, "src", "decision-agent")
+    if "decision_agent" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "decision_agent", os.path.join(agent_dir, "__init__.py"),
+            submodule_search_locations=[agent_dir],
+        )
+        pkg = importlib.util.module_from_spec(spec)
+        sys.modules["decision_agent"] = pkg
+        spec.loader.exec_module(pkg)
+    return importlib.import_module("decision_agent.graph")
@@ -0,0 +1,70 @@
+"""
+基准测试用合成中文语料
+
+按固定随机种子从决策领域词表拼句，生成 N 条 200~500 字的知识片段（Document），
+同一 N 每次生成完全相同的语料，便于和基线对比。
+"""
+
+import os
+import random
+from functools import lru_cache
+from typing import List
+
+from langchain_core.documents import Document
+
+# 语料规模（条），默认 1k / 10k / 100k
+SIZES = [int(s) for s in os.getenv("BENCH_SIZES", "1000,10000,100000").split(",") if s.strip()]
+
+_TOPICS = {
+    "cost": ["首付", "月供", "房贷利率", "装修费用", "物业费", "通勤成本", "学费", "机会成本", "税费", "维护成本"],
+    "risk": ["裁员", "现金流", "流动性", "违约", "政策变化", "市场波动", "估值回调", "资金链", "健康风险", "汇率"],
+    "value": ["职业发展", "期权", "晋升体系", "生活质量", "家庭幸福", "学历背书", "技能积累", "人脉", "自由度", "成就感"],
+}
+_SUBJECTS = ["一线城市", "互联网行业", "应届生", "三十岁上班族", "创业公司", "二手房市场", "指数基金", "海外留学", "自由职业者", "中小企业"]
+_TEMPLATES = [
+    "在{subject}场景下，{topic}通常是决策中最容易被低估的因素，建议结合{topic2}一起评估。",
+    "根据行业经验，{subject}的{topic}在近两年波动明显，{topic2}需要预留至少六个月的缓冲。",
+    "评估{topic}时应区分显性与隐性部分，{subject}常见的误区是忽视{topic2}带来的长期影响。",
+    "若{topic}超过家庭月收入的百分之四十，{subject}应优先考虑降低{topic2}，避免压力过大。",
+    "{subject}在做选择前，可以把{topic}与{topic2}量化成同一口径，再比较不同方案的差异。",
+    "数据显示，{subject}因{topic}导致的决策后悔比例较高，提前规划{topic2}能明显改善结果。",
+]
+
+
+def size_id(n: int) -> str:
+    return f"{n // 1000}k" if n >= 1000 and n % 1000 == 0 else str(n)
+
+
+def make_query(seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    kb = rnd.choice(list(_TOPICS))
+    return (f"我是{rnd.choice(_SUBJECTS)}，正在考虑{rnd.choice(_TOPICS[kb])}和"
+            f"{rnd.choice(_TOPICS[kb])}的问题，该怎么权衡？")
+
+
+@lru_cache(maxsize=None)
+def make_corpus(n: int, seed: int = 42) -> List[Document]:
+    """n 条知识片段，metadata 与 rag/knowledge_base.py 写入 Chroma 的字段一致"""
+    rnd = random.Random(seed)
+    kb_types = list(_TOPICS)
+    docs = []
+    for i in range(n):
+        kb = kb_types[i % len(kb_types)]
+        sentences = []
+        target = rnd.randint(200, 500)
+        length = 0
+        while length < target:
+            topic, topic2 = rnd.sample(_TOPICS[kb], 2)
+            s = rnd.choice(_TEMPLATES).format(subject=rnd.choice(_SUBJECTS), topic=topic, topic2=topic2)
+            sentences.append(s)
+            length += len(s)
+        docs.append(Document(
+            page_content="".join(sentences),
+            metadata={"kb_type": kb, "chunk_index": i, "source": f"{kb}_knowledge.txt"},
+        ))
+    return docs
+
+
+def make_document_text(n_chunks: int) -> str:
+    """拼成一篇长文档（段落以空行分隔），分块后约得到 n_chunks 个 chunk"""
+    return "\n\n".join(d.page_content for d in make_corpus(n_chunks))
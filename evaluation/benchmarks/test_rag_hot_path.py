@@ -0,0 +1,138 @@
+"""
+RAG 热路径微基准（pytest-benchmark）
+
+逐阶段单独测量，再测 full_decision_analysis 调用 LLM 之前的整段（build_decision_prompt）：
+
+  语料规模（BENCH_SIZES）      _chunk_text / rrf_fusion / BM25Retriever 构建与检索 /
+                               hybrid_retrieve / build_decision_prompt
+  候选文档数（10 / 50 / 200）  self_rag_filter / _local_rerank / CitationManager
+                               —— 这几步只处理检索返回的候选，不随语料规模增长
+
+运行方式（在项目根目录）：
+    python -m pytest evaluation/benchmarks -q
+    BENCH_SIZES=1000,10000 python -m pytest evaluation/benchmarks -q
+    python -m pytest evaluation/benchmarks -q -k "rerank or citation"
+    python -m pytest evaluation/benchmarks -q --bench-update-baseline   # 参考机器上更新基线
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from corpus import SIZES, make_corpus, make_document_text, make_query, size_id
+
+CANDIDATES = [10, 50, 200]
+
+sized = pytest.mark.parametrize("n", SIZES, ids=[size_id(n) for n in SIZES])
+candidates = pytest.mark.parametrize("k", CANDIDATES, ids=[f"cand{k}" for k in CANDIDATES])
+
+QUERY = make_query(0)
+
+
+# ============================================================
+# 语料规模相关的阶段
+# ============================================================
+
+@sized
+def test_chunk_text(bench, offline_rag, n):
+    text = make_document_text(n)
+    chunks = bench(offline_rag._chunk_text, text)
+    assert chunks
+
+
+@sized
+def test_rrf_fusion(bench, offline_rag, n):
+    from rag.hybrid_retrieval import rrf_fusion
+
+    docs = make_corpus(n)
+    vector_ranked = [(d.page_content[:40], 1.0 / (1 + i)) for i, d in enumerate(docs)]
+    bm25_ranked = [(d.page_content[:40], float(n - i)) for i, d in enumerate(reversed(docs))]
+    fused = bench(rrf_fusion, [vector_ranked, bm25_ranked])
+    assert len(fused) <= n
+
+
+@sized
+def test_bm25_build(bench, offline_rag, n):
+    from rag.hybrid_retrieval import BM25_AVAILABLE, BM25Retriever
+
+    if not BM25_AVAILABLE:
+        pytest.skip("rank_bm25 未安装")
+    docs = make_corpus(n)
+    retriever = bench(BM25Retriever, docs)
+    assert retriever.bm25 is not None
+
+
+@sized
+def test_bm25_retrieve(bench, offline_rag, n):
+    from rag.hybrid_retrieval import BM25_AVAILABLE, BM25Retriever
+
+    if not BM25_AVAILABLE:
+        pytest.skip("rank_bm25 未安装")
+    retriever = BM25Retriever(make_corpus(n))
+    ranked = bench(retriever.retrieve, QUERY, 10)
+    assert len(ranked) == 10
+
+
+@sized
+def test_hybrid_retrieve(bench, chroma_corpus, n):
+    from rag.hybrid_retrieval import hybrid_retrieve
+
+    chroma_corpus(n)
+    docs = bench(hybrid_retrieve, "knowledge_cost", QUERY, 3)
+    assert docs
+
+
+@sized
+def test_pre_llm_stage(bench, chroma_corpus, decision_graph, n):
+    """full_decision_analysis 中 LLM 调用之前的全部工作：三库检索 + 过滤 + 精排 + 搜索 + prompt 组装"""
+    chroma_corpus(n)
+    mgr = decision_graph._citation_mgr
+
+    def pre_llm():
+        result = decision_graph.build_decision_prompt(QUERY, '{"city": "北京", "risk": "中等"}', 2026)
+        if mgr is not None:
+            mgr.clear()
+        return result
+
+    system_prompt, user_msg, usage = bench(pre_llm)
+    assert system_prompt and user_msg
+    assert usage["total_input_tokens"] > 0
+
+
+# ============================================================
+# 候选文档数相关的阶段
+# ============================================================
+
+@candidates
+def test_self_rag_filter(bench, offline_rag, k):
+    from rag.self_rag import self_rag_filter
+
+    docs = make_corpus(k)
+    kept = bench(self_rag_filter, QUERY, docs, rel_threshold=0.3, max_docs=2, lightweight=True)
+    assert 0 < len(kept) <= 2
+
+
+@candidates
+def test_local_rerank(bench, offline_rag, k):
+    from rag.reranker import _local_rerank
+
+    docs = make_corpus(k)
+    ranked = bench(_local_rerank, QUERY, docs, 5)
+    assert len(ranked) == min(5, k)
+
+
+@candidates
+def test_citation_manager(bench, decision_graph, k):
+    from decision_agent.citation import CitationManager
+
+    docs = make_corpus(k)
+    answer = "综合来看建议谨慎推进 [1][2]，并关注现金流风险 [3]。"
+
+    def cite():
+        mgr = CitationManager()
+        mgr.add_documents(docs, source_type="knowledge_base")
+        mgr.build_context_prompt()
+        return mgr.build_cited_decision(answer, include_all=False)
+
+    cited = bench(cite)
+    assert len(cited.references) == 3
@@ -16,6 +16,9 @@
     python evaluation/evaluate.py --mode intent_only
     python evaluation/evaluate.py --mode full
     python evaluation/evaluate.py --mode compare  # 基线 vs 增强对比
+    python evaluation/evaluate.py --mode tiers    # 分层意图识别：关键词 / 本地分类器 / LLM
+    python evaluation/evaluate.py --mode prompt_tokens  # 上下文 token / 要素覆盖：字符截断 vs token 预算
+    python evaluation/evaluate.py --mode prompt_tokens --judge  # 另外让 LLM 作答并打分（质量对比）
 """
 
 import json
@@ -76,17 +79,245 @@ def baseline_intent_classify(text: str) -> str:
 # 增强版意图识别（使用 LLM + 问题重写）
 # ============================================================
 
+_AGENT_DIR = os.path.join(_ROOT, "src", "decision-agent")
+_agent_modules: Dict[str, object] = {}
+
+
+def _load_agent_module(name: str):
+    """按文件加载 src/decision-agent 下的模块（同一进程只加载一次）"""
+    if name not in _agent_modules:
+        import importlib
+        if _AGENT_DIR not in sys.path:
+            sys.path.insert(0, _AGENT_DIR)
+        _agent_modules[name] = importlib.import_module(name)
+    return _agent_modules[name]
+
+
 def enhanced_intent_classify(text: str) -> Dict:
-    """增强版意图识别（LLM + 意图重写模块）"""
-    import importlib.util, pathlib
-    _agent_dir = pathlib.Path(_ROOT) / "src" / "decision-agent"
-    _spec = importlib.util.spec_from_file_location(
-        "intent_recognition",
-        str(_agent_dir / "intent_recognition.py"),
-    )
-    _mod = importlib.util.module_from_spec(_spec)
-    _spec.loader.exec_module(_mod)
-    return _mod.recognize_intent(text)
+    """
+    增强版意图识别（LLM + 意图重写模块）。
+    跳过本地分类器：生产环境的本地分类器以 test_set.jsonl 为训练数据，
+    在同一测试集上评估会"见过答案"；本地层的留一法评估见 evaluate_intent_tiers。
+    """
+    return _load_agent_module("intent_recognition").recognize_intent(text, use_local=False)
+
+
+# ============================================================
+# 分层意图识别评估（关键词 / 本地分类器 / LLM / 分层组合）
+# ============================================================
+
+def _ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def _tier_row(name: str, correct: List[bool], latencies: List[float]) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "tier": name,
+        "n": len(correct),
+        "accuracy": sum(correct) / len(correct) if correct else 0.0,
+        "p50_ms": ordered[len(ordered) // 2] if ordered else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+    }
+
+
+def evaluate_intent_tiers(samples: List[Dict], threshold: float = None, use_llm: bool = True) -> List[Dict]:
+    """
+    分层意图识别评估。本地分类器使用留一法（leave-one-out）：
+    预测某条样本时，用其余样本 + 历史日志训练，避免"见过答案"。
+    """
+    classifier_mod = _load_agent_module("intent_classifier")
+    from rag.embeddings import get_embedding_function
+    embed_fn = get_embedding_function()
+    threshold = classifier_mod.LOCAL_THRESHOLD if threshold is None else threshold
+
+    recognize = None
+    if use_llm:
+        try:
+            recognize = _load_agent_module("intent_recognition").recognize_intent
+        except Exception as e:
+            print(f"⚠️ LLM 层不可用，仅评估本地层：{e}")
+
+    kw_ok, kw_ms = [], []
+    local_ok, local_ms, conf_ok = [], [], []
+    factor_hits, factor_total = 0, 0
+    llm_ok, llm_ms = [], []
+    tier_ok, tier_ms = [], []
+    escalated = 0
+
+    for sample in samples:
+        text, expected = sample["input"], sample["intent_label"]
+
+        t = time.perf_counter()
+        kw_ok.append(baseline_intent_classify(text) == expected)
+        kw_ms.append(_ms(t))
+
+        texts, labels = classifier_mod.load_training_data(exclude_ids={sample["id"]})
+        clf = classifier_mod.IntentClassifier(embed_fn).fit(texts, labels)
+        t = time.perf_counter()
+        local_label, confidence = clf.predict(text)
+        local_latency = _ms(t)
+        local_ok.append(local_label == expected)
+        local_ms.append(local_latency)
+        hits, total = _factor_hits(sample.get("key_factors", []),
+                                   classifier_mod.extract_local_factors(text, local_label))
+        factor_hits += hits
+        factor_total += total
+        confident = confidence >= threshold
+        if confident:
+            conf_ok.append(local_label == expected)
+
+        llm_label, llm_latency = None, None
+        if recognize is not None:
+            t = time.perf_counter()
+            llm_result = recognize(text, use_local=False)
+            llm_latency = _ms(t)
+            llm_label = llm_result.get("intent_label", "general")
+            llm_ok.append(llm_label == expected)
+            llm_ms.append(llm_latency)
+            if not llm_result.get("cached"):
+                time.sleep(0.5)  # 避免 API 限流
+
+        if confident or llm_label is None:
+            tier_ok.append(local_label == expected)
+            tier_ms.append(local_latency)
+        else:
+            escalated += 1
+            tier_ok.append(llm_label == expected)
+            tier_ms.append(local_latency + llm_latency)
+
+        status = "✅" if tier_ok[-1] else "❌"
+        route = "local" if confident or llm_label is None else "llm"
+        print(f"  {status} [{sample['id']}] 预期:{expected} 本地:{local_label}({confidence:.0%}) → {route}")
+
+    local_row = _tier_row("local (LOO)", local_ok, local_ms)
+    local_row["factor_coverage"] = factor_hits / factor_total if factor_total else 0.0
+    rows = [_tier_row("keyword", kw_ok, kw_ms), local_row]
+    confident_row = _tier_row(f"local ≥{threshold:.2f}", conf_ok, [])
+    confident_row["coverage"] = len(conf_ok) / len(samples) if samples else 0.0
+    rows.append(confident_row)
+    if llm_ok:
+        rows.append(_tier_row("llm", llm_ok, llm_ms))
+        tiered = _tier_row("tiered", tier_ok, tier_ms)
+        tiered["llm_share"] = escalated / len(samples) if samples else 0.0
+        rows.append(tiered)
+
+    print("\n" + "=" * 72)
+    print(f"{'tier':<16}{'n':>5}{'accuracy':>10}{'p50(ms)':>10}{'mean(ms)':>10}  备注")
+    print("-" * 72)
+    for r in rows:
+        note = ""
+        if "coverage" in r:
+            note = f"覆盖率 {r['coverage']:.0%}"
+        elif "factor_coverage" in r:
+            note = f"本地要素覆盖率 {r['factor_coverage']:.0%}"
+        elif "llm_share" in r:
+            note = f"升级到 LLM {r['llm_share']:.0%}"
+        print(f"{r['tier']:<16}{r['n']:>5}{r['accuracy']:>10.1%}{r['p50_ms']:>10.1f}{r['mean_ms']:>10.1f}  {note}")
+    return rows
+
+
+# ============================================================
+# Prompt 上下文 token 对比（字符截断 vs token 预算）
+# ============================================================
+
+_ANSWER_PROMPT = "请基于以下参考资料，针对用户的决策问题给出分析与建议（300 字以内）。\n\n{context}\n\n【决策问题】\n{query}"
+
+
+def _judge_answer(query: str, context: str, expected_factors: List[str]) -> Dict:
+    """用同一个 LLM 基于给定上下文作答，返回答案的要素覆盖与 ISUSE 评分"""
+    from langchain_core.messages import HumanMessage
+    from rag import self_rag
+
+    answer = self_rag._get_llm().invoke(
+        [HumanMessage(content=_ANSWER_PROMPT.format(context=context, query=query))]
+    ).content
+    hits, total = _factor_hits(expected_factors, [answer])
+    grade = self_rag.evaluate_usefulness(query, answer)
+    return {"factor_hits": hits, "factor_total": total,
+            "isuse": float(grade.get("total_score", 0))}
+
+
+def evaluate_prompt_tokens(samples: List[Dict], budget: int = None, judge: bool = False) -> Dict:
+    """
+    对每条样本检索三个知识库，比较 full_decision_analysis 两种上下文组装方式：
+      - legacy：拼接后按字符截断（rag_context[:2000]）
+      - budget：prompt_budget.build_context（去重 + 按相关度分配 token 预算）
+
+    指标：
+      - token 数
+      - 上下文要素覆盖率：样本 key_factors 出现在上下文中的比例（离线质量代理，不调用 LLM）
+      - judge=True 时：两种上下文分别让 LLM 作答，比较答案的要素覆盖率与 Self-RAG ISUSE 评分
+        （ISUSE 需要 USE_LLM_EVAL=true，否则只有要素覆盖率有意义）
+    不做网络搜索。
+    """
+    from rag.knowledge_base import retrieve_knowledge
+    pb = _load_agent_module("prompt_budget")
+    budget = budget or pb.CONTEXT_TOKEN_BUDGET
+
+    legacy_tokens, budget_tokens, dropped = [], [], 0
+    quality = {name: {"ctx_hits": 0, "factor_hits": 0, "factor_total": 0, "isuse": []}
+               for name in ("legacy", "budget")}
+    for sample in samples:
+        query = sample["input"]
+        expected = sample.get("key_factors", [])
+        snippets = []
+        for kb_key, label in [("cost", "成本"), ("risk", "风险"), ("value", "价值")]:
+            for chunk in retrieve_knowledge(query, kb_type=kb_key, n_results=2):
+                snippets.append(pb.Snippet(
+                    text=f"[{label}知识库]\n{chunk['content']}",
+                    score=float(chunk.get("similarity", 0.5)),
+                    source=kb_key,
+                ))
+        legacy = "【知识库参考】\n" + "\n\n".join(s.text for s in snippets)[:2000]
+        context, usage = pb.build_context(
+            [pb.PromptSection("knowledge", "知识库参考", snippets)], budget
+        )
+        legacy_tokens.append(pb.count_tokens(legacy))
+        budget_tokens.append(pb.count_tokens(context))
+        dropped += usage["knowledge"]["dropped"]
+
+        for name, ctx in (("legacy", legacy), ("budget", context)):
+            q = quality[name]
+            q["ctx_hits"] += _factor_hits(expected, [ctx])[0]
+            if judge and expected:
+                graded = _judge_answer(query, ctx, expected)
+                q["factor_hits"] += graded["factor_hits"]
+                q["isuse"].append(graded["isuse"])
+            q["factor_total"] += len(expected)
+        if judge:
+            time.sleep(0.5)  # 避免 API 限流
+
+    n = len(samples) or 1
+    result = {
+        "samples": len(samples),
+        "budget": budget,
+        "legacy_mean_tokens": sum(legacy_tokens) / n,
+        "budget_mean_tokens": sum(budget_tokens) / n,
+        "legacy_max_tokens": max(legacy_tokens, default=0),
+        "budget_max_tokens": max(budget_tokens, default=0),
+        "dropped_snippets": dropped,
+    }
+    for name, q in quality.items():
+        total = q["factor_total"] or 1
+        result[f"{name}_context_factor_coverage"] = q["ctx_hits"] / total
+        if judge:
+            result[f"{name}_answer_factor_coverage"] = q["factor_hits"] / total
+            result[f"{name}_isuse_mean"] = sum(q["isuse"]) / len(q["isuse"]) if q["isuse"] else 0.0
+
+    print("\n" + "=" * 72)
+    header = f"{'':<12}{'mean tokens':>14}{'max tokens':>14}{'ctx 要素':>10}"
+    if judge:
+        header += f"{'答案要素':>10}{'ISUSE':>8}"
+    print(header)
+    for name in ("legacy", "budget"):
+        line = (f"{name:<12}{result[f'{name}_mean_tokens']:>14.0f}{result[f'{name}_max_tokens']:>14}"
+                f"{result[f'{name}_context_factor_coverage']:>10.1%}")
+        if judge:
+            line += f"{result[f'{name}_answer_factor_coverage']:>10.1%}{result[f'{name}_isuse_mean']:>8.2f}"
+        print(line)
+    print(f"token 预算 {budget}，去重/超预算丢弃片段 {dropped} 个")
+    return result
 
 
 # ============================================================
@@ -118,7 +349,8 @@ def evaluate_intent_accuracy(
             result = enhanced_intent_classify(text)
             predicted = result.get("intent_label", "general")
             confidence = result.get("confidence", None)
-            time.sleep(0.5)  # 避免 API 限流
+            if result.get("tier") == "llm" and not result.get("cached"):
+                time.sleep(0.5)  # 避免 API 限流（缓存命中 / 本地分类无需等待）
 
         is_correct = predicted == expected
         if is_correct:
@@ -147,20 +379,23 @@ def evaluate_intent_accuracy(
 # 关键要素覆盖率
 # ============================================================
 
+def _factor_hits(expected_factors: List[str], extracted_factors: List[str]):
+    """返回 (命中的预期要素数, 预期要素总数)"""
+    extracted_text = " ".join(extracted_factors).lower()
+    # 模糊匹配：关键词包含关系
+    hits = sum(
+        1 for factor in expected_factors
+        if any(word in extracted_text for word in factor.lower().split())
+    )
+    return hits, len(expected_factors)
+
+
 def evaluate_factor_coverage(
     samples: List[Dict],
     verbose: bool = True,
 ) -> float:
-    """评估意图识别结果中关键要素的覆盖率"""
-    import importlib.util, pathlib
-    _agent_dir = pathlib.Path(_ROOT) / "src" / "decision-agent"
-    _spec = importlib.util.spec_from_file_location(
-        "intent_recognition",
-        str(_agent_dir / "intent_recognition.py"),
-    )
-    _mod = importlib.util.module_from_spec(_spec)
-    _spec.loader.exec_module(_mod)
-    recognize_intent = _mod.recognize_intent
+    """评估 LLM 意图识别结果中关键要素的覆盖率（跳过本地层，原因同 enhanced_intent_classify）"""
+    recognize_intent = _load_agent_module("intent_recognition").recognize_intent
 
     total_factors = 0
     covered_factors = 0
@@ -170,17 +405,13 @@ def evaluate_factor_coverage(
         if not expected_factors:
             continue
 
-        result = recognize_intent(sample["input"])
-        extracted_factors = result.get("key_factors", [])
-        extracted_text = " ".join(extracted_factors).lower()
-
-        for factor in expected_factors:
-            total_factors += 1
-            # 模糊匹配：关键词包含关系
-            if any(word in extracted_text for word in factor.lower().split()):
-                covered_factors += 1
+        result = recognize_intent(sample["input"], use_local=False)
+        hits, total = _factor_hits(expected_factors, result.get("key_factors", []))
+        covered_factors += hits
+        total_factors += total
 
-        time.sleep(0.5)
+        if result.get("tier") == "llm" and not result.get("cached"):
+            time.sleep(0.5)
 
     coverage = covered_factors / total_factors if total_factors > 0 else 0.0
     if verbose:
@@ -239,11 +470,15 @@ def main():
     parser = argparse.ArgumentParser(description="DecideX 评估脚本")
     parser.add_argument(
         "--mode",
-        choices=["intent_only", "factor", "full", "compare"],
+        choices=["intent_only", "factor", "full", "compare", "tiers", "prompt_tokens"],
         default="compare",
         help="评估模式",
     )
     parser.add_argument("--test_set", default=None, help="测试集路径（默认使用内置）")
+    parser.add_argument("--threshold", type=float, default=None, help="tiers 模式：本地分类器置信度阈值")
+    parser.add_argument("--no_llm", action="store_true", help="tiers 模式：只评估本地层，不调用 LLM")
+    parser.add_argument("--budget", type=int, default=None, help="prompt_tokens 模式：上下文 token 预算")
+    parser.add_argument("--judge", action="store_true", help="prompt_tokens 模式：LLM 作答并比较答案质量")
     args = parser.parse_args()
 
     samples = load_test_set(args.test_set)
@@ -260,6 +495,12 @@ def main():
     elif args.mode == "compare":
         run_comparison(samples)
 
+    elif args.mode == "tiers":
+        evaluate_intent_tiers(samples, threshold=args.threshold, use_llm=not args.no_llm)
+
+    elif args.mode == "prompt_tokens":
+        evaluate_prompt_tokens(samples, budget=args.budget, judge=args.judge)
+
     elif args.mode == "full":
         baseline_acc, enhanced_acc = run_comparison(samples)
         evaluate_factor_coverage(samples)
@@ -0,0 +1,232 @@
+"""
+压测用离线替身 — 确定性假 LLM / 假 DuckDuckGo / 哈希 embedding
+
+全部替身只依赖 prompt / query 的哈希做随机种子：同一输入每次得到相同的输出和相同的延迟，
+不同性能改动之间的压测结果可以直接对比。
+
+  - FakeChatModel          替换 langchain_google_genai.ChatGoogleGenerativeAI
+                           延迟 = 首 token 延迟（对数正态）+ 输出 token 数 / 生成速率
+                           system prompt 要求 JSON 时返回意图 / 决策摘要 JSON，否则返回 Markdown 报告
+  - FakeDDGS               替换 ddgs.DDGS / duckduckgo_search.DDGS，固定延迟分布 + 合成搜索结果
+  - HashEmbeddingFunction  字符 n-gram 哈希向量，替换 sentence-transformers / OpenAI embedding
+
+延迟分布通过环境变量配置（均为中位数 + 对数正态 sigma）：
+  FAKE_LLM_TTFT_MS=300        FAKE_LLM_TTFT_SIGMA=0.4
+  FAKE_LLM_TOKENS_PER_S=80    FAKE_LLM_OUTPUT_TOKENS=400   FAKE_LLM_TOKENS_SIGMA=0.3
+  FAKE_DDG_MS=400             FAKE_DDG_SIGMA=0.5
+  FAKE_EMBED_DIM=384
+
+install() 必须在导入 backend_proxy（以及 decision-agent / rag）之前调用。
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import types
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "300"))
+LLM_TTFT_SIGMA = float(os.getenv("FAKE_LLM_TTFT_SIGMA", "0.4"))
+LLM_TOKENS_PER_S = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "80"))
+LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "400"))
+LLM_TOKENS_SIGMA = float(os.getenv("FAKE_LLM_TOKENS_SIGMA", "0.3"))
+DDG_MS = float(os.getenv("FAKE_DDG_MS", "400"))
+DDG_SIGMA = float(os.getenv("FAKE_DDG_SIGMA", "0.5"))
+EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "384"))
+
+
+def _rng(*parts: str) -> random.Random:
+    digest = hashlib.sha1("\x1f".join(parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _lognormal(rnd: random.Random, median: float, sigma: float) -> float:
+    return median * math.exp(rnd.gauss(0.0, sigma)) if sigma > 0 else median
+
+
+# ============================================================
+# 假 LLM
+# ============================================================
+
+_REPORT_SECTIONS = ("## 💰 成本分析", "## ⚠️ 风险评估", "## 🎯 价值评估", "## 👤 个人匹配度", "## ✅ 综合推荐")
+_FILLER = ("综合考虑当前收入水平与长期规划，", "该方案的主要不确定性来自市场波动，", "从机会成本角度看，",
+           "结合用户画像中的风险偏好，", "参考知识库中的行业基准数据，", "建议设置明确的止损条件，")
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, list):
+        return " ".join(item.get("text", "") if isinstance(item, dict) else str(item) for item in content)
+    return str(content)
+
+
+def _fake_completion(messages: List[BaseMessage], model: str) -> tuple:
+    """返回 (文本, 输出 token 数, 总延迟秒数)，完全由输入决定"""
+    system = next((_message_text(m) for m in messages if m.type == "system"), "")
+    prompt = "\n".join(_message_text(m) for m in messages)
+    rnd = _rng(model, prompt)
+    ttft = _lognormal(rnd, LLM_TTFT_MS, LLM_TTFT_SIGMA) / 1000.0
+
+    if "JSON" in system or "json" in system:
+        text = json.dumps({
+            "intent_label": "general",
+            "intent_desc": "通用决策分析",
+            "rewritten_query": prompt[-80:],
+            "key_factors": ["成本", "风险", "收益"],
+            "confidence": 0.9,
+            "scenario_summary": prompt[-20:],
+            "recommendation": "谨慎推进",
+            "user_preference_tags": ["稳健"],
+        }, ensure_ascii=False)
+        tokens = len(text) // 2
+    else:
+        tokens = max(16, int(_lognormal(rnd, LLM_OUTPUT_TOKENS, LLM_TOKENS_SIGMA)))
+        lines = ["# 【DecideX 综合决策报告】"]
+        per_section = max(1, tokens // len(_REPORT_SECTIONS) // 20)
+        for header in _REPORT_SECTIONS:
+            lines.append(f"\n{header}\n")
+            lines.extend(f"- {rnd.choice(_FILLER)}第 {i + 1} 点结论。" for i in range(per_section))
+        text = "\n".join(lines)
+    return text, tokens, ttft + tokens / max(LLM_TOKENS_PER_S, 1e-6)
+
+
+class FakeChatModel(BaseChatModel):
+    """确定性假 Chat 模型，接受 ChatGoogleGenerativeAI 的任意构造参数"""
+
+    model_config = ConfigDict(extra="allow")
+
+    model: str = "fake-gemini"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-loadtest"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "FakeChatModel":
+        # 假模型从不发起工具调用，supervisor / react agent 会直接结束
+        return self
+
+    def _result(self, messages: List[BaseMessage], text: str, tokens: int) -> ChatResult:
+        input_tokens = sum(len(_message_text(m)) for m in messages) // 2
+        message = AIMessage(content=text, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": tokens,
+            "total_tokens": input_tokens + tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text, tokens, delay = _fake_completion(messages, self.model)
+        time.sleep(delay)
+        return self._result(messages, text, tokens)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text, tokens, delay = _fake_completion(messages, self.model)
+        await asyncio.sleep(delay)
+        return self._result(messages, text, tokens)
+
+
+# ============================================================
+# 假 DuckDuckGo
+# ============================================================
+
+class FakeDDGS:
+    """与 ddgs.DDGS 相同的用法：with DDGS() as d: d.text(query, max_results=3)"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self) -> "FakeDDGS":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def text(self, query: str, max_results: int = 3, **kwargs) -> List[dict]:
+        rnd = _rng("ddg", query)
+        time.sleep(_lognormal(rnd, DDG_MS, DDG_SIGMA) / 1000.0)
+        slug = hashlib.md5(query.encode("utf-8")).hexdigest()[:8]
+        return [
+            {
+                "title": f"{query} - 参考资料 {i + 1}",
+                "href": f"https://example.com/{slug}/{i}",
+                "body": f"关于「{query}」的第 {i + 1} 条摘要：{rnd.choice(_FILLER)}数据仅供压测使用。",
+            }
+            for i in range(max_results)
+        ]
+
+
+# ============================================================
+# 哈希 embedding
+# ============================================================
+
+try:
+    from chromadb.api.types import EmbeddingFunction as _EmbeddingFunction
+except ImportError:
+    _EmbeddingFunction = object
+
+
+class HashEmbeddingFunction(_EmbeddingFunction):
+    """字符 1/2-gram 哈希到固定维度后 L2 归一化：无模型下载，相近文本仍有一定相似度"""
+
+    def __init__(self, dim: int = EMBED_DIM):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        # 按码点做乘法哈希（numpy 向量化，10 万条语料也能在秒级完成；与进程的 hash 随机化无关）
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        grams = np.concatenate([codes, codes[:-1] * np.uint64(1000003) + codes[1:]]) if len(codes) > 1 else codes
+        h = (grams * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+        signs = np.where((h >> np.uint64(31)) & np.uint64(1), 1.0, -1.0)
+        vec = np.bincount((h % np.uint64(self.dim)).astype(np.int64), weights=signs, minlength=self.dim)
+        norm = float(np.linalg.norm(vec)) or 1.0
+        return (vec / norm).tolist()
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in input]
+
+    @staticmethod
+    def name() -> str:
+        return "loadtest-hash"
+
+
+# ============================================================
+# 安装
+# ============================================================
+
+def install() -> None:
+    """把替身注入 sys.modules / rag.embeddings，必须在导入 backend_proxy 之前调用"""
+    os.environ.setdefault("GOOGLE_MODEL", "fake-gemini")
+    # 置空而不是删除：load_dotenv() 不覆盖已存在的变量，删除后会把 .env 中的真实 key 重新注入
+    for key in ("GOOGLE_API_KEY", "OPENAI_API_KEY", "COHERE_API_KEY"):
+        os.environ[key] = ""
+    os.environ.setdefault("EMBED_MODEL", HashEmbeddingFunction.name())
+    os.environ.setdefault("RERANK_BACKEND", "jaccard")
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    genai = types.ModuleType("langchain_google_genai")
+    genai.ChatGoogleGenerativeAI = FakeChatModel
+    sys.modules["langchain_google_genai"] = genai
+
+    for name in ("ddgs", "duckduckgo_search"):
+        mod = types.ModuleType(name)
+        mod.DDGS = FakeDDGS
+        sys.modules[name] = mod
+
+    import rag.embeddings
+    rag.embeddings.create_local_embedding_function = HashEmbeddingFunction
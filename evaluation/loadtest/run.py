@@ -0,0 +1,284 @@
+"""
+压测 — 按目标 RPS 回放 evaluation/test_set.jsonl 到 /chat（开环）
+
+启动 evaluation/loadtest/server.py（假 LLM / 假 DuckDuckGo / 预构建 Chroma，全程离线），
+预热后按固定到达间隔（或泊松到达）发送请求，不等待前一个请求返回：
+  - 延迟从“计划发送时刻”算起，服务端排队不会被客户端节奏掩盖
+  - 错误：HTTP 非 200、超时 / 连接失败、以及 /chat 以 200 返回的“❌ 分析出错”
+  - CPU：服务端进程树（gunicorn 模式下含全部 worker）/proc/<pid>/stat 的 utime + stime
+         在压测期间的增量 ÷ 完成请求数
+
+输出 p50 / p95 / p99 / max 延迟、实际吞吐、错误数与每请求 CPU 毫秒；--json 保存结果，
+--compare 与之前保存的结果对比，用于评估每一次性能改动。
+
+运行方式：
+    python evaluation/loadtest/run.py
+    python evaluation/loadtest/run.py --rps 4 --duration 60 --mode detailed --json results/lt_base.json
+    python evaluation/loadtest/run.py --rps 4 --duration 60 --compare results/lt_base.json
+    FAKE_LLM_TTFT_MS=800 FAKE_LLM_TOKENS_PER_S=40 python evaluation/loadtest/run.py
+    python evaluation/loadtest/run.py --url http://127.0.0.1:8765   # 连接已启动的服务（不统计 CPU）
+    python evaluation/loadtest/run.py --workers 4 --rps 8            # gunicorn 多 worker
+    python evaluation/loadtest/scaling.py                            # 1 / 2 / 4 / 8 worker 扩展性对比
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(os.path.dirname(_HERE))
+TEST_SET_PATH = os.path.join(os.path.dirname(_HERE), "test_set.jsonl")
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _load_test_set() -> List[dict]:
+    with open(TEST_SET_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _proc_cpu_seconds(pid: int) -> Optional[float]:
+    """进程累计 CPU 时间（用户态 + 内核态），非 Linux 返回 None"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # comm 字段可能含空格，从最后一个 ')' 之后再切分
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _proc_children(pid: int) -> List[int]:
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(c) for c in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return children
+
+
+def _proc_tree_cpu_seconds(pid: int) -> Optional[float]:
+    """进程及其全部子孙进程的累计 CPU 时间；非 Linux 返回 None"""
+    total = _proc_cpu_seconds(pid)
+    if total is None:
+        return None
+    for child in _proc_children(pid):
+        total += _proc_tree_cpu_seconds(child) or 0.0
+    return total
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+# ============================================================
+# 服务端子进程
+# ============================================================
+
+def _start_server(port: int, rebuild: bool, workers: Optional[int] = None) -> subprocess.Popen:
+    cmd = [sys.executable, os.path.join(_HERE, "server.py"), "--port", str(port)]
+    if rebuild:
+        cmd.append("--rebuild")
+    if workers:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=_ROOT)
+
+
+async def _wait_ready(client: httpx.AsyncClient, url: str, proc: Optional[subprocess.Popen], timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"压测服务启动失败，退出码 {proc.returncode}")
+        try:
+            resp = await client.get(f"{url}/health", timeout=2.0)
+            if resp.status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"等待 {url}/health 超时（{timeout}s）")
+
+
+# ============================================================
+# 开环负载
+# ============================================================
+
+async def _one_request(client: httpx.AsyncClient, url: str, case: dict, mode: str,
+                       scheduled: float, timeout: float, results: List[Dict]) -> None:
+    payload = {"agent": "decision", "message": case["input"], "mode": mode}
+    error = ""
+    try:
+        resp = await client.post(f"{url}/chat", json=payload, timeout=timeout)
+        if resp.status_code != 200:
+            error = f"http_{resp.status_code}"
+        elif resp.json().get("response", "").lstrip().startswith("❌"):
+            error = "chat_error"
+    except httpx.TimeoutException:
+        error = "timeout"
+    except httpx.HTTPError as e:
+        error = type(e).__name__
+    results.append({
+        "id": case.get("id", ""),
+        "latency_s": time.perf_counter() - scheduled,
+        "error": error,
+    })
+
+
+async def _replay(client: httpx.AsyncClient, url: str, cases: List[dict], mode: str, rps: float,
+                  duration: float, arrival: str, timeout: float, seed: int) -> Dict:
+    rnd = random.Random(seed)
+    results: List[Dict] = []
+    tasks = []
+    start = time.perf_counter()
+    next_at = start
+    i = 0
+    while next_at - start < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        case = cases[i % len(cases)]
+        tasks.append(asyncio.create_task(_one_request(client, url, case, mode, next_at, timeout, results)))
+        i += 1
+        next_at += rnd.expovariate(rps) if arrival == "poisson" else 1.0 / rps
+    sent_window = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    return {"results": results, "sent": len(tasks), "send_window_s": sent_window,
+            "wall_s": time.perf_counter() - start}
+
+
+def _summarize(run: Dict, cpu_s: Optional[float], args) -> Dict:
+    results = run["results"]
+    ok = sorted(r["latency_s"] for r in results if not r["error"])
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    completed = len(results)
+    return {
+        "config": {
+            "rps": args.rps, "duration_s": args.duration, "mode": args.mode, "arrival": args.arrival,
+            "workers": getattr(args, "workers", None),
+            "fake_llm": {k: v for k, v in os.environ.items() if k.startswith("FAKE_")},
+        },
+        "sent": run["sent"],
+        "completed": completed,
+        "ok": len(ok),
+        "errors": errors,
+        "throughput_rps": round(len(ok) / run["wall_s"], 3) if run["wall_s"] else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(ok, 50) * 1000, 1),
+            "p95": round(_percentile(ok, 95) * 1000, 1),
+            "p99": round(_percentile(ok, 99) * 1000, 1),
+            "max": round(ok[-1] * 1000, 1) if ok else 0.0,
+            "mean": round(sum(ok) / len(ok) * 1000, 1) if ok else 0.0,
+        },
+        "server_cpu_ms_per_request": round(cpu_s / completed * 1000, 2) if cpu_s is not None and completed else None,
+    }
+
+
+def _print_report(summary: Dict, baseline: Optional[Dict]) -> None:
+    lat = summary["latency_ms"]
+    print(f"\n发送 {summary['sent']}，完成 {summary['completed']}，成功 {summary['ok']}，"
+          f"吞吐 {summary['throughput_rps']} req/s，错误 {summary['errors'] or 0}")
+    rows = [("p50(ms)", lat["p50"]), ("p95(ms)", lat["p95"]), ("p99(ms)", lat["p99"]),
+            ("max(ms)", lat["max"]), ("cpu/req(ms)", summary["server_cpu_ms_per_request"])]
+    if baseline is None:
+        for name, value in rows:
+            print(f"  {name:<12}{value if value is not None else '-':>12}")
+        return
+    base_lat = baseline["latency_ms"]
+    base_vals = [base_lat["p50"], base_lat["p95"], base_lat["p99"], base_lat["max"],
+                 baseline.get("server_cpu_ms_per_request")]
+    print(f"  {'':<12}{'current':>12}{'baseline':>12}{'delta':>10}")
+    for (name, value), base in zip(rows, base_vals):
+        if value is None or not base:
+            print(f"  {name:<12}{value if value is not None else '-':>12}{base if base is not None else '-':>12}")
+            continue
+        print(f"  {name:<12}{value:>12}{base:>12}{(value - base) / base * 100:>+9.1f}%")
+
+
+async def _main_async(args) -> int:
+    cases = _load_test_set()
+    proc = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        proc = _start_server(args.port, args.rebuild, args.workers)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+    try:
+        async with httpx.AsyncClient(limits=limits) as client:
+            await _wait_ready(client, url, proc, args.startup_timeout)
+            if args.warmup > 0:
+                print(f"[loadtest] 预热 {args.warmup} 个请求 ...", flush=True)
+                warm: List[Dict] = []
+                await asyncio.gather(*[
+                    _one_request(client, url, cases[i % len(cases)], args.mode, time.perf_counter(), args.timeout, warm)
+                    for i in range(args.warmup)
+                ])
+
+            print(f"[loadtest] {args.rps} req/s × {args.duration}s，mode={args.mode}，arrival={args.arrival}", flush=True)
+            cpu0 = _proc_tree_cpu_seconds(proc.pid) if proc else None
+            run = await _replay(client, url, cases, args.mode, args.rps, args.duration,
+                                args.arrival, args.timeout, args.seed)
+            cpu1 = _proc_tree_cpu_seconds(proc.pid) if proc else None
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    cpu_s = cpu1 - cpu0 if cpu0 is not None and cpu1 is not None else None
+    summary = _summarize(run, cpu_s, args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(summary, baseline)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存：{args.json}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat 离线压测（开环回放 test_set.jsonl）")
+    parser.add_argument("--rps", type=float, default=2.0, help="目标请求速率")
+    parser.add_argument("--duration", type=float, default=30.0, help="发送持续时间（秒）")
+    parser.add_argument("--mode", default="detailed", choices=["simple", "detailed", "deep"])
+    parser.add_argument("--arrival", default="uniform", choices=["uniform", "poisson"])
+    parser.add_argument("--warmup", type=int, default=3, help="正式压测前的预热请求数")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="泊松到达的随机种子")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default=None, help="连接已启动的服务，不再自动启动 server.py")
+    parser.add_argument("--rebuild", action="store_true", help="重建压测用知识库索引")
+    parser.add_argument("--workers", type=int, default=None, help="以 gunicorn 多 worker 启动服务")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果对比")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+压测 — worker 数扩展性（1 / 2 / 4 / 8 个 gunicorn worker）
+
+对每个 worker 数 N：
+  1. 以 gunicorn（gunicorn.conf.py，preload）启动 evaluation/loadtest/server.py --workers N（N > 1 时自动启动 chroma 服务）
+  2. 预热 2N 个请求，使每个 worker 都完成模块级冷启动
+  3. 按 --rps-per-worker × N 的目标速率开环回放 --duration 秒（与 run.py 相同的测量口径）
+  4. 关闭服务，进入下一档
+
+输出每档的吞吐、p50 / p95 / p99、错误数、每请求 CPU，以及扩展效率
+    efficiency(N) = throughput(N) / (N × throughput(1))
+接近 1 表示线性扩展；明显下降说明存在跨进程争用（Chroma 服务、SQLite 共享缓存、CPU 核数不足等）。
+
+--fixed-rps 时各档使用相同的总速率，用于观察在同一负载下增加 worker 对尾延迟的改善。
+
+运行方式：
+    python evaluation/loadtest/scaling.py
+    python evaluation/loadtest/scaling.py --workers 1,2,4 --rps-per-worker 3 --duration 60
+    python evaluation/loadtest/scaling.py --fixed-rps 8 --json results/scaling.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, _HERE)
+
+from run import (  # noqa: E402
+    _load_test_set,
+    _one_request,
+    _proc_tree_cpu_seconds,
+    _replay,
+    _start_server,
+    _summarize,
+    _wait_ready,
+)
+
+
+async def _measure(workers: int, rps: float, cases: List[dict], args, rebuild: bool) -> Dict:
+    url = f"http://127.0.0.1:{args.port}"
+    # 索引构建在服务就绪之前完成，不计入测量
+    proc = _start_server(args.port, rebuild=rebuild, workers=workers)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+    try:
+        async with httpx.AsyncClient(limits=limits) as client:
+            await _wait_ready(client, url, proc, args.startup_timeout)
+            warm: List[Dict] = []
+            await asyncio.gather(*[
+                _one_request(client, url, cases[i % len(cases)], args.mode, time.perf_counter(), args.timeout, warm)
+                for i in range(2 * workers)
+            ])
+            cpu0 = _proc_tree_cpu_seconds(proc.pid)
+            run = await _replay(client, url, cases, args.mode, rps, args.duration,
+                                args.arrival, args.timeout, args.seed)
+            cpu1 = _proc_tree_cpu_seconds(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    step_args = argparse.Namespace(rps=rps, duration=args.duration, mode=args.mode,
+                                   arrival=args.arrival, workers=workers)
+    cpu_s = cpu1 - cpu0 if cpu0 is not None and cpu1 is not None else None
+    return _summarize(run, cpu_s, step_args)
+
+
+def _print_table(steps: List[Dict]) -> None:
+    base = steps[0]["throughput_rps"] / steps[0]["config"]["workers"] if steps and steps[0]["throughput_rps"] else 0.0
+    print(f"\n{'workers':>8}{'target':>9}{'rps':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          f"{'errors':>8}{'cpu/req':>9}{'eff':>7}")
+    for s in steps:
+        n = s["config"]["workers"]
+        lat = s["latency_ms"]
+        errors = sum(s["errors"].values())
+        cpu = s["server_cpu_ms_per_request"]
+        eff = s["throughput_rps"] / (n * base) if base else 0.0
+        print(f"{n:>8}{s['config']['rps']:>9.1f}{s['throughput_rps']:>9.2f}{lat['p50']:>10}{lat['p95']:>10}"
+              f"{lat['p99']:>10}{errors:>8}{cpu if cpu is not None else '-':>9}{eff:>7.2f}")
+
+
+async def _main_async(args) -> int:
+    cases = _load_test_set()
+    worker_counts = [int(w) for w in args.workers.split(",") if w.strip()]
+
+    steps = []
+    for i, n in enumerate(worker_counts):
+        rps = args.fixed_rps or args.rps_per_worker * n
+        print(f"[scaling] {n} worker(s)，{rps} req/s × {args.duration}s，mode={args.mode}", flush=True)
+        steps.append(await _measure(n, rps, cases, args, rebuild=args.rebuild and i == 0))
+
+    _print_table(steps)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"steps": steps}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存：{args.json}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat 多 worker 扩展性压测")
+    parser.add_argument("--workers", default="1,2,4,8", help="逗号分隔的 worker 数")
+    parser.add_argument("--rps-per-worker", type=float, default=2.0, help="每个 worker 的目标请求速率")
+    parser.add_argument("--fixed-rps", type=float, default=None, help="各档使用相同的总速率")
+    parser.add_argument("--duration", type=float, default=30.0, help="每档发送持续时间（秒）")
+    parser.add_argument("--mode", default="detailed", choices=["simple", "detailed", "deep"])
+    parser.add_argument("--arrival", default="uniform", choices=["uniform", "poisson"])
+    parser.add_argument("--timeout", type=float, default=120.0, help="单请求超时（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rebuild", action="store_true", help="重建压测用知识库索引")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--json", default=None, help="结果保存路径")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+压测用后端 — 注入离线替身后启动 backend_proxy
+
+  1. fakes.install()：假 LLM / 假 DuckDuckGo / 哈希 embedding，全程不访问网络
+  2. Chroma、embedding 磁盘缓存、意图历史、trace 全部写到 LOADTEST_DATA_DIR（默认 /tmp/decidex_loadtest），
+     不碰 data/ 下的真实数据
+  3. 知识库索引用哈希 embedding 预先构建一次，之后的压测直接复用（--rebuild 强制重建）
+  4. 导入 backend_proxy 并用 uvicorn 启动；指定 --workers 时改用 gunicorn（gunicorn.conf.py，
+     preload：替身与预热都在 master 中完成，worker fork 后直接继承）
+  5. --workers > 1 且未设置 CHROMA_SERVER_URL 时，先在空闲端口上启动 `chroma run`（数据目录同上），
+     知识库预构建与各 worker 都经 HttpClient 访问；PersistentClient 不能被多个进程共享
+
+一般由 evaluation/loadtest/run.py / scaling.py 以子进程方式启动，也可单独运行：
+    python evaluation/loadtest/server.py --port 8765
+    python evaluation/loadtest/server.py --port 8765 --workers 4
+"""
+
+import argparse
+import atexit
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(os.path.dirname(_HERE))
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, _HERE)
+
+DATA_DIR = os.getenv("LOADTEST_DATA_DIR", os.path.join(tempfile.gettempdir(), "decidex_loadtest"))
+
+
+def _prepare_env() -> None:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # 显式置空：backend_proxy 的 load_dotenv() 不会覆盖已存在的变量，.env 里的真实 Key 不会生效
+    for key in ("GOOGLE_API_KEY", "OPENAI_API_KEY", "COHERE_API_KEY"):
+        os.environ[key] = ""
+    os.environ.setdefault("EMBEDDING_CACHE_DB", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+    os.environ.setdefault("INTENT_HISTORY_PATH", os.path.join(DATA_DIR, "intent_history.jsonl"))
+    os.environ.setdefault("TRACE_FILE", os.path.join(DATA_DIR, "traces.jsonl"))
+    os.environ.setdefault("SHARED_CACHE_DB", os.path.join(DATA_DIR, "shared_cache.sqlite3"))
+    os.environ.setdefault("PIPELINE_PERSIST", "0")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_chroma_server(timeout_s: float = 30.0) -> None:
+    """
+    启动 chroma 服务并设置 CHROMA_SERVER_URL，必须在导入 rag 之前调用（chroma_client 导入时读取该变量）。
+    进程退出时关闭服务；gunicorn worker 继承了 atexit 回调，按 pid 只在启动它的进程中执行。
+    """
+    port = _free_port()
+    proc = subprocess.Popen(
+        ["chroma", "run", "--path", os.path.join(DATA_DIR, "chroma_db"), "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    owner = os.getpid()
+
+    def _stop():
+        if os.getpid() != owner or proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    atexit.register(_stop)
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout_s
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"chroma 服务启动失败（exit {proc.returncode}）")
+        try:
+            with urllib.request.urlopen(f"{url}/api/v2/heartbeat", timeout=1):
+                break
+        except OSError:
+            if time.monotonic() > deadline:
+                _stop()
+                raise RuntimeError(f"chroma 服务 {timeout_s:.0f}s 内未就绪（{url}）")
+            time.sleep(0.2)
+    os.environ["CHROMA_SERVER_URL"] = url
+    print(f"[loadtest] chroma server: {url}", flush=True)
+
+
+def _prebuild_chroma(rebuild: bool) -> None:
+    import rag.knowledge_base as knowledge_base
+    import rag.vector_store as vector_store
+
+    chroma_dir = os.path.join(DATA_DIR, "chroma_db")
+    knowledge_base.CHROMA_PERSIST_DIR = chroma_dir
+    vector_store.CHROMA_PERSIST_DIR = chroma_dir
+    for kb_type in knowledge_base.KNOWLEDGE_FILES:
+        count = knowledge_base.build_knowledge_index(kb_type, force_rebuild=rebuild)
+        print(f"[loadtest] knowledge_{kb_type}: {count} chunks ({chroma_dir})", flush=True)
+
+
+def _serve_gunicorn(app, host: str, port: int, workers: int) -> None:
+    """以 gunicorn.conf.py 为基础启动多 worker，只覆盖监听地址、worker 数和日志级别"""
+    from gunicorn.app.base import BaseApplication
+
+    class _LoadtestApp(BaseApplication):
+        def load_config(self):
+            self.load_config_from_file(os.path.join(_ROOT, "gunicorn.conf.py"))
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("loglevel", "warning")
+            self.cfg.set("accesslog", None)
+
+        def load(self):
+            return app
+
+    _LoadtestApp().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线替身 + backend_proxy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rebuild", action="store_true", help="重建压测用知识库索引")
+    parser.add_argument("--workers", type=int, default=None, help="gunicorn worker 数（不指定则单进程 uvicorn）")
+    args = parser.parse_args()
+
+    _prepare_env()
+    if (args.workers or 1) > 1 and not os.getenv("CHROMA_SERVER_URL"):
+        _start_chroma_server()
+    import fakes
+    fakes.install()
+    _prebuild_chroma(args.rebuild)
+
+    import backend_proxy
+    if args.workers:
+        _serve_gunicorn(backend_proxy.app, args.host, args.port, args.workers)
+        return
+    import uvicorn
+    uvicorn.run(backend_proxy.app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
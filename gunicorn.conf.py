@@ -0,0 +1,61 @@
+"""
+DecideX 后端多进程部署配置（gunicorn + uvicorn worker）
+
+启动：
+    gunicorn backend_proxy:app -c gunicorn.conf.py
+    WEB_CONCURRENCY=4 PORT=8123 gunicorn backend_proxy:app -c gunicorn.conf.py
+
+进程模型：
+  - preload_app=True：master 先导入 backend_proxy（加载 graph、构建 LLM 客户端），
+    再在 when_ready 中调用 backend_proxy.warmup() 加载 embedding / 精排模型权重，
+    fork 出的 worker 以写时复制方式共享，不再各自冷启动
+  - 请求级状态（引用池、停止规则）按 contextvars 隔离，见 decision-agent/graph.py begin_request()
+  - Chroma / SQLite 连接按进程创建，fork 后在 worker 中自动重建
+
+跨 worker 共享：
+  - embedding 向量：EMBEDDING_CACHE_DB（SQLite WAL），或 EMBEDDING_SERVICE_SOCKET 指向的
+    rag/embedding_service.py 服务进程（全部 worker 只持有一份模型）
+  - 网络搜索结果 / 完整报告：SHARED_CACHE_DB（SQLite WAL），TTL 分别为 SEARCH_CACHE_TTL_S、REPORT_CACHE_TTL_S
+  - Chroma：workers > 1 时必须设置 CHROMA_SERVER_URL，经 HttpClient 连接 chroma 服务
+    （chroma run --path data/chroma_db --port 8000）；PersistentClient 只能用于单 worker，
+    未设置时 on_starting 直接报错退出
+
+注意：/metrics、/stats/* 为各 worker 进程内的统计，多 worker 时每次请求只看到其中一个 worker。
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8123')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 4))))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+# /chat 的完整分析可能超过 60s（deep 模式 + 慢 LLM）
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+graceful_timeout = 30
+keepalive = 5
+
+# 长时间运行后按请求数轮换 worker，抖动避免所有 worker 同时重启
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """fork worker 之前检查 Chroma 部署方式：多个进程不能共享同一个 PersistentClient 目录"""
+    if server.cfg.workers > 1 and not os.getenv("CHROMA_SERVER_URL"):
+        raise RuntimeError(
+            f"workers={server.cfg.workers} 需要设置 CHROMA_SERVER_URL，"
+            "请先启动 Chroma 服务：chroma run --path data/chroma_db --port 8000"
+        )
+
+
+def when_ready(server):
+    """master 就绪、尚未 fork worker 时执行预热（仅 preload_app 时 backend_proxy 已在 master 中导入）"""
+    if not preload_app:
+        return
+    import backend_proxy
+    backend_proxy.warmup()
@@ -3,12 +3,14 @@ from .vector_store import (
     save_decision,
     retrieve_similar_decisions,
     format_history_for_prompt,
+    get_decision_store,
 )
 from .knowledge_base import (
     build_knowledge_index,
     retrieve_knowledge,
     format_knowledge_for_prompt,
     ensure_knowledge_index,
+    invalidate_knowledge_cache,
 )
 from .hybrid_retrieval import (
     hybrid_retrieve,
@@ -20,18 +22,20 @@ from .self_rag import (
     evaluate_relevance,
     evaluate_usefulness,
 )
-from .reranker import rerank, format_reranked_results
+from .reranker import rerank, format_reranked_results, reranker_health
 
 __all__ = [
     # 用户记忆 RAG
     "save_decision",
     "retrieve_similar_decisions",
     "format_history_for_prompt",
+    "get_decision_store",
     # 知识库 RAG
     "build_knowledge_index",
     "ensure_knowledge_index",
     "retrieve_knowledge",
     "format_knowledge_for_prompt",
+    "invalidate_knowledge_cache",
     # 混合检索 + RRF
     "hybrid_retrieve",
     "format_hybrid_results",
@@ -43,4 +47,5 @@ __all__ = [
     # Cohere 精排
     "rerank",
     "format_reranked_results",
+    "reranker_health",
 ]
@@ -0,0 +1,105 @@
+"""
+DecideX RAG 模块 - Chroma 客户端工厂（多 worker 部署）
+
+chromadb.PersistentClient 只能由一个进程打开：每个进程各自持有内存中的 HNSW 段，
+另一个进程写入的向量不会出现在本进程的索引里，加文件锁也无法解决。
+knowledge_base / vector_store 统一通过这里获取客户端：
+
+  - 设置了 CHROMA_SERVER_URL（如 http://127.0.0.1:8000）→ chromadb.HttpClient，
+    所有 worker 共享一个 Chroma 服务进程，读写并发由服务端处理
+  - 否则使用 PersistentClient，仅限单 worker：WEB_CONCURRENCY > 1 时 get_client() 直接报错
+  - 客户端按进程缓存：gunicorn --preload 在 master 中创建的客户端，fork 后在 worker 中自动重建
+  - write_lock()：单 worker 时为进程内锁；服务模式下为同一主机上各 worker 之间的 fcntl 锁，
+    只用于让知识库索引只构建一次，数据一致性由 Chroma 服务保证
+
+Chroma 服务启动示例：
+    chroma run --path data/chroma_db --port 8000
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import chromadb
+
+try:
+    import fcntl
+except ImportError:  # Windows：服务模式下不做跨 worker 锁，退化为进程内锁
+    fcntl = None
+
+# ============================================================
+# 配置
+# ============================================================
+
+CHROMA_SERVER_URL = os.getenv("CHROMA_SERVER_URL", "")
+
+_LOCK_FILE = ".decidex_write.lock"
+
+# (persist_dir, pid) → client
+_clients: dict = {}
+_clients_lock = threading.Lock()
+_write_locks: dict = {}
+
+
+def using_server() -> bool:
+    return bool(CHROMA_SERVER_URL)
+
+
+def require_server_for_workers(workers: int) -> None:
+    """多 worker 部署必须使用 Chroma 服务；PersistentClient 无法在多个进程间共享"""
+    if workers > 1 and not using_server():
+        raise RuntimeError(
+            f"{workers} 个 worker 需要设置 CHROMA_SERVER_URL：PersistentClient 只支持单进程，"
+            "请先启动 Chroma 服务（chroma run --path data/chroma_db --port 8000）"
+        )
+
+
+def get_client(persist_dir: str):
+    """
+    返回当前进程可用的 Chroma 客户端（按进程缓存）。
+    CHROMA_SERVER_URL 已设置时 persist_dir 只作为缓存 key。
+    """
+    key = (os.path.abspath(persist_dir), os.getpid())
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if CHROMA_SERVER_URL:
+                url = urlparse(CHROMA_SERVER_URL)
+                client = chromadb.HttpClient(
+                    host=url.hostname or "127.0.0.1",
+                    port=url.port or (443 if url.scheme == "https" else 8000),
+                    ssl=url.scheme == "https",
+                )
+            else:
+                require_server_for_workers(int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+                os.makedirs(persist_dir, exist_ok=True)
+                client = chromadb.PersistentClient(path=persist_dir)
+            _clients[key] = client
+    return client
+
+
+@contextmanager
+def write_lock(persist_dir: str):
+    """
+    Chroma 写操作的互斥锁。
+    先取进程内 threading.Lock；HttpClient 模式下再取 <persist_dir>/.decidex_write.lock 上的
+    fcntl 排他锁，让同一主机上的多个 worker 串行执行“检查是否已有数据 → 构建”。
+    """
+    path = os.path.abspath(persist_dir)
+    with _clients_lock:
+        local = _write_locks.setdefault(path, threading.Lock())
+    with local:
+        if not CHROMA_SERVER_URL or fcntl is None:
+            yield
+            return
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, _LOCK_FILE), "a+") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
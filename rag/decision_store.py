@@ -0,0 +1,380 @@
+"""
+DecideX RAG 模块 - 历史决策存储后端（按用户分区）
+
+背景：
+  早期实现把所有用户的决策记录放在同一个 `decision_history` collection 中，
+  检索时用 where={"user_id": ...} 过滤。HNSW 近邻搜索会先在全体用户的向量中
+  找邻居再做后过滤，用户越多，越容易出现"扫了一堆别人的邻居、自己的结果不够"。
+
+分区策略（通过环境变量 DECISION_STORE_BACKEND 选择）：
+  - shared    单一 collection + where 过滤（旧行为，默认，兼容已有数据）
+  - per_user  每个用户一个独立 collection，检索无需过滤，n_results 上界取该用户自己的条数
+  - sharded   按 user_id 哈希分到 N 个分片（DECISION_STORE_SHARDS，默认 16），
+              分片内再做 where 过滤；适合用户数极多、单用户记录很少的场景
+
+自定义后端：继承 DecisionStore 并调用 register_backend("name", cls) 注册。
+
+从 shared 切换到分区后端前，必须先迁移已有记录（否则旧历史对所有用户不可见）：
+    python rag/migrate_decisions.py --backend per_user
+迁移完成后旧 collection 改名为 decision_history_migrated_<时间戳> 保留备份。
+旧 collection 中仍有记录时，vector_store.get_decision_store() 拒绝以分区后端启动。
+"""
+
+import hashlib
+import os
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Type
+
+# ============================================================
+# 配置
+# ============================================================
+
+DECISION_COLLECTION = "decision_history"
+
+DEFAULT_BACKEND = os.getenv("DECISION_STORE_BACKEND", "shared").lower()
+DEFAULT_SHARDS = int(os.getenv("DECISION_STORE_SHARDS", "16"))
+
+_INCLUDE = ["documents", "metadatas", "distances"]
+
+
+def _empty_result() -> dict:
+    """与 Chroma query 返回结构一致的空结果"""
+    return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+
+# ============================================================
+# 后端基类
+# ============================================================
+
+class DecisionStore(ABC):
+    """
+    决策记录存储后端基类。
+
+    所有后端的 query() 都返回 Chroma query 风格的结果字典
+    （ids / documents / metadatas / distances，外层各包一层 list），
+    方便 vector_store 复用同一套结果解析逻辑。
+    """
+
+    name = "base"
+
+    def __init__(self, client, embedding_function=None):
+        self._client = client
+        self._ef = embedding_function
+        self._lock = threading.Lock()
+        self._collections: Dict[str, object] = {}
+
+    # ---- collection 句柄缓存 ----------------------------------------------
+
+    def _open(self, name: str, create: bool):
+        """获取 collection 句柄；create=False 且不存在时返回 None"""
+        col = self._collections.get(name)
+        if col is not None:
+            return col
+        with self._lock:
+            col = self._collections.get(name)
+            if col is not None:
+                return col
+            if create:
+                col = self._client.get_or_create_collection(
+                    name=name,
+                    embedding_function=self._ef,
+                    metadata={"hnsw:space": "cosine"},
+                )
+            else:
+                try:
+                    col = self._client.get_collection(name=name, embedding_function=self._ef)
+                except Exception:
+                    # 该分区尚未创建（用户还没有任何历史记录）
+                    return None
+            self._collections[name] = col
+            return col
+
+    @staticmethod
+    def _query(collection, n_results: int, where: Optional[dict],
+               query_text: Optional[str], query_embedding: Optional[List[float]]) -> dict:
+        kwargs = {"n_results": n_results, "include": _INCLUDE}
+        if where:
+            kwargs["where"] = where
+        if query_embedding is not None:
+            kwargs["query_embeddings"] = [query_embedding]
+        else:
+            kwargs["query_texts"] = [query_text]
+        return collection.query(**kwargs)
+
+    # ---- 子类实现 ----------------------------------------------------------
+
+    @abstractmethod
+    def add(self, user_id: str, doc_id: str, document: str, metadata: dict,
+            embedding: Optional[List[float]] = None) -> None:
+        ...
+
+    def add_many(self, user_id: str, ids: List[str], documents: List[str],
+                 metadatas: List[dict], embeddings: Optional[List[List[float]]] = None) -> None:
+        """批量写入同一用户的多条记录（迁移 / 基准测试灌数据用）"""
+        for i, doc_id in enumerate(ids):
+            self.add(user_id, doc_id, documents[i], metadatas[i],
+                     embeddings[i] if embeddings is not None else None)
+
+    @abstractmethod
+    def query(self, user_id: str, n_results: int = 3, query_text: Optional[str] = None,
+              query_embedding: Optional[List[float]] = None) -> dict:
+        ...
+
+    @abstractmethod
+    def count(self, user_id: Optional[str] = None) -> int:
+        ...
+
+
+# ============================================================
+# shared：单一 collection + where 过滤（旧行为）
+# ============================================================
+
+class SharedCollectionStore(DecisionStore):
+    """所有用户共用 decision_history，检索时按 user_id 后过滤"""
+
+    name = "shared"
+
+    def _col(self):
+        return self._open(DECISION_COLLECTION, create=True)
+
+    def add(self, user_id, doc_id, document, metadata, embedding=None):
+        kwargs = {"documents": [document], "metadatas": [metadata], "ids": [doc_id]}
+        if embedding is not None:
+            kwargs["embeddings"] = [embedding]
+        self._col().add(**kwargs)
+
+    def add_many(self, user_id, ids, documents, metadatas, embeddings=None):
+        kwargs = {"documents": documents, "metadatas": metadatas, "ids": ids}
+        if embeddings is not None:
+            kwargs["embeddings"] = embeddings
+        self._col().add(**kwargs)
+
+    def query(self, user_id, n_results=3, query_text=None, query_embedding=None):
+        col = self._col()
+        total = col.count()
+        if total == 0:
+            return _empty_result()
+        return self._query(col, min(n_results, total), {"user_id": {"$eq": user_id}},
+                           query_text, query_embedding)
+
+    def count(self, user_id=None):
+        col = self._col()
+        if user_id is None:
+            return col.count()
+        got = col.get(where={"user_id": {"$eq": user_id}}, include=[])
+        return len(got.get("ids", []))
+
+
+# ============================================================
+# per_user：每用户一个 collection
+# ============================================================
+
+class PerUserCollectionStore(DecisionStore):
+    """
+    每个用户一个独立 collection（decision_history_u_<hash>）。
+    检索只在该用户自己的 HNSW 图上进行，不需要 where 过滤，
+    延迟只与该用户的记录数相关，与总用户数无关。
+    """
+
+    name = "per_user"
+
+    @staticmethod
+    def collection_name(user_id: str) -> str:
+        # Chroma collection 名只允许 [a-zA-Z0-9._-] 且长度 3~63，用哈希规避任意 user_id
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:16]
+        return f"{DECISION_COLLECTION}_u_{digest}"
+
+    def add(self, user_id, doc_id, document, metadata, embedding=None):
+        col = self._open(self.collection_name(user_id), create=True)
+        kwargs = {"documents": [document], "metadatas": [metadata], "ids": [doc_id]}
+        if embedding is not None:
+            kwargs["embeddings"] = [embedding]
+        col.add(**kwargs)
+
+    def add_many(self, user_id, ids, documents, metadatas, embeddings=None):
+        col = self._open(self.collection_name(user_id), create=True)
+        kwargs = {"documents": documents, "metadatas": metadatas, "ids": ids}
+        if embeddings is not None:
+            kwargs["embeddings"] = embeddings
+        col.add(**kwargs)
+
+    def query(self, user_id, n_results=3, query_text=None, query_embedding=None):
+        col = self._open(self.collection_name(user_id), create=False)
+        if col is None:
+            return _empty_result()
+        total = col.count()
+        if total == 0:
+            return _empty_result()
+        return self._query(col, min(n_results, total), None, query_text, query_embedding)
+
+    def count(self, user_id=None):
+        if user_id is None:
+            prefix = f"{DECISION_COLLECTION}_u_"
+            total = 0
+            for c in self._client.list_collections():
+                name = c if isinstance(c, str) else getattr(c, "name", "")
+                if name.startswith(prefix):
+                    total += self._open(name, create=True).count()
+            return total
+        col = self._open(self.collection_name(user_id), create=False)
+        return col.count() if col is not None else 0
+
+
+# ============================================================
+# sharded：按用户哈希分片
+# ============================================================
+
+class ShardedCollectionStore(DecisionStore):
+    """
+    按 crc32(user_id) % shards 把用户分到固定数量的 collection。
+    collection 数量有上界（不会随用户数增长），每个分片内的邻居规模约为总量 / shards。
+    """
+
+    name = "sharded"
+
+    def __init__(self, client, embedding_function=None, shards: int = DEFAULT_SHARDS):
+        super().__init__(client, embedding_function)
+        self.shards = max(1, shards)
+
+    def shard_name(self, user_id: str) -> str:
+        shard = zlib.crc32(user_id.encode("utf-8")) % self.shards
+        return f"{DECISION_COLLECTION}_s{self.shards}_{shard:03d}"
+
+    def add(self, user_id, doc_id, document, metadata, embedding=None):
+        col = self._open(self.shard_name(user_id), create=True)
+        kwargs = {"documents": [document], "metadatas": [metadata], "ids": [doc_id]}
+        if embedding is not None:
+            kwargs["embeddings"] = [embedding]
+        col.add(**kwargs)
+
+    def add_many(self, user_id, ids, documents, metadatas, embeddings=None):
+        col = self._open(self.shard_name(user_id), create=True)
+        kwargs = {"documents": documents, "metadatas": metadatas, "ids": ids}
+        if embeddings is not None:
+            kwargs["embeddings"] = embeddings
+        col.add(**kwargs)
+
+    def query(self, user_id, n_results=3, query_text=None, query_embedding=None):
+        col = self._open(self.shard_name(user_id), create=False)
+        if col is None:
+            return _empty_result()
+        total = col.count()
+        if total == 0:
+            return _empty_result()
+        return self._query(col, min(n_results, total), {"user_id": {"$eq": user_id}},
+                           query_text, query_embedding)
+
+    def count(self, user_id=None):
+        if user_id is not None:
+            col = self._open(self.shard_name(user_id), create=False)
+            if col is None:
+                return 0
+            got = col.get(where={"user_id": {"$eq": user_id}}, include=[])
+            return len(got.get("ids", []))
+        total = 0
+        for shard in range(self.shards):
+            col = self._open(f"{DECISION_COLLECTION}_s{self.shards}_{shard:03d}", create=False)
+            if col is not None:
+                total += col.count()
+        return total
+
+
+# ============================================================
+# 后端注册表
+# ============================================================
+
+_BACKENDS: Dict[str, Type[DecisionStore]] = {
+    SharedCollectionStore.name: SharedCollectionStore,
+    PerUserCollectionStore.name: PerUserCollectionStore,
+    ShardedCollectionStore.name: ShardedCollectionStore,
+}
+
+
+def register_backend(name: str, cls: Type[DecisionStore]) -> None:
+    """注册自定义决策存储后端（例如外部向量数据库）"""
+    _BACKENDS[name.lower()] = cls
+
+
+def available_backends() -> List[str]:
+    return sorted(_BACKENDS)
+
+
+def create_store(client, embedding_function=None, backend: Optional[str] = None) -> DecisionStore:
+    """按名称创建后端实例；未知名称抛 ValueError"""
+    name = (backend or DEFAULT_BACKEND).lower()
+    cls = _BACKENDS.get(name)
+    if cls is None:
+        raise ValueError(f"未知决策存储后端: {name}（可选：{', '.join(available_backends())}）")
+    return cls(client, embedding_function)
+
+
+# ============================================================
+# 迁移：shared → 分区后端
+# ============================================================
+
+def legacy_row_count(client) -> int:
+    """旧共享 collection decision_history 中的记录数（不存在时为 0）"""
+    try:
+        return client.get_collection(name=DECISION_COLLECTION).count()
+    except Exception:
+        return 0
+
+
+def ensure_no_legacy_rows(store: DecisionStore) -> None:
+    """分区后端启动前检查：旧共享 collection 仍有记录时抛 RuntimeError，避免历史被静默隐藏"""
+    if isinstance(store, SharedCollectionStore):
+        return
+    rows = legacy_row_count(store._client)
+    if rows:
+        raise RuntimeError(
+            f"{DECISION_COLLECTION} 中仍有 {rows} 条历史记录，切换到 {store.name} 后将无法检索；"
+            f"请先运行 python rag/migrate_decisions.py --backend {store.name}"
+        )
+
+
+def migrate_shared_to(store: DecisionStore, batch_size: int = 500, retire: bool = False) -> int:
+    """
+    把旧 decision_history collection 中的记录按 user_id 拷贝到分区后端。
+    直接复用已存的 embedding，不重新向量化；重复执行时已存在的 id 会被跳过。
+    retire=True 时在全部拷贝完成后把旧 collection 改名为 decision_history_migrated_<时间戳>。
+
+    Returns:
+        迁移的记录条数
+    """
+    if isinstance(store, SharedCollectionStore):
+        return 0
+    try:
+        legacy = store._client.get_collection(name=DECISION_COLLECTION)
+    except Exception:
+        return 0
+
+    moved = 0
+    offset = 0
+    while True:
+        page = legacy.get(
+            include=["documents", "metadatas", "embeddings"],
+            limit=batch_size,
+            offset=offset,
+        )
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        by_user: Dict[str, dict] = {}
+        for i, doc_id in enumerate(ids):
+            meta = page["metadatas"][i] or {}
+            uid = meta.get("user_id", "default")
+            bucket = by_user.setdefault(uid, {"ids": [], "documents": [], "metadatas": [], "embeddings": []})
+            bucket["ids"].append(doc_id)
+            bucket["documents"].append(page["documents"][i])
+            bucket["metadatas"].append(meta)
+            bucket["embeddings"].append(list(page["embeddings"][i]))
+        for uid, b in by_user.items():
+            store.add_many(uid, b["ids"], b["documents"], b["metadatas"], b["embeddings"])
+        moved += len(ids)
+        offset += len(ids)
+    if retire:
+        legacy.modify(name=f"{DECISION_COLLECTION}_migrated_{datetime.now().strftime('%Y%m%d%H%M%S')}")
+    return moved
@@ -0,0 +1,275 @@
+"""
+DecideX RAG 模块 - Embedding 缓存（内存 LRU + SQLite 磁盘）
+
+同样的文本会被反复向量化：用户重复提问、self_rag 给知识库片段重新打分、
+保存决策时再次向量化摘要。CachedEmbeddingFunction 包在任意 embedding function 外面：
+
+  text ──sha256(model, text)──► 内存 LRU ──未命中──► SQLite ──未命中──► 模型
+                                   ▲                    ▲                 │
+                                   └────────────────────┴─────回填────────┘
+
+- Key 中带模型名，切换模型后旧向量自然不再命中（purge_other_models() 可清理）
+- SQLite 使用 WAL 模式，多个 worker 进程可共享同一个缓存文件
+- embedding_cache_stats() 导出命中率和估算节省的时间
+
+配置：
+  EMBEDDING_CACHE=0              关闭缓存
+  EMBEDDING_CACHE_SIZE=4096      内存 LRU 条数
+  EMBEDDING_CACHE_DB=<path>      磁盘缓存路径（默认 data/embedding_cache.sqlite3，设为空串关闭磁盘层）
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+from rag.tracing import incr as _trace_incr
+
+# ============================================================
+# 配置
+# ============================================================
+
+CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+DEFAULT_DB_PATH = os.getenv(
+    "EMBEDDING_CACHE_DB",
+    os.path.join(os.path.dirname(__file__), "..", "data", "embedding_cache.sqlite3"),
+)
+
+# SQLite 单条 IN 查询的最大参数个数
+_SQL_CHUNK = 500
+
+
+def _text_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# 磁盘层
+# ============================================================
+
+class _DiskCache:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connect()
+
+    def _connect(self) -> None:
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        self._pid = os.getpid()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # gunicorn --preload 时缓存可能在 master 中创建；fork 出的 worker 不能沿用父进程的连接
+        if self._pid != os.getpid():
+            self._connect()
+        return self._db
+
+    def get_many(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[i:i + _SQL_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model_name: str, items: List[tuple]) -> None:
+        now = time.time()
+        rows = [(k, model_name, len(v), np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def purge_other_models(self, model_name: str) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM embeddings WHERE model != ?", (model_name,))
+            self._conn.commit()
+            return cur.rowcount
+
+
+# ============================================================
+# Chroma 配置透传
+# ============================================================
+
+def bind_chroma_identity(ef) -> None:
+    """
+    chroma 新建集合时以 type(ef) 注册 embedding function，会在类上调用 name() / build_from_config()。
+    包装类的名字取决于实例（内层模型 / 服务端模型），这里为实例生成专属子类，
+    把这两个类级调用转发给实例本身，集合持久化的仍是内层模型的配置。
+    """
+    cls = type(ef)
+    sub = type(cls.__name__, (cls,), {
+        "name": staticmethod(ef.name),
+        "build_from_config": staticmethod(ef.build_from_config),
+    })
+    # EmbeddingFunction.__init_subclass__ 会再包一层 __call__ 校验，恢复成父类已包装好的版本
+    sub.__call__ = cls.__call__
+    ef.__class__ = sub
+
+
+# ============================================================
+# 带缓存的 EmbeddingFunction
+# ============================================================
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """对任意 Chroma 兼容 embedding function 加两级缓存，接口保持不变"""
+
+    def __init__(self, inner, model_name: str, memory_size: int = MEMORY_SIZE,
+                 db_path: Optional[str] = DEFAULT_DB_PATH):
+        self.inner = inner
+        self.model_name = model_name
+        self.memory_size = memory_size
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if db_path:
+            try:
+                self._disk = _DiskCache(db_path)
+            except Exception as e:
+                print(f"[EmbeddingCache] 磁盘缓存不可用，仅使用内存：{e}")
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._embed_seconds = 0.0
+        self._embedded_texts = 0
+        bind_chroma_identity(self)
+
+    # ── Chroma 配置接口：透传给被包装的函数 ─────────────────────
+    # 集合持久化时记录的是 name() / get_config()，必须与内层一致，
+    # 否则打开已有集合会报 “Embedding function conflict”
+
+    def name(self) -> str:
+        return self.inner.name()
+
+    def get_config(self) -> dict:
+        return self.inner.get_config()
+
+    def build_from_config(self, config: dict):
+        return CachedEmbeddingFunction(self.inner.build_from_config(config), self.model_name,
+                                       self.memory_size, self._disk.path if self._disk else None)
+
+    def is_legacy(self) -> bool:
+        return self.inner.is_legacy()
+
+    def default_space(self):
+        return self.inner.default_space()
+
+    def supported_spaces(self):
+        return self.inner.supported_spaces()
+
+    def validate_config_update(self, old_config: dict, new_config: dict) -> None:
+        self.inner.validate_config_update(old_config, new_config)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def __call__(self, input):
+        texts = list(input)
+        if not texts:
+            return []
+        keys = [_text_key(self.model_name, t) for t in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        # ── 内存层 ────────────────────────────────────────────
+        with self._lock:
+            for i, key in enumerate(keys):
+                v = self._memory.get(key)
+                if v is not None:
+                    self._memory.move_to_end(key)
+                    vectors[i] = v
+                    self.memory_hits += 1
+
+        # ── 磁盘层 ────────────────────────────────────────────
+        pending = [i for i, v in enumerate(vectors) if v is None]
+        if pending and self._disk is not None:
+            try:
+                found = self._disk.get_many(list({keys[i] for i in pending}))
+            except Exception:
+                found = {}
+            if found:
+                with self._lock:
+                    for i in pending:
+                        v = found.get(keys[i])
+                        if v is not None:
+                            vectors[i] = v
+                            self.disk_hits += 1
+                            self._remember(keys[i], v)
+                pending = [i for i in pending if vectors[i] is None]
+
+        _trace_incr("embedding_cache_hits", len(texts) - len(pending))
+
+        # ── 模型 ──────────────────────────────────────────────
+        if pending:
+            unique = list(dict.fromkeys(keys[i] for i in pending))
+            text_of = {keys[i]: texts[i] for i in pending}
+            t0 = time.perf_counter()
+            computed = self.inner([text_of[k] for k in unique])
+            elapsed = time.perf_counter() - t0
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(unique, computed)}
+            with self._lock:
+                self.misses += len(pending)
+                self._embed_seconds += elapsed
+                self._embedded_texts += len(unique)
+                for k, v in fresh.items():
+                    self._remember(k, v)
+            for i in pending:
+                vectors[i] = fresh[keys[i]]
+            if self._disk is not None:
+                try:
+                    self._disk.put_many(self.model_name, list(fresh.items()))
+                except Exception:
+                    pass
+
+        return [v.tolist() for v in vectors]
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            per_text = self._embed_seconds / self._embedded_texts if self._embedded_texts else 0.0
+            return {
+                "model": self.model_name,
+                "memory_size": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / total, 4) if total else 0.0,
+                "avg_embed_ms": round(per_text * 1000, 3),
+                "time_saved_s": round(hits * per_text, 3),
+            }
+
+    def purge_other_models(self) -> int:
+        """删除磁盘中其它模型名下的向量，返回删除条数"""
+        return self._disk.purge_other_models(self.model_name) if self._disk is not None else 0
@@ -0,0 +1,380 @@
+"""
+DecideX RAG 模块 - 本地 Embedding 服务（Unix Socket）
+
+问题：
+  每个 uvicorn worker 都会在 knowledge_base / vector_store / self_rag 中加载
+  sentence-transformers 模型，N 个 worker 就有 N 份以上的模型常驻内存。
+
+方案：
+  单独起一个服务进程持有唯一一份模型，worker 通过 Unix Socket 请求向量。
+  服务端做动态微批（dynamic micro-batching）：
+    - 第一个请求到达后最多再等 EMBEDDING_BATCH_WAIT_MS 毫秒（延迟预算）
+    - 期间到达的请求合并成一次模型调用，总条数不超过 EMBEDDING_MAX_BATCH
+  并发请求越多，单次前向的批越大，吞吐越高；空闲时单请求只多付出几毫秒。
+
+协议（长度前缀帧，4 字节大端长度 + 内容）：
+  请求：  JSON {"texts": [...]}
+  响应：  JSON {"ok": true, "n": N, "dim": D, "model": "..."} + float32 原始字节（N×D）
+          或 JSON {"ok": false, "error": "..."}
+  {"op": "info"}  → 服务端模型的 Chroma 配置 {"ok": true, "name": ..., "config": ..., "default_space": ...}，
+                    客户端据此上报 name() / get_config()，与已持久化的集合保持一致
+
+启动：
+    python -m rag.embedding_service --socket /tmp/decidex-embed.sock
+然后在各 worker 中设置 EMBEDDING_SERVICE_SOCKET=/tmp/decidex-embed.sock，
+rag/embeddings.get_embedding_function() 会自动改用 EmbeddingServiceClient。
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+from rag.embedding_cache import bind_chroma_identity
+
+# ============================================================
+# 配置
+# ============================================================
+
+DEFAULT_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET", "/tmp/decidex-embed.sock")
+MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+# 服务不可用后，多久再尝试重新连接（秒）
+RETRY_INTERVAL_S = float(os.getenv("EMBEDDING_SERVICE_RETRY_S", "30"))
+
+_FRAME = struct.Struct("!I")
+
+
+# ============================================================
+# 帧读写
+# ============================================================
+
+def _send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_FRAME.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding 服务连接已关闭")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (length,) = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    return _recv_exact(sock, length)
+
+
+# ============================================================
+# 服务端：动态微批
+# ============================================================
+
+class _Pending:
+    __slots__ = ("texts", "event", "result", "error")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """把并发到达的请求合并为一次模型调用"""
+
+    def __init__(self, ef, max_batch: int = MAX_BATCH, max_wait_ms: float = BATCH_WAIT_MS):
+        self._ef = ef
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+        threading.Thread(target=self._loop, name="embed-batcher", daemon=True).start()
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        pending = _Pending(texts)
+        self._queue.put(pending)
+        pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item.texts)
+
+            texts = [t for p in batch for t in p.texts]
+            try:
+                vectors = np.asarray(self._ef(texts), dtype=np.float32)
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            else:
+                offset = 0
+                for p in batch:
+                    p.result = vectors[offset: offset + len(p.texts)]
+                    offset += len(p.texts)
+            finally:
+                self.batches += 1
+                self.texts += len(texts)
+                self.largest_batch = max(self.largest_batch, len(texts))
+                for p in batch:
+                    p.event.set()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+
+def _ef_info(ef) -> dict:
+    """embedding function 的 Chroma 配置；未实现 name() / get_config() 的旧式实现 name 为 None"""
+    legacy = not hasattr(ef, "is_legacy") or ef.is_legacy()
+    return {
+        "name": None if legacy else ef.name(),
+        "config": None if legacy else ef.get_config(),
+        "default_space": ef.default_space() if hasattr(ef, "default_space") else "l2",
+        "supported_spaces": list(ef.supported_spaces()) if hasattr(ef, "supported_spaces") else ["cosine", "l2", "ip"],
+    }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """每个连接一个线程，连接内可连续发送多个请求"""
+
+    def handle(self):
+        server: "EmbeddingServer" = self.server  # type: ignore[assignment]
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+            except ValueError as e:
+                _send_frame(self.request, json.dumps({"ok": False, "error": f"bad request: {e}"}).encode())
+                continue
+
+            if request.get("op") == "stats":
+                _send_frame(self.request, json.dumps({"ok": True, **server.batcher.stats()}).encode())
+                continue
+            if request.get("op") == "info":
+                _send_frame(self.request, json.dumps({"ok": True, **server.ef_info}).encode())
+                continue
+
+            texts = [str(t) for t in request.get("texts", [])]
+            try:
+                vectors = server.batcher.submit(texts) if texts else np.zeros((0, 0), np.float32)
+            except Exception as e:
+                _send_frame(self.request, json.dumps({"ok": False, "error": str(e)}).encode())
+                continue
+            n, dim = vectors.shape if vectors.ndim == 2 else (0, 0)
+            header = {"ok": True, "n": n, "dim": dim, "model": server.model_name}
+            _send_frame(self.request, json.dumps(header).encode())
+            _send_frame(self.request, np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, ef, model_name: str,
+                 max_batch: int = MAX_BATCH, max_wait_ms: float = BATCH_WAIT_MS):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        self.model_name = model_name
+        self.ef_info = _ef_info(ef)
+        self.batcher = MicroBatcher(ef, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, max_batch: int = MAX_BATCH,
+          max_wait_ms: float = BATCH_WAIT_MS) -> None:
+    """加载模型并在 Unix Socket 上提供服务（阻塞）"""
+    from rag.embeddings import create_local_embedding_function, embedding_model_name
+
+    model_name = embedding_model_name()
+    print(f"[EmbeddingService] 加载模型 {model_name} ...", flush=True)
+    ef = create_local_embedding_function()
+    ef(["warmup"])
+
+    server = EmbeddingServer(socket_path, ef, model_name, max_batch, max_wait_ms)
+    print(f"[EmbeddingService] 监听 {socket_path}（max_batch={max_batch}, wait={max_wait_ms}ms）", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+# ============================================================
+# 客户端：Chroma 兼容的 EmbeddingFunction
+# ============================================================
+
+class EmbeddingServiceClient(EmbeddingFunction):
+    """
+    通过 Unix Socket 调用 embedding 服务。
+    每个线程复用一条长连接；服务不可用时退回 fallback（进程内模型，懒加载），
+    并在 RETRY_INTERVAL_S 秒后重新尝试服务。
+    name() / get_config() 上报服务端实际模型的配置（服务不可用时取 fallback 的配置）。
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET,
+                 fallback: Optional[Callable[[], object]] = None, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._fallback_factory = fallback
+        self._fallback_ef = None
+        self._local = threading.local()
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._info: Optional[dict] = None
+        bind_chroma_identity(self)
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset_connection(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _request(self, payload: dict) -> dict:
+        sock = self._connection()
+        _send_frame(sock, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        header = json.loads(_recv_frame(sock))
+        if not header.get("ok"):
+            raise RuntimeError(header.get("error", "embedding 服务返回错误"))
+        return header
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """直接请求服务，返回 (N, D) float32 数组；失败抛异常"""
+        try:
+            header = self._request({"texts": texts})
+            raw = _recv_frame(self._local.sock)
+        except Exception:
+            self._reset_connection()
+            raise
+        return np.frombuffer(raw, dtype=np.float32).reshape(header["n"], header["dim"])
+
+    def stats(self) -> dict:
+        """服务端微批统计"""
+        try:
+            return self._request({"op": "stats"})
+        except Exception:
+            self._reset_connection()
+            raise
+
+    def info(self) -> dict:
+        """服务端模型的 Chroma 配置（成功后缓存；服务不可用时返回 fallback 的配置，不缓存）"""
+        if self._info is not None:
+            return self._info
+        try:
+            header = self._request({"op": "info"})
+        except Exception:
+            self._reset_connection()
+            if self._fallback_factory is None:
+                raise
+            return _ef_info(self._get_fallback())
+        self._info = {k: header.get(k) for k in ("name", "config", "default_space", "supported_spaces")}
+        return self._info
+
+    # ── Chroma 配置接口 ───────────────────────────────────────
+
+    def name(self) -> str:
+        return self.info()["name"] or NotImplemented
+
+    def get_config(self) -> dict:
+        config = self.info()["config"]
+        return config if config is not None else NotImplemented
+
+    def build_from_config(self, config: dict) -> "EmbeddingServiceClient":
+        return EmbeddingServiceClient(self.socket_path, self._fallback_factory, self.timeout)
+
+    def is_legacy(self) -> bool:
+        info = self.info()
+        return info["name"] is None or info["config"] is None
+
+    def default_space(self):
+        return self.info()["default_space"] or "l2"
+
+    def supported_spaces(self):
+        return self.info()["supported_spaces"] or ["cosine", "l2", "ip"]
+
+    def _get_fallback(self):
+        with self._lock:
+            if self._fallback_ef is None:
+                if self._fallback_factory is None:
+                    raise RuntimeError("embedding 服务不可用且未配置本地降级")
+                self._fallback_ef = self._fallback_factory()
+        return self._fallback_ef
+
+    def __call__(self, input):
+        texts = list(input)
+        if not texts:
+            return []
+        if time.monotonic() >= self._retry_at:
+            try:
+                return self.embed(texts).tolist()
+            except Exception as e:
+                if self._fallback_factory is None:
+                    raise
+                with self._lock:
+                    if self._retry_at <= time.monotonic():
+                        print(f"[EmbeddingService] 服务不可用（{e}），{RETRY_INTERVAL_S:.0f}s 内改用进程内模型")
+                    self._retry_at = time.monotonic() + RETRY_INTERVAL_S
+        return self._get_fallback()(texts)
+
+
+# ============================================================
+# CLI 入口
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="DecideX 本地 embedding 服务")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix Socket 路径")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="单次模型调用最多条数")
+    parser.add_argument("--wait-ms", type=float, default=BATCH_WAIT_MS, help="凑批的最长等待（毫秒）")
+    args = parser.parse_args()
+    serve(args.socket, args.max_batch, args.wait_ms)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    main()
@@ -0,0 +1,71 @@
+"""
+DecideX RAG 模块 - 统一 Embedding 入口
+
+knowledge_base / vector_store / hybrid_retrieval / self_rag 都通过
+get_embedding_function() 获取同一个进程内单例，不再各自加载模型。
+
+选择顺序：
+  1. 设置了 EMBEDDING_SERVICE_SOCKET → 连接本地 embedding 服务（rag/embedding_service.py），
+     多个 worker 共享服务进程里的一份模型；服务不可用时自动退回第 2/3 步
+  2. 有 OPENAI_API_KEY → OpenAI text-embedding-ada-002
+  3. 本地 sentence-transformers（EMBED_MODEL，默认 all-MiniLM-L6-v2）
+
+以上任一实现外面再套一层 CachedEmbeddingFunction（rag/embedding_cache.py），
+EMBEDDING_CACHE=0 时关闭。
+"""
+
+import os
+import threading
+
+from chromadb.utils import embedding_functions
+
+from rag.embedding_cache import CACHE_ENABLED, CachedEmbeddingFunction
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+OPENAI_EMBED_MODEL = "text-embedding-ada-002"
+
+_ef = None
+_lock = threading.Lock()
+
+
+def embedding_model_name() -> str:
+    """当前配置下实际使用的模型名（用于缓存标记 / 日志）"""
+    return OPENAI_EMBED_MODEL if os.getenv("OPENAI_API_KEY") else EMBED_MODEL
+
+
+def create_local_embedding_function():
+    """在当前进程内创建 embedding function（服务端和降级路径使用）"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        return embedding_functions.OpenAIEmbeddingFunction(
+            api_key=api_key,
+            model_name=OPENAI_EMBED_MODEL,
+        )
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBED_MODEL)
+
+
+def get_embedding_function():
+    """获取全进程共享的 embedding function（单例）"""
+    global _ef
+    if _ef is not None:
+        return _ef
+    with _lock:
+        if _ef is None:
+            socket_path = os.getenv("EMBEDDING_SERVICE_SOCKET")
+            if socket_path:
+                from rag.embedding_service import EmbeddingServiceClient
+                ef = EmbeddingServiceClient(socket_path, fallback=create_local_embedding_function)
+            else:
+                ef = create_local_embedding_function()
+            if CACHE_ENABLED:
+                ef = CachedEmbeddingFunction(ef, embedding_model_name())
+            _ef = ef
+    return _ef
+
+
+def embedding_cache_stats() -> dict:
+    """embedding 缓存命中率与节省时间（未启用缓存时返回 {"enabled": False}）"""
+    ef = _ef
+    if isinstance(ef, CachedEmbeddingFunction):
+        return {"enabled": True, **ef.stats()}
+    return {"enabled": False}
@@ -42,7 +42,12 @@ except ImportError:
 # ============================================================
 # ChromaDB 向量检索（复用 knowledge_base 的客户端和 embedding）
 # ============================================================
-from rag.knowledge_base import _get_client, _get_embedding_function as _get_kb_ef
+from rag.knowledge_base import (
+    KNOWLEDGE_INDEX_BACKEND,
+    _get_client,
+    _get_embedding_function as _get_kb_ef,
+)
+from rag.local_index import get_local_index
 
 def _get_collection(collection_name: str):
     """通用 Chroma Collection 获取器（按名称）"""
@@ -147,16 +152,22 @@ def vector_retrieve(
         ranked_list: [(doc_id, distance_score)]，score 越高越相似
     """
     try:
-        col = _get_collection(collection_name)
         ef = _get_kb_ef()
 
         # ChromaDB EmbeddingFunction 是 callable: ef(["text"]) → [[float...]]
         query_embedding = ef([query])[0]
-        results = col.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            include=["documents", "metadatas", "distances"],
-        )
+
+        # 已导出本地量化索引时直接检索，不打开 Chroma
+        local_index = get_local_index(collection_name) if KNOWLEDGE_INDEX_BACKEND == "local" else None
+        if local_index is not None:
+            results = local_index.query(query_embedding, n_results=top_k)
+        else:
+            col = _get_collection(collection_name)
+            results = col.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"],
+            )
 
         docs = []
         ranked = []
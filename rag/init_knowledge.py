@@ -5,6 +5,7 @@
 使用方式：
     python rag/init_knowledge.py
     python rag/init_knowledge.py --rebuild   # 强制重建
+    python rag/init_knowledge.py --local-index --dtype int8   # 另外导出本地量化索引
 """
 
 import sys
@@ -14,11 +15,14 @@ import argparse
 # 确保项目根目录在 path 中
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from rag.knowledge_base import build_knowledge_index
+from rag.knowledge_base import build_knowledge_index, export_knowledge_index
 
 def main():
     parser = argparse.ArgumentParser(description="初始化 DecideX 知识库")
     parser.add_argument("--rebuild", action="store_true", help="强制重建（清空旧数据）")
+    parser.add_argument("--local-index", action="store_true",
+                        help="导出本地量化内存映射索引（配合 KNOWLEDGE_INDEX_BACKEND=local 使用）")
+    parser.add_argument("--dtype", default="int8", choices=["int8", "float16"], help="本地索引量化方式")
     args = parser.parse_args()
 
     print("🚀 开始初始化 DecideX 知识库...\n")
@@ -29,13 +33,18 @@ def main():
         try:
             count = build_knowledge_index(kb_type, force_rebuild=args.rebuild)
             print(f"✅ 完成，共 {count} 个知识片段")
+            if args.local_index:
+                exported = export_knowledge_index(kb_type, dtype=args.dtype)
+                print(f"   ↳ 本地索引（{args.dtype}）已导出 {exported} 条")
         except FileNotFoundError as e:
             print(f"❌ 文件不存在：{e}")
         except Exception as e:
             print(f"❌ 失败：{e}")
 
     print("\n✨ 知识库初始化完成！")
-    print(f"📁 数据存储位置：data/chroma_db/")
+    print("📁 数据存储位置：data/chroma_db/")
+    if args.local_index:
+        print("📁 本地索引位置：data/local_index/")
 
 
 if __name__ == "__main__":
@@ -4,11 +4,18 @@ DecideX RAG 模块 - 专业知识库检索
 供 Cost Agent 和 Risk Agent 在分析时检索参考
 """
 
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Literal
 
-import chromadb
-from chromadb.utils import embedding_functions
+from rag.chroma_client import get_client as _chroma_client, write_lock as _chroma_write_lock
+from rag.embeddings import get_embedding_function
+
+from rag.local_index import export_collection, get_local_index
+from rag.tracing import incr as _trace_incr
 
 # ============================================================
 # 配置
@@ -34,45 +41,193 @@ CHUNK_OVERLAP = 50
 # 知识库检索相似度阈值
 KNOWLEDGE_THRESHOLD = 0.25
 
+# 检索结果缓存容量（条），设为 0 关闭缓存
+KNOWLEDGE_CACHE_SIZE = int(os.getenv("KNOWLEDGE_CACHE_SIZE", "256"))
+
+# 知识库检索后端：chroma（默认）/ local（rag/local_index.py 量化内存映射索引）
+KNOWLEDGE_INDEX_BACKEND = os.getenv("KNOWLEDGE_INDEX_BACKEND", "chroma").lower()
+# 本地索引量化方式：int8 / float16
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "int8").lower()
+
 
 def _get_embedding_function():
-    """优先 OpenAI Embeddings，无 Key 则退回本地免费模型"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key:
-        return embedding_functions.OpenAIEmbeddingFunction(
-            api_key=api_key,
-            model_name="text-embedding-ada-002",
-        )
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    """优先 OpenAI Embeddings，无 Key 则退回本地免费模型（统一由 rag/embeddings.py 提供单例）"""
+    return get_embedding_function()
 
 
-# 单例缓存
+# 单例缓存（按进程：gunicorn --preload fork 后在 worker 中重建）
 _client = None
+_client_pid = None
 _collections: dict = {}
 
+# 每个知识库的条数（进程内记忆，build_knowledge_index 时刷新）
+_counts: dict = {}
+# 每个知识库的版本号，重建索引时递增，使旧的检索缓存自然失效
+_versions: dict = {}
+
+# 跨进程版本戳：<CHROMA_PERSIST_DIR>/.knowledge_<kb>.stamp
+# 任一进程（其它 worker、rag/init_knowledge.py）重建后重写该文件；每次检索 stat 一次，
+# (mtime_ns, inode) 变化即丢弃本进程的条数记忆与 collection 句柄，检索缓存按新戳隔离。
+# 戳文件在本机目录下，CHROMA_SERVER_URL 模式下只对同一主机上的进程生效。
+_stamps: dict = {}
+_NO_STAMP = object()
+
+
+def _get_kb_embedding_function():
+    """知识库共用同一个 embedding function 实例（避免重复加载模型）"""
+    return get_embedding_function()
+
 
 def _get_client():
-    global _client
-    if _client is None:
-        os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
-        _client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = _chroma_client(CHROMA_PERSIST_DIR)
+        _client_pid = os.getpid()
+        _collections.clear()
     return _client
 
 
 def _get_kb_collection(kb_type: Literal["cost", "risk"]):
     """获取指定类型的知识库 Collection（单例）"""
+    client = _get_client()
     if kb_type not in _collections:
-        client = _get_client()
         _collections[kb_type] = client.get_or_create_collection(
             name=f"knowledge_{kb_type}",
-            embedding_function=_get_embedding_function(),
+            embedding_function=_get_kb_embedding_function(),
             metadata={"hnsw:space": "cosine"},
         )
     return _collections[kb_type]
 
 
+def _get_local_kb_index(kb_type: str):
+    """KNOWLEDGE_INDEX_BACKEND=local 且已导出时返回本地索引，否则 None（走 Chroma）"""
+    if KNOWLEDGE_INDEX_BACKEND != "local":
+        return None
+    return get_local_index(f"knowledge_{kb_type}")
+
+
+def _stamp_path(kb_type: str) -> str:
+    return os.path.join(CHROMA_PERSIST_DIR, f".knowledge_{kb_type}.stamp")
+
+
+def _touch_stamp(kb_type: str) -> None:
+    """重写版本戳（写临时文件后 os.replace，inode 与 mtime 都会变化）"""
+    path = _stamp_path(kb_type)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+        with open(tmp, "w") as f:
+            f.write(f"{time.time_ns()} {os.getpid()}\n")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[KnowledgeBase] 版本戳写入失败，其它进程不会感知本次重建：{e}")
+
+
+def _sync_stamp(kb_type: str):
+    """读取版本戳；与上次看到的不同则丢弃进程内记忆，返回当前戳（用于检索缓存 key）"""
+    try:
+        st = os.stat(_stamp_path(kb_type))
+        stamp = (st.st_mtime_ns, st.st_ino)
+    except OSError:
+        stamp = None
+    if _stamps.get(kb_type, _NO_STAMP) != stamp:
+        _stamps[kb_type] = stamp
+        _counts.pop(kb_type, None)
+        _collections.pop(kb_type, None)
+    return stamp
+
+
+def _get_count(kb_type: str) -> int:
+    """知识库条数（进程内只查询一次 collection.count()）"""
+    if kb_type not in _counts:
+        _counts[kb_type] = _get_kb_collection(kb_type).count()
+    return _counts[kb_type]
+
+
+# ============================================================
+# 检索结果缓存（LRU）
+# ============================================================
+
+class _KnowledgeCache:
+    """
+    线程安全的 LRU 缓存。
+    Key 中带有知识库版本号，索引重建后旧条目不会再被命中，随 LRU 淘汰。
+
+    一次检索会依次探测文本 key 和向量 key，get() 只统计命中；
+    未命中由调用方在所有探测都失败后调用 record_miss() 记一次。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_result_cache = _KnowledgeCache(KNOWLEDGE_CACHE_SIZE)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+def _embedding_key(embedding) -> str:
+    """query 向量的指纹（保留 6 位小数，消除浮点噪声）"""
+    text = ",".join(f"{float(x):.6f}" for x in embedding)
+    return hashlib.sha1(text.encode("ascii")).hexdigest()
+
+
+def invalidate_knowledge_cache(kb_type: str = None) -> None:
+    """
+    使检索缓存与条数记忆失效，并重写版本戳通知其它进程。
+    kb_type 为空时作用于全部知识库；build_knowledge_index 写入后会自动调用。
+    """
+    kb_types = [kb_type] if kb_type else list(set(_counts) | set(_versions) | set(KNOWLEDGE_FILES))
+    for kb in kb_types:
+        _counts.pop(kb, None)
+        _versions[kb] = _versions.get(kb, 0) + 1
+        _touch_stamp(kb)
+    if not kb_type:
+        _result_cache.clear()
+
+
+def knowledge_cache_stats() -> dict:
+    """检索缓存命中统计"""
+    return _result_cache.stats()
+
+
 # ============================================================
 # 文本分块工具
 # ============================================================
@@ -118,51 +273,69 @@ def build_knowledge_index(kb_type: Literal["cost", "risk", "value"], force_rebui
     Returns:
         写入的 chunk 数量
     """
-    collection = _get_kb_collection(kb_type)
-
-    # 如果已有数据且不强制重建，直接跳过
-    if collection.count() > 0 and not force_rebuild:
-        return collection.count()
-
-    # 如果强制重建，清空旧数据
-    if force_rebuild and collection.count() > 0:
-        existing = collection.get()
-        if existing["ids"]:
-            collection.delete(ids=existing["ids"])
-
-    # 读取文档
     doc_file = KNOWLEDGE_FILES.get(kb_type)
     if not doc_file:
         raise ValueError(f"未知知识库类型: {kb_type}")
 
-    doc_path = os.path.join(DOCUMENTS_DIR, doc_file)
-    if not os.path.exists(doc_path):
-        raise FileNotFoundError(f"知识文档不存在: {doc_path}")
+    collection = _get_kb_collection(kb_type)
+
+    # 多个 worker 同时启动时只有一个进程构建，其余进程拿到锁后看到已有数据直接返回
+    with _chroma_write_lock(CHROMA_PERSIST_DIR):
+        # 如果已有数据且不强制重建，直接跳过
+        if collection.count() > 0 and not force_rebuild:
+            return collection.count()
+
+        # 如果强制重建，清空旧数据
+        if force_rebuild and collection.count() > 0:
+            existing = collection.get()
+            if existing["ids"]:
+                collection.delete(ids=existing["ids"])
+            invalidate_knowledge_cache(kb_type)
+
+        # 读取文档
+        doc_path = os.path.join(DOCUMENTS_DIR, doc_file)
+        if not os.path.exists(doc_path):
+            raise FileNotFoundError(f"知识文档不存在: {doc_path}")
+
+        with open(doc_path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        # 分块
+        chunks = _chunk_text(text)
+
+        # 批量写入
+        ids = [f"{kb_type}_chunk_{i:04d}" for i in range(len(chunks))]
+        metadatas = [{"kb_type": kb_type, "chunk_index": i, "source": doc_file}
+                     for i in range(len(chunks))]
+
+        collection.add(
+            documents=chunks,
+            metadatas=metadatas,
+            ids=ids,
+        )
+    invalidate_knowledge_cache(kb_type)
 
-    with open(doc_path, "r", encoding="utf-8") as f:
-        text = f.read()
+    if KNOWLEDGE_INDEX_BACKEND == "local":
+        export_knowledge_index(kb_type)
 
-    # 分块
-    chunks = _chunk_text(text)
+    return len(chunks)
 
-    # 批量写入
-    ids = [f"{kb_type}_chunk_{i:04d}" for i in range(len(chunks))]
-    metadatas = [{"kb_type": kb_type, "chunk_index": i, "source": doc_file}
-                 for i in range(len(chunks))]
 
-    collection.add(
-        documents=chunks,
-        metadatas=metadatas,
-        ids=ids,
-    )
+def export_knowledge_index(kb_type: Literal["cost", "risk", "value"], dtype: str = None) -> int:
+    """
+    将 Chroma 中的知识库导出为本地量化索引（data/local_index/knowledge_<kb_type>）。
 
-    return len(chunks)
+    Returns:
+        导出的 chunk 数量
+    """
+    count = export_collection(_get_kb_collection(kb_type), dtype=dtype or LOCAL_INDEX_DTYPE)
+    invalidate_knowledge_cache(kb_type)
+    return count
 
 
 def ensure_knowledge_index(kb_type: Literal["cost", "risk", "value"]) -> None:
     """确保知识库已初始化（首次运行时自动构建）"""
-    collection = _get_kb_collection(kb_type)
-    if collection.count() == 0:
+    if _get_count(kb_type) == 0:
         build_knowledge_index(kb_type)
 
 
@@ -185,20 +358,51 @@ def retrieve_knowledge(
 
     Returns:
         相关知识片段列表（按相似度从高到低）
-    """
-    ensure_knowledge_index(kb_type)
-    collection = _get_kb_collection(kb_type)
 
-    total = collection.count()
+    同一知识库版本下的重复查询直接命中缓存：先按归一化文本精确匹配，
+    未命中再按 query 向量指纹匹配（措辞不同但向量相同的查询也能复用）。
+    版本 = 进程内版本号 + 跨进程版本戳，其它进程重建后旧缓存不再命中。
+    """
+    stamp = _sync_stamp(kb_type)
+    local_index = _get_local_kb_index(kb_type)
+    if local_index is not None:
+        total = local_index.count
+    else:
+        ensure_knowledge_index(kb_type)
+        total = _get_count(kb_type)
     if total == 0:
         return []
 
+    version = (_versions.get(kb_type, 0), stamp)
+    text_key = ("text", kb_type, version, n_results, _normalize_query(query))
+    cached = _result_cache.get(text_key)
+    if cached is not None:
+        _trace_incr("kb_result_cache_hits")
+        return [dict(c) for c in cached]
+
     try:
-        results = collection.query(
-            query_texts=[query],
-            n_results=min(n_results, total),
-            include=["documents", "metadatas", "distances"],
-        )
+        query_embedding = list(_get_kb_embedding_function()([query])[0])
+    except Exception:
+        _result_cache.record_miss()
+        return []
+
+    emb_key = ("emb", kb_type, version, n_results, _embedding_key(query_embedding))
+    cached = _result_cache.get(emb_key)
+    if cached is not None:
+        _trace_incr("kb_result_cache_hits")
+        _result_cache.put(text_key, cached)
+        return [dict(c) for c in cached]
+    _result_cache.record_miss()
+
+    try:
+        if local_index is not None:
+            results = local_index.query(query_embedding, n_results=min(n_results, total))
+        else:
+            results = _get_kb_collection(kb_type).query(
+                query_embeddings=[query_embedding],
+                n_results=min(n_results, total),
+                include=["documents", "metadatas", "distances"],
+            )
     except Exception:
         return []
 
@@ -216,7 +420,9 @@ def retrieve_knowledge(
             "kb_type":    kb_type,
         })
 
-    return knowledge_chunks
+    _result_cache.put(text_key, knowledge_chunks)
+    _result_cache.put(emb_key, knowledge_chunks)
+    return [dict(c) for c in knowledge_chunks]
 
 
 def format_knowledge_for_prompt(chunks: list, kb_type: str) -> str:
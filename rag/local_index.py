@@ -0,0 +1,326 @@
+"""
+DecideX RAG 模块 - 本地量化向量索引（只读、内存映射）
+
+用途：
+  knowledge_* 知识库是静态数据，却在每个 worker 进程里各自打开一个
+  chromadb.PersistentClient、加载一份 HNSW 索引和 float32 向量。
+  本模块把这些 collection 导出为磁盘上的紧凑只读索引：
+
+    data/local_index/<collection_name>/
+      ├─ vectors.bin    int8 或 float16 向量（np.memmap 只读映射）
+      ├─ scales.npy     int8 模式下每条向量的反量化系数
+      ├─ centroids.npy  IVF 模式下的聚类中心
+      ├─ offsets.npy    IVF 模式下每个倒排列表在 vectors.bin 中的起止行
+      └─ meta.json      文档、metadata、维度、量化方式等
+
+  多个 worker 通过 mmap 共享操作系统页缓存，每个进程只多出很少的常驻内存；
+  打开索引只读取 meta.json，冷启动几乎为零。
+
+检索方式：
+  - 条数 < LOCAL_INDEX_IVF_THRESHOLD：NumPy 分块暴力内积（精确）
+  - 条数 ≥ 阈值：构建时做球面 k-means，检索时只扫描最近的 nprobe 个倒排列表
+
+启用：KNOWLEDGE_INDEX_BACKEND=local，并用
+    python rag/init_knowledge.py --local-index [--dtype int8|float16]
+导出索引。未导出时自动回退到 Chroma。
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+# ============================================================
+# 配置
+# ============================================================
+
+LOCAL_INDEX_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "local_index")
+
+# 超过该条数才构建 IVF 倒排结构
+IVF_THRESHOLD = int(os.getenv("LOCAL_INDEX_IVF_THRESHOLD", "20000"))
+# IVF 检索时扫描的倒排列表数
+DEFAULT_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+
+# 暴力检索时每次反量化的行数（控制临时 float32 内存）
+_BLOCK_ROWS = 65536
+
+SUPPORTED_DTYPES = ("int8", "float16")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _empty_result() -> dict:
+    return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+
+# ============================================================
+# 构建
+# ============================================================
+
+def _quantize(vectors: np.ndarray, dtype: str):
+    """返回 (codes, scales)；float16 模式 scales 为 None"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if len(vectors) == 0:
+        return vectors.astype(np.int8), np.zeros(0, dtype=np.float32)
+    # 对称 int8 量化，每条向量一个系数：v ≈ codes * scale
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _spherical_kmeans(vectors: np.ndarray, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """在单位球面上做 k-means（相似度用内积），训练样本最多 50k 条"""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > 50000:
+        sample = vectors[rng.choice(len(vectors), 50000, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                centroids[c] = sample[rng.integers(len(sample))]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def build_local_index(
+    name: str,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[dict],
+    embeddings,
+    dtype: str = "int8",
+    nlist: Optional[int] = None,
+) -> str:
+    """
+    把一组向量写成本地只读索引，返回索引目录。
+
+    先写入临时目录再整体替换，已映射旧文件的进程不受影响。
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"不支持的量化类型: {dtype}（可选：{', '.join(SUPPORTED_DTYPES)}）")
+
+    vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(0, 0)
+    n, dim = vectors.shape
+
+    order = np.arange(n)
+    centroids = offsets = None
+    if n >= IVF_THRESHOLD:
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        centroids = _spherical_kmeans(vectors, min(nlist, n))
+        assign = np.concatenate([
+            np.argmax(vectors[i:i + _BLOCK_ROWS] @ centroids.T, axis=1)
+            for i in range(0, n, _BLOCK_ROWS)
+        ])
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    codes, scales = _quantize(vectors[order], dtype)
+
+    final_dir = os.path.join(LOCAL_INDEX_DIR, name)
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    codes.tofile(os.path.join(tmp_dir, "vectors.bin"))
+    if scales is not None:
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+    if centroids is not None:
+        np.save(os.path.join(tmp_dir, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+
+    meta = {
+        "name": name,
+        "count": int(n),
+        "dim": int(dim),
+        "dtype": dtype,
+        "layout": "ivf" if centroids is not None else "flat",
+        "ids": [ids[i] for i in order],
+        "documents": [documents[i] for i in order],
+        "metadatas": [metadatas[i] or {} for i in order],
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    # 旧目录先改名让位，新目录随即就位，最后再删旧目录。
+    # 两次 rename 之间目录短暂不存在，get_local_index() 此时回退到 Chroma；
+    # 已映射旧文件的读者不受影响，其它进程下次访问时按 meta.json 的 (mtime, inode) 发现新索引
+    old_dir = f"{final_dir}.old-{os.getpid()}"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.isdir(final_dir):
+        os.replace(final_dir, old_dir)
+    os.replace(tmp_dir, final_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    drop_local_index(name)
+    return final_dir
+
+
+def export_collection(collection, name: Optional[str] = None, dtype: str = "int8") -> int:
+    """把一个 Chroma collection（含已存 embedding）导出为本地索引，返回条数"""
+    data = collection.get(include=["documents", "metadatas", "embeddings"])
+    ids = data.get("ids") or []
+    if not ids:
+        return 0
+    build_local_index(
+        name or collection.name,
+        ids,
+        data["documents"],
+        data["metadatas"],
+        data["embeddings"],
+        dtype=dtype,
+    )
+    return len(ids)
+
+
+# ============================================================
+# 检索
+# ============================================================
+
+class LocalIndex:
+    """只读本地索引；向量通过 np.memmap 按需从页缓存读取"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.name = meta["name"]
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        self.dtype = meta["dtype"]
+        self.layout = meta["layout"]
+        self.ids = meta["ids"]
+        self.documents = meta["documents"]
+        self.metadatas = meta["metadatas"]
+
+        np_dtype = np.int8 if self.dtype == "int8" else np.float16
+        self._vectors = (
+            np.memmap(os.path.join(path, "vectors.bin"), dtype=np_dtype, mode="r",
+                      shape=(self.count, self.dim))
+            if self.count else np.zeros((0, self.dim), dtype=np_dtype)
+        )
+        scales_path = os.path.join(path, "scales.npy")
+        self._scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        if self.layout == "ivf":
+            self._centroids = np.load(os.path.join(path, "centroids.npy"))
+            self._offsets = np.load(os.path.join(path, "offsets.npy"))
+        else:
+            self._centroids = self._offsets = None
+
+    def _score_rows(self, q: np.ndarray, start: int, end: int) -> np.ndarray:
+        scores = np.empty(end - start, dtype=np.float32)
+        for i in range(start, end, _BLOCK_ROWS):
+            j = min(i + _BLOCK_ROWS, end)
+            block = np.asarray(self._vectors[i:j], dtype=np.float32) @ q
+            if self._scales is not None:
+                block *= self._scales[i:j]
+            scores[i - start:j - start] = block
+        return scores
+
+    def search(self, query_embedding, top_k: int = 5, nprobe: Optional[int] = None):
+        """返回 [(row, cosine_similarity)]，按相似度降序"""
+        if self.count == 0 or top_k <= 0:
+            return []
+        q = _normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        if self.layout == "ivf":
+            probe = min(nprobe or DEFAULT_NPROBE, len(self._centroids))
+            lists = np.argsort(-(self._centroids @ q))[:probe]
+            rows_parts, score_parts = [], []
+            for c in lists:
+                start, end = int(self._offsets[c]), int(self._offsets[c + 1])
+                if end > start:
+                    rows_parts.append(np.arange(start, end))
+                    score_parts.append(self._score_rows(q, start, end))
+            if not rows_parts:
+                return []
+            rows = np.concatenate(rows_parts)
+            scores = np.concatenate(score_parts)
+        else:
+            rows = None
+            scores = self._score_rows(q, 0, self.count)
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        picked = rows[top] if rows is not None else top
+        return [(int(r), float(scores[t])) for r, t in zip(picked, top)]
+
+    def query(self, query_embedding, n_results: int = 5, nprobe: Optional[int] = None) -> dict:
+        """与 Chroma collection.query 相同结构的结果（distances 为余弦距离）"""
+        hits = self.search(query_embedding, n_results, nprobe)
+        if not hits:
+            return _empty_result()
+        return {
+            "ids": [[self.ids[r] for r, _ in hits]],
+            "documents": [[self.documents[r] for r, _ in hits]],
+            "metadatas": [[self.metadatas[r] for r, _ in hits]],
+            "distances": [[1.0 - s for _, s in hits]],
+        }
+
+
+# ============================================================
+# 进程内缓存
+# ============================================================
+
+# name → ((meta.json 的 mtime_ns, inode), LocalIndex)
+_indexes: dict = {}
+_lock = threading.Lock()
+
+
+def _meta_signature(path: str):
+    try:
+        st = os.stat(os.path.join(path, "meta.json"))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino)
+
+
+def get_local_index(name: str) -> Optional[LocalIndex]:
+    """
+    打开（并缓存）本地索引；未导出时返回 None。
+    每次访问 stat 一次 meta.json：其它进程重新导出后自动重新映射；
+    目录不存在（未导出，或正处在重建的两次 rename 之间）时返回 None，由调用方回退到 Chroma。
+    """
+    path = os.path.join(LOCAL_INDEX_DIR, name)
+    signature = _meta_signature(path)
+    if signature is None:
+        return None
+    entry = _indexes.get(name)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    with _lock:
+        entry = _indexes.get(name)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        try:
+            idx = LocalIndex(path)
+        except Exception as e:
+            print(f"[LocalIndex] 打开 {name} 失败：{e}")
+            return None
+        _indexes[name] = (signature, idx)
+        return idx
+
+
+def drop_local_index(name: Optional[str] = None) -> None:
+    """丢弃进程内已打开的索引（重新导出后调用，下次访问时重新映射）"""
+    with _lock:
+        if name is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(name, None)
@@ -0,0 +1,49 @@
+"""
+把旧的共享 decision_history collection 迁移到分区后端
+
+切换 DECISION_STORE_BACKEND 到 per_user / sharded 之前运行一次：
+    python rag/migrate_decisions.py --backend per_user
+    python rag/migrate_decisions.py --backend sharded --batch-size 1000
+
+已存在的 id 会被跳过，中途失败可直接重跑；完成后旧 collection 改名为
+decision_history_migrated_<时间戳> 保留备份。
+"""
+
+import sys
+import os
+import argparse
+
+# 确保项目根目录在 path 中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rag.decision_store import (
+    DECISION_COLLECTION,
+    DEFAULT_BACKEND,
+    SharedCollectionStore,
+    create_store,
+    legacy_row_count,
+    migrate_shared_to,
+)
+from rag.vector_store import _get_client, _get_embedding_function
+
+
+def main():
+    parser = argparse.ArgumentParser(description="迁移 DecideX 历史决策到分区后端")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, help="目标后端（per_user / sharded / 自定义）")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批读取的记录数")
+    args = parser.parse_args()
+
+    client = _get_client()
+    store = create_store(client, _get_embedding_function(), backend=args.backend)
+    if isinstance(store, SharedCollectionStore):
+        parser.error("目标后端不能是 shared")
+
+    pending = legacy_row_count(client)
+    print(f"📦 {DECISION_COLLECTION}：{pending} 条 → {store.name}")
+    moved = migrate_shared_to(store, batch_size=args.batch_size, retire=True)
+    print(f"✅ 已迁移 {moved} 条，旧 collection 已改名保留")
+    print(f"   设置 DECISION_STORE_BACKEND={store.name} 后重启服务")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,13 @@ Cohere 精排序模块（Reranker）
 
 使用方式：
     1. 在 .env 中设置 COHERE_API_KEY=your_key
-    2. 若无 API Key，自动降级为基于 TF-IDF 的本地精排
+    2. 若无 API Key，使用本地交叉编码器（sentence-transformers CrossEncoder，CPU 批量推理）
+    3. 本地模型也不可用时，降级为基于关键词重叠的 Jaccard 精排
+
+后端选择（RERANK_BACKEND）：auto（默认，按上面顺序）/ cohere / cross_encoder / jaccard
+本地模型：RERANK_LOCAL_MODEL（默认 cross-encoder/mmarco-mMiniLMv2-L12-H384-v1，多语言）
+ONNX：RERANK_ONNX=1 使用 ONNX Runtime 推理，RERANK_ONNX_FILE 可指定量化模型文件
+      （如 onnx/model_qint8_avx512_vnni.onnx）
 
 Cohere Rerank 优势：
     - 交叉编码器（Cross-encoder）架构，比双编码器更精准
@@ -14,8 +20,13 @@ Cohere Rerank 优势：
     - 支持中英文混合文本
 """
 
+import hashlib
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from typing import List, Tuple, Optional
 
 _ROOT = os.path.join(os.path.dirname(__file__), "..")
@@ -24,6 +35,8 @@ if _ROOT not in sys.path:
 
 from langchain_core.documents import Document
 
+from rag.tracing import incr as _trace_incr
+
 
 # ============================================================
 # Cohere 客户端初始化
@@ -40,6 +53,15 @@ except ImportError:
     COHERE_AVAILABLE = False
     print("[Reranker] cohere not installed. Install with: pip install cohere")
 
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "auto").lower()
+RERANK_LOCAL_MODEL = os.getenv("RERANK_LOCAL_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_ONNX = os.getenv("RERANK_ONNX", "0") == "1"
+RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE", "")
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "2048"))
+
+# 送入模型的文档截断长度（与 Cohere 路径一致）
+_MAX_DOC_CHARS = 512
+
 
 # ============================================================
 # 本地降级精排（TF-IDF 相似度）
@@ -85,10 +107,230 @@ def _local_rerank(
     return scored[:top_k]
 
 
+# ============================================================
+# 本地交叉编码器精排
+# ============================================================
+
+_cross_encoder = None
+_cross_encoder_failed = False
+_ce_lock = threading.Lock()
+
+# (query, doc_hash) → score 的 LRU 缓存
+_score_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _get_cross_encoder():
+    """懒加载 CrossEncoder（进程内单例）；加载失败后不再重试，返回 None"""
+    global _cross_encoder, _cross_encoder_failed
+    if _cross_encoder is not None or _cross_encoder_failed:
+        return _cross_encoder
+    with _ce_lock:
+        if _cross_encoder is None and not _cross_encoder_failed:
+            try:
+                from sentence_transformers import CrossEncoder
+                kwargs = {"device": "cpu", "max_length": 512}
+                if RERANK_ONNX:
+                    kwargs["backend"] = "onnx"
+                    if RERANK_ONNX_FILE:
+                        kwargs["model_kwargs"] = {"file_name": RERANK_ONNX_FILE}
+                _cross_encoder = CrossEncoder(RERANK_LOCAL_MODEL, **kwargs)
+            except Exception as e:
+                _cross_encoder_failed = True
+                print(f"[Reranker] CrossEncoder unavailable ({e}), using Jaccard fallback.")
+    return _cross_encoder
+
+
+def _doc_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _cross_encoder_rerank(
+    query: str,
+    documents: List[Document],
+    top_k: int = 5,
+) -> Optional[List[Tuple[Document, float]]]:
+    """
+    用交叉编码器给 (query, doc) 打分。
+    未缓存的文档对合并成一次批量前向推理；模型不可用时返回 None。
+    """
+    model = _get_cross_encoder()
+    if model is None:
+        return None
+
+    texts = [doc.page_content[:_MAX_DOC_CHARS] for doc in documents]
+    keys = [(query, _doc_hash(t)) for t in texts]
+    scores: List[Optional[float]] = [None] * len(texts)
+
+    with _cache_lock:
+        for i, key in enumerate(keys):
+            if key in _score_cache:
+                _score_cache.move_to_end(key)
+                scores[i] = _score_cache[key]
+
+    missing = [i for i, sc in enumerate(scores) if sc is None]
+    _trace_incr("rerank_score_cache_hits", len(texts) - len(missing))
+    if missing:
+        try:
+            predicted = model.predict(
+                [(query, texts[i]) for i in missing],
+                batch_size=len(missing),
+                show_progress_bar=False,
+            )
+        except Exception as e:
+            print(f"[Reranker] CrossEncoder inference error: {e}")
+            return None
+        with _cache_lock:
+            for i, sc in zip(missing, predicted):
+                scores[i] = float(sc)
+                _score_cache[keys[i]] = float(sc)
+            while len(_score_cache) > RERANK_CACHE_SIZE:
+                _score_cache.popitem(last=False)
+
+    scored = []
+    for doc, sc in zip(documents, scores):
+        doc.metadata["_rerank_score"] = round(sc, 4)
+        scored.append((doc, sc))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:top_k]
+
+
+def local_rerank(
+    query: str,
+    documents: List[Document],
+    top_k: int = 5,
+) -> List[Tuple[Document, float]]:
+    """本地精排：交叉编码器优先，不可用时退回 Jaccard"""
+    if RERANK_BACKEND != "jaccard":
+        ranked = _cross_encoder_rerank(query, documents, top_k)
+        if ranked is not None:
+            return ranked
+    return _local_rerank(query, documents, top_k)
+
+
+# ============================================================
+# 熔断器（Circuit Breaker）
+# ============================================================
+
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "1500"))
+RERANK_BREAKER_FAILURES = int(os.getenv("RERANK_BREAKER_FAILURES", "3"))
+RERANK_BREAKER_COOLDOWN_S = float(os.getenv("RERANK_BREAKER_COOLDOWN_S", "30"))
+# 调用远程精排的同时在本地计算一份结果，远程超时 / 失败时直接使用
+RERANK_HEDGE = os.getenv("RERANK_HEDGE", "1") == "1"
+
+
+class CircuitBreaker:
+    """
+    三态熔断器：
+      closed     正常调用远程；连续失败（含超出延迟预算）达到阈值 → open
+      open       直接跳过远程调用；冷却 cooldown 秒后 → half_open
+      half_open  只放行一个探测请求：成功 → closed，失败 → 重新 open
+    只在状态变化时打印日志。
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = RERANK_BREAKER_FAILURES,
+                 cooldown_s: float = RERANK_BREAKER_COOLDOWN_S):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_s = cooldown_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = ""
+        self.total_calls = 0
+        self.total_failures = 0
+        self.short_circuited = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, new_state: str) -> None:
+        if new_state != self.state:
+            detail = f"（{self.last_error}）" if new_state == self.OPEN and self.last_error else ""
+            print(f"[Reranker] {self.name} breaker: {self.state} → {new_state}{detail}")
+            self.state = new_state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.total_calls += 1
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += 1
+            self.failures += 1
+            self.last_error = error[:200]
+            probing = self.state == self.HALF_OPEN
+            self._probe_in_flight = False
+            if probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.cooldown_s - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "total_calls": self.total_calls,
+                "total_failures": self.total_failures,
+                "short_circuited": self.short_circuited,
+                "last_error": self.last_error,
+                "retry_in_s": round(retry_in, 1),
+            }
+
+
+_cohere_breaker = CircuitBreaker("cohere")
+_remote_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rerank-remote")
+# 对冲用的本地精排单独一个池：远程调用堆积时不会把本地结果也排在后面
+_hedge_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank-hedge")
+_unavailable_logged = False
+
+
+def reranker_health() -> dict:
+    """精排后端与熔断器状态（供 /health 展示）"""
+    return {
+        "backend": RERANK_BACKEND,
+        "cohere_available": COHERE_AVAILABLE,
+        "latency_budget_ms": RERANK_LATENCY_BUDGET_MS,
+        "cohere_breaker": _cohere_breaker.snapshot(),
+    }
+
+
 # ============================================================
 # Cohere 精排
 # ============================================================
 
+def _cohere_call(query: str, texts: List[str], top_n: int, model: str) -> List[Tuple[int, float]]:
+    """远程调用本体（在线程池中执行），只返回 (index, score)，不修改 Document"""
+    response = _cohere_client.rerank(
+        query=query,
+        documents=texts,
+        top_n=top_n,
+        model=model,
+        return_documents=False,
+    )
+    return [(hit.index, hit.relevance_score) for hit in response.results]
+
+
 def cohere_rerank(
     query: str,
     documents: List[Document],
@@ -98,6 +340,11 @@ def cohere_rerank(
     """
     使用 Cohere Rerank API 对文档列表精排。
 
+    远程调用受熔断器保护：熔断打开时直接走本地精排；
+    远程调用超出 RERANK_LATENCY_BUDGET_MS 时放弃等待并使用本地结果（计为一次失败）。
+    RERANK_HEDGE=1 时本地精排在线程池中与远程调用并行计算，降级不额外增加延迟；
+    延迟预算只针对远程调用计时，不受本地精排耗时影响。
+
     Args:
         query:     检索 query
         documents: 待精排文档
@@ -107,35 +354,45 @@ def cohere_rerank(
     Returns:
         [(Document, relevance_score)] 列表，按相关性降序
     """
+    global _unavailable_logged
     if not documents:
         return []
 
     if not COHERE_AVAILABLE:
-        print("[Reranker] Cohere unavailable, using local reranker fallback.")
-        return _local_rerank(query, documents, top_k)
-
-    try:
-        texts = [doc.page_content[:512] for doc in documents]
+        if not _unavailable_logged:
+            _unavailable_logged = True
+            print("[Reranker] Cohere unavailable, using local reranker fallback.")
+        return local_rerank(query, documents, top_k)
 
-        response = _cohere_client.rerank(
-            query=query,
-            documents=texts,
-            top_n=min(top_k, len(texts)),
-            model=model,
-            return_documents=False,
-        )
+    if not _cohere_breaker.allow_request():
+        return local_rerank(query, documents, top_k)
 
-        results = []
-        for hit in response.results:
-            doc = documents[hit.index]
-            doc.metadata["_cohere_score"] = round(hit.relevance_score, 4)
-            results.append((doc, hit.relevance_score))
+    texts = [doc.page_content[:512] for doc in documents]
+    future = _remote_pool.submit(_cohere_call, query, texts, min(top_k, len(texts)), model)
+    hedge = _hedge_pool.submit(local_rerank, query, documents, top_k) if RERANK_HEDGE else None
 
-        return results
+    def _fallback():
+        return hedge.result() if hedge is not None else local_rerank(query, documents, top_k)
 
+    try:
+        hits = future.result(timeout=RERANK_LATENCY_BUDGET_MS / 1000.0)
+    except FuturesTimeout:
+        _cohere_breaker.record_failure(f"timeout > {RERANK_LATENCY_BUDGET_MS:.0f}ms")
+        return _fallback()
     except Exception as e:
-        print(f"[Reranker] Cohere API error: {e}. Falling back to local reranker.")
-        return _local_rerank(query, documents, top_k)
+        _cohere_breaker.record_failure(str(e))
+        return _fallback()
+
+    _cohere_breaker.record_success()
+    if hedge is not None:
+        # 远程已返回，尚未开始的本地精排不再需要
+        hedge.cancel()
+    results = []
+    for index, score in hits:
+        doc = documents[index]
+        doc.metadata["_cohere_score"] = round(score, 4)
+        results.append((doc, score))
+    return results
 
 
 # ============================================================
@@ -150,9 +407,9 @@ def rerank(
     """
     对文档列表进行精排，返回最相关的 top_k 篇文档。
 
-    自动检测 COHERE_API_KEY：
+    后端由 RERANK_BACKEND 决定，auto 时自动检测 COHERE_API_KEY：
     - 有 Key → 使用 Cohere Rerank API（精准但需网络）
-    - 无 Key → 使用本地 TF-IDF 精排（速度快，精度适中）
+    - 无 Key → 使用本地交叉编码器（CPU 批量推理），模型不可用时退回 Jaccard
 
     Args:
         query:     决策问题
@@ -165,7 +422,12 @@ def rerank(
     if not documents:
         return []
 
-    ranked = cohere_rerank(query, documents, top_k=top_k)
+    if RERANK_BACKEND == "jaccard":
+        ranked = _local_rerank(query, documents, top_k)
+    elif RERANK_BACKEND == "cross_encoder" or (RERANK_BACKEND == "auto" and not COHERE_AVAILABLE):
+        ranked = local_rerank(query, documents, top_k)
+    else:
+        ranked = cohere_rerank(query, documents, top_k=top_k)
     return [doc for doc, _ in ranked]
 
 
@@ -196,7 +458,7 @@ def format_reranked_results(
     for i, doc in enumerate(reranked, 1):
         content = doc.page_content[:max_chars]
         source = doc.metadata.get("source", doc.metadata.get("_collection", "知识库"))
-        cohere_score = doc.metadata.get("_cohere_score", "")
+        cohere_score = doc.metadata.get("_cohere_score", doc.metadata.get("_rerank_score", ""))
         score_str = f"（精排分 {cohere_score:.3f}）" if cohere_score else ""
         lines.append(f"[{i}]{score_str} 来源：{source}\n{content}")
 
@@ -15,16 +15,27 @@ Self-RAG 核心思想：
   评分公式：cosine(query_embedding, doc_embedding)
   已复用 knowledge_base 模块的 embedding function，无额外模型加载开销。
   如需 LLM 级精度评估，可设 SELF_RAG_LLM=true（会显著增加响应时间）。
+
+LLM 评估模式（SELF_RAG_LLM_MODE，仅 SELF_RAG_LLM=true 时生效）：
+  - batch（默认）  一次调用同时给所有候选文档打 ISREL + ISSUP 分，
+                   文档数超过 SELF_RAG_BATCH_SIZE 时分成多批并发调用
+  - concurrent     每篇文档一次调用（ISREL + ISSUP 合并），
+                   最多 SELF_RAG_LLM_CONCURRENCY 个并发
+  - serial         旧行为：逐篇依次调用 evaluate_relevance / evaluate_support
+  评分结果按 (query, 文档内容哈希) 缓存，重复检索到的文档不再调用 LLM。
 """
 
+import hashlib
 import json
 import re
 import os
 import sys
 import math
+import threading
 import numpy as np
-from typing import List, Tuple
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from collections import Counter, OrderedDict
 
 _ROOT = os.path.join(os.path.dirname(__file__), "..")
 if _ROOT not in sys.path:
@@ -34,6 +45,10 @@ from langchain_core.documents import Document
 
 # ── 是否启用 LLM 级评估（默认关闭以保证速度）──────────────────────────────────
 USE_LLM_EVAL = os.getenv("SELF_RAG_LLM", "false").lower() == "true"
+LLM_EVAL_MODE = os.getenv("SELF_RAG_LLM_MODE", "batch").lower()
+LLM_CONCURRENCY = int(os.getenv("SELF_RAG_LLM_CONCURRENCY", "4"))
+BATCH_SIZE = int(os.getenv("SELF_RAG_BATCH_SIZE", "12"))
+GRADE_CACHE_SIZE = int(os.getenv("SELF_RAG_CACHE_SIZE", "1024"))
 
 _llm = None
 
@@ -60,20 +75,15 @@ def _get_llm():
 _ef = None  # embedding function 懒加载
 
 def _get_embedding_fn():
-    """懒加载 embedding function（复用 knowledge_base 已加载的模型）"""
+    """懒加载 embedding function（复用 rag/embeddings.py 的进程内单例）"""
     global _ef
     if _ef is not None:
         return _ef
     try:
-        from rag.knowledge_base import _get_embedding_function
-        _ef = _get_embedding_function()
+        from rag.embeddings import get_embedding_function
+        _ef = get_embedding_function()
     except Exception:
-        try:
-            from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-            model_name = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
-            _ef = SentenceTransformerEmbeddingFunction(model_name=model_name)
-        except Exception:
-            _ef = None
+        _ef = None
     return _ef
 
 
@@ -261,6 +271,125 @@ def evaluate_support(query: str, document: Document) -> Tuple[bool, float, str]:
         return (True, 0.5, "")
 
 
+# ============================================================
+# 批量 / 并发评估（ISREL + ISSUP 一次完成）
+# ============================================================
+
+_GRADE_SYSTEM = """你是一个检索质量评估专家。
+给定一个用户决策问题和若干段编号的知识文本，逐段评估：
+1. 相关性：该文本对回答此问题是否相关
+2. 支持性：是否包含支持决策的具体数据、案例、规则或分析框架
+
+输出严格 JSON 数组，每段一个对象，不添加任何额外文字：
+[
+  {
+    "id": 文本编号（整数）,
+    "relevant": true 或 false,
+    "score": 0到1之间的浮点数（相关性）,
+    "supportive": true 或 false,
+    "support_score": 0到1之间的浮点数（支持性）,
+    "key_evidence": "提炼出的关键证据（一句话）"
+  }
+]"""
+
+# (query, doc_hash) → grade 的 LRU 缓存
+_grade_cache: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+_grade_lock = threading.Lock()
+_llm_semaphore = threading.Semaphore(max(1, LLM_CONCURRENCY))
+
+
+def _default_grade(reason: str = "评估失败，默认保留") -> dict:
+    return {"relevant": True, "score": 0.5, "reason": reason,
+            "supportive": True, "support_score": 0.5, "key_evidence": ""}
+
+
+def _doc_hash(document: Document) -> str:
+    return hashlib.sha1(document.page_content[:600].encode("utf-8")).hexdigest()
+
+
+def _parse_json(raw: str):
+    raw = raw.strip()
+    raw = re.sub(r"```json\s*", "", raw)
+    raw = re.sub(r"```\s*", "", raw)
+    return json.loads(raw)
+
+
+def _grade_chunk(query: str, documents: List[Document]) -> List[dict]:
+    """一次 LLM 调用给一组文档打分；解析失败的文档使用默认分"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    parts = [f"【决策问题】\n{query}\n"]
+    for i, doc in enumerate(documents):
+        parts.append(f"【知识文本 {i}】\n{doc.page_content[:600]}\n")
+
+    grades = [_default_grade() for _ in documents]
+    try:
+        with _llm_semaphore:
+            response = _get_llm().invoke([
+                SystemMessage(content=_GRADE_SYSTEM),
+                HumanMessage(content="\n".join(parts)),
+            ])
+        result = _parse_json(response.content)
+        if isinstance(result, dict):
+            result = [result]
+        for item in result:
+            idx = int(item.get("id", -1))
+            if 0 <= idx < len(documents):
+                grades[idx] = {
+                    "relevant": bool(item.get("relevant", False)),
+                    "score": float(item.get("score", 0.0)),
+                    "reason": "LLM 批量评估",
+                    "supportive": bool(item.get("supportive", False)),
+                    "support_score": float(item.get("support_score", 0.0)),
+                    "key_evidence": item.get("key_evidence", ""),
+                }
+    except Exception:
+        pass
+    return grades
+
+
+def grade_documents(query: str, documents: List[Document]) -> List[dict]:
+    """
+    给每篇文档打 ISREL + ISSUP 分，返回与 documents 一一对应的 grade 字典：
+    {"relevant", "score", "reason", "supportive", "support_score", "key_evidence"}
+
+    先查 (query, 文档哈希) 缓存，未命中的文档按 LLM_EVAL_MODE 合并或并发调用 LLM。
+    """
+    keys = [(query, _doc_hash(d)) for d in documents]
+    grades: List[Optional[dict]] = [None] * len(documents)
+    with _grade_lock:
+        for i, key in enumerate(keys):
+            if key in _grade_cache:
+                _grade_cache.move_to_end(key)
+                grades[i] = _grade_cache[key]
+
+    missing = [i for i, g in enumerate(grades) if g is None]
+    if missing:
+        if LLM_EVAL_MODE == "concurrent":
+            chunks = [[i] for i in missing]
+        else:
+            size = max(1, BATCH_SIZE)
+            chunks = [missing[j:j + size] for j in range(0, len(missing), size)]
+
+        if len(chunks) == 1:
+            results = [_grade_chunk(query, [documents[i] for i in chunks[0]])]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(LLM_CONCURRENCY, len(chunks)))) as pool:
+                results = list(pool.map(
+                    lambda chunk: _grade_chunk(query, [documents[i] for i in chunk]), chunks
+                ))
+
+        with _grade_lock:
+            for chunk, chunk_grades in zip(chunks, results):
+                for i, g in zip(chunk, chunk_grades):
+                    grades[i] = g
+                    if g.get("reason") != "评估失败，默认保留":
+                        _grade_cache[keys[i]] = g
+            while len(_grade_cache) > GRADE_CACHE_SIZE:
+                _grade_cache.popitem(last=False)
+
+    return grades
+
+
 # ============================================================
 # 主函数：Self-RAG 过滤
 # ============================================================
@@ -278,7 +407,8 @@ def self_rag_filter(
 
     性能说明：
     - USE_LLM_EVAL=False（默认）：使用本地评分，无 API 调用，毫秒级完成
-    - USE_LLM_EVAL=True：每篇文档调用一次 LLM，会显著增加延迟
+    - USE_LLM_EVAL=True：batch / concurrent 模式下约一次 LLM 往返完成全部文档的评估；
+      serial 模式每篇文档依次调用（ISREL + ISSUP 最多 2×N 次）
 
     Args:
         query:          用户决策问题
@@ -297,15 +427,27 @@ def self_rag_filter(
     # 本地模式下降低阈值（关键词评分分布与 LLM 评分不同）
     effective_threshold = rel_threshold * 0.2 if not USE_LLM_EVAL else rel_threshold
 
+    # 批量 / 并发模式：一次性拿到全部文档的 ISREL + ISSUP 评分
+    grades = None
+    if USE_LLM_EVAL and LLM_EVAL_MODE != "serial":
+        grades = grade_documents(query, documents)
+
     scored = []
-    for doc in documents:
-        is_rel, rel_score, rel_reason = evaluate_relevance(query, doc)
+    for i, doc in enumerate(documents):
+        if grades is not None:
+            is_rel, rel_score = grades[i]["relevant"], grades[i]["score"]
+        else:
+            is_rel, rel_score, rel_reason = evaluate_relevance(query, doc)
 
         if not is_rel or rel_score < effective_threshold:
             continue
 
-        if not lightweight and not USE_LLM_EVAL is False:
-            is_sup, sup_score, key_evidence = evaluate_support(query, doc)
+        if not lightweight and USE_LLM_EVAL:
+            if grades is not None:
+                g = grades[i]
+                is_sup, sup_score, key_evidence = g["supportive"], g["support_score"], g["key_evidence"]
+            else:
+                is_sup, sup_score, key_evidence = evaluate_support(query, doc)
             if not is_sup or sup_score < sup_threshold:
                 continue
             combined = (rel_score + sup_score) / 2
@@ -0,0 +1,134 @@
+"""
+DecideX RAG 模块 - 跨进程共享缓存（SQLite WAL）
+
+多 worker 部署时，进程内 LRU 只能让同一个 worker 命中；网络搜索结果、完整决策报告
+这类“算一次很贵、短时间内可以复用”的数据放到一个本机共享的 SQLite 文件里，
+所有 worker（以及 gunicorn 重启后的新 worker）都能命中。
+
+  SharedCache(namespace, ttl_s)
+    .get(key)          → 命中且未过期时返回 JSON 反序列化后的值，否则 None
+    .put(key, value)   → value 需可 JSON 序列化
+
+- key 为任意字符串，内部按 sha256(namespace, key) 存储
+- 连接按进程创建（fork 之后自动重连），进程内用锁串行化
+- ttl_s <= 0 或 SHARED_CACHE_DB 为空串时缓存关闭，get 恒为 None、put 不写入
+- 过期条目在写入时按概率顺带清理
+
+配置：
+  SHARED_CACHE_DB=<path>      缓存文件（默认 data/shared_cache.sqlite3，设为空串关闭）
+  embedding 向量另有 rag/embedding_cache.py 的 SQLite 缓存（同样是 WAL，多进程共享）
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from rag.tracing import incr as _trace_incr
+
+# ============================================================
+# 配置
+# ============================================================
+
+DEFAULT_DB_PATH = os.getenv(
+    "SHARED_CACHE_DB",
+    os.path.join(os.path.dirname(__file__), "..", "data", "shared_cache.sqlite3"),
+)
+
+# 每次写入时顺带清理过期条目的概率
+_PURGE_PROBABILITY = 0.01
+
+# (path, pid) → sqlite3.Connection
+_conns: dict = {}
+_lock = threading.Lock()
+
+
+def _connection(path: str):
+    """当前进程的 SQLite 连接（fork 后重连）；打开失败返回 None。调用方须持有 _lock"""
+    key = (os.path.abspath(path), os.getpid())
+    if key in _conns:
+        return _conns[key]
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_cache ("
+            " key TEXT PRIMARY KEY, namespace TEXT NOT NULL,"
+            " value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+    except Exception as e:
+        print(f"[SharedCache] 共享缓存不可用：{e}")
+        conn = None
+    _conns[key] = conn
+    return conn
+
+
+class SharedCache:
+    """按 namespace 隔离的跨进程 TTL 缓存"""
+
+    def __init__(self, namespace: str, ttl_s: float, db_path: Optional[str] = DEFAULT_DB_PATH):
+        self.namespace = namespace
+        self.ttl_s = ttl_s
+        self.db_path = db_path
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.db_path) and self.ttl_s > 0
+
+    def _key(self, key: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{key}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        if not self.enabled:
+            return None
+        with _lock:
+            conn = _connection(self.db_path)
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT value FROM shared_cache WHERE key = ? AND expires_at > ?",
+                    (self._key(key), time.time()),
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        if row is None:
+            return None
+        _trace_incr(f"{self.namespace}_shared_cache_hits")
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with _lock:
+            conn = _connection(self.db_path)
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO shared_cache (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self._key(key), self.namespace, payload, now + self.ttl_s),
+                )
+                if random.random() < _PURGE_PROBABILITY:
+                    conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"[SharedCache] 写入失败：{e}")
+
+    def clear(self) -> None:
+        if not self.db_path:
+            return
+        with _lock:
+            conn = _connection(self.db_path)
+            if conn is not None:
+                conn.execute("DELETE FROM shared_cache WHERE namespace = ?", (self.namespace,))
+                conn.commit()
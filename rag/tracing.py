@@ -0,0 +1,301 @@
+"""
+DecideX - 分阶段延迟 / token 埋点（Tracing）
+
+full_decision_analysis 的各个阶段（每个知识库的混合检索、Self-RAG、精排、DDG 搜索、
+LLM 调用、Citation、simple 模式压缩）都包在 span 里：
+
+    with span("rerank", collection=kb_type) as sp:
+        docs = rerank(query, docs, top_k=2)
+        sp.set(docs=len(docs))
+
+  - span 通过 contextvars 嵌套；没有父 span 时自动成为一条 trace 的根
+  - 根 span 结束时整条 trace 写入 JSONL（TRACE_FILE），并汇总进进程内指标
+  - record_llm_usage(sp, resp) 从 resp.usage_metadata 读取输入 / 输出 token
+  - incr("xxx_cache_hits", n) 把缓存命中记到当前 span（embedding / 知识库 / 精排 / 意图缓存）
+  - render_prometheus() 输出 Prometheus 文本格式，backend_proxy 通过 GET /metrics 暴露
+
+指标：
+  decidex_stage_duration_seconds{stage}            histogram，可用 histogram_quantile 对 p95 告警
+  decidex_llm_tokens_total{stage,direction}        counter，direction = input / output
+  decidex_cache_hits_total{stage,cache}            counter
+  decidex_stage_documents_total{stage}             counter，阶段产出的文档数
+  decidex_stage_errors_total{stage}                counter
+
+配置：
+  TRACE_ENABLED=0      关闭埋点（span 变为空操作）
+  TRACE_FILE=<path>    trace 文件（默认 data/traces.jsonl，设为空串只保留内存指标）
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# ============================================================
+# 配置
+# ============================================================
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") != "0"
+TRACE_FILE = os.getenv(
+    "TRACE_FILE", os.path.join(os.path.dirname(__file__), "..", "data", "traces.jsonl")
+)
+
+# 延迟直方图分桶（秒）
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# ============================================================
+# Span / Trace
+# ============================================================
+
+class Span:
+    def __init__(self, name: str, trace: "Trace", parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = uuid.uuid4().hex[:8]
+        self.attrs = dict(attrs)
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, **attrs) -> "Span":
+        self.attrs.update(attrs)
+        return self
+
+    def incr(self, key: str, n: float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+    def to_dict(self) -> dict:
+        d = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent": self.parent.span_id if self.parent else None,
+            "offset_ms": round((self.start - self.trace.start) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2),
+        }
+        if self.attrs:
+            d["attrs"] = self.attrs
+        if self.error:
+            d["error"] = self.error
+        return d
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, sp: Span) -> None:
+        with self._lock:
+            self.spans.append(sp)
+
+
+class _NoopSpan:
+    """TRACE_ENABLED=0 时使用，接口与 Span 相同"""
+
+    def set(self, **attrs):
+        return self
+
+    def incr(self, key: str, n: float = 1) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+_current_span: contextvars.ContextVar = contextvars.ContextVar("decidex_span", default=None)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    sp = _current_span.get()
+    return sp.trace.trace_id if sp is not None else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    记录一个阶段。嵌套在已有 span 内时作为子 span；否则开启新 trace 并作为根 span。
+    异常会记录到 span.error 后原样抛出。
+    """
+    if not TRACE_ENABLED:
+        yield _NOOP
+        return
+    parent = _current_span.get()
+    trace = parent.trace if parent is not None else Trace()
+    sp = Span(name, trace, parent, attrs)
+    token = _current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        sp.duration = time.perf_counter() - sp.start
+        _current_span.reset(token)
+        trace.add(sp)
+        _registry.observe(sp)
+        if parent is None:
+            _export(trace, sp)
+
+
+def incr(key: str, n: float = 1) -> None:
+    """给当前 span 的计数属性加 n（没有活动 span 时忽略）"""
+    sp = _current_span.get()
+    if sp is not None and n:
+        sp.incr(key, n)
+
+
+def record_llm_usage(sp, resp) -> None:
+    """从 LangChain AIMessage.usage_metadata 读取 token 用量写入 span"""
+    usage = getattr(resp, "usage_metadata", None) or {}
+    if usage:
+        sp.set(input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0))
+
+
+# ============================================================
+# 导出：JSONL
+# ============================================================
+
+_file_lock = threading.Lock()
+
+
+def _export(trace: Trace, root: Span) -> None:
+    if not TRACE_FILE:
+        return
+    row = {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "ts": round(trace.wall_start, 3),
+        "duration_ms": round(root.duration * 1000, 2),
+        "spans": [s.to_dict() for s in sorted(trace.spans, key=lambda s: s.start)],
+    }
+    # 本次请求最耗时的叶子阶段，便于直接 grep
+    leaves = [s for s in trace.spans if s is not root and not any(c.parent is s for c in trace.spans)]
+    if leaves:
+        hot = max(leaves, key=lambda s: s.duration)
+        row["hot_stage"] = {"name": hot.name, "duration_ms": round(hot.duration * 1000, 2)}
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(TRACE_FILE)), exist_ok=True)
+        line = json.dumps(row, ensure_ascii=False, default=str)
+        with _file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        pass
+
+
+# ============================================================
+# 导出：Prometheus 指标
+# ============================================================
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(_BUCKETS) + 1))
+        self._sum: Dict[str, float] = defaultdict(float)
+        self._count: Dict[str, int] = defaultdict(int)
+        self._tokens: Dict[tuple, int] = defaultdict(int)
+        self._cache_hits: Dict[tuple, float] = defaultdict(float)
+        self._docs: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+
+    def observe(self, sp: Span) -> None:
+        stage = sp.name
+        with self._lock:
+            idx = next((i for i, b in enumerate(_BUCKETS) if sp.duration <= b), len(_BUCKETS))
+            self._hist[stage][idx] += 1
+            self._sum[stage] += sp.duration
+            self._count[stage] += 1
+            for direction in ("input", "output"):
+                n = sp.attrs.get(f"{direction}_tokens")
+                if isinstance(n, (int, float)):
+                    self._tokens[(stage, direction)] += int(n)
+            for key, value in sp.attrs.items():
+                if key.endswith("_cache_hits") and isinstance(value, (int, float)):
+                    self._cache_hits[(stage, key[: -len("_cache_hits")])] += value
+            docs = sp.attrs.get("docs")
+            if isinstance(docs, int):
+                self._docs[stage] += docs
+            if sp.error:
+                self._errors[stage] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += ["# HELP decidex_stage_duration_seconds Latency of each pipeline stage",
+                      "# TYPE decidex_stage_duration_seconds histogram"]
+            for stage in sorted(self._count):
+                cumulative = 0
+                for bound, n in zip(_BUCKETS, self._hist[stage]):
+                    cumulative += n
+                    lines.append(f'decidex_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'decidex_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {self._count[stage]}')
+                lines.append(f'decidex_stage_duration_seconds_sum{{stage="{stage}"}} {self._sum[stage]:.6f}')
+                lines.append(f'decidex_stage_duration_seconds_count{{stage="{stage}"}} {self._count[stage]}')
+
+            lines += ["# HELP decidex_llm_tokens_total LLM tokens by stage and direction",
+                      "# TYPE decidex_llm_tokens_total counter"]
+            for (stage, direction), n in sorted(self._tokens.items()):
+                lines.append(f'decidex_llm_tokens_total{{stage="{stage}",direction="{direction}"}} {n}')
+
+            lines += ["# HELP decidex_cache_hits_total Cache hits observed inside each stage",
+                      "# TYPE decidex_cache_hits_total counter"]
+            for (stage, cache), n in sorted(self._cache_hits.items()):
+                lines.append(f'decidex_cache_hits_total{{stage="{stage}",cache="{cache}"}} {n:g}')
+
+            lines += ["# HELP decidex_stage_documents_total Documents produced by each stage",
+                      "# TYPE decidex_stage_documents_total counter"]
+            for stage, n in sorted(self._docs.items()):
+                lines.append(f'decidex_stage_documents_total{{stage="{stage}"}} {n}')
+
+            lines += ["# HELP decidex_stage_errors_total Stage failures",
+                      "# TYPE decidex_stage_errors_total counter"]
+            for stage, n in sorted(self._errors.items()):
+                lines.append(f'decidex_stage_errors_total{{stage="{stage}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def quantile(self, stage: str, q: float) -> Optional[float]:
+        """按直方图分桶估算分位数（桶上界），无数据时返回 None"""
+        with self._lock:
+            total = self._count.get(stage, 0)
+            if not total:
+                return None
+            target, cumulative = q * total, 0
+            for bound, n in zip(_BUCKETS, self._hist[stage]):
+                cumulative += n
+                if cumulative >= target:
+                    return bound
+            return float("inf")
+
+    def stages(self) -> List[str]:
+        with self._lock:
+            return sorted(self._count)
+
+
+_registry = _Registry()
+
+
+def render_prometheus() -> str:
+    return _registry.render()
+
+
+def stage_summary() -> Dict[str, dict]:
+    """各阶段调用次数与 p50 / p95（秒，按分桶上界估算）"""
+    return {
+        stage: {
+            "count": _registry._count[stage],
+            "p50_s": _registry.quantile(stage, 0.5),
+            "p95_s": _registry.quantile(stage, 0.95),
+        }
+        for stage in _registry.stages()
+    }
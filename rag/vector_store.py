@@ -15,8 +15,9 @@ import os
 import re
 from datetime import datetime
 
-import chromadb
-from chromadb.utils import embedding_functions
+from rag.chroma_client import get_client as _chroma_client, write_lock as _chroma_write_lock
+from rag.decision_store import DecisionStore, create_store, ensure_no_legacy_rows
+from rag.embeddings import get_embedding_function
 
 # LLM（用于提取摘要）
 try:
@@ -134,32 +135,34 @@ SIMILARITY_THRESHOLD = 0.30
 
 def _get_embedding_function():
     """
-    优先使用 OpenAI Embeddings；若无 API Key 则退回本地免费模型
-    本地模型：paraphrase-multilingual-MiniLM-L12-v2（支持中文，约 120MB）
+    优先使用 OpenAI Embeddings；若无 API Key 则退回本地免费模型 all-MiniLM-L6-v2。
+    与知识库共用 rag/embeddings.py 中的单例，进程内只加载一份模型。
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key:
-        return embedding_functions.OpenAIEmbeddingFunction(
-            api_key=api_key,
-            model_name="text-embedding-ada-002",
-        )
-    # 本地 sentence-transformers（需要 pip install sentence-transformers）
-    # 使用 all-MiniLM-L6-v2（约 80MB，比 multilingual 版本小很多，启动更快）
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    return get_embedding_function()
 
 
-# 单例：避免重复初始化
+# 单例：避免重复初始化（按进程：gunicorn --preload fork 后在 worker 中重建）
+_client = None
+_client_pid = None
 _collection = None
+_store: "DecisionStore | None" = None
+
+
+def _get_client():
+    global _client, _client_pid, _collection, _store
+    if _client is None or _client_pid != os.getpid():
+        _client = _chroma_client(CHROMA_PERSIST_DIR)
+        _client_pid = os.getpid()
+        _collection = None
+        _store = None
+    return _client
 
 
 def get_collection():
-    """获取（或初始化）Chroma 集合"""
+    """获取（或初始化）旧版共享 Chroma 集合 decision_history"""
     global _collection
+    client = _get_client()
     if _collection is None:
-        os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
-        client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
         _collection = client.get_or_create_collection(
             name="decision_history",
             embedding_function=_get_embedding_function(),
@@ -168,6 +171,21 @@ def get_collection():
     return _collection
 
 
+def get_decision_store() -> DecisionStore:
+    """
+    获取决策记录存储后端（单例）。
+    后端由 DECISION_STORE_BACKEND 决定：shared（默认）/ per_user / sharded，
+    详见 rag/decision_store.py。旧 decision_history 中仍有未迁移的记录时，分区后端抛 RuntimeError。
+    """
+    global _store
+    client = _get_client()
+    if _store is None:
+        store = create_store(client, _get_embedding_function())
+        ensure_no_legacy_rows(store)
+        _store = store
+    return _store
+
+
 # ============================================================
 # 写入：保存一条决策记录
 # ============================================================
@@ -200,7 +218,7 @@ def save_decision(
     Returns:
         保存的文档 ID
     """
-    collection = get_collection()
+    store = get_decision_store()
 
     doc_id = f"decision_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
 
@@ -234,11 +252,13 @@ def save_decision(
         "user_preference_tags": json.dumps(summary.get("user_preference_tags", []), ensure_ascii=False),
     }
 
-    collection.add(
-        documents=[index_document],   # 向量化的是 Gemini 摘要
-        metadatas=[metadata],
-        ids=[doc_id],
-    )
+    with _chroma_write_lock(CHROMA_PERSIST_DIR):
+        store.add(
+            user_id=user_id,
+            doc_id=doc_id,
+            document=index_document,   # 向量化的是 Gemini 摘要
+            metadata=metadata,
+        )
     return doc_id
 
 
@@ -262,22 +282,11 @@ def retrieve_similar_decisions(
     Returns:
         相似度从高到低排列的历史记录列表
     """
-    collection = get_collection()
-
-    total = collection.count()
-    if total == 0:
-        return []
-
-    # 按 user_id 过滤
-    where = {"user_id": {"$eq": user_id}}
+    store = get_decision_store()
 
+    # 分区后端只在该用户自己的分区内检索；shared 后端按 user_id 过滤
     try:
-        results = collection.query(
-            query_texts=[query],
-            n_results=min(n_results, total),
-            where=where,
-            include=["documents", "metadatas", "distances"],
-        )
+        results = store.query(user_id=user_id, n_results=n_results, query_text=query)
     except Exception:
         return []
 
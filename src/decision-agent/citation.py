@@ -17,6 +17,8 @@ Citation 流程：
 import re
 import json
 import hashlib
+import threading
+from contextvars import ContextVar
 from dataclasses import dataclass, field, asdict
 from typing import List, Dict, Optional
 from langchain_core.documents import Document
@@ -99,6 +101,8 @@ class CitationManager:
     def __init__(self):
         self._sources: List[CitationSource] = []
         self._dedup: Dict[str, str] = {}  # content_hash → cid
+        # 并行专家 Agent 会同时登记来源，编号分配需要串行
+        self._lock = threading.Lock()
 
     def _hash(self, content: str) -> str:
         return hashlib.md5(content[:200].encode()).hexdigest()[:8]
@@ -113,27 +117,30 @@ class CitationManager:
         自动去重：相同内容返回已有 ID。
         """
         h = self._hash(doc.page_content)
-        if h in self._dedup:
-            return self._dedup[h]
-
-        cid = str(len(self._sources) + 1)
         meta = doc.metadata or {}
+        with self._lock:
+            if h in self._dedup:
+                return self._dedup[h]
+            cid = str(len(self._sources) + 1)
+            self._sources.append(self._make_source(cid, doc.page_content, source_type, meta))
+            self._dedup[h] = cid
+        return cid
 
-        source = CitationSource(
+    @staticmethod
+    def _make_source(cid: str, content: str, source_type: str, meta: dict) -> CitationSource:
+        return CitationSource(
             cid=cid,
-            content=doc.page_content[:200],
+            content=content[:200],
             source_type=source_type,
             collection=meta.get("_collection", meta.get("source", "unknown")),
             relevance_score=float(
                 meta.get("_cohere_score",
+                meta.get("_rerank_score",
                 meta.get("_rrf_score",
-                meta.get("_self_rag_score", 0.0)))
+                meta.get("_self_rag_score", 0.0))))
             ),
             metadata=dict(meta),
         )
-        self._sources.append(source)
-        self._dedup[h] = cid
-        return cid
 
     def add_documents(
         self,
@@ -220,14 +227,50 @@ class CitationManager:
 
     def clear(self):
         """清空引用池（新会话时调用）"""
-        self._sources.clear()
-        self._dedup.clear()
+        with self._lock:
+            self._sources.clear()
+            self._dedup.clear()
 
     @property
     def has_sources(self) -> bool:
         return len(self._sources) > 0
 
 
+# ============================================================
+# 请求级 CitationManager
+# ============================================================
+
+_request_mgr: ContextVar = ContextVar("decidex_citation_mgr", default=None)
+
+
+def begin_request_citations() -> CitationManager:
+    """
+    为当前请求上下文创建独立的 CitationManager。
+    须在请求入口（分发到工具 / 线程之前）调用：asyncio 任务与 to_thread 复制的上下文
+    引用的是同一个实例，因此同一请求内的各个工具共用一个引用池，不同请求互不串扰。
+    """
+    mgr = CitationManager()
+    _request_mgr.set(mgr)
+    return mgr
+
+
+class RequestCitationManager:
+    """
+    CitationManager 的上下文代理：属性访问转发到当前请求的实例；
+    请求上下文之外（如 LangGraph Studio 直接运行 graph）退回进程级默认实例。
+    """
+
+    def __init__(self):
+        self._default = CitationManager()
+
+    def current(self) -> CitationManager:
+        mgr = _request_mgr.get()
+        return mgr if mgr is not None else self._default
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+
 # ============================================================
 # 便捷函数
 # ============================================================
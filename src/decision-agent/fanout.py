@@ -0,0 +1,246 @@
+"""
+决策型 Agent 系统 - 并行专家模式（Fan-out）
+
+supervisor graph 只能通过 create_handoff_tool 一次转交一个专家 Agent，
+需要深度多 Agent 报告时，成本 → 风险 → 价值 → 个人匹配度只能串行执行。
+本模块把四个专家 Agent 并行跑在同一份输入上，再合并进 finalize_decision：
+
+  prepare ──┬── cost_analysis_agent ─────┐
+            ├── risk_assessment_agent ───┤
+            ├── user_value_agent ────────┼──► synthesize（1 次 LLM）──► finalize_decision ──► END
+            └── personal_match_agent ────┘
+
+  - 墙钟时间 ≈ 最慢的专家 Agent + 一次综合推荐
+  - 每个专家单独记录延迟、LLM 调用次数和 token 用量（agent_stats）
+  - 专家的检索工具仍登记到全局 CitationManager，由 finalize_decision 统一生成参考来源
+
+在 langgraph.json 中注册为 "decision-fanout"；backend_proxy 的 mode="deep" 使用此图。
+"""
+
+import operator
+import os
+import re
+import threading
+import time
+from typing import Annotated, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from .graph import (
+    _LLM_MODEL_NAME,
+    cost_analysis_agent,
+    finalize_decision,
+    llm,
+    personal_match_agent,
+    risk_assessment_agent,
+    user_value_agent,
+)
+from .prompt_budget import truncate_to_tokens
+
+# 单个专家 Agent 的最大 ReAct 步数（工具调用 + 回复）
+AGENT_RECURSION_LIMIT = int(os.getenv("FANOUT_RECURSION_LIMIT", "12"))
+# 合并进综合推荐 prompt 时，每个专家输出最多保留的 token 数
+AGENT_OUTPUT_TOKENS = int(os.getenv("FANOUT_AGENT_OUTPUT_TOKENS", "600"))
+
+# 状态字段名 → (专家 Agent, 报告中的中文名)
+SPECIALISTS = {
+    "cost_analysis":   (cost_analysis_agent, "成本分析"),
+    "risk_assessment": (risk_assessment_agent, "风险评估"),
+    "user_value":      (user_value_agent, "价值评估"),
+    "personal_match":  (personal_match_agent, "个人匹配度"),
+}
+
+
+# ============================================================================
+# Token / 延迟统计
+# ============================================================================
+
+class UsageTracker(BaseCallbackHandler):
+    """累计一次 Agent 运行中的 LLM 调用次数与 token 用量"""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs):
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not (input_tokens or output_tokens):
+            # OpenAI 旧版返回格式：llm_output.token_usage
+            token_usage = (response.llm_output or {}).get("token_usage", {})
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+        with self._lock:
+            self.llm_calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def snapshot(self, agent: str, latency_ms: float, ok: bool = True) -> Dict:
+        return {
+            "agent": agent,
+            "ok": ok,
+            "latency_ms": round(latency_ms, 1),
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+def _message_text(content) -> str:
+    if isinstance(content, list):
+        return " ".join(
+            item.get("text", "") if isinstance(item, dict) else str(item)
+            for item in content
+        )
+    return str(content or "")
+
+
+# ============================================================================
+# 状态
+# ============================================================================
+
+class FanoutState(TypedDict, total=False):
+    messages: Annotated[list, add_messages]
+    decision_query: str
+    user_profile: str
+    user_id: str
+    cost_analysis: str
+    risk_assessment: str
+    user_value: str
+    personal_match: str
+    final_recommendation: str
+    agent_stats: Annotated[list, operator.add]
+
+
+def prepare_node(state: FanoutState) -> dict:
+    """从消息中解析问题与用户画像（格式与 backend_proxy 注入的一致）"""
+    query, profile = state.get("decision_query", ""), state.get("user_profile", "")
+    if not query:
+        humans = [m for m in state.get("messages", []) if isinstance(m, HumanMessage)]
+        text = _message_text(humans[-1].content) if humans else ""
+        m = re.search(r"【用户画像】\s*\n(.*?)(?:\n\n|$)", text, re.S)
+        if m and not profile:
+            profile = m.group(1).strip()
+        query = text.split("【用户问题】", 1)[1].strip() if "【用户问题】" in text else text.strip()
+    return {"decision_query": query, "user_profile": profile}
+
+
+def _specialist_input(state: FanoutState) -> str:
+    profile = state.get("user_profile", "")
+    profile_ctx = f"【用户画像】\n{profile}\n\n" if profile else ""
+    return f"{profile_ctx}【用户问题】{state['decision_query']}"
+
+
+def _make_specialist_node(field: str):
+    agent, label = SPECIALISTS[field]
+
+    def node(state: FanoutState) -> dict:
+        tracker = UsageTracker()
+        start = time.perf_counter()
+        try:
+            result = agent.invoke(
+                {"messages": [HumanMessage(content=_specialist_input(state))]},
+                {"recursion_limit": AGENT_RECURSION_LIMIT, "callbacks": [tracker]},
+            )
+            ai_msgs = [m for m in result.get("messages", []) if getattr(m, "type", "") == "ai"]
+            text = _message_text(ai_msgs[-1].content).strip() if ai_msgs else ""
+            ok = bool(text)
+        except Exception as e:
+            text, ok = f"（{label}失败：{e}）", False
+        stats = tracker.snapshot(agent.name, (time.perf_counter() - start) * 1000, ok)
+        return {field: text or f"（{label}无输出）", "agent_stats": [stats]}
+
+    node.__name__ = f"{field}_node"
+    return node
+
+
+def synthesize_node(state: FanoutState) -> dict:
+    """一次 LLM 调用：基于四位专家的输出给出最终推荐"""
+    tracker = UsageTracker()
+    start = time.perf_counter()
+    parts = [
+        f"### {label}\n{truncate_to_tokens(state.get(field, ''), AGENT_OUTPUT_TOKENS, _LLM_MODEL_NAME)}"
+        for field, (_, label) in SPECIALISTS.items()
+    ]
+    system = (
+        "你是 DecideX 综合决策专家。下面是成本、风险、价值、个人匹配度四位专家对同一问题的独立分析。\n"
+        "请权衡各方观点（指出它们之间的冲突并说明取舍），给出明确的最终决策建议：\n"
+        "推荐哪个方案、核心理由（3 条以内）、需要注意的风险与下一步行动。\n"
+        "全程中文，400 字以内，禁止表格、JSON 和代码块，禁止向用户提问。"
+    )
+    user = f"决策问题：{state['decision_query']}\n\n" + "\n\n".join(parts)
+    try:
+        resp = llm.invoke([SystemMessage(content=system), HumanMessage(content=user)],
+                          config={"callbacks": [tracker]})
+        text, ok = _message_text(resp.content).strip(), True
+    except Exception as e:
+        text, ok = f"综合推荐生成失败：{e}", False
+    stats = tracker.snapshot("synthesis", (time.perf_counter() - start) * 1000, ok)
+    return {"final_recommendation": text, "agent_stats": [stats]}
+
+
+def finalize_node(state: FanoutState) -> dict:
+    """合并进 finalize_decision：生成报告、附加参考来源、保存决策记忆"""
+    report = finalize_decision.invoke({
+        "user_query": state["decision_query"],
+        "cost_analysis": state.get("cost_analysis", ""),
+        "risk_assessment": state.get("risk_assessment", ""),
+        "user_value": state.get("user_value", ""),
+        "personal_match": state.get("personal_match", ""),
+        "final_recommendation": state.get("final_recommendation", ""),
+        "user_id": state.get("user_id") or "default",
+    })
+    print("[Fanout] " + format_agent_stats(state.get("agent_stats", [])))
+    return {"messages": [AIMessage(content=report)]}
+
+
+def format_agent_stats(stats: List[Dict]) -> str:
+    """一行汇总：各 Agent 延迟 / LLM 次数 / token，以及并行节省的时间"""
+    if not stats:
+        return "无统计"
+    specialists = [s for s in stats if s["agent"] != "synthesis"]
+    wall = max((s["latency_ms"] for s in specialists), default=0.0)
+    serial = sum(s["latency_ms"] for s in specialists)
+    rows = " | ".join(
+        f"{s['agent']} {s['latency_ms']:.0f}ms LLM×{s['llm_calls']} "
+        f"in {s['input_tokens']} out {s['output_tokens']}{'' if s['ok'] else ' ✗'}"
+        for s in stats
+    )
+    total_tokens = sum(s["input_tokens"] + s["output_tokens"] for s in stats)
+    return f"{rows} || 专家并行 {wall:.0f}ms（串行约 {serial:.0f}ms），总 token {total_tokens}"
+
+
+# ============================================================================
+# 编译
+# ============================================================================
+
+def build_fanout_graph():
+    builder = StateGraph(FanoutState)
+    builder.add_node("prepare", prepare_node)
+    # 节点名不能与状态字段重名：cost_analysis 字段由 cost_analysis_agent 节点写入
+    specialist_nodes = [f"{field}_agent" for field in SPECIALISTS]
+    for field, node in zip(SPECIALISTS, specialist_nodes):
+        builder.add_node(node, _make_specialist_node(field))
+    builder.add_node("synthesize", synthesize_node)
+    builder.add_node("finalize", finalize_node)
+
+    builder.add_edge(START, "prepare")
+    for node in specialist_nodes:
+        builder.add_edge("prepare", node)
+    builder.add_edge(specialist_nodes, "synthesize")
+    builder.add_edge("synthesize", "finalize")
+    builder.add_edge("finalize", END)
+    return builder.compile()
+
+
+graph = build_fanout_graph()
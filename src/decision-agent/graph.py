@@ -19,6 +19,7 @@ from langchain_core.tools import tool
 from langchain_core.prompts.chat import ChatPromptTemplate
 from langgraph_supervisor import create_handoff_tool, create_supervisor
 from langgraph.prebuilt.chat_agent_executor import create_react_agent
+import asyncio
 import os
 import sys
 import requests
@@ -49,15 +50,48 @@ try:
 except ImportError:
     INTENT_ENABLED = False
 
+# 分阶段埋点（rag/tracing.py）；rag 依赖缺失时退化为空操作
 try:
-    from .citation import CitationManager
+    from rag.tracing import record_llm_usage, span
+except ImportError:
+    from contextlib import contextmanager as _contextmanager
+
+    class _NoopSpan:
+        def set(self, **attrs):
+            return self
+
+    @_contextmanager
+    def span(name, **attrs):
+        yield _NoopSpan()
+
+    def record_llm_usage(sp, resp):
+        pass
+
+from .prompt_budget import (
+    CONTEXT_TOKEN_BUDGET,
+    PromptSection,
+    Snippet,
+    build_context,
+    count_tokens,
+    report_length_hint,
+)
+
+try:
+    from .citation import RequestCitationManager, begin_request_citations
     CITATION_ENABLED = True
 except ImportError:
     CITATION_ENABLED = False
 
-# ── 全局 CitationManager（模块级单例，跨工具调用共享）────────────────────────
-# 每次 finalize_decision 调用后会 .clear() 重置，确保每轮决策独立
-_citation_mgr: "CitationManager | None" = CitationManager() if CITATION_ENABLED else None
+# ── CitationManager（按请求上下文隔离，跨工具调用共享）────────────────────────
+# begin_request() 为每个请求创建独立实例；finalize_decision 调用后会 .clear() 重置，确保每轮决策独立
+_citation_mgr: "RequestCitationManager | None" = RequestCitationManager() if CITATION_ENABLED else None
+
+# 网络搜索结果的跨进程共享缓存（多 worker 共用；SEARCH_CACHE_TTL_S=0 关闭）
+try:
+    from rag.shared_cache import SharedCache
+    _search_cache = SharedCache("web_search", float(os.getenv("SEARCH_CACHE_TTL_S", "1800")))
+except ImportError:
+    _search_cache = None
 
 try:
     # 优先使用新包名 ddgs，兼容旧包名 duckduckgo_search
@@ -68,8 +102,15 @@ try:
 
     def _run_ddg_search(query: str, max_results: int = 3):
         """返回原始结果列表 [{"title":..,"href":..,"body":..}, ...]"""
+        cache_key = f"{max_results}\0{query}"
+        if _search_cache is not None:
+            cached = _search_cache.get(cache_key)
+            if cached is not None:
+                return cached
         with _DDGS() as ddgs:
             results = list(ddgs.text(query, max_results=max_results))
+        if results and _search_cache is not None:
+            _search_cache.put(cache_key, results)
         return results  # 返回列表，供调用方逐条处理
     WEB_SEARCH_ENABLED = True
 except ImportError:
@@ -78,6 +119,16 @@ except ImportError:
 
 from .stopping_rules import check_should_stop, reset_stopping_state, MAX_ROUNDS
 
+
+def begin_request() -> None:
+    """
+    请求入口调用（backend_proxy /chat）：为当前请求上下文创建独立的引用池与停止规则状态。
+    之后 ainvoke / astream / to_thread 派生出的上下文都共享这两份请求级状态。
+    """
+    if CITATION_ENABLED:
+        begin_request_citations()
+    reset_stopping_state()
+
 # 实例化共享的 LLM
 def _resolve_google_model() -> str:
     """优先使用环境变量；否则在线探测当前 key 可用的 Gemini 模型。"""
@@ -810,111 +861,136 @@ def evaluate_stop(
 # LLM 调用从 ~30 次降至 2 次（意图识别 + 多角色分析）
 # ============================================================================
 
-@tool
-def full_decision_analysis(decision_query: str, user_profile: str = "", mode: str = "detailed") -> str:
-    """
-    【一站式决策分析】在单次调用内完成全部分析流程：
-    1. BM25+向量混合检索（RRF融合）+ Self-RAG过滤 + Cohere精排 ← 知识库RAG
-    2. DuckDuckGo实时网络搜索 ← 获取最新价格/政策/行业数据
-    3. Multi-Agent多角色单次LLM推理 ← 成本/风险/价值/个人匹配度四维分析
-    4. 生成【DecideX 综合决策报告】
+# 当前 LLM 的模型名（用于 token 计数）
+_LLM_MODEL_NAME = google_model if USE_GOOGLE else _openai_model
 
-    等价于依次调用 cost_analysis_agent、risk_assessment_agent、
-    user_value_agent、personal_match_agent，但只消耗一次 LLM API 调用。
 
-    Args:
-        decision_query: 用户决策问题（完整原始问题）
-        user_profile:   用户画像JSON字符串（城市/预算/风险偏好等）
-        mode:           输出模式，"detailed"（完整报告）或 "simple"（精简结论，200字以内）
+def _doc_relevance(doc) -> float:
+    """检索文档的相关度（0~1）：优先 Self-RAG 余弦分，其次精排分"""
+    meta = doc.metadata or {}
+    for key in ("_self_rag_score", "_cohere_score", "_rerank_score"):
+        value = meta.get(key)
+        if isinstance(value, (int, float)):
+            return max(0.0, min(float(value), 1.0))
+    return 0.5
 
-    Returns:
-        含成本/风险/价值/个人匹配度的完整决策报告（Markdown格式）
+
+def _collect_knowledge_snippets(decision_query: str):
     """
-    from langchain_core.messages import HumanMessage as _HM, SystemMessage as _SM
-    from datetime import datetime as _dt
-    current_year = _dt.now().year
+    Step 1: RAG 知识库检索（BM25+向量+RRF+Self-RAG+精排）。
 
-    # ── Step 1: RAG 知识库检索（BM25+向量+RRF+Self-RAG+Cohere精排）────────────
-    rag_sections = []
-    if RAG_ENABLED:
-        for kb_type, label in [("knowledge_cost", "成本"), ("knowledge_risk", "风险"), ("knowledge_value", "价值")]:
-            try:
+    Returns:
+        (snippets, cite_docs)  带相关度的 Snippet 列表，以及需要登记为引用来源的文档
+    """
+    snippets, cite_docs = [], []
+    if not RAG_ENABLED:
+        return snippets, cite_docs
+    for kb_type, label in [("knowledge_cost", "成本"), ("knowledge_risk", "风险"), ("knowledge_value", "价值")]:
+        try:
+            with span("hybrid_retrieve", collection=kb_type) as sp:
                 docs = hybrid_retrieve(kb_type, decision_query, top_k=3)
+                sp.set(docs=len(docs))
+            with span("self_rag", collection=kb_type) as sp:
                 docs = self_rag_filter(decision_query, docs, rel_threshold=0.3, max_docs=2, lightweight=True)
-                result = format_reranked_results(decision_query, docs, top_k=2)
-                if CITATION_ENABLED and _citation_mgr is not None:
-                    _citation_mgr.add_documents(docs, source_type="knowledge_base")
-                rag_sections.append(f"**{label}知识库**：\n{result}")
+                sp.set(docs=len(docs))
+            with span("rerank", collection=kb_type) as sp:
+                docs = rerank(decision_query, docs, top_k=2)
+                sp.set(docs=len(docs))
+            cite_docs.extend(docs)
+            for doc in docs:
+                source = doc.metadata.get("source", doc.metadata.get("_collection", "知识库"))
+                snippets.append(Snippet(
+                    text=f"[{label}知识库｜{source}]\n{doc.page_content}",
+                    score=_doc_relevance(doc),
+                    source=source,
+                ))
+        except Exception:
+            try:
+                kb_key = kb_type.replace("knowledge_", "")
+                for chunk in retrieve_knowledge(decision_query, kb_type=kb_key, n_results=2):
+                    snippets.append(Snippet(
+                        text=f"[{label}知识库]\n{chunk['content']}",
+                        score=float(chunk.get("similarity", 0.5)),
+                        source=kb_key,
+                    ))
             except Exception:
-                try:
-                    kb_key = kb_type.replace("knowledge_", "")
-                    chunks = retrieve_knowledge(decision_query, kb_type=kb_key, n_results=2)
-                    rag_sections.append(f"**{label}知识库**：\n{format_knowledge_for_prompt(chunks, kb_type=kb_key)}")
-                except Exception:
-                    pass
-    rag_context = "\n\n".join(rag_sections)
-
-    # ── Step 2: Web Search（带年份的实时数据搜索）─────────────────────────────
-    web_context = ""
-    if WEB_SEARCH_ENABLED:
-        # 提取关键词：去掉标点，取前 5 个词组，拼接年份
-        import re as _re
-        _kw = _re.sub(r'[？?！!。，,、；;：:「」【】《》()（）\s]+', ' ', decision_query).strip()
-        _kw = ' '.join(_kw.split()[:5])
-        web_search_query = f"{_kw} {current_year}年"
-        def _cn_ratio(text: str) -> float:
-            """中文字符占比（用于过滤英文/乱码垃圾结果）"""
-            return sum(1 for c in text if '\u4e00' <= c <= '\u9fff') / max(len(text), 1)
-
-        # 垃圾/八卦/低质内容标题关键词
-        _SPAM_TITLE_WORDS = {'黑料', '大瓜', '吃瓜', '爆料', '爆点', '八卦', '撕逼',
-                             '每日热搜', '热门大赛', '扒皮', '料包', '瓜圈', '劲爆'}
-
-        def _title_is_url(title: str) -> bool:
-            """判断标题是否像 URL 路径（如 wiki.xxx.cc/archives/204725.html）"""
-            if not title:
-                return True
-            has_slash = '/' in title
-            has_dot = '.' in title
-            no_chinese = _cn_ratio(title) < 0.05
-            looks_like_url = has_slash and has_dot and no_chinese
-            is_http = title.strip().startswith(('http://', 'https://'))
-            return looks_like_url or is_http
-
-        def _is_quality(r: dict) -> bool:
-            """只过滤明显垃圾：URL标题、八卦词、非中文内容。
-            DDG 本身已按相关性排序，不再做额外关键词匹配，避免过度过滤导致 citation 消失。"""
-            title = r.get("title", "") or ""
-            body  = r.get("body",  "") or ""
-            if _title_is_url(title):
-                return False
-            if any(w in title for w in _SPAM_TITLE_WORDS):
-                return False
-            # 正文需有一定中文内容（≥15%）
-            return _cn_ratio(body) >= 0.15 if body else False
+                pass
+    return snippets, cite_docs
+
+
+def _cn_ratio(text: str) -> float:
+    """中文字符占比（用于过滤英文/乱码垃圾结果）"""
+    return sum(1 for c in text if '\u4e00' <= c <= '\u9fff') / max(len(text), 1)
+
+# 垃圾/八卦/低质内容标题关键词
+_SPAM_TITLE_WORDS = {'黑料', '大瓜', '吃瓜', '爆料', '爆点', '八卦', '撕逼',
+                     '每日热搜', '热门大赛', '扒皮', '料包', '瓜圈', '劲爆'}
+
+def _title_is_url(title: str) -> bool:
+    """判断标题是否像 URL 路径（如 wiki.xxx.cc/archives/204725.html）"""
+    if not title:
+        return True
+    has_slash = '/' in title
+    has_dot = '.' in title
+    no_chinese = _cn_ratio(title) < 0.05
+    looks_like_url = has_slash and has_dot and no_chinese
+    is_http = title.strip().startswith(('http://', 'https://'))
+    return looks_like_url or is_http
+
+def _is_quality(r: dict) -> bool:
+    """只过滤明显垃圾：URL标题、八卦词、非中文内容。
+    DDG 本身已按相关性排序，不再做额外关键词匹配，避免过度过滤导致 citation 消失。"""
+    title = r.get("title", "") or ""
+    body  = r.get("body",  "") or ""
+    if _title_is_url(title):
+        return False
+    if any(w in title for w in _SPAM_TITLE_WORDS):
+        return False
+    # 正文需有一定中文内容（≥15%）
+    return _cn_ratio(body) >= 0.15 if body else False
+
+
+def _collect_web_snippets(decision_query: str, current_year: int):
+    """
+    Step 2: Web Search（带年份的实时数据搜索）。
 
-        try:
+    Returns:
+        (snippets, cite_docs)  Snippet 按搜索排名递减打分；cite_docs 为前 2 条有效结果
+    """
+    from langchain_core.documents import Document as _Doc
+
+    snippets, cite_docs = [], []
+    if not WEB_SEARCH_ENABLED:
+        return snippets, cite_docs
+    # 提取关键词：去掉标点，取前 5 个词组，拼接年份
+    import re as _re
+    _kw = _re.sub(r'[？?！!。，,、；;：:「」【】《》()（）\s]+', ' ', decision_query).strip()
+    _kw = ' '.join(_kw.split()[:5])
+    web_search_query = f"{_kw} {current_year}年"
+
+    try:
+        with span("ddg_search") as sp:
             _raw_results = _run_ddg_search(web_search_query, max_results=5)
             _valid = [r for r in _raw_results if _is_quality(r)]
-            if _valid:
-                # 拼接正文供 LLM 阅读
-                web_context = " ".join(r.get("body", "") for r in _valid[:3])[:1000]
-                # Citation：只取前 2 条有效结果，用文章标题作来源名
-                if CITATION_ENABLED and _citation_mgr is not None:
-                    from langchain_core.documents import Document as _Doc
-                    for _r in _valid[:2]:
-                        _title = (_r.get("title") or "网络实时搜索")[:60]
-                        _snippet = _r.get("body", "")[:300]
-                        _citation_mgr.add_document(
-                            _Doc(page_content=_snippet,
-                                 metadata={"source": _title}),
-                            source_type="web_search"
-                        )
-        except Exception as e:
-            web_context = f"（搜索失败：{e}）"
+            sp.set(raw_results=len(_raw_results), docs=len(_valid))
+    except Exception:
+        return snippets, cite_docs
+    for rank, r in enumerate(_valid[:3]):
+        title = (r.get("title") or "网络实时搜索")[:60]
+        snippets.append(Snippet(text=r.get("body", ""), score=0.5 - 0.05 * rank, source=title))
+
+    # Citation：只取前 2 条有效结果，用文章标题作来源名
+    for _r in _valid[:2]:
+        _title = (_r.get("title") or "网络实时搜索")[:60]
+        cite_docs.append(_Doc(page_content=_r.get("body", "")[:300], metadata={"source": _title}))
+    return snippets, cite_docs
+
 
-    # ── Step 3: Multi-Agent 多角色单次 LLM 推理（Chain-of-Thought）───────────
-    # 四个专家角色描述（两种模式共用）
+def _decision_system_prompt(current_year: int, min_chars: int) -> str:
+    """
+    多角色推理的 system prompt。
+    min_chars 由上下文实际 token 数决定：检索到的资料越少，字数要求越低，避免模型凭空扩写。
+    """
     _role_definitions = (
         f"你是 DecideX 多 Agent 决策系统的核心推理引擎（当前年份：{current_year}年）。\n"
         f"所有数据、政策、价格、利率等信息必须基于 {current_year} 年最新情况。\n"
@@ -939,54 +1015,111 @@ def full_decision_analysis(decision_query: str, user_profile: str = "", mode: st
         "全程中文。\n\n"
     )
 
-    # 无论 mode 如何，内部始终生成完整详细报告（压缩由 backend_proxy 的 _compress_to_simple 处理）
-    if True:
-        system_prompt = (
-            _role_definitions +
-            "## 输出格式（详细模式）\n"
-            "请对每个专家角色**充分展开分析**，输出完整决策报告（总字数不少于800字）：\n\n"
-            "# 【DecideX 综合决策报告】\n\n"
-            "## 💰 成本分析\n"
-            "（详细分析，含具体数字，覆盖初始成本、月度支出、机会成本，至少200字）\n\n"
-            "## ⚠️ 风险评估\n"
-            "（各类风险逐项评分，给出概率×影响=评分，综合风险等级，至少200字）\n\n"
-            "## 🎯 价值评估\n"
-            "（四维度 bullet 评分，每项一行含说明，最后一行输出加权综合得分，至少150字）\n\n"
-            "## 👤 个人匹配度\n"
-            "（基于用户画像详细说明，末尾给出偏好类型和匹配百分比，至少200字）\n\n"
-            "## ✅ 综合推荐\n"
-            "（明确行动建议，给出优先推荐方案及理由，至少150字）"
-        )
+    def _at_least(n: int) -> str:
+        return f"，至少{round(n * min_chars / 800 / 10) * 10}字" if min_chars else ""
 
+    length_rule = f"（总字数不少于{min_chars}字）" if min_chars else "（资料有限处简要说明即可，不要凭空扩写）"
+    return (
+        _role_definitions +
+        "## 输出格式（详细模式）\n"
+        f"请对每个专家角色**充分展开分析**，输出完整决策报告{length_rule}：\n\n"
+        "# 【DecideX 综合决策报告】\n\n"
+        "## 💰 成本分析\n"
+        f"（详细分析，含具体数字，覆盖初始成本、月度支出、机会成本{_at_least(200)}）\n\n"
+        "## ⚠️ 风险评估\n"
+        f"（各类风险逐项评分，给出概率×影响=评分，综合风险等级{_at_least(200)}）\n\n"
+        "## 🎯 价值评估\n"
+        f"（四维度 bullet 评分，每项一行含说明，最后一行输出加权综合得分{_at_least(150)}）\n\n"
+        "## 👤 个人匹配度\n"
+        f"（基于用户画像详细说明，末尾给出偏好类型和匹配百分比{_at_least(200)}）\n\n"
+        "## ✅ 综合推荐\n"
+        f"（明确行动建议，给出优先推荐方案及理由{_at_least(150)}）"
+    )
+
+
+def assemble_decision_prompt(decision_query: str, user_profile: str, sections: list, current_year: int):
+    """
+    在 token 预算内把各上下文分区组装成 (system_prompt, user_msg, usage)。
+    用户画像不参与预算，始终完整保留。
+    """
+    context, usage = build_context(sections, CONTEXT_TOKEN_BUDGET, _LLM_MODEL_NAME)
+    context_tokens = sum(u["used"] for u in usage.values())
+
+    user_msg = f"决策问题：{decision_query}"
     context_parts = []
     if user_profile:
         context_parts.append(f"【用户画像】\n{user_profile}")
-    if rag_context:
-        context_parts.append(f"【知识库参考】\n{rag_context[:2000]}")
-    if web_context:
-        context_parts.append(f"【{current_year}年实时数据】\n{web_context[:1000]}")
-
-    user_msg = f"决策问题：{decision_query}"
+    if context:
+        context_parts.append(context)
     if context_parts:
         user_msg += "\n\n" + "\n\n".join(context_parts)
 
-    try:
-        resp = llm.invoke([_SM(content=system_prompt), _HM(content=user_msg)])
-        content = resp.content
-        if isinstance(content, list):
-            content = " ".join(
-                item.get("text", "") if isinstance(item, dict) else str(item)
-                for item in content
-            )
-        result = str(content)
+    system_prompt = _decision_system_prompt(current_year, report_length_hint(context_tokens))
+    usage["total_input_tokens"] = count_tokens(system_prompt, _LLM_MODEL_NAME) + count_tokens(user_msg, _LLM_MODEL_NAME)
+    return system_prompt, user_msg, usage
+
+
+def build_decision_prompt(decision_query: str, user_profile: str = "", current_year: int = None):
+    """
+    检索知识库与网络数据，并在 token 预算内组装 full_decision_analysis 的 prompt。
+    检索到的来源登记到全局 CitationManager。
+
+    Returns:
+        (system_prompt, user_msg, usage)  usage 为各分区的 token 用量
+    """
+    from datetime import datetime as _dt
+    current_year = current_year or _dt.now().year
+
+    kb_snippets, kb_docs = _collect_knowledge_snippets(decision_query)
+    web_snippets, web_docs = _collect_web_snippets(decision_query, current_year)
+    return _finish_decision_prompt(decision_query, user_profile, current_year,
+                                   kb_snippets, kb_docs, web_snippets, web_docs)
+
+
+async def abuild_decision_prompt(decision_query: str, user_profile: str = "", current_year: int = None):
+    """
+    build_decision_prompt 的异步版本：知识库检索（CPU + Chroma）与网络搜索（ddgs 只有同步接口）
+    各占一个工作线程并行执行，事件循环不被阻塞。asyncio.to_thread 会复制 contextvars，阶段 span 照常挂在请求 trace 下。
+    """
+    from datetime import datetime as _dt
+    current_year = current_year or _dt.now().year
+
+    (kb_snippets, kb_docs), (web_snippets, web_docs) = await asyncio.gather(
+        asyncio.to_thread(_collect_knowledge_snippets, decision_query),
+        asyncio.to_thread(_collect_web_snippets, decision_query, current_year),
+    )
+    return _finish_decision_prompt(decision_query, user_profile, current_year,
+                                   kb_snippets, kb_docs, web_snippets, web_docs)
+
 
-        # ── Citation：将本轮 RAG + Web Search 来源追加到报告末尾 ────────────
-        if CITATION_ENABLED and _citation_mgr is not None and _citation_mgr.has_sources:
-            cited = _citation_mgr.build_cited_decision(
+def _finish_decision_prompt(decision_query, user_profile, current_year,
+                            kb_snippets, kb_docs, web_snippets, web_docs):
+    """登记引用来源，并在 token 预算内组装 prompt"""
+    if CITATION_ENABLED and _citation_mgr is not None:
+        _citation_mgr.add_documents(kb_docs, source_type="knowledge_base")
+        _citation_mgr.add_documents(web_docs, source_type="web_search")
+
+    sections = [
+        PromptSection("knowledge", "知识库参考", kb_snippets, min_tokens=300),
+        PromptSection("web", f"{current_year}年实时数据", web_snippets),
+    ]
+    return assemble_decision_prompt(decision_query, user_profile, sections, current_year)
+
+
+def _append_citations(result: str, citation_mgr=None, intent_label: str = "general") -> str:
+    """
+    Citation：将本轮 RAG + Web Search 来源追加到报告末尾，并清空 CitationManager。
+    citation_mgr 为空时使用模块级单例。
+    """
+    citation_mgr = citation_mgr if citation_mgr is not None else _citation_mgr
+    if CITATION_ENABLED and citation_mgr is not None and citation_mgr.has_sources:
+        with span("citation", intent=intent_label) as sp:
+            cited = citation_mgr.build_cited_decision(
                 answer=result,
-                intent_label="general",
+                intent_label=intent_label,
                 include_all=True,
             )
+            sp.set(docs=len(cited.references))
             if cited.references:
                 ref_lines = ["\n\n---\n📎 **决策依据来源**\n"]
                 kb_refs  = [r for r in cited.references if r.source_type == "knowledge_base"]
@@ -1002,11 +1135,72 @@ def full_decision_analysis(decision_query: str, user_profile: str = "", mode: st
                     ref_lines.append("\n🌐 **网络搜索**")
                     ref_lines.extend(r.to_reference_str() for r in web_refs)
                 result += "\n".join(ref_lines)
-            _citation_mgr.clear()
+        citation_mgr.clear()
+    return result
 
-        return result
-    except Exception as e:
-        return f"分析失败：{str(e)}"
+
+@tool
+def full_decision_analysis(decision_query: str, user_profile: str = "", mode: str = "detailed") -> str:
+    """
+    【一站式决策分析】在单次调用内完成全部分析流程：
+    1. BM25+向量混合检索（RRF融合）+ Self-RAG过滤 + Cohere精排 ← 知识库RAG
+    2. DuckDuckGo实时网络搜索 ← 获取最新价格/政策/行业数据
+    3. Multi-Agent多角色单次LLM推理 ← 成本/风险/价值/个人匹配度四维分析
+    4. 生成【DecideX 综合决策报告】
+
+    等价于依次调用 cost_analysis_agent、risk_assessment_agent、
+    user_value_agent、personal_match_agent，但只消耗一次 LLM API 调用。
+
+    Args:
+        decision_query: 用户决策问题（完整原始问题）
+        user_profile:   用户画像JSON字符串（城市/预算/风险偏好等）
+        mode:           输出模式，"detailed"（完整报告）或 "simple"（精简结论，200字以内）
+
+    Returns:
+        含成本/风险/价值/个人匹配度的完整决策报告（Markdown格式）
+    """
+    from langchain_core.messages import HumanMessage as _HM, SystemMessage as _SM
+
+    with span("full_decision_analysis"):
+        # 无论 mode 如何，内部始终生成完整详细报告（压缩由 backend_proxy 的 _compress_to_simple 处理）
+        try:
+            system_prompt, user_msg, usage = build_decision_prompt(decision_query, user_profile)
+            with span("llm_analysis", model=_LLM_MODEL_NAME,
+                      prompt_tokens_est=usage.get("total_input_tokens", 0)) as sp:
+                resp = llm.invoke([_SM(content=system_prompt), _HM(content=user_msg)])
+                record_llm_usage(sp, resp)
+            return _append_citations(_message_text(resp.content))
+        except Exception as e:
+            return f"分析失败：{str(e)}"
+
+
+def _message_text(content) -> str:
+    """LLM 返回的 content 可能是分段列表，统一拼成字符串"""
+    if isinstance(content, list):
+        return " ".join(
+            item.get("text", "") if isinstance(item, dict) else str(item)
+            for item in content
+        )
+    return str(content)
+
+
+async def afull_decision_analysis(decision_query: str, user_profile: str = "", mode: str = "detailed") -> str:
+    """
+    full_decision_analysis 的原生异步版本（backend_proxy /chat 使用）。
+    检索阶段在线程中并行执行，LLM 通过 ainvoke 等待，等待期间不占用任何线程。
+    """
+    from langchain_core.messages import HumanMessage as _HM, SystemMessage as _SM
+
+    with span("full_decision_analysis"):
+        try:
+            system_prompt, user_msg, usage = await abuild_decision_prompt(decision_query, user_profile)
+            with span("llm_analysis", model=_LLM_MODEL_NAME,
+                      prompt_tokens_est=usage.get("total_input_tokens", 0)) as sp:
+                resp = await llm.ainvoke([_SM(content=system_prompt), _HM(content=user_msg)])
+                record_llm_usage(sp, resp)
+            return _append_citations(_message_text(resp.content))
+        except Exception as e:
+            return f"分析失败：{str(e)}"
 
 
 comprehensive_agent = create_react_agent(
@@ -0,0 +1,255 @@
+"""
+本地意图分类器（Tiered Intent Engine 第一层）
+
+recognize_intent 每次都要调用一次 Gemini 才能从 7 个标签里选一个。
+本模块在 LLM 之前加一层本地分类：
+
+  用户输入 ──embedding──► 最近类中心（nearest centroid）
+                              │
+              置信度 ≥ INTENT_LOCAL_THRESHOLD ──► 直接返回（毫秒级，无 API 调用）
+                              │
+                         置信度不足 ──► 交给 LLM（intent_recognition.recognize_intent）
+
+训练数据：
+  - evaluation/test_set.jsonl 中的人工标注样本
+  - data/intent_history.jsonl：LLM 高置信度识别结果的日志（recognize_intent 自动追加）
+
+置信度：对各类中心的余弦相似度做温度 softmax 后的最大概率。
+
+本地层不调用 LLM，关键要素由 extract_local_factors 按领域词表 + 金额规则从原文中抽取，
+保证走本地层时下游 prompt 仍然拿得到 key_factors。
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+# ============================================================
+# 配置
+# ============================================================
+
+TEST_SET_PATH = os.path.join(_ROOT, "evaluation", "test_set.jsonl")
+HISTORY_PATH = os.getenv(
+    "INTENT_HISTORY_PATH", os.path.join(_ROOT, "data", "intent_history.jsonl")
+)
+
+# 本地分类器置信度阈值：高于此值直接采用本地结果
+LOCAL_THRESHOLD = float(os.getenv("INTENT_LOCAL_THRESHOLD", "0.6"))
+# softmax 温度（越小越"尖锐"）
+SOFTMAX_TEMPERATURE = float(os.getenv("INTENT_SOFTMAX_T", "0.05"))
+# LLM 结果置信度达到该值才写入历史日志，作为后续训练样本
+HISTORY_MIN_CONFIDENCE = float(os.getenv("INTENT_HISTORY_MIN_CONF", "0.8"))
+HISTORY_ENABLED = os.getenv("INTENT_HISTORY", "1") != "0"
+
+_history_lock = threading.Lock()
+
+
+# ============================================================
+# 训练数据
+# ============================================================
+
+def _read_jsonl(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                continue
+    return rows
+
+
+def load_training_data(exclude_ids: Optional[set] = None) -> Tuple[List[str], List[str]]:
+    """合并测试集标注与 LLM 历史日志，返回 (texts, labels)"""
+    exclude_ids = exclude_ids or set()
+    texts, labels = [], []
+    excluded_texts = set()
+    for row in _read_jsonl(TEST_SET_PATH):
+        if row.get("id") in exclude_ids:
+            excluded_texts.add(row["input"])
+            continue
+        texts.append(row["input"])
+        labels.append(row["intent_label"])
+    for row in _read_jsonl(HISTORY_PATH):
+        # 留一法评估时，历史日志里同样的文本也要排除
+        if row.get("text") in excluded_texts:
+            continue
+        if row.get("text") and row.get("intent_label"):
+            texts.append(row["text"])
+            labels.append(row["intent_label"])
+    return texts, labels
+
+
+def log_intent_history(text: str, intent_label: str, confidence: float) -> None:
+    """记录一次高置信度的 LLM 识别结果，供本地分类器下次加载时学习"""
+    if not HISTORY_ENABLED or confidence < HISTORY_MIN_CONFIDENCE:
+        return
+    row = {"text": text, "intent_label": intent_label,
+           "confidence": round(float(confidence), 3), "ts": int(time.time())}
+    try:
+        os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+        with _history_lock, open(HISTORY_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+# ============================================================
+# 最近类中心分类器
+# ============================================================
+
+class IntentClassifier:
+    """基于句向量的最近类中心分类器"""
+
+    def __init__(self, embed_fn, temperature: float = SOFTMAX_TEMPERATURE):
+        self._embed = embed_fn
+        self.temperature = temperature
+        self.labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self._embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def fit(self, texts: List[str], labels: List[str]) -> "IntentClassifier":
+        if not texts:
+            raise ValueError("意图分类器训练数据为空")
+        vectors = self._encode(texts)
+        self.labels = sorted(set(labels))
+        label_arr = np.asarray(labels)
+        centroids = np.stack([vectors[label_arr == lb].mean(axis=0) for lb in self.labels])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._centroids = centroids
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        if self._centroids is None:
+            raise RuntimeError("意图分类器尚未训练")
+        sims = self._centroids @ self._encode([text])[0]
+        logits = sims / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        return {lb: float(p) for lb, p in zip(self.labels, probs)}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """返回 (intent_label, confidence)"""
+        probs = self.predict_proba(text)
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+
+# ============================================================
+# 进程内单例
+# ============================================================
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_failed = False
+_lock = threading.Lock()
+
+
+def get_classifier() -> Optional[IntentClassifier]:
+    """懒加载并训练默认分类器；embedding 不可用或无训练数据时返回 None"""
+    global _classifier, _classifier_failed
+    if _classifier is not None or _classifier_failed:
+        return _classifier
+    with _lock:
+        if _classifier is None and not _classifier_failed:
+            try:
+                from rag.embeddings import get_embedding_function
+                texts, labels = load_training_data()
+                _classifier = IntentClassifier(get_embedding_function()).fit(texts, labels)
+            except Exception as e:
+                _classifier_failed = True
+                print(f"[IntentClassifier] 本地分类器不可用，全部走 LLM：{e}")
+    return _classifier
+
+
+def reload_classifier() -> Optional[IntentClassifier]:
+    """丢弃当前分类器并用最新的训练数据（含新增历史日志）重新训练"""
+    global _classifier, _classifier_failed
+    with _lock:
+        _classifier = None
+        _classifier_failed = False
+    return get_classifier()
+
+
+def classify_local(text: str, threshold: float = LOCAL_THRESHOLD) -> Optional[Tuple[str, float]]:
+    """
+    本地分类。置信度达到阈值时返回 (intent_label, confidence)，否则返回 None（需要升级到 LLM）。
+    """
+    clf = get_classifier()
+    if clf is None:
+        return None
+    try:
+        label, confidence = clf.predict(text)
+    except Exception:
+        return None
+    return (label, confidence) if confidence >= threshold else None
+
+
+# ============================================================
+# 本地关键要素抽取
+# ============================================================
+
+# 各意图下常见的决策要素：原文中出现的词按出现顺序作为 key_factors
+_FACTOR_LEXICON: Dict[str, List[str]] = {
+    "career_choice": ["薪资", "涨薪", "期权", "股权", "晋升", "发展空间", "职业发展", "稳定性",
+                      "加班", "通勤", "团队", "平台", "创业", "大厂", "行业前景", "家庭"],
+    "investment":    ["收益", "回报", "风险", "流动性", "期限", "分散", "本金", "定投",
+                      "股票", "基金", "理财", "股权", "信息不对称", "风险偏好"],
+    "purchase":      ["预算", "价格", "首付", "月供", "房价", "贷款", "租金", "性能",
+                      "维护", "二手", "使用频率", "通勤", "区位", "性价比"],
+    "travel":        ["目的地", "预算", "假期", "行程", "签证", "季节", "同行", "住宿", "交通"],
+    "education":     ["费用", "学费", "时间投入", "证书", "含金量", "考研", "留学", "就业",
+                      "专业", "培训机构", "备考"],
+    "relationship":  ["信任", "借钱", "还款", "友情", "感情", "合作", "沟通", "边界"],
+}
+_COMMON_FACTORS = ["风险", "成本", "收益", "时间", "家庭", "长期发展"]
+
+# 本地层未从原文抽到任何要素时使用的默认要素
+_DEFAULT_FACTORS: Dict[str, List[str]] = {
+    "career_choice": ["薪资", "职业发展", "稳定性"],
+    "investment":    ["风险", "收益", "流动性"],
+    "purchase":      ["预算", "使用需求", "长期成本"],
+    "travel":        ["目的地", "预算", "时间安排"],
+    "education":     ["费用", "时间投入", "就业价值"],
+    "relationship":  ["信任", "关系维护", "财务风险"],
+    "general":       ["成本", "风险", "收益"],
+}
+
+_AMOUNT_RE = re.compile(r"\d+(?:\.\d+)?\s*(?:万|千|k|K|w|W|元|块)")
+
+
+def extract_local_factors(text: str, intent_label: str, limit: int = 5) -> List[str]:
+    """
+    不调用 LLM 的关键要素抽取：金额表述 + 领域词表命中（按原文出现顺序），
+    都没有命中时返回该意图的默认要素。
+    """
+    found: List[Tuple[int, str]] = []
+    for m in _AMOUNT_RE.finditer(text):
+        found.append((m.start(), f"金额{m.group(0).replace(' ', '')}"))
+    seen = set()
+    for term in _FACTOR_LEXICON.get(intent_label, []) + _COMMON_FACTORS:
+        pos = text.find(term)
+        if pos >= 0 and term not in seen:
+            seen.add(term)
+            found.append((pos, term))
+    factors = [term for _, term in sorted(found)][:limit]
+    return factors or list(_DEFAULT_FACTORS.get(intent_label, _DEFAULT_FACTORS["general"]))
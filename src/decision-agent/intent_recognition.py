@@ -14,12 +14,23 @@
 - education:        学习/教育规划
 - relationship:     人际/社交决策
 - general:          通用决策
+
+分层识别（Tiered）：
+  1. 本地最近类中心分类器（intent_classifier.py），置信度足够时直接返回（关键要素按本地规则抽取）
+  2. 置信度不足 / 有多轮对话上下文 → 调用 LLM（同时做问题重写与要素提取）
+  INTENT_LOCAL_TIER=0 可关闭第 1 层。
 """
 
+import copy
+import hashlib
 import json
 import re
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+
 import requests
 
 # 确保能找到上层模块
@@ -27,6 +38,13 @@ _ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
 if _ROOT not in sys.path:
     sys.path.insert(0, _ROOT)
 
+# 缓存命中计入当前 span（rag/tracing.py）；rag 依赖缺失时忽略
+try:
+    from rag.tracing import incr as _trace_incr
+except ImportError:
+    def _trace_incr(key, n=1):
+        pass
+
 try:
     from langchain_google_genai import ChatGoogleGenerativeAI
     def _resolve_google_model() -> str:
@@ -69,6 +87,21 @@ except ImportError:
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
+try:
+    from .intent_classifier import classify_local, extract_local_factors, log_intent_history
+except ImportError:
+    # 以独立文件方式加载（evaluation/evaluate.py、backend_proxy.py）时没有父包
+    _AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
+    if _AGENT_DIR not in sys.path:
+        sys.path.insert(0, _AGENT_DIR)
+    from intent_classifier import classify_local, extract_local_factors, log_intent_history
+
+LOCAL_TIER_ENABLED = os.getenv("INTENT_LOCAL_TIER", "1") != "0"
+
+# 意图识别结果缓存（TTL + LRU）
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "512"))
+INTENT_CACHE_TTL_S = float(os.getenv("INTENT_CACHE_TTL_S", "600"))
+
 
 # ============================================================
 # 意图分类体系
@@ -112,17 +145,85 @@ INTENT_SYSTEM_PROMPT = """你是一个决策意图分析专家。请分析用户
 }"""
 
 
+# ============================================================
+# 结果缓存
+# ============================================================
+
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(user_input: str, conversation_history: list, use_local: bool) -> tuple:
+    """归一化输入 + 最近 6 轮对话历史的哈希（与注入 prompt 的范围一致）"""
+    normalized = " ".join(user_input.split())
+    history_hash = ""
+    if conversation_history:
+        recent = [(m.get("role", ""), m.get("content", "")) for m in conversation_history[-6:]]
+        history_hash = hashlib.sha1(
+            json.dumps(recent, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+    return (normalized, history_hash, use_local)
+
+
+def _cache_get(key: tuple):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+    _trace_incr("intent_cache_hits")
+    return copy.deepcopy(result)
+
+
+def _cache_put(key: tuple, result: dict) -> None:
+    if INTENT_CACHE_SIZE <= 0:
+        return
+    with _cache_lock:
+        _cache[key] = (time.monotonic() + INTENT_CACHE_TTL_S, copy.deepcopy(result))
+        _cache.move_to_end(key)
+        while len(_cache) > INTENT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def clear_intent_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
 # ============================================================
 # 核心函数
 # ============================================================
 
-def recognize_intent(user_input: str, conversation_history: list = None) -> dict:
+def _coerce_confidence(value, default: float = 0.5) -> float:
+    """LLM 返回的 confidence 可能是 "0.8"、"85%" 甚至 "高"：能解析则截断到 [0, 1]，否则取默认值"""
+    try:
+        if isinstance(value, str) and value.strip().endswith("%"):
+            number = float(value.strip()[:-1]) / 100
+        else:
+            number = float(value)
+    except (TypeError, ValueError):
+        return default
+    if number != number:  # NaN
+        return default
+    return min(max(number, 0.0), 1.0)
+
+
+def recognize_intent(
+    user_input: str,
+    conversation_history: list = None,
+    use_local: bool = True,
+) -> dict:
     """
     对用户输入进行意图识别与问题重写。
 
     Args:
         user_input:           用户原始输入
         conversation_history: 多轮对话历史 [{"role": "user/assistant", "content": "..."}]
+        use_local:            是否先尝试本地分类器（有对话历史时总是直接走 LLM）
 
     Returns:
         {
@@ -131,9 +232,38 @@ def recognize_intent(user_input: str, conversation_history: list = None) -> dict
             "rewritten_query": str,
             "key_factors": list,
             "confidence": float,
-            "original_query": str
+            "original_query": str,
+            "tier": "local" / "llm" / "fallback",
+            "cached": True（仅缓存命中时出现）
         }
+
+    相同输入 + 相同最近 6 轮历史的结果会缓存 INTENT_CACHE_TTL_S 秒，
+    命中时直接返回已解析的 dict（副本），不再调用 LLM。
     """
+    key = _cache_key(user_input, conversation_history, use_local)
+    cached = _cache_get(key)
+    if cached is not None:
+        cached["cached"] = True
+        return cached
+
+    # ── 第 1 层：本地分类器（不做问题重写，key_factors 由本地规则抽取）──────────
+    if use_local and LOCAL_TIER_ENABLED and not conversation_history:
+        local = classify_local(user_input)
+        if local is not None:
+            label, confidence = local
+            result = {
+                "intent_label": label,
+                "intent_desc": INTENT_LABELS.get(label, ""),
+                "rewritten_query": user_input,
+                "key_factors": extract_local_factors(user_input, label),
+                "confidence": round(confidence, 3),
+                "original_query": user_input,
+                "tier": "local",
+            }
+            _cache_put(key, result)
+            return result
+
+    # ── 第 2 层：LLM ──────────────────────────────────────────────────────
     messages = [SystemMessage(content=INTENT_SYSTEM_PROMPT)]
 
     # 注入对话历史上下文（最近3轮）
@@ -157,7 +287,14 @@ def recognize_intent(user_input: str, conversation_history: list = None) -> dict
         raw = re.sub(r"```\s*", "", raw)
 
         result = json.loads(raw)
+        result["confidence"] = _coerce_confidence(result.get("confidence"))
         result["original_query"] = user_input
+        result["tier"] = "llm"
+
+        # 无上下文的高置信度结果记入历史，作为本地分类器的训练样本
+        if not conversation_history and result.get("intent_label") in INTENT_LABELS:
+            log_intent_history(user_input, result["intent_label"], result["confidence"])
+        _cache_put(key, result)
         return result
 
     except Exception as e:
@@ -169,6 +306,7 @@ def recognize_intent(user_input: str, conversation_history: list = None) -> dict
             "key_factors": [],
             "confidence": 0.5,
             "original_query": user_input,
+            "tier": "fallback",
         }
 
 
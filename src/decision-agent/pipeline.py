@@ -0,0 +1,272 @@
+"""
+决策型 Agent 系统 - 确定性直连流水线（不经过 Supervisor）
+
+graph.py 导出的 supervisor graph 中，每条消息先经过 supervisor LLM 路由，
+再由 comprehensive_agent（又一个 LLM）决定调用 full_decision_analysis —— 这两次以上的
+LLM 往返只是路由开销。本模块用一个编译好的确定性 StateGraph 直接完成同样的工作：
+
+  recognize_intent ──┬── retrieve_knowledge ──┐
+                     ├── retrieve_web ────────┼──► analysis ──► citation ──► persist ──► END
+                     └── retrieve_memory ─────┘
+
+  - recognize_intent：意图识别（本地分类器优先，见 intent_classifier.py）
+  - retrieve_*：知识库 RAG / 网络搜索 / 历史决策记忆，三路并行
+  - analysis：在 token 预算内组装上下文，单次 LLM 多角色推理
+  - citation：本次运行独立的 CitationManager 生成参考来源，不与其它请求共享
+  - persist：保存决策到向量库（PIPELINE_PERSIST=0 关闭）
+
+LLM 调用：意图识别（本地命中时 0 次）+ 分析 1 次。
+输入与 supervisor graph 相同（messages），也可直接传 decision_query / user_profile / user_id。
+在 langgraph.json 中注册为 "decision-pipeline"。
+"""
+
+import operator
+import os
+import re
+import time
+from datetime import datetime
+from typing import Annotated, List
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from .graph import (
+    CITATION_ENABLED,
+    INTENT_ENABLED,
+    RAG_ENABLED,
+    PromptSection,
+    Snippet,
+    _append_citations,
+    _collect_knowledge_snippets,
+    _collect_web_snippets,
+    assemble_decision_prompt,
+    llm,
+)
+
+if INTENT_ENABLED:
+    from .intent_recognition import recognize_intent
+if RAG_ENABLED:
+    from rag.vector_store import retrieve_similar_decisions, save_decision
+if CITATION_ENABLED:
+    from .citation import CitationManager
+
+PERSIST_ENABLED = os.getenv("PIPELINE_PERSIST", "1") != "0"
+
+
+# ============================================================================
+# 状态
+# ============================================================================
+
+class PipelineState(TypedDict, total=False):
+    messages: Annotated[list, add_messages]
+    decision_query: str
+    user_profile: str
+    user_id: str
+    intent: dict
+    current_year: int
+    # 三路检索结果：Snippet 进 prompt，Document 进 citation
+    knowledge: List[Snippet]
+    knowledge_docs: List[Document]
+    web: List[Snippet]
+    web_docs: List[Document]
+    memory: List[Snippet]
+    memory_docs: List[Document]
+    report: str
+    # 各节点耗时（ms），并行节点各自追加
+    timings: Annotated[list, operator.add]
+
+
+def _parse_message(text: str):
+    """
+    解析 backend_proxy 注入的消息格式：
+      【用户画像】\\n{json}\\n\\n...\\n\\n【用户问题】{question}
+    返回 (decision_query, user_profile)。
+    """
+    profile = ""
+    m = re.search(r"【用户画像】\s*\n(.*?)(?:\n\n|$)", text, re.S)
+    if m:
+        profile = m.group(1).strip()
+    if "【用户问题】" in text:
+        return text.split("【用户问题】", 1)[1].strip(), profile
+    return text.strip(), profile
+
+
+def _timed(name: str, start: float) -> list:
+    return [{"node": name, "ms": round((time.perf_counter() - start) * 1000, 1)}]
+
+
+def _message_text(content) -> str:
+    """兼容 Gemini list 格式和普通字符串"""
+    if isinstance(content, list):
+        return " ".join(
+            item.get("text", "") if isinstance(item, dict) else str(item)
+            for item in content
+        )
+    return str(content or "")
+
+
+# ============================================================================
+# 节点
+# ============================================================================
+
+def intent_node(state: PipelineState) -> dict:
+    start = time.perf_counter()
+    query, profile = state.get("decision_query", ""), state.get("user_profile", "")
+    if not query:
+        humans = [m for m in state.get("messages", []) if isinstance(m, HumanMessage)]
+        if humans:
+            query, parsed_profile = _parse_message(_message_text(humans[-1].content))
+            profile = profile or parsed_profile
+
+    intent = {"intent_label": "general", "key_factors": [], "tier": "disabled"}
+    if INTENT_ENABLED and query:
+        try:
+            intent = recognize_intent(query)
+        except Exception as e:
+            print(f"[Pipeline] 意图识别失败，按 general 处理：{e}")
+
+    return {
+        "decision_query": query,
+        "user_profile": profile,
+        "intent": intent,
+        "current_year": datetime.now().year,
+        "timings": _timed("recognize_intent", start),
+    }
+
+
+def retrieve_knowledge_node(state: PipelineState) -> dict:
+    start = time.perf_counter()
+    snippets, docs = _collect_knowledge_snippets(state["decision_query"])
+    return {"knowledge": snippets, "knowledge_docs": docs, "timings": _timed("retrieve_knowledge", start)}
+
+
+def retrieve_web_node(state: PipelineState) -> dict:
+    start = time.perf_counter()
+    snippets, docs = _collect_web_snippets(state["decision_query"], state["current_year"])
+    return {"web": snippets, "web_docs": docs, "timings": _timed("retrieve_web", start)}
+
+
+def retrieve_memory_node(state: PipelineState) -> dict:
+    """检索该用户的相似历史决策（supervisor 路径由 user_value_agent 完成）"""
+    start = time.perf_counter()
+    snippets, docs = [], []
+    if RAG_ENABLED:
+        try:
+            decisions = retrieve_similar_decisions(
+                state["decision_query"], n_results=2, user_id=state.get("user_id") or "default"
+            )
+        except Exception:
+            decisions = []
+        for d in decisions:
+            text = f"- 决策场景：{d['scenario']}\n- 当时结论：{d['decision']}"
+            if d.get("preference_tags"):
+                text += f"\n- 偏好标签：{d['preference_tags']}"
+            snippets.append(Snippet(text=text, score=float(d["similarity"]), source="memory"))
+            docs.append(Document(
+                page_content=text,
+                metadata={"_collection": "decision_memory", "_rerank_score": d["similarity"]},
+            ))
+    return {"memory": snippets, "memory_docs": docs, "timings": _timed("retrieve_memory", start)}
+
+
+def analysis_node(state: PipelineState) -> dict:
+    start = time.perf_counter()
+    year = state["current_year"]
+    sections = [
+        PromptSection("knowledge", "知识库参考", list(state.get("knowledge", [])), min_tokens=300),
+        PromptSection("memory", "用户历史决策参考", list(state.get("memory", []))),
+        PromptSection("web", f"{year}年实时数据", list(state.get("web", []))),
+    ]
+    system_prompt, user_msg, _ = assemble_decision_prompt(
+        state["decision_query"], state.get("user_profile", ""), sections, year
+    )
+    factors = state.get("intent", {}).get("key_factors") or []
+    if factors:
+        user_msg += f"\n\n【关键决策要素】{'、'.join(factors)}"
+
+    try:
+        resp = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=user_msg)])
+        report = _message_text(resp.content)
+    except Exception as e:
+        report = f"分析失败：{str(e)}"
+    return {"report": report, "timings": _timed("analysis", start)}
+
+
+def citation_node(state: PipelineState) -> dict:
+    """每次运行使用独立的 CitationManager，并发请求之间互不干扰"""
+    start = time.perf_counter()
+    report = state.get("report", "")
+    if CITATION_ENABLED and not report.startswith("分析失败"):
+        mgr = CitationManager()
+        mgr.add_documents(state.get("knowledge_docs", []), source_type="knowledge_base")
+        mgr.add_documents(state.get("memory_docs", []), source_type="memory")
+        mgr.add_documents(state.get("web_docs", []), source_type="web_search")
+        report = _append_citations(
+            report, citation_mgr=mgr,
+            intent_label=state.get("intent", {}).get("intent_label", "general"),
+        )
+    return {"report": report, "timings": _timed("citation", start)}
+
+
+def _report_section(report: str, title: str, limit: int = 300) -> str:
+    """从报告中截取某个 ## 小节的正文"""
+    m = re.search(rf"##[^\n]*{title}[^\n]*\n(.*?)(?=\n##|\n---|$)", report, re.S)
+    return m.group(1).strip()[:limit] if m else ""
+
+
+def persist_node(state: PipelineState) -> dict:
+    start = time.perf_counter()
+    report = state.get("report", "")
+    if PERSIST_ENABLED and RAG_ENABLED and not report.startswith("分析失败"):
+        try:
+            doc_id = save_decision(
+                user_query=state["decision_query"],
+                decision_result=_report_section(report, "综合推荐", 500) or report[:500],
+                cost_summary=_report_section(report, "成本分析"),
+                risk_summary=_report_section(report, "风险评估"),
+                value_summary=(
+                    f"{_report_section(report, '价值评估', 150)} | "
+                    f"匹配度：{_report_section(report, '个人匹配度', 150)}"
+                ),
+                user_id=state.get("user_id") or "default",
+            )
+            report += f"\n\n📝 *本次决策已记录（ID: {doc_id[:20]}...），将用于未来个性化分析。*"
+        except Exception as e:
+            print(f"[Pipeline] 决策记录保存失败：{e}")
+
+    timings = _timed("persist", start)
+    summary = " ".join(f"{t['node']}={t['ms']}ms" for t in state.get("timings", []) + timings)
+    print(f"[Pipeline] {summary}")
+    return {"report": report, "messages": [AIMessage(content=report)], "timings": timings}
+
+
+# ============================================================================
+# 编译
+# ============================================================================
+
+def build_pipeline():
+    builder = StateGraph(PipelineState)
+    # 节点名不能与状态字段 intent 重名
+    builder.add_node("recognize_intent", intent_node)
+    builder.add_node("retrieve_knowledge", retrieve_knowledge_node)
+    builder.add_node("retrieve_web", retrieve_web_node)
+    builder.add_node("retrieve_memory", retrieve_memory_node)
+    builder.add_node("analysis", analysis_node)
+    builder.add_node("citation", citation_node)
+    builder.add_node("persist", persist_node)
+
+    builder.add_edge(START, "recognize_intent")
+    retrievers = ["retrieve_knowledge", "retrieve_web", "retrieve_memory"]
+    for name in retrievers:
+        builder.add_edge("recognize_intent", name)
+    builder.add_edge(retrievers, "analysis")
+    builder.add_edge("analysis", "citation")
+    builder.add_edge("citation", "persist")
+    builder.add_edge("persist", END)
+    return builder.compile()
+
+
+graph = build_pipeline()
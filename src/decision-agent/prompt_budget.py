@@ -0,0 +1,257 @@
+"""
+Prompt 预算组装（Token-budgeted Prompt Assembly）
+
+full_decision_analysis 以前按字符数硬截断上下文（rag_context[:2000]、web_context[:1000]），
+不考虑 token、不考虑相关度，重复片段也会原样送进 LLM。本模块：
+
+  1. count_tokens()       按当前模型计 token（有 tiktoken 用 tiktoken，否则按中英文字符估算）
+  2. dedup_snippets()     跨分区去除近似重复片段（字符 3-gram Jaccard）
+  3. allocate_budget()    按各分区片段相关度之和分配总预算，用不完的额度再分给其它分区
+  4. build_context()      按相关度从高到低填充各分区，超出额度时按 token 截断，并记录每个分区的用量
+  5. report_length_hint() 根据实际上下文量调整报告字数要求（上下文很薄时不再强求 800 字）
+
+配置：
+  PROMPT_CONTEXT_TOKENS   上下文总预算（默认 1500）
+  PROMPT_DEDUP_THRESHOLD  近似重复判定阈值（默认 0.8）
+  PROMPT_BUDGET_LOG=0     关闭每次请求的分区用量日志
+"""
+
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# ============================================================
+# 配置
+# ============================================================
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1500"))
+DEDUP_THRESHOLD = float(os.getenv("PROMPT_DEDUP_THRESHOLD", "0.8"))
+BUDGET_LOG = os.getenv("PROMPT_BUDGET_LOG", "1") != "0"
+
+# 片段被截断后至少要保留的 token 数
+_MIN_TRUNCATED_TOKENS = 40
+
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+
+# ============================================================
+# Token 计数
+# ============================================================
+
+_encoders: Dict[str, object] = {}
+
+
+def _get_encoder(model: Optional[str]):
+    """tiktoken 编码器（仅 OpenAI 系模型）；不可用时返回 None"""
+    key = model or ""
+    if key in _encoders:
+        return _encoders[key]
+    enc = None
+    if model and not model.startswith("gemini"):
+        try:
+            import tiktoken
+            try:
+                enc = tiktoken.encoding_for_model(model)
+            except KeyError:
+                enc = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            enc = None
+    _encoders[key] = enc
+    return enc
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    估算 text 在指定模型下的 token 数。
+    Gemini 没有本地 tokenizer，按经验估算：中文约 1 字 1 token，其它字符约 4 个 1 token。
+    """
+    if not text:
+        return 0
+    enc = _get_encoder(model)
+    if enc is not None:
+        return len(enc.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """把 text 截断到不超过 max_tokens（二分查找字符长度，末尾的省略号也计入额度）"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid].rstrip() + "…", model) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + "…" if lo else ""
+
+
+# ============================================================
+# 数据结构
+# ============================================================
+
+@dataclass
+class Snippet:
+    """一条候选上下文片段"""
+    text: str
+    score: float = 0.5          # 相关度（0~1），决定分区预算和填充顺序
+    source: str = ""
+
+
+@dataclass
+class PromptSection:
+    """一个上下文分区（如【知识库参考】【实时数据】）"""
+    name: str
+    title: str
+    snippets: List[Snippet] = field(default_factory=list)
+    min_tokens: int = 0         # 有内容时至少分配的额度
+    max_tokens: Optional[int] = None
+
+
+# ============================================================
+# 近似去重
+# ============================================================
+
+def _shingles(text: str, n: int = 3) -> set:
+    compact = re.sub(r"\s+", "", text)
+    if len(compact) <= n:
+        return {compact} if compact else set()
+    return {compact[i:i + n] for i in range(len(compact) - n + 1)}
+
+
+def dedup_snippets(sections: List[PromptSection], threshold: float = DEDUP_THRESHOLD) -> int:
+    """
+    跨分区去除近似重复片段：两两比较 3-gram Jaccard，重复时保留相关度更高的一条。
+    原地修改 sections，返回删除的片段数。
+    """
+    ranked = sorted(
+        ((s.score, si, i) for si, sec in enumerate(sections) for i, s in enumerate(sec.snippets)),
+        reverse=True,
+    )
+    kept_shingles: List[set] = []
+    drop = set()
+    for _, si, i in ranked:
+        sh = _shingles(sections[si].snippets[i].text)
+        if not sh:
+            drop.add((si, i))
+            continue
+        if any(len(sh & k) / len(sh | k) >= threshold for k in kept_shingles):
+            drop.add((si, i))
+            continue
+        kept_shingles.append(sh)
+    for si, sec in enumerate(sections):
+        sec.snippets = [s for i, s in enumerate(sec.snippets) if (si, i) not in drop]
+    return len(drop)
+
+
+# ============================================================
+# 预算分配与组装
+# ============================================================
+
+def allocate_budget(sections: List[PromptSection], total: int, model: Optional[str] = None) -> Dict[str, int]:
+    """
+    按相关度之和分配 token 预算。
+    每个分区的额度不超过其实际需要；多出来的额度按比例再分给仍有需要的分区（注水法）。
+    """
+    need = {
+        sec.name: min(sum(count_tokens(s.text, model) for s in sec.snippets),
+                      sec.max_tokens if sec.max_tokens is not None else 10 ** 9)
+        for sec in sections
+    }
+    alloc = {sec.name: 0 for sec in sections}
+
+    # 先满足最低额度
+    remaining = total
+    for sec in sections:
+        if need[sec.name] and sec.min_tokens:
+            give = min(sec.min_tokens, need[sec.name], remaining)
+            alloc[sec.name] += give
+            remaining -= give
+
+    weight = {sec.name: sum(max(s.score, 0.01) for s in sec.snippets) for sec in sections}
+    while remaining > 0:
+        open_secs = [n for n in alloc if alloc[n] < need[n]]
+        if not open_secs:
+            break
+        total_w = sum(weight[n] for n in open_secs) or 1.0
+        spent = 0
+        for n in open_secs:
+            give = min(need[n] - alloc[n], max(1, int(remaining * weight[n] / total_w)), remaining - spent)
+            alloc[n] += give
+            spent += give
+        remaining -= spent
+        if spent == 0:
+            break
+    return alloc
+
+
+def build_context(
+    sections: List[PromptSection],
+    total_budget: int = CONTEXT_TOKEN_BUDGET,
+    model: Optional[str] = None,
+) -> Tuple[str, Dict[str, dict]]:
+    """
+    去重 → 分配预算 → 按相关度填充各分区。
+
+    Returns:
+        (context_text, usage)
+        usage: {section_name: {"allocated", "used", "kept", "dropped"}}
+    """
+    before = {sec.name: len(sec.snippets) for sec in sections}
+    dedup_snippets(sections)
+    alloc = allocate_budget(sections, total_budget, model)
+
+    parts = []
+    usage: Dict[str, dict] = {}
+    for sec in sections:
+        budget = alloc.get(sec.name, 0)
+        used = 0
+        kept: List[str] = []
+        for snip in sorted(sec.snippets, key=lambda s: s.score, reverse=True):
+            left = budget - used
+            if left <= 0:
+                break
+            # 剩余额度太小时不再塞入截断后的残句
+            if left < _MIN_TRUNCATED_TOKENS and count_tokens(snip.text, model) > left:
+                break
+            text = truncate_to_tokens(snip.text, left, model)
+            if not text:
+                break
+            kept.append(text)
+            used += count_tokens(text, model)
+        if kept:
+            parts.append(f"【{sec.title}】\n" + "\n\n".join(kept))
+        usage[sec.name] = {
+            "allocated": budget,
+            "used": used,
+            "kept": len(kept),
+            "dropped": before[sec.name] - len(kept),
+        }
+
+    if BUDGET_LOG:
+        summary = "，".join(
+            f"{name} {u['used']}/{u['allocated']}tok 保留{u['kept']} 丢弃{u['dropped']}"
+            for name, u in usage.items()
+        )
+        print(f"[PromptBudget] 总预算 {total_budget}tok：{summary}")
+    return "\n\n".join(parts), usage
+
+
+def report_length_hint(context_tokens: int) -> int:
+    """
+    报告最少字数：上下文越少，越不应要求长篇（避免模型凭空扩写）。
+    返回 0 表示不设下限。
+    """
+    if context_tokens >= 900:
+        return 800
+    if context_tokens >= 400:
+        return 600
+    if context_tokens > 0:
+        return 400
+    return 0
@@ -9,6 +9,7 @@ C. 低收益停止：本轮新增观点/信息 < delta_info 阈值，或重复
 A. 硬停止（保底）：分析轮次 ≥ max_rounds 必须结束
 """
 
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -129,14 +130,20 @@ def evaluate_stopping(state: StoppingState, current: RoundResult) -> tuple:
 # 轻量版：供 Agent 工具调用的简化接口
 # ============================================================
 
-# 全局状态（单次对话生命周期内）
-_stopping_state = StoppingState()
+# 单次对话的状态按请求上下文隔离（并发请求 / 多 worker 互不影响）；
+# 请求上下文之外使用进程级默认状态
+_default_stopping_state = StoppingState()
+_stopping_state_var: ContextVar = ContextVar("decidex_stopping_state", default=None)
+
+
+def _current_stopping_state() -> StoppingState:
+    state = _stopping_state_var.get()
+    return state if state is not None else _default_stopping_state
 
 
 def reset_stopping_state():
-    """每次新对话开始时重置状态"""
-    global _stopping_state
-    _stopping_state = StoppingState()
+    """每次新对话开始时重置状态（在请求入口调用，只作用于当前请求上下文）"""
+    _stopping_state_var.set(StoppingState())
 
 
 def check_should_stop(
@@ -162,15 +169,16 @@ def check_should_stop(
             "round_num": int
         }
     """
+    state = _current_stopping_state()
     current = RoundResult(
-        round_num=len(_stopping_state.rounds) + 1,
+        round_num=len(state.rounds) + 1,
         top_recommendation=top_recommendation,
         confidence_scores=confidence_scores,
         key_points=key_points,
         controversy_count=controversy_count,
     )
 
-    should_stop, reason, stop_type = evaluate_stopping(_stopping_state, current)
+    should_stop, reason, stop_type = evaluate_stopping(state, current)
 
     return {
         "should_stop": should_stop,
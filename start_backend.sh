@@ -11,5 +11,18 @@ if ! python3 -c "import fastapi" 2>/dev/null; then
 fi
 
 # 启动后端代理服务
+# WEB_CONCURRENCY > 1 时使用 gunicorn 多 worker 模式（配置见 gunicorn.conf.py）
+# 多 worker 不能共享 Chroma 本地目录，需要先启动 Chroma 服务并设置 CHROMA_SERVER_URL
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+    if [ -z "${CHROMA_SERVER_URL}" ]; then
+        echo "❌ WEB_CONCURRENCY=${WEB_CONCURRENCY} 需要设置 CHROMA_SERVER_URL"
+        echo "   先启动 Chroma 服务：chroma run --path data/chroma_db --port 8000"
+        echo "   再执行：CHROMA_SERVER_URL=http://127.0.0.1:8000 WEB_CONCURRENCY=${WEB_CONCURRENCY} ./start_backend.sh"
+        exit 1
+    fi
+    echo "📡 启动后端代理服务（端口 ${PORT:-8123}，${WEB_CONCURRENCY} 个 worker）..."
+    exec gunicorn backend_proxy:app -c gunicorn.conf.py
+fi
+
 echo "📡 启动后端代理服务（端口 8123）..."
 python3 backend_proxy.py
@@ -0,0 +1,56 @@
+import importlib
+import importlib.util
+import os
+import sys
+
+import pytest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 三个 agent 模板的 src/utils 完全一致，单元测试针对 user_value_agent 这一份
+TEMPLATE_SRC = os.path.join(_ROOT, "user_value_agent", "src")
+AGENT_DIR = os.path.join(_ROOT, "src", "decision-agent")
+LOADTEST_DIR = os.path.join(_ROOT, "evaluation", "loadtest")
+
+for path in (_ROOT, TEMPLATE_SRC, AGENT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def decision_agent():
+    """
+    以包 decision_agent 的形式加载 src/decision-agent，返回 load(submodule)。
+    LLM / 网络搜索 / embedding 换成 evaluation/loadtest/fakes.py 的离线替身，
+    结束后还原环境变量与被替换的模块。
+    """
+    sys.path.insert(0, LOADTEST_DIR)
+    import fakes
+    import rag.embeddings as embeddings
+
+    saved_env = dict(os.environ)
+    saved_modules = {name: sys.modules.get(name)
+                     for name in ("langchain_google_genai", "ddgs", "duckduckgo_search")}
+    saved_factory, saved_ef = embeddings.create_local_embedding_function, embeddings._ef
+    fakes.install()
+
+    if "decision_agent" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "decision_agent", os.path.join(AGENT_DIR, "__init__.py"),
+            submodule_search_locations=[AGENT_DIR],
+        )
+        pkg = importlib.util.module_from_spec(spec)
+        sys.modules["decision_agent"] = pkg
+        spec.loader.exec_module(pkg)
+
+    yield lambda name: importlib.import_module(f"decision_agent.{name}")
+
+    os.environ.clear()
+    os.environ.update(saved_env)
+    for name, mod in saved_modules.items():
+        if mod is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = mod
+    embeddings.create_local_embedding_function, embeddings._ef = saved_factory, saved_ef
+    sys.path.remove(LOADTEST_DIR)
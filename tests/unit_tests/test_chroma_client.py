@@ -0,0 +1,110 @@
+"""rag/chroma_client.py 与 gunicorn.conf.py：多 worker 必须使用 Chroma 服务"""
+
+import importlib.util
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from rag import chroma_client
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setattr(chroma_client, "_clients", {})
+    monkeypatch.setattr(chroma_client, "_write_locks", {})
+    monkeypatch.setattr(chroma_client, "CHROMA_SERVER_URL", "")
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    created = []
+
+    def persistent(path):
+        created.append(("persistent", path))
+        return SimpleNamespace(kind="persistent", path=path)
+
+    def http(host, port, ssl):
+        created.append(("http", host, port, ssl))
+        return SimpleNamespace(kind="http")
+
+    monkeypatch.setattr(chroma_client.chromadb, "PersistentClient", persistent)
+    monkeypatch.setattr(chroma_client.chromadb, "HttpClient", http)
+    return created
+
+
+def test_single_worker_uses_cached_persistent_client(clients, tmp_path):
+    path = str(tmp_path / "chroma_db")
+    client = chroma_client.get_client(path)
+    assert client.kind == "persistent"
+    assert chroma_client.get_client(path) is client
+    assert len(clients) == 1 and os.path.isdir(path)
+
+
+def test_multiple_workers_without_server_are_refused(clients, tmp_path, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(RuntimeError, match="CHROMA_SERVER_URL"):
+        chroma_client.get_client(str(tmp_path / "chroma_db"))
+    assert clients == []
+    chroma_client.require_server_for_workers(1)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("http://127.0.0.1:8000", ("http", "127.0.0.1", 8000, False)),
+    ("https://chroma.internal", ("http", "chroma.internal", 443, True)),
+    ("http://chroma", ("http", "chroma", 8000, False)),
+])
+def test_server_url_uses_http_client(clients, tmp_path, monkeypatch, url, expected):
+    monkeypatch.setattr(chroma_client, "CHROMA_SERVER_URL", url)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert chroma_client.get_client(str(tmp_path)).kind == "http"
+    assert clients == [expected]
+
+
+def test_client_is_rebuilt_after_fork(clients, tmp_path, monkeypatch):
+    path = str(tmp_path / "chroma_db")
+    parent = chroma_client.get_client(path)
+    monkeypatch.setattr(chroma_client.os, "getpid", lambda: -1)
+    assert chroma_client.get_client(path) is not parent
+    assert len(clients) == 2
+
+
+def _hold_lock(path, events):
+    with chroma_client.write_lock(path):
+        events.append("enter")
+        time.sleep(0.05)
+        events.append("exit")
+
+
+@pytest.mark.parametrize("server", ["", "http://127.0.0.1:8000"])
+def test_write_lock_serializes_writers(clients, tmp_path, monkeypatch, server):
+    monkeypatch.setattr(chroma_client, "CHROMA_SERVER_URL", server)
+    path = str(tmp_path / "chroma_db")
+    events = []
+    threads = [threading.Thread(target=_hold_lock, args=(path, events)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert events == ["enter", "exit"] * 3
+    # 只有服务模式才需要跨 worker 的锁文件
+    lock_file = os.path.join(path, chroma_client._LOCK_FILE)
+    assert os.path.exists(lock_file) == bool(server and chroma_client.fcntl)
+
+
+def _gunicorn_conf():
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", os.path.join(_ROOT, "gunicorn.conf.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_gunicorn_refuses_workers_without_server(monkeypatch):
+    monkeypatch.delenv("CHROMA_SERVER_URL", raising=False)
+    conf = _gunicorn_conf()
+    with pytest.raises(RuntimeError, match="CHROMA_SERVER_URL"):
+        conf.on_starting(SimpleNamespace(cfg=SimpleNamespace(workers=2)))
+    conf.on_starting(SimpleNamespace(cfg=SimpleNamespace(workers=1)))
+    monkeypatch.setenv("CHROMA_SERVER_URL", "http://127.0.0.1:8000")
+    conf.on_starting(SimpleNamespace(cfg=SimpleNamespace(workers=2)))
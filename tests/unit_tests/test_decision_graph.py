@@ -0,0 +1,79 @@
+"""src/decision-agent/graph.py：一站式分析工具的异步路径与失败路径（离线替身，不访问网络）"""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from rag import tracing
+
+
+@pytest.fixture(scope="module")
+def graph(decision_agent):
+    return decision_agent("graph")
+
+
+def _boom(*args, **kwargs):
+    raise ValueError("预算计算出错")
+
+
+async def _aboom(*args, **kwargs):
+    raise ValueError("预算计算出错")
+
+
+def test_prompt_assembly_error_is_returned_not_raised(graph, monkeypatch):
+    monkeypatch.setattr(graph, "build_decision_prompt", _boom)
+    result = graph.full_decision_analysis.invoke({"decision_query": "要不要买车"})
+    assert result == "分析失败：预算计算出错"
+
+
+def test_async_prompt_assembly_error_is_returned_not_raised(graph, monkeypatch):
+    monkeypatch.setattr(graph, "abuild_decision_prompt", _aboom)
+    result = asyncio.run(graph.afull_decision_analysis("要不要买车"))
+    assert result == "分析失败：预算计算出错"
+
+
+def test_async_analysis_overlaps_retrieval_and_awaits_llm(graph, monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    # 两路检索都到达屏障才能继续：串行执行会超时
+    barrier = threading.Barrier(2, timeout=5)
+    parents = []
+
+    def knowledge(query):
+        parents.append(tracing.current_span().name)
+        barrier.wait()
+        return [graph.Snippet(text="知识：购车预算", score=0.9)], []
+
+    def web(query, year):
+        parents.append(tracing.current_span().name)
+        barrier.wait()
+        return [graph.Snippet(text="网络：油价走势", score=0.5)], []
+
+    prompts = []
+
+    async def ainvoke(messages):
+        prompts.append(messages[1].content)
+        return SimpleNamespace(content=[{"text": "建议"}, {"text": "买车"}],
+                               usage_metadata={"input_tokens": 10, "output_tokens": 2})
+
+    monkeypatch.setattr(graph, "_collect_knowledge_snippets", knowledge)
+    monkeypatch.setattr(graph, "_collect_web_snippets", web)
+    monkeypatch.setattr(graph, "llm", SimpleNamespace(ainvoke=ainvoke))
+
+    result = asyncio.run(graph.afull_decision_analysis("要不要买车"))
+    assert result.startswith("建议 买车")
+    assert "知识：购车预算" in prompts[0] and "网络：油价走势" in prompts[0]
+    # asyncio.to_thread 复制 contextvars：检索 span 仍挂在请求 trace 下
+    assert parents == ["full_decision_analysis", "full_decision_analysis"]
+
+
+def test_async_llm_error_is_returned_not_raised(graph, monkeypatch):
+    async def ainvoke(messages):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(graph, "_collect_knowledge_snippets", lambda q: ([], []))
+    monkeypatch.setattr(graph, "_collect_web_snippets", lambda q, y: ([], []))
+    monkeypatch.setattr(graph, "llm", SimpleNamespace(ainvoke=ainvoke))
+    assert asyncio.run(graph.afull_decision_analysis("要不要买车")) == "分析失败：quota exceeded"
@@ -0,0 +1,127 @@
+"""rag/decision_store.py 各分区后端的单元测试（内存 Chroma，不依赖 embedding 模型）"""
+
+import chromadb
+import pytest
+
+from rag.decision_store import (
+    DECISION_COLLECTION,
+    DecisionStore,
+    PerUserCollectionStore,
+    ShardedCollectionStore,
+    available_backends,
+    create_store,
+    ensure_no_legacy_rows,
+    legacy_row_count,
+    migrate_shared_to,
+)
+
+
+def _vec(i: int):
+    # 固定维度的确定性向量，避免加载 embedding 模型
+    return [1.0 if j == i % 8 else 0.0 for j in range(8)]
+
+
+@pytest.fixture
+def client():
+    c = chromadb.EphemeralClient()
+    yield c
+    for col in c.list_collections():
+        c.delete_collection(col if isinstance(col, str) else col.name)
+
+
+def _fill(store: DecisionStore, user_id: str, n: int) -> None:
+    store.add_many(
+        user_id,
+        ids=[f"{user_id}-{i}" for i in range(n)],
+        documents=[f"{user_id} 的第 {i} 条决策" for i in range(n)],
+        metadatas=[{"user_id": user_id, "idx": i} for i in range(n)],
+        embeddings=[_vec(i) for i in range(n)],
+    )
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        DecisionStore(None)
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(ValueError):
+        create_store(None, None, "no_such_backend")
+
+
+@pytest.mark.parametrize("backend", ["shared", "per_user", "sharded"])
+def test_query_isolated_per_user(client, backend):
+    store = create_store(client, None, backend)
+    _fill(store, "alice", 5)
+    _fill(store, "bob", 3)
+    store.add("alice", "alice-extra", "额外一条", {"user_id": "alice", "idx": 99}, _vec(1))
+
+    assert store.count("alice") == 6
+    assert store.count("bob") == 3
+    assert store.count() == 9
+
+    res = store.query("bob", n_results=10, query_embedding=_vec(0))
+    ids = res["ids"][0]
+    # n_results 大于该用户条数时返回其全部记录，且不混入其他用户
+    assert len(ids) == 3
+    assert all(i.startswith("bob-") for i in ids)
+    assert all(m["user_id"] == "bob" for m in res["metadatas"][0])
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_unknown_user_returns_empty(client, backend):
+    store = create_store(client, None, backend)
+    res = store.query("nobody", n_results=3, query_embedding=_vec(0))
+    assert res["ids"] == [[]]
+    assert store.count("nobody") == 0
+
+
+def test_per_user_collection_name_is_valid():
+    name = PerUserCollectionStore.collection_name("用户/带空格 的 id")
+    assert 3 <= len(name) <= 63
+    assert all(ch.isalnum() or ch in "._-" for ch in name)
+
+
+def test_sharded_routing_is_stable(client):
+    store = ShardedCollectionStore(client, None, shards=4)
+    assert store.shard_name("alice") == ShardedCollectionStore(client, None, shards=4).shard_name("alice")
+    names = {store.shard_name(f"u{i}") for i in range(200)}
+    assert len(names) <= 4
+
+
+def _fill_legacy(client):
+    shared = create_store(client, backend="shared")
+    _fill(shared, "alice", 3)
+    _fill(shared, "bob", 2)
+
+
+@pytest.mark.parametrize("backend", ["per_user", "sharded"])
+def test_switching_with_legacy_rows_is_refused(client, backend):
+    _fill_legacy(client)
+    with pytest.raises(RuntimeError, match="migrate"):
+        ensure_no_legacy_rows(create_store(client, backend=backend))
+    # shared 后端本身不受影响
+    ensure_no_legacy_rows(create_store(client, backend="shared"))
+
+
+@pytest.mark.parametrize("backend", ["per_user", "sharded"])
+def test_migration_moves_rows_and_retires_legacy(client, backend):
+    _fill_legacy(client)
+    store = create_store(client, backend=backend)
+    assert migrate_shared_to(store, batch_size=2, retire=True) == 5
+
+    assert store.count("alice") == 3 and store.count("bob") == 2
+    result = store.query("alice", n_results=5, query_embedding=_vec(0))
+    assert all(m["user_id"] == "alice" for m in result["metadatas"][0])
+    assert legacy_row_count(client) == 0
+    names = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+    assert any(n.startswith(f"{DECISION_COLLECTION}_migrated_") for n in names)
+    ensure_no_legacy_rows(store)
+
+
+def test_migration_is_idempotent(client):
+    _fill_legacy(client)
+    store = create_store(client, backend="per_user")
+    migrate_shared_to(store)
+    migrate_shared_to(store)
+    assert store.count("alice") == 3
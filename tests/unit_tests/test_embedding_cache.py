@@ -0,0 +1,98 @@
+"""rag/embedding_cache.py：两级缓存命中，以及包装后仍能打开已持久化的 Chroma 集合"""
+
+import os
+import shutil
+
+import chromadb
+import pytest
+from chromadb.api.types import EmbeddingFunction
+from chromadb.utils.embedding_functions import known_embedding_functions
+
+from rag.embedding_cache import CachedEmbeddingFunction
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+COMMITTED_DB = os.path.join(_ROOT, "data", "chroma_db")
+DIM = 384
+
+
+class FakeSentenceTransformer(EmbeddingFunction):
+    """与 SentenceTransformerEmbeddingFunction 同名同配置，但不加载模型"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self.model_name = model_name
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        return [[float((len(t) + j) % 7) / 7 + 0.01 for j in range(DIM)] for t in input]
+
+    @staticmethod
+    def name() -> str:
+        return "sentence_transformer"
+
+    def default_space(self):
+        return "cosine"
+
+    @staticmethod
+    def build_from_config(config):
+        return FakeSentenceTransformer(config["model_name"])
+
+    def get_config(self):
+        return {"model_name": self.model_name, "device": "cpu", "normalize_embeddings": False, "kwargs": {}}
+
+
+@pytest.fixture(autouse=True)
+def restore_registry():
+    # 新建集合时 chroma 会把包装实例的类注册到全局表，测试结束后还原
+    saved = dict(known_embedding_functions)
+    yield
+    known_embedding_functions.clear()
+    known_embedding_functions.update(saved)
+
+
+@pytest.fixture
+def cached(tmp_path):
+    return CachedEmbeddingFunction(FakeSentenceTransformer(), "all-MiniLM-L6-v2",
+                                   db_path=os.path.join(tmp_path, "cache.sqlite3"))
+
+
+def test_config_is_passed_through(cached):
+    assert cached.name() == "sentence_transformer"
+    assert cached.get_config()["model_name"] == "all-MiniLM-L6-v2"
+    assert cached.default_space() == "cosine"
+    assert not cached.is_legacy()
+    assert isinstance(cached.build_from_config(cached.get_config()), CachedEmbeddingFunction)
+
+
+def test_opens_collection_persisted_with_sentence_transformer(tmp_path, cached):
+    # 复制仓库中的 data/chroma_db，不修改原文件
+    db = os.path.join(tmp_path, "chroma_db")
+    shutil.copytree(COMMITTED_DB, db)
+    client = chromadb.PersistentClient(path=db)
+    persisted = client.get_collection("decision_history").configuration_json["embedding_function"]
+    assert persisted["name"] == "sentence_transformer"
+
+    collection = client.get_or_create_collection("decision_history", embedding_function=cached)
+    result = collection.query(query_texts=["要不要换工作"], n_results=1)
+    assert len(result["ids"][0]) == 1
+
+
+def test_new_collection_records_inner_config(tmp_path, cached):
+    client = chromadb.PersistentClient(path=os.path.join(tmp_path, "db"))
+    client.get_or_create_collection("knowledge_test", embedding_function=cached)
+    ef = client.get_collection("knowledge_test").configuration_json["embedding_function"]
+    assert ef["name"] == "sentence_transformer"
+    assert ef["config"]["model_name"] == "all-MiniLM-L6-v2"
+
+
+def test_memory_and_disk_hits(tmp_path, cached):
+    cached(["a", "bb", "a"])
+    assert cached.inner.calls == 1
+    cached(["a", "bb"])
+    assert cached.inner.calls == 1
+
+    # 新实例（相当于另一个 worker）从磁盘层命中
+    other = CachedEmbeddingFunction(cached.inner, "all-MiniLM-L6-v2", db_path=cached._disk.path)
+    other(["bb"])
+    assert cached.inner.calls == 1
+    assert other.stats()["disk_hits"] == 1
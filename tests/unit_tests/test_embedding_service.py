@@ -0,0 +1,83 @@
+"""rag/embedding_service.py：微批服务 + 客户端，客户端上报服务端模型的 Chroma 配置"""
+
+import os
+import shutil
+import threading
+
+import chromadb
+import pytest
+from chromadb.api.types import EmbeddingFunction
+from chromadb.utils.embedding_functions import known_embedding_functions
+
+from rag.embedding_service import EmbeddingServer, EmbeddingServiceClient
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+COMMITTED_DB = os.path.join(_ROOT, "data", "chroma_db")
+DIM = 384
+
+
+class FakeSentenceTransformer(EmbeddingFunction):
+    """与 SentenceTransformerEmbeddingFunction 同名同配置，但不加载模型"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        self.model_name = model_name
+
+    def __call__(self, input):
+        return [[float((len(t) + j) % 5) / 5 + 0.01 for j in range(DIM)] for t in input]
+
+    @staticmethod
+    def name() -> str:
+        return "sentence_transformer"
+
+    def default_space(self):
+        return "cosine"
+
+    @staticmethod
+    def build_from_config(config):
+        return FakeSentenceTransformer(config["model_name"])
+
+    def get_config(self):
+        return {"model_name": self.model_name, "device": "cpu", "normalize_embeddings": False, "kwargs": {}}
+
+
+@pytest.fixture(autouse=True)
+def restore_registry():
+    saved = dict(known_embedding_functions)
+    yield
+    known_embedding_functions.clear()
+    known_embedding_functions.update(saved)
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = os.path.join(tmp_path, "embed.sock")
+    srv = EmbeddingServer(path, FakeSentenceTransformer(), "all-MiniLM-L6-v2", max_wait_ms=1)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield path
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_client_reports_served_model(server):
+    client = EmbeddingServiceClient(server)
+    assert client.name() == "sentence_transformer"
+    assert client.get_config()["model_name"] == "all-MiniLM-L6-v2"
+    assert client.default_space() == "cosine"
+    assert not client.is_legacy()
+    assert len(client(["a", "bb"])[0]) == DIM
+
+
+def test_client_opens_persisted_collection(tmp_path, server):
+    db = os.path.join(tmp_path, "chroma_db")
+    shutil.copytree(COMMITTED_DB, db)
+    collection = chromadb.PersistentClient(path=db).get_or_create_collection(
+        "decision_history", embedding_function=EmbeddingServiceClient(server))
+    assert len(collection.query(query_texts=["要不要换工作"], n_results=1)["ids"][0]) == 1
+
+
+def test_unavailable_service_reports_fallback_config(tmp_path):
+    client = EmbeddingServiceClient(os.path.join(tmp_path, "missing.sock"),
+                                    fallback=lambda: FakeSentenceTransformer("fallback-model"))
+    assert client.name() == "sentence_transformer"
+    assert client.get_config()["model_name"] == "fallback-model"
+    assert len(client(["x"])[0]) == DIM
@@ -0,0 +1,84 @@
+"""agent 模板 utils/error/patterns.py：预编译匹配器与逐条线性扫描的一致性"""
+
+import random
+
+import pytest
+
+from utils.error.patterns import (
+    CUSTOM_EXCEPTION_PATTERNS,
+    ERROR_PATTERNS,
+    TRACEBACK_EXCEPTION_PATTERNS,
+    CompiledPatternTable,
+    match_error_pattern,
+    match_error_pattern_linear,
+)
+
+TABLES = {
+    "error": ERROR_PATTERNS,
+    "traceback": TRACEBACK_EXCEPTION_PATTERNS,
+    "custom": CUSTOM_EXCEPTION_PATTERNS,
+}
+
+
+def _keywords(patterns):
+    return sorted({kw for kws, _, _ in patterns for kw in kws if kw})
+
+
+def _samples(patterns, n=400, seed=0):
+    """单个关键词、大小写变化、多个关键词拼接、关键词相互重叠 / 截断，以及不含关键词的噪声"""
+    rnd = random.Random(seed)
+    keywords = _keywords(patterns)
+    out = ["", "nothing to see here", "正常返回"]
+    for kw in keywords:
+        out += [kw, kw.upper(), f"prefix {kw} suffix", kw[:-1], kw[1:]]
+    filler = ["Traceback (most recent call last):", "at line 42", "请求", "xyz", " ", "\n"]
+    for _ in range(n):
+        parts = rnd.sample(keywords, k=min(len(keywords), rnd.randint(1, 4)))
+        parts += rnd.sample(filler, k=2)
+        rnd.shuffle(parts)
+        glue = rnd.choice(["", " ", ": "])
+        out.append(glue.join(parts))
+        # 一个关键词的后缀紧接另一个关键词的前缀（findall 跳过的重叠情形）
+        a, b = rnd.sample(keywords, k=2)
+        out.append(a + b[rnd.randint(0, max(0, len(b) - 1)):])
+    return out
+
+
+@pytest.mark.parametrize("name", sorted(TABLES))
+@pytest.mark.parametrize("require_all", [False, True])
+def test_compiled_matches_linear(name, require_all):
+    patterns = TABLES[name]
+    for text in _samples(patterns):
+        assert match_error_pattern(text, patterns, require_all) == \
+            match_error_pattern_linear(text, patterns, require_all), text
+
+
+@pytest.mark.parametrize("require_all", [False, True])
+def test_long_strings_use_scan_path(require_all):
+    table = CompiledPatternTable(ERROR_PATTERNS, regex_max_len=16)
+    for text in _samples(ERROR_PATTERNS, n=100, seed=1):
+        code, _ = match_error_pattern_linear(text, ERROR_PATTERNS, require_all)
+        idx = table.match_index(text.lower(), require_all)
+        assert (ERROR_PATTERNS[idx][1] if idx is not None else None) == code, text
+
+
+def test_priority_follows_table_order():
+    patterns = [
+        (["timeout"], 1, "first"),
+        (["read timeout"], 2, "second"),
+    ]
+    table = CompiledPatternTable(patterns)
+    # 两个模式都命中时取表中靠前的
+    assert table.match("Read Timeout occurred")[0] == 1
+
+
+def test_overlapping_keywords_are_found():
+    # "abc" 的后缀与 "cde" 的前缀重叠，findall 只会取到 "abc"
+    patterns = [(["cde"], 1, "cde"), (["abc"], 2, "abc")]
+    table = CompiledPatternTable(patterns)
+    assert table.found_keywords("xabcdex") == {"abc", "cde"}
+    assert table.match("xabcdex")[0] == 1
+
+
+def test_no_match_returns_none():
+    assert match_error_pattern("all good", [(["boom"], 1, "boom")]) == (None, None)
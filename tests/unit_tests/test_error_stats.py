@@ -0,0 +1,109 @@
+"""agent 模板 utils/error/stats.py：分片计数、环形缓冲与滑动窗口"""
+
+import threading
+
+import pytest
+
+from utils.error import stats
+from utils.error.stats import ErrorStatsCollector, RingBuffer
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": float(T0)}
+    monkeypatch.setattr(stats.time, "time", lambda: now["t"])
+    return now
+
+
+def _record_at(collector, clock, t, n=1, category="api", code=500, node="n"):
+    clock["t"] = float(t)
+    for _ in range(n):
+        collector.record(category, code, node)
+
+
+def test_windows_count_only_recent_buckets(clock):
+    clock["t"] = float(T0 - 7200)
+    collector = ErrorStatsCollector()
+    _record_at(collector, clock, T0 - 4000)      # 超出所有窗口
+    _record_at(collector, clock, T0 - 1000)      # 仅 1h
+    _record_at(collector, clock, T0 - 120, n=2)  # 5m / 1h
+    _record_at(collector, clock, T0 - 10, n=3)   # 全部窗口
+    _record_at(collector, clock, T0)             # 当前这一秒也计入
+    clock["t"] = float(T0)
+
+    windows = collector.windows()
+    assert windows["1m"]["count"] == 4
+    assert windows["5m"]["count"] == 6
+    assert windows["1h"]["count"] == 7
+    assert windows["1m"]["rate_per_min"] == pytest.approx(4.0)
+    assert windows["1h"]["rate_per_min"] == pytest.approx(7 / 60, rel=1e-2)
+    assert collector.totals()["total_count"] == 8
+
+
+def test_expired_bucket_is_reset_on_reuse(clock):
+    clock["t"] = float(T0 - 7200)
+    collector = ErrorStatsCollector()
+    # 同一个桶槽位（相差最大窗口秒数）被复用时，旧计数不能残留
+    _record_at(collector, clock, T0 - 3600, n=5)
+    _record_at(collector, clock, T0, n=1)
+    assert collector.windows(now=T0)["1h"]["count"] == 1
+
+
+def test_rate_uses_uptime_before_first_full_window(clock):
+    collector = ErrorStatsCollector()
+    _record_at(collector, clock, T0 + 30, n=3)
+    # 启动 30 秒：1h 窗口按 30 秒计速率
+    assert collector.windows()["1h"]["rate_per_min"] == pytest.approx(6.0)
+
+
+def test_totals_merge_thread_shards():
+    collector = ErrorStatsCollector()
+
+    def worker(i):
+        for _ in range(100):
+            collector.record("api" if i % 2 else "db", 400 + i, f"node{i}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    totals = collector.totals()
+    assert totals["total_count"] == 400
+    assert totals["by_category"] == {"api": 200, "db": 200}
+    assert sum(totals["by_code"].values()) == 400
+    # 线程都已退出：分片并入 retired，计数不丢
+    assert collector.snapshot()["threads"] == 0
+
+
+def test_dead_thread_shards_are_folded(clock):
+    collector = ErrorStatsCollector()
+    clock["t"] = float(T0 - 10)
+
+    def short_lived():
+        collector.record("api", 500, "stream")
+
+    for _ in range(50):
+        t = threading.Thread(target=short_lived)
+        t.start()
+        t.join()
+    collector.record("db", 503, "main")
+
+    assert len(collector._shards) <= 2
+    snapshot = collector.snapshot()
+    assert snapshot["threads"] == 1
+    assert snapshot["total_count"] == 51
+    assert snapshot["by_node"] == {"stream": 50, "main": 1}
+    assert collector.windows(now=T0)["1m"]["count"] == 51
+
+
+def test_ring_buffer_keeps_latest_in_order():
+    buf = RingBuffer(3)
+    for i in range(5):
+        buf.append(i)
+    assert len(buf) == 3
+    assert buf.latest() == [2, 3, 4]
+    assert buf.latest(2) == [3, 4]
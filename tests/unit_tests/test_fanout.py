@@ -0,0 +1,108 @@
+"""src/decision-agent/fanout.py：四个专家并行执行、各自统计，综合后交给 finalize_decision"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+
+class FakeAgent:
+    """记录输入与并发度；每次运行通过回调上报一次 LLM 用量"""
+
+    def __init__(self, name, shared, delay=0.05, error=None):
+        self.name = name
+        self.shared = shared
+        self.delay = delay
+        self.error = error
+        self.inputs = []
+
+    def invoke(self, payload, config):
+        self.inputs.append(payload["messages"][0].content)
+        with self.shared["lock"]:
+            self.shared["running"] += 1
+            self.shared["peak"] = max(self.shared["peak"], self.shared["running"])
+        try:
+            time.sleep(self.delay)
+            if self.error:
+                raise self.error
+            message = AIMessage(content=f"{self.name} 的结论",
+                                usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15})
+            for callback in config["callbacks"]:
+                callback.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+            return {"messages": [payload["messages"][0], message]}
+        finally:
+            with self.shared["lock"]:
+                self.shared["running"] -= 1
+
+
+@pytest.fixture
+def fanout(decision_agent, monkeypatch):
+    mod = decision_agent("fanout")
+    shared = {"lock": threading.Lock(), "running": 0, "peak": 0, "synth": [], "final": []}
+    agents = {field: FakeAgent(f"{field}_agent", shared) for field in mod.SPECIALISTS}
+    monkeypatch.setattr(mod, "SPECIALISTS", {
+        field: (agents[field], label) for field, (_, label) in mod.SPECIALISTS.items()})
+
+    def synth(messages, config=None):
+        shared["synth"].append(messages[1].content)
+        return SimpleNamespace(content="推荐接受 offer")
+
+    def finalize(payload):
+        shared["final"].append(payload)
+        return "最终报告"
+
+    monkeypatch.setattr(mod, "llm", SimpleNamespace(invoke=synth))
+    monkeypatch.setattr(mod, "finalize_decision", SimpleNamespace(invoke=finalize))
+    mod.agents, mod.shared = agents, shared
+    return mod
+
+
+def test_specialists_run_in_parallel(fanout):
+    graph = fanout.build_fanout_graph()
+    state = graph.invoke({
+        "messages": [HumanMessage(content='【用户画像】\n{"age": 28}\n\n【用户问题】要不要跳槽')],
+        "user_id": "u1",
+    })
+    assert fanout.shared["peak"] == 4
+    for agent in fanout.agents.values():
+        assert agent.inputs == ['【用户画像】\n{"age": 28}\n\n【用户问题】要不要跳槽']
+
+    synth_prompt = fanout.shared["synth"][0]
+    assert "决策问题：要不要跳槽" in synth_prompt
+    assert "cost_analysis_agent 的结论" in synth_prompt
+
+    final = fanout.shared["final"][0]
+    assert final["user_id"] == "u1"
+    assert final["risk_assessment"] == "risk_assessment_agent 的结论"
+    assert final["final_recommendation"] == "推荐接受 offer"
+    assert state["messages"][-1].content == "最终报告"
+
+    stats = {s["agent"]: s for s in state["agent_stats"]}
+    assert set(stats) == {a.name for a in fanout.agents.values()} | {"synthesis"}
+    assert stats["user_value_agent"]["llm_calls"] == 1
+    assert stats["user_value_agent"]["input_tokens"] == 10
+
+
+def test_failed_specialist_does_not_block_others(fanout):
+    fanout.agents["risk_assessment"].error = RuntimeError("tool timeout")
+    state = fanout.build_fanout_graph().invoke({"decision_query": "要不要跳槽"})
+    assert state["risk_assessment"].endswith("失败：tool timeout）")
+    assert state["cost_analysis"] == "cost_analysis_agent 的结论"
+    failed = [s for s in state["agent_stats"] if not s["ok"]]
+    assert [s["agent"] for s in failed] == ["risk_assessment_agent"]
+    assert "✗" in fanout.format_agent_stats(state["agent_stats"])
+
+
+def test_format_agent_stats_reports_parallel_saving(fanout):
+    stats = [
+        {"agent": "a", "ok": True, "latency_ms": 100.0, "llm_calls": 1, "input_tokens": 10, "output_tokens": 5},
+        {"agent": "b", "ok": True, "latency_ms": 300.0, "llm_calls": 2, "input_tokens": 20, "output_tokens": 5},
+        {"agent": "synthesis", "ok": True, "latency_ms": 50.0, "llm_calls": 1, "input_tokens": 30, "output_tokens": 10},
+    ]
+    line = fanout.format_agent_stats(stats)
+    assert "专家并行 300ms（串行约 400ms）" in line
+    assert line.endswith("总 token 80")
+    assert fanout.format_agent_stats([]) == "无统计"
@@ -0,0 +1,45 @@
+"""agent 模板 main.py：GraphService.astream 被取消时先发出取消结束帧"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("cozeloop")
+main = pytest.importorskip("main")
+
+from utils.messages.server import MESSAGE_END_CODE_CANCELED  # noqa: E402
+
+PAYLOAD = {"session_id": "s1", "content": {"query": {"prompt": [{"type": "text", "content": {"text": "hi"}}]}}}
+
+
+class HangingGraph:
+    """不产出任何消息、一直等待的 graph（模拟进行中的 LLM 调用）"""
+
+    async def astream(self, *args, **kwargs):
+        await asyncio.Event().wait()
+        yield  # pragma: no cover
+
+
+def test_cancel_yields_end_frame_before_raising():
+    service = main.GraphService.__new__(main.GraphService)
+    service.stream_impl = "async"
+    ctx = SimpleNamespace(run_id="r1", logid="l1")
+    received = []
+
+    async def consume():
+        async for item in service.astream(dict(PAYLOAD), HangingGraph(), {}, ctx):
+            received.append(item)
+
+    async def scenario():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert received, "取消时应先收到结束帧"
+    end = received[-1]
+    assert end["content"]["message_end"]["code"] == MESSAGE_END_CODE_CANCELED
+    assert end["finish"] is True
@@ -0,0 +1,122 @@
+"""src/decision-agent/intent_recognition.py：LLM 输出解析与置信度容错，结果缓存"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def intent(decision_agent, monkeypatch):
+    mod = decision_agent("intent_recognition")
+    logged = []
+    monkeypatch.setattr(mod, "log_intent_history", lambda *args: logged.append(args))
+    mod.clear_intent_cache()
+    mod.logged = logged
+    yield mod
+    mod.clear_intent_cache()
+
+
+def _llm_reply(monkeypatch, mod, payload):
+    content = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+    monkeypatch.setattr(mod, "_llm", SimpleNamespace(invoke=lambda messages: SimpleNamespace(content=content)))
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (0.8, 0.8), ("0.7", 0.7), ("85%", 0.85), (1.7, 1.0), (-1, 0.0),
+    ("高", 0.5), (None, 0.5), ([0.9], 0.5), (float("nan"), 0.5),
+])
+def test_coerce_confidence(intent, raw, expected):
+    assert intent._coerce_confidence(raw) == pytest.approx(expected)
+
+
+def test_non_numeric_confidence_keeps_llm_parse(intent, monkeypatch):
+    _llm_reply(monkeypatch, intent, {
+        "intent_label": "career_choice",
+        "intent_desc": "换工作",
+        "rewritten_query": "是否接受新公司 offer",
+        "key_factors": ["薪资", "通勤"],
+        "confidence": "高",
+    })
+    result = intent.recognize_intent("要不要换工作", use_local=False)
+    assert result["tier"] == "llm"
+    assert result["intent_label"] == "career_choice"
+    assert result["confidence"] == 0.5
+    assert intent.logged == [("要不要换工作", "career_choice", 0.5)]
+
+
+def test_unparseable_reply_falls_back(intent, monkeypatch):
+    _llm_reply(monkeypatch, intent, "不是 JSON")
+    result = intent.recognize_intent("要不要换工作", use_local=False)
+    assert result["tier"] == "fallback"
+
+
+# ============================================================
+# 结果缓存
+# ============================================================
+
+_REPLY = {"intent_label": "career_choice", "intent_desc": "换工作", "rewritten_query": "是否换工作",
+          "key_factors": ["薪资"], "confidence": 0.9}
+
+
+@pytest.fixture
+def counting_llm(intent, monkeypatch):
+    calls = []
+
+    def invoke(messages):
+        calls.append(messages)
+        return SimpleNamespace(content=json.dumps(_REPLY, ensure_ascii=False))
+    monkeypatch.setattr(intent, "_llm", SimpleNamespace(invoke=invoke))
+    return calls
+
+
+def test_cache_key_normalizes_whitespace(intent):
+    assert intent._cache_key(" 要不要  换工作\n", None, True) == intent._cache_key("要不要 换工作", [], True)
+    assert intent._cache_key("要不要换工作", None, True) != intent._cache_key("要不要换工作", None, False)
+
+
+def test_cache_key_uses_last_six_history_turns(intent):
+    history = [{"role": "user", "content": f"第 {i} 轮"} for i in range(8)]
+    older_changed = [{"role": "user", "content": "改过"}] + history[1:]
+    latest_changed = history[:-1] + [{"role": "user", "content": "改过"}]
+    key = intent._cache_key("继续", history, True)
+    assert intent._cache_key("继续", older_changed, True) == key
+    assert intent._cache_key("继续", latest_changed, True) != key
+    assert intent._cache_key("继续", None, True) != key
+
+
+def test_repeated_input_hits_cache(intent, counting_llm):
+    first = intent.recognize_intent("要不要换工作", use_local=False)
+    first["key_factors"].append("被调用方修改")
+    second = intent.recognize_intent("  要不要换工作\n", use_local=False)
+    assert len(counting_llm) == 1
+    assert second["cached"] is True
+    # 命中返回副本，调用方的修改不会污染缓存
+    assert second["key_factors"] == ["薪资"]
+
+
+def test_different_history_misses_cache(intent, counting_llm):
+    intent.recognize_intent("继续", [{"role": "user", "content": "考研还是工作"}], use_local=False)
+    intent.recognize_intent("继续", [{"role": "user", "content": "买房还是租房"}], use_local=False)
+    assert len(counting_llm) == 2
+
+
+def test_expired_entry_is_recomputed(intent, counting_llm, monkeypatch):
+    monkeypatch.setattr(intent, "INTENT_CACHE_TTL_S", -1)
+    intent.recognize_intent("要不要换工作", use_local=False)
+    result = intent.recognize_intent("要不要换工作", use_local=False)
+    assert len(counting_llm) == 2
+    assert "cached" not in result
+
+
+def test_fallback_results_are_not_cached(intent, monkeypatch):
+    _llm_reply(monkeypatch, intent, "不是 JSON")
+    intent.recognize_intent("要不要换工作", use_local=False)
+    assert len(intent._cache) == 0
+
+
+def test_cache_is_bounded(intent, counting_llm, monkeypatch):
+    monkeypatch.setattr(intent, "INTENT_CACHE_SIZE", 2)
+    for text in ("甲", "乙", "丙"):
+        intent.recognize_intent(text, use_local=False)
+    assert [key[0] for key in intent._cache] == ["乙", "丙"]
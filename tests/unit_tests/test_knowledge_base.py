@@ -0,0 +1,73 @@
+"""rag/knowledge_base.py：检索缓存与条数记忆的跨进程失效（版本戳）"""
+
+import pytest
+
+import rag.knowledge_base as kb
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+
+    def count(self):
+        return len(self.docs)
+
+    def query(self, query_embeddings, n_results, include):
+        self.queries += 1
+        docs = self.docs[:n_results]
+        return {"documents": [docs], "distances": [[0.1] * len(docs)], "metadatas": [[{}] * len(docs)]}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    state = {"collection": FakeCollection(["旧片段 A", "旧片段 B"]), "opens": 0}
+
+    def get_collection(kb_type):
+        if kb_type not in kb._collections:
+            state["opens"] += 1
+            kb._collections[kb_type] = state["collection"]
+        return kb._collections[kb_type]
+
+    monkeypatch.setattr(kb, "CHROMA_PERSIST_DIR", str(tmp_path))
+    monkeypatch.setattr(kb, "KNOWLEDGE_INDEX_BACKEND", "chroma")
+    monkeypatch.setattr(kb, "_get_kb_collection", get_collection)
+    monkeypatch.setattr(kb, "_get_kb_embedding_function", lambda: (lambda texts: [[0.5, 0.5]] * len(texts)))
+    monkeypatch.setattr(kb, "_result_cache", kb._KnowledgeCache(16))
+    # 模块级记忆在测试间隔离
+    for name in ("_collections", "_counts", "_versions", "_stamps"):
+        monkeypatch.setattr(kb, name, {})
+    return state
+
+
+def test_repeated_query_is_cached(store):
+    first = kb.retrieve_knowledge("要不要换工作", "cost", n_results=2)
+    second = kb.retrieve_knowledge("要不要换工作", "cost", n_results=2)
+    assert first == second and len(first) == 2
+    assert store["collection"].queries == 1
+
+
+def test_rebuild_in_another_process_invalidates_cache_and_count(store):
+    kb.retrieve_knowledge("要不要换工作", "cost", n_results=5)
+    assert kb._get_count("cost") == 2
+
+    # 另一个进程重建：只改了 Chroma 数据和版本戳，本进程的内存状态没有被直接触碰
+    store["collection"] = FakeCollection(["新片段 A", "新片段 B", "新片段 C"])
+    kb._touch_stamp("cost")
+
+    results = kb.retrieve_knowledge("要不要换工作", "cost", n_results=5)
+    assert [r["content"] for r in results] == ["新片段 A", "新片段 B", "新片段 C"]
+    assert kb._counts["cost"] == 3
+    assert store["opens"] == 2
+
+
+def test_stamp_of_other_kb_does_not_invalidate(store):
+    kb.retrieve_knowledge("要不要换工作", "cost", n_results=2)
+    kb._touch_stamp("risk")
+    kb.retrieve_knowledge("要不要换工作", "cost", n_results=2)
+    assert store["collection"].queries == 1
+
+
+def test_invalidate_writes_stamp(store, tmp_path):
+    kb.invalidate_knowledge_cache("value")
+    assert (tmp_path / ".knowledge_value.stamp").exists()
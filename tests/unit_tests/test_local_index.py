@@ -0,0 +1,65 @@
+"""rag/local_index.py：量化检索结果，以及其它进程重新导出后的重新映射"""
+
+import os
+
+import numpy as np
+import pytest
+
+from rag import local_index
+from rag.local_index import build_local_index, get_local_index
+
+
+def _corpus(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"doc{i}" for i in range(n)]
+    return ids, [f"文档 {i}" for i in range(n)], [{"i": i} for i in range(n)], vectors
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_index, "LOCAL_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(local_index, "_indexes", {})
+    return tmp_path
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_query_finds_exact_match(dtype):
+    ids, docs, metas, vectors = _corpus(200)
+    build_local_index("kb", ids, docs, metas, vectors, dtype=dtype)
+    result = get_local_index("kb").query(vectors[42], n_results=3)
+    assert result["ids"][0][0] == "doc42"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=0.01)
+
+
+def test_reexport_from_another_process_is_picked_up(monkeypatch):
+    ids, docs, metas, vectors = _corpus(50)
+    build_local_index("kb", ids, docs, metas, vectors)
+    old = get_local_index("kb")
+
+    # 另一个进程重新导出：本进程不会调用 drop_local_index
+    monkeypatch.setattr(local_index, "drop_local_index", lambda name=None: None)
+    ids2, docs2, metas2, vectors2 = _corpus(30, seed=1)
+    build_local_index("kb", ids2, docs2, metas2, vectors2)
+
+    new = get_local_index("kb")
+    assert new is not old
+    assert new.count == 30
+    assert get_local_index("kb") is new
+
+
+def test_missing_directory_falls_back(index_dir):
+    ids, docs, metas, vectors = _corpus(20)
+    path = build_local_index("kb", ids, docs, metas, vectors)
+    assert get_local_index("kb") is not None
+
+    # 重建时两次 rename 之间目录不存在：返回 None，调用方改走 Chroma
+    moved = os.path.join(index_dir, "kb.old-test")
+    os.replace(path, moved)
+    assert get_local_index("kb") is None
+    os.replace(moved, path)
+    assert get_local_index("kb").count == 20
+
+
+def test_not_exported_returns_none():
+    assert get_local_index("missing") is None
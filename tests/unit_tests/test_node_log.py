@@ -0,0 +1,164 @@
+"""agent 模板 utils/log：_BoundedSerializer 预算与 AsyncLogSink 过载 / 排空"""
+
+import json
+import os
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from utils.log import log_sink
+from utils.log import node_log
+from utils.log.log_sink import AsyncLogSink
+from utils.log.node_log import _BoundedSerializer, _serialize_data
+
+
+# ============================================================
+# _BoundedSerializer
+# ============================================================
+
+def test_long_string_is_truncated_with_marker():
+    s = _BoundedSerializer(max_str=10)
+    out = s.walk("x" * 25)
+    assert out == "x" * 10 + "...[+15 chars]"
+    assert s.truncations == 1
+
+
+def test_long_list_keeps_head_and_tail():
+    s = _BoundedSerializer(max_items=10)
+    out = s.walk(list(range(100)))
+    assert out[:5] == [0, 1, 2, 3, 4]
+    assert out[5] == "...[90 items omitted]"
+    assert out[-5:] == [95, 96, 97, 98, 99]
+
+
+def test_large_dict_and_depth_are_bounded():
+    s = _BoundedSerializer(max_items=3, max_depth=2)
+    out = s.walk({"a": {"b": {"c": 1}}, "x": 1, "y": 2, "z": 3})
+    assert out["a"] == {"b": "<dict>"}
+    assert out["..."] == "[1 keys omitted]"
+
+
+def test_byte_budget_caps_output():
+    data = [{"text": "v" * 100} for _ in range(40)]
+    s = _BoundedSerializer(max_bytes=1000, max_items=100)
+    walked = s.walk(data)
+    # 超出预算后的内容只留标记，整体大小与预算同量级
+    assert len(json.dumps(walked, ensure_ascii=False)) < 1500
+    kept = len(walked) - 1
+    assert walked[-1] == f"...[{40 - kept} items omitted]"
+    assert s.truncations == 1
+
+
+def test_seen_messages_are_referenced_not_repeated():
+    m1 = HumanMessage(content="hello", id="m1")
+    out = json.loads(_serialize_data({"messages": [m1]}, seen_message_ids={"m1"}))
+    assert out["messages"] == [{"type": "human", "id": "m1", "_logged": True}]
+
+
+def test_only_untruncated_messages_are_collected():
+    full = HumanMessage(content="short", id="full")
+    cut = AIMessage(content="y" * (node_log.SERIALIZE_MAX_STR + 1), id="cut")
+    seen, new = set(), set()
+    out = json.loads(_serialize_data([full, cut, full], seen, new))
+    assert new == {"full"}
+    # seen 只读，由调用方在日志被接收后更新
+    assert seen == set()
+    # 同一条目内重复出现的消息只完整输出一次
+    assert out[2] == {"type": "human", "id": "full", "_logged": True}
+
+
+def test_messages_cut_by_byte_budget_are_not_collected():
+    s = _BoundedSerializer(set(), max_bytes=50)
+    s.walk([HumanMessage(content="y" * 100, id="a"), HumanMessage(content="z", id="b")])
+    assert s.new_ids == set()
+
+
+@pytest.mark.parametrize("accepted", [True, False])
+def test_logger_marks_seen_only_for_accepted_entries(monkeypatch, accepted):
+    monkeypatch.setattr(node_log, "write_log", lambda entry: accepted)
+    logger = node_log.Logger.__new__(node_log.Logger)
+    logger.logged_message_ids = set()
+    new_ids = set()
+    payload = logger._serialize([HumanMessage(content="hi", id="m1")], new_ids)
+    logger._write({"input": payload}, new_ids)
+    assert logger.logged_message_ids == ({"m1"} if accepted else set())
+
+
+# ============================================================
+# AsyncLogSink
+# ============================================================
+
+def _read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.fixture
+def paused(monkeypatch):
+    """不启动写线程，让队列只进不出，用于构造过载"""
+    original = AsyncLogSink._ensure_writer
+    monkeypatch.setattr(AsyncLogSink, "_ensure_writer", lambda self: None)
+    return original
+
+
+def test_submit_and_flush_writes_all_entries(tmp_path):
+    path = os.path.join(tmp_path, "app.log")
+    sink = AsyncLogSink(path, queue_size=100, batch_size=7)
+    for i in range(50):
+        assert sink.submit({"level": "info", "message": f"m{i}"})
+    assert sink.flush(5.0)
+    lines = _read_lines(path)
+    assert [e["message"] for e in lines] == [f"m{i}" for i in range(50)]
+    stats = sink.stats()
+    assert stats["written"] == 50 and stats["dropped"] == 0 and stats["fsyncs"] >= 1
+    sink.close()
+
+
+def test_drop_policy_counts_and_reports_dropped(tmp_path, paused):
+    path = os.path.join(tmp_path, "app.log")
+    sink = AsyncLogSink(path, queue_size=3, overflow="drop")
+    accepted = [sink.submit({"level": "info", "message": f"m{i}"}) for i in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert sink.stats()["dropped"] == 2
+
+    paused(sink)  # 恢复写线程，排空队列
+    assert sink.flush(5.0)
+    lines = _read_lines(path)
+    assert [e["message"] for e in lines[:3]] == ["m0", "m1", "m2"]
+    assert lines[-1]["type"] == "log_dropped"
+    assert "2 entries dropped" in lines[-1]["message"]
+    sink.close()
+
+
+def test_sample_policy_keeps_errors_above_high_water(tmp_path, paused, monkeypatch):
+    monkeypatch.setattr(log_sink, "SAMPLE_HIGH_WATER", 0.5)
+    sink = AsyncLogSink(os.path.join(tmp_path, "app.log"), queue_size=20, overflow="sample", sample_n=3)
+    for i in range(10):
+        assert sink.submit({"level": "info", "message": f"fill{i}"})
+    kept = [sink.submit({"level": "info", "message": f"s{i}"}) for i in range(6)]
+    assert kept.count(True) == 2
+    assert sink.stats()["sampled_out"] == 4
+    # error 与 workflow 开始 / 结束条目不参与采样
+    assert sink.submit({"level": "error", "message": "boom"})
+    assert sink.submit({"level": "info", "type": "done", "message": "end"})
+
+
+def test_block_policy_times_out_then_drops(tmp_path, paused, monkeypatch):
+    monkeypatch.setattr(log_sink, "BLOCK_TIMEOUT_S", 0.05)
+    sink = AsyncLogSink(os.path.join(tmp_path, "app.log"), queue_size=1, overflow="block")
+    assert sink.submit({"message": "a"})
+    start = time.monotonic()
+    assert not sink.submit({"message": "b"})
+    assert time.monotonic() - start >= 0.04
+    assert sink.stats()["dropped"] == 1
+
+
+def test_close_drains_queue(tmp_path):
+    path = os.path.join(tmp_path, "app.log")
+    sink = AsyncLogSink(path, queue_size=100, fsync_interval=10.0)
+    for i in range(20):
+        sink.submit({"message": f"m{i}"})
+    sink.close(5.0)
+    assert len(_read_lines(path)) == 20
+    assert not sink.submit({"message": "late"})
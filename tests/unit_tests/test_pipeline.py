@@ -0,0 +1,106 @@
+"""src/decision-agent/pipeline.py：确定性直连流水线（检索 / LLM / 存储均为替身）"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
+
+REPORT = "## 综合推荐\n建议接受新 offer\n## 风险评估\n试用期风险"
+
+
+@pytest.fixture
+def pipeline(decision_agent, monkeypatch):
+    mod = decision_agent("pipeline")
+    calls = {"prompts": [], "saved": [], "retrieved": []}
+    lock = threading.Lock()
+
+    def knowledge(query):
+        with lock:
+            calls["retrieved"].append("knowledge")
+        return [mod.Snippet(text="知识：跳槽窗口期", score=0.9, source="kb")], \
+            [Document(page_content="跳槽窗口期", metadata={"source": "kb"})]
+
+    def web(query, year):
+        with lock:
+            calls["retrieved"].append("web")
+        return [mod.Snippet(text="网络：行业薪资", score=0.6, source="web")], []
+
+    def memory(query, n_results, user_id):
+        with lock:
+            calls["retrieved"].append(("memory", user_id))
+        return [{"scenario": "去年考虑过跳槽", "decision": "留下", "similarity": 0.8}]
+
+    def invoke(messages):
+        calls["prompts"].append(messages)
+        return SimpleNamespace(content=REPORT)
+
+    def save(**kwargs):
+        calls["saved"].append(kwargs)
+        return "decision_123456789012345678901234"
+
+    monkeypatch.setattr(mod, "recognize_intent", lambda q: {"intent_label": "career_choice",
+                                                            "key_factors": ["薪资", "通勤"]})
+    monkeypatch.setattr(mod, "_collect_knowledge_snippets", knowledge)
+    monkeypatch.setattr(mod, "_collect_web_snippets", web)
+    monkeypatch.setattr(mod, "retrieve_similar_decisions", memory, raising=False)
+    monkeypatch.setattr(mod, "save_decision", save, raising=False)
+    monkeypatch.setattr(mod, "_append_citations", lambda report, **kwargs: report + "\n---\n参考来源")
+    monkeypatch.setattr(mod, "llm", SimpleNamespace(invoke=invoke))
+    monkeypatch.setattr(mod, "RAG_ENABLED", True)
+    monkeypatch.setattr(mod, "INTENT_ENABLED", True)
+    monkeypatch.setattr(mod, "CITATION_ENABLED", True)
+    monkeypatch.setattr(mod, "PERSIST_ENABLED", True)
+    mod.calls = calls
+    return mod
+
+
+def test_parse_message_extracts_profile_and_question(pipeline):
+    text = '【用户画像】\n{"age": 28}\n\n其它说明\n\n【用户问题】要不要跳槽'
+    assert pipeline._parse_message(text) == ("要不要跳槽", '{"age": 28}')
+    assert pipeline._parse_message("  要不要跳槽 ") == ("要不要跳槽", "")
+
+
+def test_runs_every_stage_once(pipeline):
+    state = pipeline.graph.invoke({
+        "messages": [HumanMessage(content='【用户画像】\n{"age": 28}\n\n【用户问题】要不要跳槽')],
+        "user_id": "u1",
+    })
+    calls = pipeline.calls
+    assert sorted(map(str, calls["retrieved"])) == sorted(["knowledge", "web", "('memory', 'u1')"])
+    assert len(calls["prompts"]) == 1
+    user_msg = calls["prompts"][0][1].content
+    for text in ("知识：跳槽窗口期", "网络：行业薪资", "去年考虑过跳槽", "【关键决策要素】薪资、通勤"):
+        assert text in user_msg
+    assert state["decision_query"] == "要不要跳槽"
+    assert state["user_profile"] == '{"age": 28}'
+
+    saved = calls["saved"][0]
+    assert saved["user_id"] == "u1"
+    assert saved["decision_result"] == "建议接受新 offer"
+    assert saved["risk_summary"] == "试用期风险"
+    assert "参考来源" in state["report"] and "本次决策已记录" in state["report"]
+    assert state["messages"][-1].content == state["report"]
+    assert {t["node"] for t in state["timings"]} == {
+        "recognize_intent", "retrieve_knowledge", "retrieve_web", "retrieve_memory", "analysis", "citation", "persist"}
+
+
+def test_analysis_failure_skips_citation_and_persist(pipeline, monkeypatch):
+    def boom(messages):
+        raise RuntimeError("quota exceeded")
+    monkeypatch.setattr(pipeline, "llm", SimpleNamespace(invoke=boom))
+    state = pipeline.graph.invoke({"decision_query": "要不要跳槽"})
+    assert state["report"] == "分析失败：quota exceeded"
+    assert pipeline.calls["saved"] == []
+
+
+def test_intent_failure_falls_back_to_general(pipeline, monkeypatch):
+    def boom(query):
+        raise RuntimeError("classifier down")
+    monkeypatch.setattr(pipeline, "recognize_intent", boom)
+    monkeypatch.setattr(pipeline, "PERSIST_ENABLED", False)
+    state = pipeline.graph.invoke({"decision_query": "要不要跳槽"})
+    assert state["intent"]["intent_label"] == "general"
+    assert "【关键决策要素】" not in pipeline.calls["prompts"][0][1].content
+    assert pipeline.calls["saved"] == []
@@ -0,0 +1,80 @@
+"""src/decision-agent/prompt_budget.py：预算分配与上下文组装"""
+
+import pytest
+
+import prompt_budget as pb
+from prompt_budget import PromptSection, Snippet, allocate_budget, build_context, count_tokens
+
+
+def _section(name, texts_scores, **kw):
+    return PromptSection(name, name, [Snippet(text=t, score=s) for t, s in texts_scores], **kw)
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr(pb, "BUDGET_LOG", False)
+
+
+def test_allocation_never_exceeds_total_or_need():
+    sections = [
+        _section("kb", [("知" * 400, 0.9), ("识" * 300, 0.8)]),
+        _section("web", [("w " * 200, 0.3)]),
+        _section("empty", []),
+    ]
+    alloc = allocate_budget(sections, 500)
+    assert sum(alloc.values()) == 500
+    assert alloc["empty"] == 0
+    for sec in sections:
+        assert alloc[sec.name] <= sum(count_tokens(s.text) for s in sec.snippets)
+
+
+def test_allocation_is_proportional_to_relevance():
+    sections = [
+        _section("high", [("甲" * 1000, 0.9)]),
+        _section("low", [("乙" * 1000, 0.3)]),
+    ]
+    alloc = allocate_budget(sections, 400)
+    assert alloc["high"] == pytest.approx(300, abs=2)
+    assert alloc["low"] == pytest.approx(100, abs=2)
+
+
+def test_unused_share_is_redistributed():
+    # small 只需要 10 个 token，多出来的额度应全部流向 big
+    sections = [
+        _section("small", [("小" * 10, 0.9)]),
+        _section("big", [("大" * 1000, 0.1)]),
+    ]
+    alloc = allocate_budget(sections, 300)
+    assert alloc["small"] == 10
+    assert alloc["big"] == 290
+
+
+def test_min_and_max_tokens_are_respected():
+    sections = [
+        _section("floor", [("底" * 500, 0.01)], min_tokens=120),
+        _section("capped", [("顶" * 500, 0.99)], max_tokens=50),
+        _section("rest", [("余" * 500, 0.5)]),
+    ]
+    alloc = allocate_budget(sections, 400)
+    assert alloc["floor"] >= 120
+    assert alloc["capped"] == 50
+    assert sum(alloc.values()) == 400
+
+
+def test_total_larger_than_need_gives_everything():
+    sections = [_section("a", [("abc " * 10, 0.5)]), _section("b", [("一二三", 0.5)])]
+    alloc = allocate_budget(sections, 10_000)
+    assert alloc == {"a": count_tokens("abc " * 10), "b": 3}
+
+
+def test_build_context_stays_within_budget_and_dedups():
+    dup = "这是一个关于职业选择风险的知识片段，" * 10
+    sections = [
+        _section("kb", [(dup, 0.9), (dup, 0.8), ("另一条完全不同的内容" * 20, 0.5)]),
+        _section("web", [("web result " * 80, 0.4)]),
+    ]
+    context, usage = build_context(sections, 300)
+    assert sum(u["used"] for u in usage.values()) <= 300
+    assert context.count(dup) <= 1
+    assert usage["kb"]["dropped"] >= 1
+    assert "【kb】" in context
@@ -0,0 +1,174 @@
+"""rag/reranker.py：本地交叉编码器批量打分与分数缓存，Cohere 熔断器与降级路由"""
+
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from rag import reranker
+
+
+class FakeCrossEncoder:
+    """按文档中查询词出现次数打分，记录每次 predict 的批量大小"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        return [float(doc.count(query)) for query, doc in pairs]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeCrossEncoder()
+    monkeypatch.setattr(reranker, "_get_cross_encoder", lambda: fake)
+    monkeypatch.setattr(reranker, "_score_cache", OrderedDict())
+    monkeypatch.setattr(reranker, "RERANK_BACKEND", "cross_encoder")
+    return fake
+
+
+def _docs(*texts):
+    return [Document(page_content=t) for t in texts]
+
+
+def test_scores_in_one_batch_and_sorts(model):
+    docs = _docs("跳槽", "跳槽 跳槽 跳槽", "读研", "跳槽 跳槽")
+    ranked = reranker.local_rerank("跳槽", docs, top_k=3)
+    assert model.batches == [4]
+    assert [sc for _, sc in ranked] == [3.0, 2.0, 1.0]
+    assert ranked[0][0].metadata["_rerank_score"] == 3.0
+
+
+def test_cached_pairs_are_not_rescored(model):
+    reranker.local_rerank("跳槽", _docs("跳槽", "读研"), top_k=2)
+    reranker.local_rerank("跳槽", _docs("跳槽", "读研", "跳槽 跳槽"), top_k=2)
+    # 第二次只对新文档推理
+    assert model.batches == [2, 1]
+
+
+def test_cache_is_bounded(model, monkeypatch):
+    monkeypatch.setattr(reranker, "RERANK_CACHE_SIZE", 2)
+    reranker.local_rerank("q", _docs("a", "b", "c"), top_k=3)
+    assert len(reranker._score_cache) == 2
+
+
+def test_falls_back_to_jaccard_when_model_missing(monkeypatch):
+    monkeypatch.setattr(reranker, "_get_cross_encoder", lambda: None)
+    ranked = reranker.local_rerank("换 工作", _docs("换 工作 城市", "完全无关"), top_k=2)
+    assert ranked[0][0].page_content == "换 工作 城市"
+    assert "_rerank_score" not in ranked[0][0].metadata
+
+
+def test_inference_error_falls_back_to_jaccard(model, monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("onnx session failed")
+    monkeypatch.setattr(model, "predict", boom)
+    ranked = reranker.local_rerank("换 工作", _docs("完全无关", "换 工作"), top_k=1)
+    assert ranked[0][0].page_content == "换 工作"
+
+
+# ============================================================
+# 熔断器
+# ============================================================
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 1000.0}
+    monkeypatch.setattr(reranker, "time", SimpleNamespace(monotonic=lambda: now["t"]))
+    return now
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = reranker.CircuitBreaker("test", failure_threshold=2, cooldown_s=30)
+    breaker.record_failure("boom")
+    breaker.record_success()
+    breaker.record_failure("boom")
+    assert breaker.state == breaker.CLOSED
+    breaker.record_failure("boom")
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["short_circuited"] == 1
+    assert breaker.snapshot()["retry_in_s"] == 30.0
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = reranker.CircuitBreaker("test", failure_threshold=1, cooldown_s=30)
+    breaker.record_failure("boom")
+    clock["t"] += 30
+    assert breaker.allow_request()
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = reranker.CircuitBreaker("test", failure_threshold=3, cooldown_s=30)
+    for _ in range(3):
+        breaker.record_failure("boom")
+    clock["t"] += 31
+    assert breaker.allow_request()
+    breaker.record_failure("still down")
+    assert breaker.state == breaker.OPEN
+    assert breaker.opened_at == clock["t"]
+    assert not breaker.allow_request()
+
+
+class FakeCohere:
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.release = None
+
+    def rerank(self, query, documents, top_n, model, return_documents):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        hits = [SimpleNamespace(index=i, relevance_score=1.0 - i * 0.1) for i in range(top_n)]
+        return SimpleNamespace(results=list(reversed(hits)))
+
+
+@pytest.fixture
+def cohere(monkeypatch):
+    fake = FakeCohere()
+    monkeypatch.setattr(reranker, "COHERE_AVAILABLE", True)
+    monkeypatch.setattr(reranker, "_cohere_client", fake)
+    monkeypatch.setattr(reranker, "_cohere_breaker", reranker.CircuitBreaker("cohere", 2, 30))
+    monkeypatch.setattr(reranker, "RERANK_BACKEND", "jaccard")
+    return fake
+
+
+def test_cohere_success_keeps_remote_order(cohere):
+    ranked = reranker.cohere_rerank("q", _docs("a", "b", "c"), top_k=2)
+    assert [doc.page_content for doc, _ in ranked] == ["b", "a"]
+    assert ranked[1][0].metadata["_cohere_score"] == 1.0
+    assert reranker._cohere_breaker.state == "closed"
+
+
+def test_cohere_errors_open_breaker_and_short_circuit(cohere):
+    cohere.error = RuntimeError("503")
+    for _ in range(2):
+        ranked = reranker.cohere_rerank("换 工作", _docs("无关", "换 工作"), top_k=1)
+        assert ranked[0][0].page_content == "换 工作"
+    assert reranker._cohere_breaker.state == "open"
+    reranker.cohere_rerank("换 工作", _docs("无关", "换 工作"), top_k=1)
+    assert cohere.calls == 2
+
+
+def test_cohere_over_budget_uses_local_result(cohere, monkeypatch):
+    monkeypatch.setattr(reranker, "RERANK_LATENCY_BUDGET_MS", 20)
+    cohere.release = threading.Event()
+    try:
+        ranked = reranker.cohere_rerank("换 工作", _docs("无关", "换 工作"), top_k=1)
+    finally:
+        cohere.release.set()
+    assert ranked[0][0].page_content == "换 工作"
+    snapshot = reranker._cohere_breaker.snapshot()
+    assert snapshot["total_failures"] == 1
+    assert snapshot["last_error"].startswith("timeout")
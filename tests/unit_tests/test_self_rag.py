@@ -0,0 +1,107 @@
+"""rag/self_rag.py：批量 LLM 打分、解析失败时的默认分与缓存"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from rag import self_rag
+
+
+class FakeGrader:
+    """按提示词中的文档编号返回打分；reply 可替换成任意原始文本或异常"""
+
+    def __init__(self):
+        self.prompts = []
+        self.reply = None
+        self._lock = threading.Lock()
+
+    def invoke(self, messages):
+        prompt = messages[-1].content
+        with self._lock:
+            self.prompts.append(prompt)
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        if self.reply is not None:
+            return SimpleNamespace(content=self.reply)
+        ids = [int(i) for i in re.findall(r"【知识文本 (\d+)】", prompt)]
+        grades = [{"id": i, "relevant": True, "score": 0.9, "supportive": True,
+                   "support_score": 0.8, "key_evidence": f"e{i}"} for i in ids]
+        return SimpleNamespace(content="```json\n" + json.dumps(grades) + "\n```")
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeGrader()
+    monkeypatch.setattr(self_rag, "_llm", fake)
+    monkeypatch.setattr(self_rag, "_grade_cache", OrderedDict())
+    monkeypatch.setattr(self_rag, "LLM_EVAL_MODE", "batch")
+    monkeypatch.setattr(self_rag, "BATCH_SIZE", 12)
+    return fake
+
+
+def _docs(n):
+    return [Document(page_content=f"知识片段 {i}") for i in range(n)]
+
+
+def test_batch_grades_all_documents_in_one_call(llm):
+    grades = self_rag.grade_documents("要不要跳槽", _docs(5))
+    assert len(llm.prompts) == 1
+    assert [g["key_evidence"] for g in grades] == [f"e{i}" for i in range(5)]
+    assert all(g["reason"] == "LLM 批量评估" for g in grades)
+
+
+def test_large_batches_are_split(llm, monkeypatch):
+    monkeypatch.setattr(self_rag, "BATCH_SIZE", 2)
+    grades = self_rag.grade_documents("要不要跳槽", _docs(5))
+    assert len(llm.prompts) == 3
+    assert all(g["score"] == 0.9 for g in grades)
+
+
+def test_concurrent_mode_grades_one_document_per_call(llm, monkeypatch):
+    monkeypatch.setattr(self_rag, "LLM_EVAL_MODE", "concurrent")
+    self_rag.grade_documents("要不要跳槽", _docs(3))
+    assert len(llm.prompts) == 3
+
+
+def test_unparseable_reply_falls_back_to_default_grade(llm):
+    llm.reply = "抱歉，我无法给出 JSON"
+    grades = self_rag.grade_documents("要不要跳槽", _docs(2))
+    assert grades == [self_rag._default_grade()] * 2
+    # 默认分不进缓存，下次仍会重新评估
+    assert len(self_rag._grade_cache) == 0
+    llm.reply = None
+    assert self_rag.grade_documents("要不要跳槽", _docs(2))[0]["score"] == 0.9
+
+
+def test_llm_error_falls_back_to_default_grade(llm):
+    llm.reply = RuntimeError("quota exceeded")
+    grades = self_rag.grade_documents("要不要跳槽", _docs(3))
+    assert all(g["relevant"] and g["score"] == 0.5 for g in grades)
+
+
+def test_partial_reply_keeps_defaults_for_missing_ids(llm):
+    llm.reply = json.dumps({"id": 1, "relevant": False, "score": 0.1})
+    grades = self_rag.grade_documents("要不要跳槽", _docs(2))
+    assert grades[0] == self_rag._default_grade()
+    assert grades[1]["relevant"] is False
+
+
+def test_cached_grades_skip_the_llm(llm):
+    docs = _docs(3)
+    self_rag.grade_documents("要不要跳槽", docs[:2])
+    self_rag.grade_documents("要不要跳槽", docs)
+    assert len(llm.prompts) == 2
+    assert "【知识文本 1】" not in llm.prompts[1]
+
+
+def test_filter_uses_batch_grades(llm, monkeypatch):
+    monkeypatch.setattr(self_rag, "USE_LLM_EVAL", True)
+    kept = self_rag.self_rag_filter("要不要跳槽", _docs(4), max_docs=2, lightweight=False)
+    assert len(llm.prompts) == 1
+    assert len(kept) == 2
+    assert kept[0].metadata["_self_rag_sup"] == 0.8
@@ -0,0 +1,103 @@
+"""rag/shared_cache.py：TTL、namespace 隔离，以及 fork 后的重连"""
+
+import multiprocessing
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from rag import shared_cache
+from rag.shared_cache import SharedCache
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "_conns", {})
+    return os.path.join(tmp_path, "shared.sqlite3")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 1_700_000_000.0}
+    monkeypatch.setattr(shared_cache, "time", SimpleNamespace(time=lambda: now["t"]))
+    return now
+
+
+def test_roundtrip_and_ttl(db, clock):
+    cache = SharedCache("search", ttl_s=60, db_path=db)
+    assert cache.get("跳槽") is None
+    cache.put("跳槽", [{"title": "行业薪资", "score": 0.8}])
+    clock["t"] += 59
+    assert cache.get("跳槽") == [{"title": "行业薪资", "score": 0.8}]
+    clock["t"] += 2
+    assert cache.get("跳槽") is None
+
+
+def test_put_refreshes_expiry(db, clock):
+    cache = SharedCache("report", ttl_s=10, db_path=db)
+    cache.put("k", "v1")
+    clock["t"] += 8
+    cache.put("k", "v2")
+    clock["t"] += 8
+    assert cache.get("k") == "v2"
+
+
+def test_namespaces_are_isolated(db, clock):
+    search, report = SharedCache("search", 60, db), SharedCache("report", 60, db)
+    search.put("k", "search")
+    report.put("k", "report")
+    assert search.get("k") == "search"
+    search.clear()
+    assert search.get("k") is None
+    assert report.get("k") == "report"
+
+
+def test_expired_rows_are_purged_on_write(db, clock, monkeypatch):
+    cache = SharedCache("search", ttl_s=10, db_path=db)
+    cache.put("old", 1)
+    clock["t"] += 11
+    monkeypatch.setattr(shared_cache, "_PURGE_PROBABILITY", 1.0)
+    cache.put("new", 2)
+    rows = shared_cache._connection(db).execute("SELECT COUNT(*) FROM shared_cache").fetchone()
+    assert rows == (1,)
+
+
+@pytest.mark.parametrize("ttl_s, path", [(0, "db"), (60, "")])
+def test_disabled_cache_never_writes(db, ttl_s, path):
+    cache = SharedCache("search", ttl_s, db if path else "")
+    cache.put("k", "v")
+    assert not cache.enabled
+    assert cache.get("k") is None
+    assert not os.path.exists(db)
+
+
+def test_unopenable_path_degrades_to_miss(tmp_path, db):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    cache = SharedCache("search", 60, str(blocker / "cache.sqlite3"))
+    cache.put("k", "v")
+    assert cache.get("k") is None
+
+
+def _child_put(path, queue):
+    cache = SharedCache("search", 60, path)
+    cache.put("from_child", os.getpid())
+    queue.put(sorted(pid for _, pid in shared_cache._conns))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="需要 fork")
+def test_forked_worker_reconnects(db):
+    cache = SharedCache("search", 60, db)
+    cache.put("from_parent", 1)  # 父进程先建立连接（相当于 gunicorn --preload 的 master）
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    child = ctx.Process(target=_child_put, args=(db, queue))
+    child.start()
+    pids = queue.get(timeout=10)
+    child.join(10)
+    assert child.exitcode == 0
+    # 子进程没有复用父进程的连接，而是按自己的 pid 新建了一个
+    assert pids == sorted([os.getpid(), child.pid])
+    assert cache.get("from_child") == child.pid
+    assert list(shared_cache._conns) == [(os.path.abspath(db), os.getpid())]
@@ -0,0 +1,173 @@
+"""rag/tracing.py：span 嵌套、JSONL 导出与 Prometheus 文本格式"""
+
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from rag import tracing
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    monkeypatch.setattr(tracing, "_registry", tracing._Registry())
+    return path
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+# ============================================================
+# Span 嵌套与导出
+# ============================================================
+
+def test_nested_spans_share_one_trace(trace_file):
+    with tracing.span("request") as root:
+        with tracing.span("retrieve", collection="career") as child:
+            with tracing.span("rerank") as leaf:
+                leaf.set(docs=2)
+                assert tracing.current_trace_id() == root.trace.trace_id
+        with tracing.span("llm"):
+            pass
+    assert child.parent is root and leaf.parent is child
+    assert tracing.current_span() is None
+
+    [row] = _rows(trace_file)
+    assert row["trace_id"] == root.trace.trace_id
+    assert row["name"] == "request"
+    spans = {s["name"]: s for s in row["spans"]}
+    assert [s["name"] for s in row["spans"]] == ["request", "retrieve", "rerank", "llm"]
+    assert spans["request"]["parent"] is None
+    assert spans["rerank"]["parent"] == spans["retrieve"]["span_id"]
+    assert spans["retrieve"]["attrs"] == {"collection": "career"}
+    # retrieve 有子 span，不算叶子阶段
+    assert row["hot_stage"]["name"] in ("rerank", "llm")
+
+
+def test_sequential_roots_export_separate_traces(trace_file):
+    for name in ("a", "b"):
+        with tracing.span(name):
+            pass
+    rows = _rows(trace_file)
+    assert [r["name"] for r in rows] == ["a", "b"]
+    assert rows[0]["trace_id"] != rows[1]["trace_id"]
+
+
+def test_threads_do_not_inherit_the_parent_span(trace_file):
+    seen = {}
+
+    def worker():
+        seen["span"] = tracing.current_span()
+        with tracing.span("background"):
+            pass
+
+    with tracing.span("request"):
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+    assert seen["span"] is None
+    assert sorted(r["name"] for r in _rows(trace_file)) == ["background", "request"]
+
+
+def test_error_is_recorded_and_reraised(trace_file):
+    with pytest.raises(ValueError):
+        with tracing.span("request"):
+            with tracing.span("llm"):
+                raise ValueError("quota exceeded")
+    [row] = _rows(trace_file)
+    assert all(s["error"] == "ValueError: quota exceeded" for s in row["spans"])
+    assert 'decidex_stage_errors_total{stage="llm"} 1' in tracing.render_prometheus()
+
+
+def test_incr_and_llm_usage(trace_file):
+    tracing.incr("embedding_cache_hits", 3)  # 无活动 span：忽略
+    with tracing.span("llm") as sp:
+        tracing.incr("embedding_cache_hits", 2)
+        tracing.incr("embedding_cache_hits")
+        tracing.record_llm_usage(sp, SimpleNamespace(usage_metadata={"input_tokens": 120, "output_tokens": 30}))
+    assert sp.attrs == {"embedding_cache_hits": 3, "input_tokens": 120, "output_tokens": 30}
+
+
+def test_empty_trace_file_keeps_metrics_only(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FILE", "")
+    with tracing.span("request"):
+        pass
+    assert not trace_file.exists()
+    assert tracing.stage_summary()["request"]["count"] == 1
+
+
+def test_disabled_tracing_is_a_noop(trace_file, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_ENABLED", False)
+    with tracing.span("request") as sp:
+        sp.set(docs=1).incr("x_cache_hits")
+        assert tracing.current_span() is None
+    assert not trace_file.exists()
+    assert tracing.stage_summary() == {}
+
+
+# ============================================================
+# Prometheus
+# ============================================================
+
+def _observe(name, duration, **attrs):
+    sp = tracing.Span(name, tracing.Trace(), None, attrs)
+    sp.duration = duration
+    tracing._registry.observe(sp)
+
+
+def _samples(text):
+    """解析为 {(指标名, 标签串): 值}，同时校验每行都是合法的注释或样本"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("# "):
+            assert line.split()[1] in ("HELP", "TYPE")
+            continue
+        name_labels, value = line.rsplit(" ", 1)
+        name, _, labels = name_labels.partition("{")
+        samples[(name, labels.rstrip("}"))] = float(value)
+    return samples
+
+
+def test_render_histogram_is_cumulative(trace_file):
+    for duration in (0.003, 0.04, 0.04, 0.7, 120.0):
+        _observe("rerank", duration)
+    samples = _samples(tracing.render_prometheus())
+    bucket = "decidex_stage_duration_seconds_bucket"
+    assert samples[(bucket, 'stage="rerank",le="0.005"')] == 1
+    assert samples[(bucket, 'stage="rerank",le="0.05"')] == 3
+    assert samples[(bucket, 'stage="rerank",le="1.0"')] == 4
+    assert samples[(bucket, 'stage="rerank",le="60.0"')] == 4
+    assert samples[(bucket, 'stage="rerank",le="+Inf"')] == 5
+    assert samples[("decidex_stage_duration_seconds_count", 'stage="rerank"')] == 5
+    assert samples[("decidex_stage_duration_seconds_sum", 'stage="rerank"')] == pytest.approx(120.783)
+
+
+def test_render_counters(trace_file):
+    _observe("llm", 0.5, input_tokens=100, output_tokens=20)
+    _observe("llm", 0.5, input_tokens=50, output_tokens=5)
+    _observe("retrieve", 0.1, docs=3, embedding_cache_hits=2, knowledge_cache_hits=1)
+    _observe("retrieve", 0.1, docs=2, embedding_cache_hits=1)
+    text = tracing.render_prometheus()
+    samples = _samples(text)
+    assert samples[("decidex_llm_tokens_total", 'stage="llm",direction="input"')] == 150
+    assert samples[("decidex_llm_tokens_total", 'stage="llm",direction="output"')] == 25
+    assert samples[("decidex_cache_hits_total", 'stage="retrieve",cache="embedding"')] == 3
+    assert samples[("decidex_cache_hits_total", 'stage="retrieve",cache="knowledge"')] == 1
+    assert samples[("decidex_stage_documents_total", 'stage="retrieve"')] == 5
+    for metric, kind in (("decidex_stage_duration_seconds", "histogram"), ("decidex_llm_tokens_total", "counter"),
+                         ("decidex_stage_errors_total", "counter")):
+        assert f"# TYPE {metric} {kind}" in text
+    assert text.endswith("\n")
+
+
+def test_quantile_uses_bucket_upper_bounds(trace_file):
+    for duration in [0.02] * 18 + [0.3, 3.0]:
+        _observe("llm", duration)
+    summary = tracing.stage_summary()["llm"]
+    assert summary == {"count": 20, "p50_s": 0.025, "p95_s": 0.5}
+    assert tracing._registry.quantile("missing", 0.5) is None
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+错误模式匹配基准：逐条线性扫描 vs 预编译匹配器（CompiledPatternTable）
+
+用三张模式表中的关键词随机拼出错误字符串（含大小写变化、关键词相互粘连、无命中的字符串），
+先逐条校验两种实现的结果完全一致，再按字符串长度分档对比单次匹配耗时。
+
+--log 另外对一个日志文件跑 utils.error.log_analyzer，对比单进程与多进程的吞吐。
+
+使用方式（在项目根目录）：
+    python scripts/error_pattern_bench.py
+    python scripts/error_pattern_bench.py --n 50000 --log /tmp/app/work/logs/bypass/app.log --workers 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+app_dir = os.path.join(workspace_path, "src")
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from utils.error.patterns import (
+    CUSTOM_EXCEPTION_PATTERNS,
+    ERROR_PATTERNS,
+    TRACEBACK_EXCEPTION_PATTERNS,
+    match_error_pattern,
+    match_error_pattern_linear,
+)
+
+TABLES = {
+    "error": ERROR_PATTERNS,
+    "traceback": TRACEBACK_EXCEPTION_PATTERNS,
+    "custom": CUSTOM_EXCEPTION_PATTERNS,
+}
+_FILLER = "the request to upstream service returned at line in file 数据 处理 节点 value none".split()
+
+
+def build_corpus(n: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    keywords = sorted({kw for table in TABLES.values() for kws, _, _ in table for kw in kws})
+    corpus = []
+    for _ in range(n):
+        parts = [rnd.choice(_FILLER) for _ in range(rnd.randint(3, 40))]
+        for _ in range(rnd.randint(0, 4)):
+            kw = rnd.choice(keywords)
+            parts.insert(rnd.randint(0, len(parts)), kw.upper() if rnd.random() < 0.3 else kw)
+        # 30% 不加空格，制造关键词之间的重叠 / 粘连
+        corpus.append(" ".join(parts) if rnd.random() < 0.7 else "".join(parts))
+    return corpus
+
+
+def verify(corpus: list) -> int:
+    mismatches = 0
+    for table in TABLES.values():
+        for require_all in (False, True):
+            for text in corpus:
+                if match_error_pattern(text, table, require_all) != match_error_pattern_linear(text, table, require_all):
+                    mismatches += 1
+    return mismatches
+
+
+def time_per_call(fn, texts: list) -> float:
+    t0 = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return (time.perf_counter() - t0) / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="错误模式匹配：线性扫描 vs 预编译匹配器")
+    parser.add_argument("--n", type=int, default=20000, help="随机错误字符串数量")
+    parser.add_argument("--log", default=None, help="额外对该日志文件跑批量分析")
+    parser.add_argument("--workers", type=int, default=None, help="批量分析的进程数")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.n)
+    # 编译一次（计入首次调用开销之外）
+    match_error_pattern("warmup")
+    mismatches = verify(corpus + [text * 8 for text in corpus[:2000]])
+    print(f"一致性校验：{'通过' if mismatches == 0 else f'{mismatches} 处不一致'}")
+
+    print(f"{'repeat':>6}{'avg_len':>9}{'linear(us)':>12}{'compiled(us)':>14}{'speedup':>9}")
+    for repeat in (1, 3, 5, 10, 30):
+        texts = [text * repeat for text in corpus[: max(500, args.n // repeat)]]
+        linear = time_per_call(match_error_pattern_linear, texts)
+        compiled = time_per_call(match_error_pattern, texts)
+        avg_len = sum(map(len, texts)) // len(texts)
+        print(f"{repeat:>6}{avg_len:>9}{linear:>12.1f}{compiled:>14.1f}{linear / compiled:>8.2f}x")
+
+    if args.log:
+        from utils.error.log_analyzer import analyze_log
+
+        size_mb = os.path.getsize(args.log) / 1024 / 1024
+        for workers in (1, args.workers):
+            t0 = time.perf_counter()
+            stats = analyze_log(args.log, workers=workers)
+            elapsed = time.perf_counter() - t0
+            print(f"analyze_log workers={workers or 'auto'}: {elapsed:.2f}s，{size_mb / elapsed:.1f} MB/s，"
+                  f"错误 {stats.errors} 条，错误码 {len(stats.by_code)} 种")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+流式接口压测：GraphService.astream 的 async 实现 vs 旧的 thread 实现
+
+用一个不调用外部服务的假模型（逐 token 输出，每个 token 间隔 --token-delay 秒）构建图，
+同时发起 --streams 个流，采样记录：
+  - 进程线程数峰值（threading.active_count）
+  - RSS 峰值（/proc/self/status 的 VmRSS，非 Linux 下退化为 ru_maxrss）
+  - 全部流完成的耗时、首包延迟 p50/p95
+
+使用方式（在项目根目录）：
+    python scripts/stream_load_test.py --streams 500
+    python scripts/stream_load_test.py --streams 500 --impl thread
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from typing import AsyncIterator, Iterator, List, Optional
+
+workspace_path = os.getenv("COZE_WORKSPACE_PATH", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+app_dir = os.path.join(workspace_path, "src")
+if app_dir not in sys.path:
+    sys.path.insert(0, app_dir)
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from coze_coding_utils.runtime_ctx.context import new_context
+from main import GraphService
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """逐 token 输出固定回复的假模型，同步 / 异步两条路径分别用 time.sleep / asyncio.sleep 模拟网络延迟"""
+
+    reply: str = "这是一个用于压测的流式回复，" * 4
+    token_delay: float = 0.02
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for token in self.reply:
+            time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        for token in self.reply:
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def build_fake_graph(token_delay: float):
+    model = SlowFakeChatModel(token_delay=token_delay)
+
+    def chat(state):
+        return {"messages": [model.invoke(state["messages"])]}
+
+    async def achat(state):
+        return {"messages": [await model.ainvoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("chat", RunnableLambda(chat, afunc=achat))
+    builder.add_edge(START, "chat")
+    builder.add_edge("chat", END)
+    return builder.compile()
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _payload(i: int) -> dict:
+    return {
+        "type": "query",
+        "session_id": f"load-{i}",
+        "message": "压测",
+        "content": {"query": {"prompt": [{"type": "text", "content": {"text": "请回答"}}]}},
+    }
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def run(impl: str, streams: int, token_delay: float, cancel_ratio: float) -> dict:
+    service = GraphService.__new__(GraphService)
+    service.running_tasks = {}
+    service.stream_impl = impl
+    from utils.error import ErrorClassifier
+    service.error_classifier = ErrorClassifier()
+    graph = build_fake_graph(token_delay)
+
+    peak = {"threads": threading.active_count(), "rss": _rss_mb()}
+    stop = asyncio.Event()
+
+    async def sampler():
+        while not stop.is_set():
+            peak["threads"] = max(peak["threads"], threading.active_count())
+            peak["rss"] = max(peak["rss"], _rss_mb())
+            await asyncio.sleep(0.05)
+
+    first_chunk: List[float] = []
+
+    async def one(i: int, cancel_after: Optional[int]):
+        ctx = new_context(method="load_test")
+        t0 = time.perf_counter()
+        n = 0
+        stream = service.astream(_payload(i), graph, run_config={}, ctx=ctx)
+        try:
+            async for _ in stream:
+                if n == 0:
+                    first_chunk.append(time.perf_counter() - t0)
+                n += 1
+                if cancel_after is not None and n >= cancel_after:
+                    break
+        finally:
+            # 与客户端断开时 StreamingResponse 的行为一致：关闭生成器
+            await stream.aclose()
+        return n
+
+    baseline_threads, baseline_rss = threading.active_count(), _rss_mb()
+    sample_task = asyncio.create_task(sampler())
+    t0 = time.perf_counter()
+    n_cancel = int(streams * cancel_ratio)
+    results = await asyncio.gather(*[one(i, 5 if i < n_cancel else None) for i in range(streams)])
+    elapsed = time.perf_counter() - t0
+    # 被提前放弃的流：旧实现的线程要等下一条消息才退出，这里观察残留线程
+    await asyncio.sleep(0.2)
+    lingering = threading.active_count() - baseline_threads
+    stop.set()
+    await sample_task
+
+    return {
+        "impl": impl,
+        "streams": streams,
+        "messages": sum(results),
+        "elapsed_s": round(elapsed, 2),
+        "first_chunk_p50_ms": round(_percentile(first_chunk, 50) * 1000, 1),
+        "first_chunk_p95_ms": round(_percentile(first_chunk, 95) * 1000, 1),
+        "peak_threads": peak["threads"],
+        "extra_threads": peak["threads"] - baseline_threads,
+        "lingering_threads": max(lingering, 0),
+        "peak_rss_mb": round(peak["rss"], 1),
+        "extra_rss_mb": round(peak["rss"] - baseline_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GraphService.astream 并发流压测")
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--impl", choices=["async", "thread", "both"], default="both")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="假模型每个 token 的延迟（秒）")
+    parser.add_argument("--cancel-ratio", type=float, default=0.1, help="读取 5 条消息后主动放弃的流占比")
+    args = parser.parse_args()
+
+    impls = ["async", "thread"] if args.impl == "both" else [args.impl]
+    rows = [asyncio.run(run(impl, args.streams, args.token_delay, args.cancel_ratio)) for impl in impls]
+
+    keys = ["elapsed_s", "first_chunk_p50_ms", "first_chunk_p95_ms", "peak_threads",
+            "extra_threads", "lingering_threads", "peak_rss_mb", "extra_rss_mb", "messages"]
+    print(f"{'metric':<22}" + "".join(f"{r['impl']:>12}" for r in rows))
+    for k in keys:
+        print(f"{k:<22}" + "".join(f"{r[k]:>12}" for r in rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from typing import Optional, Dict, Any, List
 
 from .codes import ErrorCategory, get_error_description
 from .exceptions import VibeCodingError, classify_error
+from .stats import ErrorStatsCollector
 from ..log.err_trace import extract_core_stack
 
 logger = logging.getLogger(__name__)
@@ -43,12 +44,13 @@ class ErrorInfo:
 
 @dataclass
 class ErrorStats:
-    """错误统计结构"""
+    """错误统计结构（get_stats() 返回的合并快照）"""
     total_count: int = 0
     by_category: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
     by_code: Dict[int, int] = field(default_factory=lambda: defaultdict(int))
     by_node: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
     recent_errors: List[ErrorInfo] = field(default_factory=list)
+    windows: Dict[str, Dict[str, float]] = field(default_factory=dict)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -56,6 +58,7 @@ class ErrorStats:
             "by_category": dict(self.by_category),
             "by_code": {str(k): v for k, v in self.by_code.items()},
             "by_node": dict(self.by_node),
+            "windows": self.windows,
             "recent_errors": [e.to_dict() for e in self.recent_errors[-10:]],  # 最近10个错误
         }
 
@@ -71,8 +74,9 @@ class ErrorClassifier:
     """
 
     def __init__(self, max_recent_errors: int = 100):
-        self._stats = ErrorStats()
         self._max_recent_errors = max_recent_errors
+        # 请求线程各写各的分片，读取时合并，热路径上没有锁
+        self._collector = ErrorStatsCollector(max_recent_errors)
 
     def classify(
             self,
@@ -176,13 +180,7 @@ class ErrorClassifier:
         """更新错误统计"""
         ctx = context or {}
 
-        self._stats.total_count += 1
-        self._stats.by_category[error.category.name] += 1
-        self._stats.by_code[error.code] += 1
-
         node_name = ctx.get("node_name", "unknown")
-        if node_name:
-            self._stats.by_node[node_name] += 1
 
         # 记录最近的错误
         error_info = ErrorInfo(
@@ -196,19 +194,27 @@ class ErrorClassifier:
             node_name=node_name,
             task_id=ctx.get("task_id", ""),
         )
-        self._stats.recent_errors.append(error_info)
-
-        # 限制最近错误数量
-        if len(self._stats.recent_errors) > self._max_recent_errors:
-            self._stats.recent_errors = self._stats.recent_errors[-self._max_recent_errors:]
+        self._collector.record(error.category.name, error.code, node_name, error_info)
 
     def get_stats(self) -> ErrorStats:
-        """获取错误统计"""
-        return self._stats
+        """获取错误统计（合并各线程分片后的快照）"""
+        totals = self._collector.totals()
+        return ErrorStats(
+            total_count=totals["total_count"],
+            by_category=totals["by_category"],
+            by_code=totals["by_code"],
+            by_node=totals["by_node"],
+            recent_errors=self._collector.recent.latest(),
+            windows=self._collector.windows(),
+        )
+
+    def get_stats_snapshot(self, recent: int = 10) -> Dict[str, Any]:
+        """用于 /stats/errors 的统计快照：累计计数 + 1m/5m/1h 滑动窗口 + 最近错误"""
+        return self._collector.snapshot(recent)
 
     def reset_stats(self):
         """重置统计"""
-        self._stats = ErrorStats()
+        self._collector = ErrorStatsCollector(self._max_recent_errors)
 
     @staticmethod
     def parse_error_from_log(log_line: str) -> Optional[ErrorInfo]:
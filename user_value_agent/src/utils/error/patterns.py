@@ -4,7 +4,10 @@
 统一管理所有错误关键词到错误码的映射，避免在多个函数中重复定义匹配逻辑。
 """
 
-from typing import List, Tuple, Optional
+import os
+import re
+import threading
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 from .codes import ErrorCode
 
 
@@ -381,13 +384,150 @@ CUSTOM_EXCEPTION_PATTERNS: List[ErrorPattern] = [
 ]
 
 
+# ============================================================
+# 预编译匹配器
+# ============================================================
+
+# 超过该长度的错误字符串不走单正则扫描（见 CompiledPatternTable）
+PATTERN_REGEX_MAX_LEN = int(os.getenv("ERROR_PATTERN_REGEX_MAX_LEN", "512"))
+
+class CompiledPatternTable:
+    """
+    把一张模式表编译为单个正则，一次扫描找出错误字符串中出现的全部关键词，
+    再按表中顺序（优先级）选出第一个命中的模式，结果与逐条线性扫描完全一致。
+
+    编译方式：
+      - 所有关键词构建成前缀树，再展开为嵌套的非捕获分组正则（同一位置只走一条分支）
+      - 一次 findall 取得所有不重叠的命中（同一位置优先最长关键词）
+      - 每个关键词预先计算出「被它包含的其它关键词」，命中它即等价于这些关键词也出现了
+      - 起点落在某次命中内部、又越过其末尾的关键词会被 findall 跳过：预先计算
+        「后缀与其前缀重叠」的关键词对，只对这少量候选再做一次子串检查
+
+    re 的分支在每个位置逐个尝试，字符串很长时不如 C 实现的子串查找；超过 regex_max_len
+    的字符串改用预先小写化的关键词按优先级线性检查（可提前返回），两条路径结果相同。
+    """
+
+    def __init__(self, patterns: List[ErrorPattern], regex_max_len: int = PATTERN_REGEX_MAX_LEN):
+        self.patterns = patterns
+        self.regex_max_len = regex_max_len
+        keywords = sorted({kw.lower() for kws, _, _ in patterns for kw in kws if kw})
+        # 关键词 -> 包含的全部关键词（含自身）
+        self._implied: Dict[str, FrozenSet[str]] = {
+            kw: frozenset(other for other in keywords if other in kw) for kw in keywords
+        }
+        # 关键词 -> 含有该关键词的模式下标（升序）
+        self._pattern_ids: Dict[str, List[int]] = {}
+        self._lowered: List[FrozenSet[str]] = []
+        self._ordered: List[Tuple[str, ...]] = []
+        for idx, (kws, _, _) in enumerate(patterns):
+            self._ordered.append(tuple(kw.lower() for kw in kws))
+            lowered = frozenset(kw.lower() for kw in kws if kw)
+            self._lowered.append(lowered)
+            for kw in lowered:
+                self._pattern_ids.setdefault(kw, []).append(idx)
+        # 关键词 -> 可能从它内部开始、越过它末尾的关键词
+        self._straddling: Dict[str, Tuple[str, ...]] = {
+            kw: tuple(
+                other for other in keywords
+                if other not in self._implied[kw]
+                and any(other.startswith(kw[i:]) for i in range(1, len(kw)))
+            )
+            for kw in keywords
+        }
+        self._regex = re.compile(_trie_regex(keywords), re.DOTALL) if keywords else None
+
+    def found_keywords(self, error_lower: str) -> Set[str]:
+        """返回 error_lower 中出现的全部关键词"""
+        found: Set[str] = set()
+        if self._regex is None:
+            return found
+        hits = set(self._regex.findall(error_lower))
+        for kw in hits:
+            found |= self._implied[kw]
+        for kw in hits:
+            for other in self._straddling[kw]:
+                if other not in found and other in error_lower:
+                    found |= self._implied[other]
+        return found
+
+    def match_index(self, error_lower: str, require_all: bool = False) -> Optional[int]:
+        """返回第一个命中模式的下标，没有命中返回 None"""
+        if len(error_lower) > self.regex_max_len:
+            return self._scan_index(error_lower, require_all)
+        found = self.found_keywords(error_lower)
+        if not found:
+            return None
+        candidates = sorted({idx for kw in found for idx in self._pattern_ids[kw]})
+        for idx in candidates:
+            if not require_all or self._lowered[idx] <= found:
+                return idx
+        return None
+
+    def _scan_index(self, error_lower: str, require_all: bool) -> Optional[int]:
+        for idx, keywords in enumerate(self._ordered):
+            if require_all:
+                if all(kw in error_lower for kw in keywords):
+                    return idx
+            else:
+                for kw in keywords:
+                    if kw in error_lower:
+                        return idx
+        return None
+
+    def match(self, error_str: str, require_all: bool = False) -> Tuple[Optional[int], Optional[str]]:
+        idx = self.match_index(error_str.lower(), require_all)
+        if idx is None:
+            return None, None
+        _, code, msg_template = self.patterns[idx]
+        return code, f"{msg_template}: {error_str[:200]}"
+
+
+def _trie_regex(keywords: List[str]) -> str:
+    """把关键词列表转换为前缀树形式的正则（贪婪，同一位置优先最长关键词）"""
+    trie: dict = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        is_end = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if is_end:
+            # 当前位置已是完整关键词，后续分支可选（贪婪，优先更长的关键词）
+            return f"(?:{body})?" if len(branches) == 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+_compiled_tables: Dict[int, CompiledPatternTable] = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_table(patterns: List[ErrorPattern]) -> CompiledPatternTable:
+    """按模式表对象缓存编译结果（模块级的三张表各编译一次）"""
+    table = _compiled_tables.get(id(patterns))
+    if table is None or table.patterns is not patterns:
+        with _compiled_lock:
+            table = _compiled_tables.get(id(patterns))
+            if table is None or table.patterns is not patterns:
+                table = CompiledPatternTable(patterns)
+                _compiled_tables[id(patterns)] = table
+    return table
+
+
 def match_error_pattern(
     error_str: str,
     patterns: List[ErrorPattern] = None,
     require_all: bool = False
 ) -> Tuple[Optional[int], Optional[str]]:
     """
-    使用模式表匹配错误消息
+    使用模式表匹配错误消息（预编译匹配器，见 CompiledPatternTable）
     
     Args:
         error_str: 错误消息字符串
@@ -397,6 +537,17 @@ def match_error_pattern(
     Returns:
         (error_code, error_message) 或 (None, None) 如果没有匹配
     """
+    if patterns is None:
+        patterns = ERROR_PATTERNS
+    return get_compiled_table(patterns).match(error_str, require_all)
+
+
+def match_error_pattern_linear(
+    error_str: str,
+    patterns: List[ErrorPattern] = None,
+    require_all: bool = False
+) -> Tuple[Optional[int], Optional[str]]:
+    """逐条线性扫描的参考实现，用于基准对比和一致性校验"""
     if patterns is None:
         patterns = ERROR_PATTERNS
     
@@ -1,4 +1,6 @@
 import inspect
+import threading
+import weakref
 from dataclasses import dataclass
 from typing import Dict, Optional, Any, Callable, cast
 from langgraph.graph.state import CompiledStateGraph
@@ -73,16 +75,53 @@ class NodeInfo:
     node_type: str = ""
 
 
+def _weak_or_strong_ref(obj) -> Callable[[], Any]:
+    """能弱引用时返回 weakref.ref，否则退化为强引用（与 _parser_cache_by_id 一致）"""
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return lambda: obj
+
+
 class LangGraphParser:
     def __init__(self, app: CompiledStateGraph):
         # 从LangGraph中获取图结构
-        self.graph_app = app
+        # 只持有图对象的弱引用：parser 作为 _parser_cache 的值，强引用会让键（图对象）永远无法回收
+        self._app_ref = _weak_or_strong_ref(app)
         self.graph = app.get_graph()
         # 从图中构建节点信息
         self.nodes: Dict[str, NodeInfo] = {}  # NodeId -> NodeInfo
         # 构建基础信息 - 优先使用CompiledStateGraph中的信息
         self._build_node_info()
         self.condition_funcs = self._pre_process_conditional_fork_node_info()  # 跟踪condition节点的判断函数，因为中间会插入哑结点和condition节点
+        self._build_lookup_tables()
+
+    @property
+    def graph_app(self) -> Optional[CompiledStateGraph]:
+        """解析所针对的图对象；已被回收时为 None"""
+        return self._app_ref()
+
+    def _build_lookup_tables(self):
+        """预计算回调中按节点名查询的表，图编译后不再变化"""
+        self.node_types: Dict[str, str] = {
+            node_id: self._infer_node_type(node_id) for node_id in self.graph.nodes
+        }
+        # func name -> metadata（get_node_metadata 原先每次线性扫描 nodes）
+        self.metadata_by_name: Dict[str, dict] = {}
+        for node in self.nodes.values():
+            graph_node = self.graph.nodes.get(node.node_id)
+            if graph_node and graph_node.metadata:
+                self.metadata_by_name[node.name] = graph_node.metadata
+        # Logger.get_node_tags 的结果
+        self.node_tags: Dict[str, Dict[str, str]] = {
+            key: {
+                "node_id": info.node_id,
+                "node_type": self.get_node_type(info.node_id),
+                "node_title": info.title,
+                "node_name": info.name,
+            }
+            for key, info in self.nodes.items()
+        }
 
     def _is_agent_node(self, node_id: str) -> bool:
         """
@@ -121,16 +160,7 @@ class LangGraphParser:
         return False
 
     def get_node_metadata(self, func_name: str) -> dict:
-        node_id = ""
-        for _, node in self.nodes.items():
-            if node.name == func_name:
-                node_id = node.node_id
-
-        node = self.graph.nodes.get(node_id)
-        if node and node.metadata:
-            return node.metadata
-
-        return {}
+        return self.metadata_by_name.get(func_name, {})
 
     def find_conditional_nodes(self):
         conditional_nodes = set()
@@ -155,6 +185,12 @@ class LangGraphParser:
         return conditional_nodes
 
     def get_node_type(self, node_id):
+        node_types = getattr(self, "node_types", None)
+        if node_types is not None and node_id in node_types:
+            return node_types[node_id]
+        return self._infer_node_type(node_id)
+
+    def _infer_node_type(self, node_id):
         # 简单推断逻辑
         if node_id == START: return "start"
         if node_id == END: return "end"
@@ -253,3 +289,41 @@ class LangGraphParser:
                 conditional_funcs[check_func_name] = {
                     "cond_node_name": "cond_" + parent_id} # 拼成前端的条件节点名
         return conditional_funcs
+
+
+# ============================================================
+# 按编译后的图缓存解析结果：图在进程生命周期内不变，每次请求复用同一个 parser
+# ============================================================
+
+_parser_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_parser_cache_by_id: Dict[int, LangGraphParser] = {}
+_parser_cache_lock = threading.Lock()
+
+
+def get_parser(app: CompiledStateGraph) -> LangGraphParser:
+    """
+    返回 app 对应的 LangGraphParser，同一个图对象只解析一次。
+    parser 只弱引用图对象，图对象被回收后 WeakKeyDictionary 中的条目随之释放；
+    不支持弱引用的对象退化为按 id 缓存（parser 强引用图对象，保证 id 不被复用）。
+    """
+    try:
+        parser = _parser_cache.get(app)
+    except TypeError:
+        parser = _parser_cache_by_id.get(id(app))
+        if parser is not None and parser.graph_app is not app:
+            parser = None
+    if parser is not None:
+        return parser
+
+    with _parser_cache_lock:
+        try:
+            parser = _parser_cache.get(app)
+            if parser is None:
+                parser = LangGraphParser(app)
+                _parser_cache[app] = parser
+        except TypeError:
+            parser = _parser_cache_by_id.get(id(app))
+            if parser is None or parser.graph_app is not app:
+                parser = LangGraphParser(app)
+                _parser_cache_by_id[id(app)] = parser
+    return parser